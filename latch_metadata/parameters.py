@@ -38,6 +38,24 @@ generated_parameters = {
         section_title=None,
         description='MultiQC report title. Printed as page header, used for filename if not otherwise specified.',
     ),
+    'skip_fastqc': NextflowParameter(
+        type=typing.Optional[bool],
+        default=None,
+        section_title=None,
+        description='Do not run FastQC on the simulated reads.',
+    ),
+    'local_bookkeeping': NextflowParameter(
+        type=typing.Optional[bool],
+        default=True,
+        section_title=None,
+        description='Build the samplesheets and extract the probe archive inside the Nextflow process.',
+    ),
+    'output_format': NextflowParameter(
+        type=typing.Optional[str],
+        default='fastq',
+        section_title=None,
+        description='Format the simulated reads are published in.',
+    ),
     'amplicon': NextflowParameter(
         type=typing.Optional[bool],
         default=None,
@@ -62,10 +80,28 @@ generated_parameters = {
         section_title=None,
         description='Option to simulate wholegenomic sequencing reads.',
     ),
+    'simulation_shards': NextflowParameter(
+        type=typing.Optional[int],
+        default=1,
+        section_title=None,
+        description="Number of tasks each sample's reads are split over.",
+    ),
+    'batch_samples': NextflowParameter(
+        type=typing.Optional[bool],
+        default=None,
+        section_title=None,
+        description='Simulate all samples of a mode in one task that reads the reference once (readsim engines only).',
+    ),
+    'amplicon_engine': NextflowParameter(
+        type=typing.Optional[str],
+        default='crabs',
+        section_title='Amplicon options',
+        description='Engine used to extract amplicons from the reference.',
+    ),
     'amplicon_fw_primer': NextflowParameter(
         type=typing.Optional[str],
         default='GTCGGTAAAACTCGTGCCAGC',
-        section_title='Amplicon options',
+        section_title=None,
         description='Forward primer to use with crabs_insilicopcr.',
     ),
     'amplicon_rv_primer': NextflowParameter(
@@ -110,6 +146,12 @@ generated_parameters = {
         section_title=None,
         description='Name of supported probe. Mandatory if not using `--probes` parameter.',
     ),
+    'target_capture_engine': NextflowParameter(
+        type=typing.Optional[str],
+        default='capsim',
+        section_title=None,
+        description='Engine used to simulate target capture reads.',
+    ),
     'target_capture_mode': NextflowParameter(
         type=typing.Optional[str],
         default='illumina',
@@ -176,10 +218,15 @@ generated_parameters = {
         section_title=None,
         description='Illumina: Sequencing mode.',
     ),
+    'metagenome_engine': NextflowParameter(
+        type=typing.Optional[str],
+        default='insilicoseq',
+        section_title='Metagenome options',
+        description='Engine used to simulate metagenomic reads.',
+    ),
     'metagenome_abundance': NextflowParameter(
         type=typing.Optional[str],
         default='lognormal',
-        section_title='Metagenome options',
         description='Abundance distribution.',
     ),
     'metagenome_abundance_file': NextflowParameter(
@@ -230,10 +277,16 @@ generated_parameters = {
         section_title=None,
         description='Use this option to prevent simulating reads that have abnormal GC content.',
     ),
+    'wholegenome_engine': NextflowParameter(
+        type=typing.Optional[str],
+        default='wgsim',
+        section_title='Wholegenome options',
+        description='Engine used to simulate wholegenome reads.',
+    ),
     'wholegenome_error_rate': NextflowParameter(
         type=typing.Optional[float],
         default=0.02,
-        section_title='Wholegenome options',
+        section_title=None,
         description='The base error rate.',
     ),
     'wholegenome_outer_dist': NextflowParameter(
@@ -284,6 +337,12 @@ generated_parameters = {
         section_title=None,
         description='The probability that an indel is extended.',
     ),
+    'wholegenome_haplotypes': NextflowParameter(
+        type=typing.Optional[bool],
+        default=False,
+        section_title=None,
+        description='Build the mutated haplotypes of every sample once, with a truth VCF, and simulate the reads from them (readsim engine only).',
+    ),
     'genome': NextflowParameter(
         type=typing.Optional[str],
         default=None,
@@ -296,6 +355,12 @@ generated_parameters = {
         section_title=None,
         description='Path to reference FASTA file.',
     ),
+    'prepare_reference': NextflowParameter(
+        type=typing.Optional[bool],
+        default=True,
+        section_title=None,
+        description='Inflate and index the reference once and share it between all simulators.',
+    ),
     'ncbidownload_accessions': NextflowParameter(
         type=typing.Optional[LatchFile],
         default=None,
@@ -320,11 +385,41 @@ generated_parameters = {
         section_title=None,
         description="The NCBI section to download. 'refseq' or 'genbank'.",
     ),
+    'ncbidownload_engine': NextflowParameter(
+        type=typing.Optional[str],
+        default='ncbi-genome-download',
+        section_title=None,
+        description='Engine used to download and merge the reference genomes.',
+    ),
+    'merge_fastas_bgzf': NextflowParameter(
+        type=typing.Optional[bool],
+        default=True,
+        section_title=None,
+        description='Merge the genomes downloaded by ncbi-genome-download into one indexed BGZF file.',
+    ),
     'multiqc_methods_description': NextflowParameter(
         type=typing.Optional[str],
         default=None,
         section_title='Generic options',
         description='Custom MultiQC yaml file containing HTML including a methods description.',
     ),
+    'reference_cache': NextflowParameter(
+        type=typing.Optional[bool],
+        default=True,
+        section_title='Latch options',
+        description='Reuse merged NCBI references, Bowtie2 indices and wholegenome haplotypes built by earlier runs for the same reference.',
+    ),
+    'resume': NextflowParameter(
+        type=typing.Optional[bool],
+        default=False,
+        section_title=None,
+        description='Keep the work directory and resume from it when the same pipeline version is run again with the same parameters (the samplesheet may differ); completed tasks are not run again.',
+    ),
+    'resource_monitor': NextflowParameter(
+        type=typing.Optional[bool],
+        default=True,
+        section_title=None,
+        description='Sample the CPU, memory, open files, work volume usage and JVM heap of the Nextflow runtime while it runs, warn when the heap or the work volume nears its limit, and upload the timeline with the Nextflow log.',
+    ),
 }
 
@@ -0,0 +1,25 @@
+process COLLATE_SAMPLESHEETS {
+    tag "samplesheets"
+
+    input:
+    val(rows) // list: [ datatype, sample, fastq_1, fastq_2 ]
+
+    output:
+    path("*_samplesheet.csv"), emit: samplesheet
+
+    exec:
+    // Build every per-datatype samplesheet in one pass in the Nextflow process,
+    // instead of one CREATE_SAMPLESHEET task per sample and mode plus a merge
+    def quote  = { value -> '"' + value + '"' }
+    def header = [ 'sample', 'fastq_1', 'fastq_2' ].collect(quote).join(',')
+    rows
+        .groupBy { it[0] }
+        .each { datatype, datatype_rows ->
+            def lines = datatype_rows
+                .collect { row -> row[1..3] }
+                .sort { a, b -> a[0] <=> b[0] ?: a[1] <=> b[1] }
+                .collect { fields -> fields.collect(quote).join(',') }
+            def samplesheet = task.workDir.resolve("${datatype}_samplesheet.csv")
+            samplesheet.text = ([ header ] + lines).join('\n') + '\n'
+        }
+}
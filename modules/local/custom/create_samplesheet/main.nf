@@ -8,11 +8,13 @@ process CREATE_SAMPLESHEET {
     tuple val(meta), path("*.csv"), emit: samplesheet
 
     exec:
-    def fastq_1 = "${params.outdir}/${meta.outdir}/${fastq}"
+    // The reads are listed where they end up, which differs from --outdir when results are uploaded after the run
+    def outdir  = params.samplesheet_outdir ?: params.outdir
+    def fastq_1 = "${outdir}/${meta.outdir}/${fastq}"
     def fastq_2 = ''
     if (fastq instanceof List && fastq.size() == 2) {
-        fastq_1 = "${params.outdir}/${meta.outdir}/${fastq[0]}"
-        fastq_2 = "${params.outdir}/${meta.outdir}/${fastq[1]}"
+        fastq_1 = "${outdir}/${meta.outdir}/${fastq[0]}"
+        fastq_2 = "${outdir}/${meta.outdir}/${fastq[1]}"
     }
 
     // Add relevant fields to the beginning of the map
@@ -0,0 +1,32 @@
+import java.util.zip.ZipInputStream
+
+process EXTRACT_ZIP {
+    tag "$file"
+
+    input:
+    path(file)
+
+    output:
+    path "unziped/*", emit: file
+
+    exec:
+    // Extract in the Nextflow process with java.util.zip instead of an unzip container;
+    // the archive is streamed, so it may also be a remote path
+    def outdir = task.workDir.resolve('unziped')
+    outdir.mkdirs()
+    new ZipInputStream(file.newInputStream()).withCloseable { zip ->
+        def entry
+        while ( (entry = zip.nextEntry) != null ) {
+            def target = outdir.resolve(entry.name).normalize()
+            if ( !target.startsWith(outdir) ) {
+                throw new IllegalArgumentException("Zip entry ${entry.name} would be extracted outside of ${outdir}")
+            }
+            if ( entry.isDirectory() ) {
+                target.mkdirs()
+            } else {
+                target.parent.mkdirs()
+                target.withOutputStream { output -> output << zip }
+            }
+        }
+    }
+}
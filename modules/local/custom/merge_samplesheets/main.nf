@@ -22,8 +22,8 @@ process MERGE_SAMPLESHEETS {
     """
     echo \\"sample\\",\\"fastq_1\\",\\"fastq_2\\" > "${prefix}_samplesheet.csv"
     for curr_sheet in $samplesheet; do
-        tail -n +2 "\$curr_sheet" >> "${prefix}_samplesheet.csv"
-        echo >> "${prefix}_samplesheet.csv"
+        # CREATE_SAMPLESHEET leaves the last row unterminated; add the newline only where it is missing
+        tail -n +2 "\$curr_sheet" | sed -e '\$a\\' >> "${prefix}_samplesheet.csv"
     done
     """
 }
@@ -0,0 +1,39 @@
+process SHA256SUM {
+    tag "$file"
+    label 'process_single'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/ubuntu:20.04' :
+        'nf-core/ubuntu:20.04' }"
+
+    input:
+    path(file)
+
+    output:
+    env(SHA256)        , emit: sha256
+    path "versions.yml", emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    """
+    SHA256=\$(sha256sum -b ${file} | cut -d ' ' -f 1)
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        sha256sum: \$(sha256sum --version | head -n 1 | sed 's/sha256sum (GNU coreutils) //g')
+    END_VERSIONS
+    """
+
+    stub:
+    """
+    SHA256=\$(echo ${file} | sha256sum | cut -d ' ' -f 1)
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        sha256sum: \$(sha256sum --version | head -n 1 | sed 's/sha256sum (GNU coreutils) //g')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,56 @@
+process READSIM_CAPSIM {
+    tag "$meta.id"
+    label 'process_medium'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    tuple val(meta), path(fasta), path(probes)
+
+    output:
+    tuple val(meta), path("*.fastq.gz")    , emit: fastq
+    tuple val(meta), path("*.fastq.gz.gzi"), emit: gzi
+    tuple val(meta), path("*.stats.json")  , emit: stats
+    path "versions.yml"                    , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args   = task.ext.args ?: ''
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    def seed   = task.ext.seed ?: "${meta.seed}"
+    """
+    readsim capsim \\
+        --reference ${fasta} \\
+        --probe ${probes} \\
+        --ID ${prefix} \\
+        --seed ${seed} \\
+        -t $task.cpus \\
+        --stats ${prefix}.stats.json \\
+        ${args} ${prefix}
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+
+    stub:
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    """
+    echo "" | gzip > ${prefix}_1.fastq.gz
+    echo "" | gzip > ${prefix}_2.fastq.gz
+    touch ${prefix}_1.fastq.gz.gzi
+    touch ${prefix}_2.fastq.gz.gzi
+    echo "{}" > ${prefix}.stats.json
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+}
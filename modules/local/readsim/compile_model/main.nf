@@ -0,0 +1,49 @@
+process READSIM_COMPILE_MODEL {
+    tag "$model"
+    label 'process_single'
+    label 'readsim'
+
+    // the InSilicoSeq models ship with its package, which also brings python and numpy
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/insilicoseq:1.6.0--pyh7cba7a3_0':
+        'biocontainers/insilicoseq:1.6.0--pyh7cba7a3_0' }"
+
+    input:
+    val(model)
+
+    output:
+    path "*.rqm"       , emit: model
+    path "versions.yml", emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args = task.ext.args ?: ''
+    """
+    readsim compile-model \\
+        --iss ${model} \\
+        ${args} \\
+        ${model}.rqm
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+        insilicoseq: \$(iss --version | sed 's/iss version //g')
+    END_VERSIONS
+    """
+
+    stub:
+    """
+    touch ${model}.rqm
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+        insilicoseq: \$(iss --version | sed 's/iss version //g')
+    END_VERSIONS
+    """
+}
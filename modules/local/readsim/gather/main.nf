@@ -0,0 +1,34 @@
+process READSIM_GATHER {
+    tag "$meta.id"
+    label 'process_single'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    tuple val(meta), path(fastqs, stageAs: "shard*/*")
+
+    output:
+    tuple val(meta), path("*.{fq,fastq}.gz")    , emit: fastq
+    tuple val(meta), path("*.{fq,fastq}.gz.gzi"), emit: gzi, optional: true
+    path "versions.yml"                         , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    // Shard directories are numbered in the order the files were given, so a
+    // natural sort of each basename's copies restores the shard order.
+    // BGZF shards are joined block by block and indexed as they are copied;
+    // shards of other engines are plain gzip, concatenated without an index.
+    """
+    for name in \$(for f in shard*/*; do basename "\$f"; done | sort -u); do
+        readsim concat --output "\$name" \$(ls -v shard*/"\$name")
+    done
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+    END_VERSIONS
+    """
+}
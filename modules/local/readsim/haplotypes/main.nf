@@ -0,0 +1,51 @@
+process READSIM_HAPLOTYPES {
+    tag "$meta.id"
+    label 'process_single'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    tuple val(meta), path(fasta)
+
+    output:
+    tuple val(meta), path("*.rhap")      , emit: haplotypes
+    tuple val(meta), path("*.vcf.gz")    , emit: vcf
+    tuple val(meta), path("*.vcf.gz.gzi"), emit: gzi
+    path "versions.yml"                  , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args   = task.ext.args ?: ''
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    """
+    readsim haplotypes \\
+        $args \\
+        -S $meta.seed \\
+        --sample $prefix \\
+        $fasta \\
+        $prefix
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+
+    stub:
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    """
+    touch ${prefix}.rhap
+    echo "" | gzip > ${prefix}.vcf.gz
+    touch ${prefix}.vcf.gz.gzi
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+}
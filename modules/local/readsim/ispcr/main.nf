@@ -0,0 +1,46 @@
+process READSIM_ISPCR {
+    tag "$meta.id"
+    label 'process_medium'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    tuple val(meta), path(fasta)
+
+    output:
+    tuple val(meta), path("*.fa"), emit: fasta
+    path "versions.yml"          , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args   = task.ext.args ?: ''
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    """
+    readsim ispcr \\
+        $args \\
+        -t $task.cpus \\
+        $fasta \\
+        ${prefix}.ispcr.fa
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+
+    stub:
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    """
+    touch ${prefix}.ispcr.fa
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,47 @@
+process READSIM_MERGE_FASTAS {
+    tag "$meta.id"
+    label 'process_medium'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    tuple val(meta), path(fasta)
+
+    output:
+    tuple val(meta), path("*.fa.gz")    , emit: fasta
+    tuple val(meta), path("*.fa.gz.gzi"), emit: gzi
+    path "versions.yml"                 , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args          = task.ext.args ?: ''
+    def prefix        = task.ext.prefix ?: "${meta.id}"
+    // Stream the downloaded genomes into a BGZF file so the merged reference can be indexed and read in parallel
+    """
+    zcat -f ${fasta} \\
+        | readsim bgzip \\
+            --threads $task.cpus \\
+            $args \\
+            --output ${prefix}.fa.gz
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+    END_VERSIONS
+    """
+
+    stub:
+    def prefix        = task.ext.prefix ?: "${meta.id}"
+    """
+    echo "" | gzip > ${prefix}.fa.gz
+    touch ${prefix}.fa.gz.gzi
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+    END_VERSIONS
+    """
+}
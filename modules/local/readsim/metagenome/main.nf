@@ -0,0 +1,72 @@
+process READSIM_METAGENOME {
+    tag "$meta.id"
+    label 'process_medium'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    tuple val(meta), path(fasta)
+    val(input_format)
+    path(abundance_file)
+    path(coverage_file)
+    path(compiled_model)
+
+    output:
+    tuple val(meta), path("*.fastq.gz")     , emit: fastq
+    tuple val(meta), path("*.fastq.gz.gzi") , emit: gzi
+    tuple val(meta), path("*_abundance.txt"), emit: abundance
+    tuple val(meta), path("*.stats.json")   , emit: stats
+    path "versions.yml"                     , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args          = task.ext.args ?: ''
+    def prefix        = task.ext.prefix ?: "${meta.id}"
+    def seed          = task.ext.seed ?: "${meta.seed}"
+    def input_format  = input_format == "genomes" ? "--genomes" : "--draft"
+    def abundance     = abundance_file ? "--abundance_file ${abundance_file}" : ""
+    def coverage      = coverage_file ? "--coverage_file ${coverage_file}" : ""
+    def compiled      = compiled_model ? "--compiled-model ${compiled_model}" : ""
+    // shards draw their reads from their own seed but the abundance profile of the sample
+    def sample_seed   = meta.sample_seed != null ? "--sample-seed ${meta.sample_seed}" : ""
+    """
+    readsim metagenome \\
+        $input_format \\
+        $args \\
+        $abundance \\
+        $coverage \\
+        $compiled \\
+        -S $seed \\
+        $sample_seed \\
+        -t $task.cpus \\
+        --stats ${prefix}.stats.json \\
+        $fasta \\
+        ${prefix}
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+
+    stub:
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    """
+    echo "" | gzip > ${prefix}_R1.fastq.gz
+    echo "" | gzip > ${prefix}_R2.fastq.gz
+    touch ${prefix}_R1.fastq.gz.gzi
+    touch ${prefix}_R2.fastq.gz.gzi
+    touch ${prefix}_abundance.txt
+    echo "{}" > ${prefix}.stats.json
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,77 @@
+process READSIM_METAGENOME_BATCH {
+    tag "$meta.id"
+    label 'process_medium'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    tuple val(meta), val(samples), path(fasta)
+    val(input_format)
+    path(abundance_file)
+    path(coverage_file)
+    path(compiled_model)
+
+    output:
+    tuple val(meta), val(samples), path("*.fastq.gz"), emit: fastq
+    tuple val(meta), path("*.fastq.gz.gzi")          , emit: gzi
+    tuple val(meta), path("*_abundance.txt")         , emit: abundance
+    tuple val(meta), path("*.stats.json")            , emit: stats
+    tuple val(meta), path("*.batch_report.json")     , emit: report
+    path "versions.yml"                              , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args          = task.ext.args ?: ''
+    def prefix        = task.ext.prefix ?: "${meta.id}"
+    def input_format  = input_format == "genomes" ? "--genomes" : "--draft"
+    def abundance     = abundance_file ? "--abundance_file ${abundance_file}" : ""
+    def coverage      = coverage_file ? "--coverage_file ${coverage_file}" : ""
+    def compiled      = compiled_model ? "--compiled-model ${compiled_model}" : ""
+    def sample_table  = samples.collect { sample -> "${sample.id}\t${sample.seed}" }.join('\n')
+    """
+    cat <<-END_SAMPLES > samples.tsv
+    ${sample_table}
+    END_SAMPLES
+
+    readsim metagenome-batch \\
+        $input_format \\
+        $args \\
+        $abundance \\
+        $coverage \\
+        $compiled \\
+        -t $task.cpus \\
+        --samples samples.tsv \\
+        --report ${prefix}.batch_report.json \\
+        $fasta
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+
+    stub:
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    def ids    = samples.collect { sample -> sample.id }.join(' ')
+    """
+    for id in ${ids}; do
+        echo "" | gzip > \${id}_R1.fastq.gz
+        echo "" | gzip > \${id}_R2.fastq.gz
+        touch \${id}_R1.fastq.gz.gzi
+        touch \${id}_R2.fastq.gz.gzi
+        touch \${id}_abundance.txt
+        echo "{}" > \${id}.stats.json
+    done
+    echo "{}" > ${prefix}.batch_report.json
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,57 @@
+process READSIM_NCBI_DOWNLOAD {
+    tag "$meta.id"
+    label 'process_medium'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    val meta
+    path accessions
+    path taxids
+    val groups
+
+    output:
+    tuple val(meta), path("*.fa.gz")         , emit: fasta
+    tuple val(meta), path("*.fa.gz.gzi")     , emit: gzi
+    tuple val(meta), path("*.assemblies.tsv"), emit: manifest
+    path "versions.yml"                      , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args           = task.ext.args ?: ''
+    def prefix         = task.ext.prefix ?: "${meta.id}"
+    def accessions_opt = accessions ? "--accessions ${accessions}" : ""
+    def taxids_opt     = taxids ? "--taxids ${taxids}" : ""
+    // Downloads are network bound, so the connection count is set in ext.args rather than from task.cpus
+    """
+    readsim ncbi-download \\
+        $args \\
+        $accessions_opt \\
+        $taxids_opt \\
+        --groups $groups \\
+        --threads $task.cpus \\
+        --manifest ${prefix}.assemblies.tsv \\
+        --output ${prefix}.fa.gz
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+    END_VERSIONS
+    """
+
+    stub:
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    """
+    echo "" | gzip > ${prefix}.fa.gz
+    touch ${prefix}.fa.gz.gzi
+    touch ${prefix}.assemblies.tsv
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,45 @@
+process READSIM_PREPARE_REFERENCE {
+    tag "$fasta"
+    label 'process_single'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    tuple val(meta), path(fasta)
+
+    output:
+    tuple val(meta), path("*.fa")    , emit: fasta
+    tuple val(meta), path("*.fa.fai"), emit: fai
+    tuple val(meta), path("*.sizes") , emit: sizes
+    path "versions.yml"              , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def prefix = task.ext.prefix ?: "${meta.id}_prepared"
+    """
+    readsim prepare-reference \\
+        $fasta \\
+        $prefix
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+    END_VERSIONS
+    """
+
+    stub:
+    def prefix = task.ext.prefix ?: "${meta.id}_prepared"
+    """
+    touch ${prefix}.fa
+    touch ${prefix}.fa.fai
+    touch ${prefix}.sizes
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+    END_VERSIONS
+    """
+}
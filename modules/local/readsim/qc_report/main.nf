@@ -0,0 +1,41 @@
+process READSIM_QC_REPORT {
+    label 'process_single'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    path(stats, stageAs: "stats*/*")
+
+    output:
+    path "*_mqc.json"  , emit: mqc
+    path "versions.yml", emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args = task.ext.args ?: ''
+    """
+    readsim qc-report \\
+        $args \\
+        $stats
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+
+    stub:
+    """
+    touch readsim_general_stats_mqc.json
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+}
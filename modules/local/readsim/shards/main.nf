@@ -0,0 +1,36 @@
+process READSIM_SHARDS {
+    tag "$meta.id"
+    label 'process_single'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    val(meta)
+    val(shards)
+
+    output:
+    tuple val(meta), path("*.shards.csv"), emit: csv
+    path "versions.yml"                  , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args   = task.ext.args ?: ''
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    def seed   = task.ext.seed ?: "${meta.seed}"
+    """
+    readsim shard-seeds \\
+        --seed $seed \\
+        --shards $shards \\
+        $args \\
+        --output ${prefix}.shards.csv
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,59 @@
+process READSIM_WGSIM {
+    tag "$meta.id"
+    label 'process_medium'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    tuple val(meta), path(fasta)
+
+    output:
+    tuple val(meta), path("*.fq.gz")    , emit: fastq
+    tuple val(meta), path("*.fq.gz.gzi"), emit: gzi
+    tuple val(meta), path("*.stats.json"), emit: stats
+    path "versions.yml"                 , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args   = task.ext.args ?: ''
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    def seed   = task.ext.seed ?: "${meta.seed}"
+    // shards draw their reads from their own seed but the genome of the sample
+    def sample_seed = meta.sample_seed != null ? "--sample-seed ${meta.sample_seed}" : ""
+    """
+    readsim wgsim \\
+        $args \\
+        -S $seed \\
+        $sample_seed \\
+        -t $task.cpus \\
+        --stats ${prefix}.stats.json \\
+        $fasta \\
+        ${prefix}_R1.fq.gz \\
+        ${prefix}_R2.fq.gz
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+
+    stub:
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    """
+    echo "" | gzip > ${prefix}_R1.fq.gz
+    echo "" | gzip > ${prefix}_R2.fq.gz
+    touch ${prefix}_R1.fq.gz.gzi
+    touch ${prefix}_R2.fq.gz.gzi
+    echo "{}" > ${prefix}.stats.json
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,68 @@
+process READSIM_WGSIM_BATCH {
+    tag "$meta.id"
+    label 'process_medium'
+    label 'readsim'
+
+    conda "${moduleDir}/environment.yml"
+
+    input:
+    tuple val(meta), val(samples), path(fasta)
+    path haplotypes
+
+    output:
+    tuple val(meta), val(samples), path("*.fq.gz")    , emit: fastq
+    tuple val(meta), path("*.fq.gz.gzi")              , emit: gzi
+    tuple val(meta), path("*.stats.json")             , emit: stats
+    tuple val(meta), path("*.batch_report.json")      , emit: report
+    path "versions.yml"                               , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args         = task.ext.args ?: ''
+    def prefix       = task.ext.prefix ?: "${meta.id}"
+    // samples with prebuilt haplotypes name them in the fourth column, after an empty read count
+    def prebuilt     = meta.haplotypes ?: [:]
+    def sample_table = samples
+        .collect { sample -> prebuilt[sample.id] ? "${sample.id}\t${sample.seed}\t\t${prebuilt[sample.id]}" : "${sample.id}\t${sample.seed}" }
+        .join('\n')
+    """
+    cat <<-END_SAMPLES > samples.tsv
+    ${sample_table}
+    END_SAMPLES
+
+    readsim wgsim-batch \\
+        $args \\
+        -t $task.cpus \\
+        --samples samples.tsv \\
+        --report ${prefix}.batch_report.json \\
+        $fasta
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+
+    stub:
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    def ids    = samples.collect { sample -> sample.id }.join(' ')
+    """
+    for id in ${ids}; do
+        echo "" | gzip > \${id}_R1.fq.gz
+        echo "" | gzip > \${id}_R2.fq.gz
+        touch \${id}_R1.fq.gz.gzi
+        touch \${id}_R2.fq.gz.gzi
+        echo "{}" > \${id}.stats.json
+    done
+    echo "{}" > ${prefix}.batch_report.json
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        readsim: \$(readsim --version | sed 's/readsim //g')
+        numpy: \$(python3 -c 'import numpy; print(numpy.__version__)')
+    END_VERSIONS
+    """
+}
@@ -0,0 +1,53 @@
+process SAMTOOLS_IMPORT {
+    tag "$meta.id"
+    label 'process_low'
+
+    conda "${moduleDir}/environment.yml"
+    container "${ workflow.containerEngine == 'singularity' && !task.ext.singularity_pull_docker_container ?
+        'https://depot.galaxyproject.org/singularity/samtools:1.18--h50ea8bc_1' :
+        'biocontainers/samtools:1.18--h50ea8bc_1' }"
+
+    input:
+    tuple val(meta), path(reads)
+
+    output:
+    tuple val(meta), path("*.bam") , optional:true, emit: bam
+    tuple val(meta), path("*.cram"), optional:true, emit: cram
+    path  "versions.yml"           , emit: versions
+
+    when:
+    task.ext.when == null || task.ext.when
+
+    script:
+    def args   = task.ext.args ?: ''
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    def suffix = args.contains("--output-fmt cram") ? "cram" : "bam"
+    def fastqs = reads instanceof List ? reads : [ reads ]
+    def input  = fastqs.size() == 2 ? "-1 ${fastqs[0]} -2 ${fastqs[1]}" : "-0 ${fastqs[0]}"
+    """
+    samtools \\
+        import \\
+        $args \\
+        -@ ${task.cpus-1} \\
+        -o ${prefix}.${suffix} \\
+        $input
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        samtools: \$(echo \$(samtools --version 2>&1) | sed 's/^.*samtools //; s/Using.*\$//')
+    END_VERSIONS
+    """
+
+    stub:
+    def args   = task.ext.args ?: ''
+    def prefix = task.ext.prefix ?: "${meta.id}"
+    def suffix = args.contains("--output-fmt cram") ? "cram" : "bam"
+    """
+    touch ${prefix}.${suffix}
+
+    cat <<-END_VERSIONS > versions.yml
+    "${task.process}":
+        samtools: \$(echo \$(samtools --version 2>&1) | sed 's/^.*samtools //; s/Using.*\$//')
+    END_VERSIONS
+    """
+}
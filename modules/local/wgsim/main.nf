@@ -31,7 +31,7 @@ process WGSIM {
         ${prefix}_R1.fq \\
         ${prefix}_R2.fq
 
-    gzip ${prefix}_R1.fq ${prefix}_R2.fq
+    gzip --no-name ${prefix}_R1.fq ${prefix}_R2.fq
 
     cat <<-END_VERSIONS > versions.yml
     "${task.process}":
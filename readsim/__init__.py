@@ -0,0 +1,9 @@
+"""
+readsim: native, vectorized read simulation engines for nf-core/readsimulator.
+
+The engines in this package are drop-in alternatives for the single-threaded
+tools wrapped by the pipeline modules. They are invoked through `bin/readsim`,
+which Nextflow places on the task `PATH`.
+"""
+
+__version__ = "0.1.0"
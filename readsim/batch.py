@@ -0,0 +1,93 @@
+"""
+Shared pieces of the multi-sample (batched) mode of the readsim engines.
+
+In batched mode one task simulates every sample of a mode: the reference is
+read once and each sample is simulated from it with its own seed stream, into
+its own output files, exactly as a separate task with that seed would have.
+The report compares the batched run with the fan-out it replaces, where each
+sample's task reads the reference itself. Only the batched run is measured;
+the fan-out is estimated from it: a sample's fan-out time is modelled as the
+measured reference load plus its own simulation, its batched time is its
+simulation plus an equal share of the single load.
+"""
+
+import csv
+import json
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+
+@dataclass
+class Sample:
+    id: str
+    seed: int
+    # reads (or read pairs, depending on the engine); None for the engine default
+    count: typing.Optional[int] = None
+    # haplotypes built by `readsim haplotypes` to draw from instead of mutating the reference
+    haplotypes: typing.Optional[str] = None
+
+
+def read_samples(path: typing.Union[str, Path]) -> typing.List[Sample]:
+    """Read a tab-separated `id, seed[, count[, haplotypes]]` table; lines starting with `#` are skipped."""
+    from .seeds import parse_read_count
+
+    samples = []
+    with open(path, newline="") as f:
+        for row in csv.reader(f, delimiter="\t"):
+            if not row or row[0].startswith("#"):
+                continue
+            count = parse_read_count(row[2]) if len(row) > 2 and row[2].strip() else None
+            haplotypes = (row[3].strip() or None) if len(row) > 3 else None
+            samples.append(Sample(row[0], int(row[1]), count, haplotypes))
+    ids = [s.id for s in samples]
+    duplicates = sorted({i for i in ids if ids.count(i) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate sample ids in {path}: {', '.join(duplicates)}")
+    if not samples:
+        raise ValueError(f"No samples in {path}")
+    return samples
+
+
+@dataclass
+class SampleTiming:
+    id: str
+    reads: int
+    seconds: float
+
+
+def batch_report(
+    engine: str,
+    load_seconds: float,
+    timings: typing.Sequence[SampleTiming],
+) -> typing.Dict[str, typing.Any]:
+    n = max(len(timings), 1)
+    samples = []
+    for t in timings:
+        batched = t.seconds + load_seconds / n
+        fan_out = t.seconds + load_seconds
+        samples.append(
+            {
+                "id": t.id,
+                "reads": t.reads,
+                "seconds": round(batched, 3),
+                "estimated_fan_out_seconds": round(fan_out, 3),
+                "estimated_speedup": round(fan_out / batched, 3) if batched else None,
+            }
+        )
+    batched_total = load_seconds + sum(t.seconds for t in timings)
+    fan_out_total = n * load_seconds + sum(t.seconds for t in timings)
+    return {
+        "engine": engine,
+        "samples": samples,
+        "reference_load_seconds": round(load_seconds, 3),
+        "seconds": round(batched_total, 3),
+        "estimated_fan_out_seconds": round(fan_out_total, 3),
+        "estimated_speedup": round(fan_out_total / batched_total, 3) if batched_total else None,
+    }
+
+
+def write_report(path: typing.Union[str, Path], report: typing.Dict[str, typing.Any]) -> None:
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+        f.write("\n")
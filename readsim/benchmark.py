@@ -0,0 +1,627 @@
+"""
+Throughput benchmarks for the readsim engines and the pipeline stages around them.
+
+`run_suite` writes a synthetic reference of a chosen size and contig count and
+times every stage of the pipeline that can run here: reference preparation,
+the amplicon, target capture, metagenome and wholegenome simulators (the
+readsim engines, plus the external tools they replace when those are on the
+`PATH`), the merge of downloaded genomes and the samplesheet merge. Each stage
+runs in a fresh process so its peak RSS, including the worker processes and
+tools it starts, is its own. Results are returned as plain dictionaries so
+they can be dumped as JSON and compared between versions with `compare`.
+"""
+
+import concurrent.futures
+import gzip
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import typing
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import numpy as np
+
+from . import __version__
+from .bgzf import bgzip_file
+
+
+def synthetic_fastq(path: str, size_mb: float, read_length: int = 150, seed: int = 0) -> int:
+    """Write roughly `size_mb` MiB of random FASTQ records; returns the byte count."""
+    rng = random.Random(seed)
+    quals = "".join(chr(33 + q) for q in range(2, 41))
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    with open(path, "w") as f:
+        i = 0
+        while written < target:
+            seq = "".join(rng.choices("ACGT", k=read_length))
+            qual = "".join(rng.choices(quals, k=read_length))
+            record = f"@read_{i}\n{seq}\n+\n{qual}\n"
+            f.write(record)
+            written += len(record)
+            i += 1
+    return written
+
+
+def _timed(func: typing.Callable[[], None]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench_compression(
+    size_mb: float = 256,
+    threads: typing.Optional[int] = None,
+    level: int = 6,
+) -> typing.Dict[str, typing.Any]:
+    """Compare the `gzip` step of the simulator modules with the BGZF writer."""
+    threads = threads or os.cpu_count() or 1
+    results: typing.Dict[str, typing.Any] = {"benchmark": "compression", "size_mb": size_mb, "level": level}
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, "reads.fq")
+        nbytes = synthetic_fastq(src, size_mb)
+        results["input_bytes"] = nbytes
+
+        runs = []
+        if shutil.which("gzip"):
+
+            def run_gzip() -> None:
+                with open(os.path.join(tmp, "gzip.fq.gz"), "wb") as out:
+                    subprocess.run(["gzip", "-c", "--no-name", f"-{level}", src], stdout=out, check=True)
+
+            runs.append(("gzip", 1, run_gzip, os.path.join(tmp, "gzip.fq.gz")))
+
+        for n in sorted({1, threads}):
+            dest = os.path.join(tmp, f"bgzf_{n}.fq.gz")
+            runs.append((f"bgzf_{n}_threads", n, lambda dest=dest, n=n: bgzip_file(src, dest, threads=n, level=level), dest))
+
+        for name, n, func, dest in runs:
+            seconds = _timed(func)
+            results[name] = {
+                "threads": n,
+                "seconds": round(seconds, 3),
+                "mb_per_sec": round(nbytes / 1024 / 1024 / seconds, 2),
+                "output_bytes": os.path.getsize(dest),
+            }
+    return results
+
+
+@dataclass
+class SuiteOptions:
+    reference_mb: float = 20
+    contigs: int = 10
+    read_pairs: int = 100_000
+    samples: int = 1000
+    threads: int = 1
+    level: int = 6
+    seed: int = 0
+
+
+def synthetic_reference(
+    path: str,
+    size_mb: float,
+    contigs: int = 1,
+    seed: int = 0,
+    line_width: int = 60,
+) -> typing.List[typing.Tuple[str, int]]:
+    """Write a random FASTA of about `size_mb` MiB over `contigs` records; returns names and lengths.
+
+    Contig lengths vary around the mean as they do between the genomes of a
+    metagenome. The file is gzipped when `path` ends with `.gz`.
+    """
+    rng = np.random.default_rng(seed)
+    total = max(int(size_mb * 1024 * 1024), contigs)
+    weights = rng.lognormal(0, 0.5, contigs)
+    lengths = np.maximum((total * weights / weights.sum()).astype(np.int64), 1)
+    alphabet = np.frombuffer(b"ACGT", dtype=np.uint8)
+    records = []
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wb") as f:
+        for i, length in enumerate(lengths.tolist()):
+            name = f"contig{i + 1}"
+            seq = alphabet[rng.integers(0, 4, length)]
+            pad = -length % line_width
+            lines = np.concatenate([seq, np.zeros(pad, dtype=np.uint8)]).reshape(-1, line_width)
+            body = np.column_stack([lines, np.full(len(lines), ord("\n"), dtype=np.uint8)]).tobytes()
+            f.write(f">{name}\n".encode())
+            f.write(body[: len(body) - pad - 1] + b"\n" if pad else body)
+            records.append((name, length))
+    return records
+
+
+def _result(
+    unit: str,
+    records: int,
+    seconds: float,
+    input_bytes: int,
+    output_bytes: int,
+) -> typing.Dict[str, typing.Any]:
+    return {
+        "unit": unit,
+        "records": records,
+        "seconds": round(seconds, 3),
+        "records_per_sec": round(records / seconds, 1) if seconds else None,
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+        "input_bytes_per_sec": round(input_bytes / seconds) if seconds else None,
+        "output_bytes_per_sec": round(output_bytes / seconds) if seconds else None,
+    }
+
+
+def _size(*paths: typing.Union[str, Path]) -> int:
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+def _readsim() -> typing.List[str]:
+    return [sys.executable, "-m", "readsim"]
+
+
+def _skipped(reason: str) -> typing.Dict[str, typing.Any]:
+    return {"skipped": reason}
+
+
+def _prepared(workdir: str, reference: str) -> str:
+    """Prepare the reference once per suite; stages after the first reuse it."""
+    from .reference import is_prepared, prepare
+
+    prefix = os.path.join(workdir, "reference_prepared")
+    if not is_prepared(f"{prefix}.fa"):
+        prepare(reference, prefix)
+    return f"{prefix}.fa"
+
+
+def bench_prepare_reference(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    from .reference import prepare
+
+    prefix = os.path.join(workdir, "prepare")
+    start = time.perf_counter()
+    records = prepare(reference, prefix)
+    seconds = time.perf_counter() - start
+    bases = sum(r.length for r in records)
+    result = _result("contigs", len(records), seconds, _size(reference), _size(f"{prefix}.fa", f"{prefix}.fa.fai"))
+    result["bases_per_sec"] = round(bases / seconds) if seconds else None
+    return result
+
+
+def bench_amplicon(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """In-silico PCR over the whole reference, with primers taken from its first contig."""
+    from .fasta import iter_fasta
+    from .ispcr import reverse_complement, run
+    from .reference import read_fai
+
+    fasta = _prepared(workdir, reference)
+    bases = sum(r.length for r in read_fai(f"{fasta}.fai"))
+    name, seq = next(iter_fasta(fasta))
+    fwd = seq[1000:1020].decode()
+    rev = reverse_complement(seq[1400:1420]).decode()
+    output = os.path.join(workdir, "amplicons.fa")
+    start = time.perf_counter()
+    count = run(fasta, output, fwd, rev, error=2, threads=opts.threads)
+    seconds = time.perf_counter() - start
+    result = _result("amplicons", count, seconds, _size(fasta), _size(output))
+    result["bases_per_sec"] = round(bases / seconds) if seconds else None
+    return result
+
+
+def bench_amplicon_art(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """ART on the amplicons of `bench_amplicon`, as the amplicon workflow runs it."""
+    if not shutil.which("art_illumina"):
+        return _skipped("art_illumina not found")
+    amplicons = os.path.join(workdir, "amplicons.fa")
+    if not os.path.exists(amplicons):
+        bench_amplicon(workdir, reference, opts)
+    prefix = os.path.join(workdir, "art_")
+    cmd = ["art_illumina", "-ss", "HS25", "-i", amplicons, "-l", "130", "-f", "100", "-p", "-m", "200", "-s", "10"]
+    start = time.perf_counter()
+    subprocess.run(cmd + ["-rs", str(opts.seed), "-na", "-o", prefix], check=True, stdout=subprocess.DEVNULL)
+    seconds = time.perf_counter() - start
+    outputs = [f"{prefix}1.fq", f"{prefix}2.fq"]
+    reads = sum(1 for path in outputs for _ in open(path, "rb")) // 4
+    return _result("reads", reads, seconds, _size(amplicons), _size(*outputs))
+
+
+def bench_target_capture(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """The Bowtie2 index build of the target capture workflow, its most expensive step."""
+    if not shutil.which("bowtie2-build"):
+        return _skipped("bowtie2-build not found")
+    fasta = _prepared(workdir, reference)
+    prefix = os.path.join(workdir, "bowtie2", "reference")
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    start = time.perf_counter()
+    subprocess.run(
+        ["bowtie2-build", "--threads", str(opts.threads), "--seed", str(opts.seed), fasta, prefix],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    seconds = time.perf_counter() - start
+    outputs = [os.path.join(os.path.dirname(prefix), f) for f in os.listdir(os.path.dirname(prefix))]
+    return _result("bases", os.path.getsize(fasta), seconds, _size(fasta), _size(*outputs))
+
+
+def bench_target_capture_probemap(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """`readsim probemap` placing a 120 bp probe taken every 2 kb of the reference, instead of Bowtie2."""
+    from .probemap import ProbemapOptions, run
+    from .reference import IndexedFasta
+
+    fasta = _prepared(workdir, reference)
+    probes = os.path.join(workdir, "probes.fa")
+    with IndexedFasta(fasta) as fa, open(probes, "w") as f:
+        for r in fa.records:
+            for start in range(0, r.length - 120, 2000):
+                f.write(f">{r.name}_{start}\n{fa.fetch(r.name, start, start + 120).tobytes().decode()}\n")
+    output = os.path.join(workdir, "probes.bed")
+    start = time.perf_counter()
+    counts = run(fasta, probes, output, ProbemapOptions(), threads=opts.threads)
+    seconds = time.perf_counter() - start
+    return _result("probes", counts["probes"], seconds, _size(fasta, probes), _size(output))
+
+
+def bench_target_capture_reads(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """`readsim capsim` with a 120 bp probe every 2 kb of the reference, read from a BED file."""
+    from .capsim import CaptureOptions, run
+    from .reference import read_fai
+
+    fasta = _prepared(workdir, reference)
+    probes = os.path.join(workdir, "probes.bed")
+    with open(probes, "w") as f:
+        for r in read_fai(f"{fasta}.fai"):
+            for start in range(0, r.length - 120, 2000):
+                f.write(f"{r.name}\t{start}\t{start + 120}\n")
+    prefix = os.path.join(workdir, "capsim")
+    start = time.perf_counter()
+    run(fasta, probes, prefix, CaptureOptions(num=opts.read_pairs, seed=opts.seed), threads=opts.threads)
+    seconds = time.perf_counter() - start
+    outputs = [f"{prefix}_1.fastq.gz", f"{prefix}_2.fastq.gz"]
+    return _result("reads", 2 * opts.read_pairs, seconds, _size(fasta, probes), _size(*outputs))
+
+
+def bench_metagenome(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    from .metagenome import MODELS, run
+
+    fasta = _prepared(workdir, reference)
+    prefix = os.path.join(workdir, "metagenome")
+    start = time.perf_counter()
+    pairs = run(fasta, prefix, 2 * opts.read_pairs, MODELS["MiSeq"], seed=opts.seed, threads=opts.threads)
+    seconds = time.perf_counter() - start
+    outputs = [f"{prefix}_R1.fastq.gz", f"{prefix}_R2.fastq.gz"]
+    return _result("reads", 2 * sum(pairs.values()), seconds, _size(fasta), _size(*outputs))
+
+
+def bench_metagenome_compiled(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """`readsim metagenome` sampling qualities from a compiled model of the MiSeq error profile."""
+    from .metagenome import MODELS, error_profile, run
+    from .qualmodel import from_read_model
+
+    fasta = _prepared(workdir, reference)
+    model_path = os.path.join(workdir, "MiSeq.rqm")
+    _, quality = error_profile(MODELS["MiSeq"])
+    from_read_model("MiSeq", len(quality), quality).save(model_path)
+    prefix = os.path.join(workdir, "metagenome_compiled")
+    start = time.perf_counter()
+    pairs = run(
+        fasta,
+        prefix,
+        2 * opts.read_pairs,
+        MODELS["MiSeq"],
+        seed=opts.seed,
+        threads=opts.threads,
+        compiled_model=model_path,
+    )
+    seconds = time.perf_counter() - start
+    outputs = [f"{prefix}_R1.fastq.gz", f"{prefix}_R2.fastq.gz"]
+    return _result("reads", 2 * sum(pairs.values()), seconds, _size(fasta, model_path), _size(*outputs))
+
+
+def bench_metagenome_iss(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    if not shutil.which("iss"):
+        return _skipped("iss not found")
+    fasta = _prepared(workdir, reference)
+    prefix = os.path.join(workdir, "iss")
+    cmd = ["iss", "generate", "--genomes", fasta, "--model", "MiSeq", "--n_reads", str(2 * opts.read_pairs)]
+    start = time.perf_counter()
+    subprocess.run(
+        cmd + ["--seed", str(opts.seed), "--cpus", str(opts.threads), "--compress", "--output", prefix],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    seconds = time.perf_counter() - start
+    outputs = [f"{prefix}_R1.fastq.gz", f"{prefix}_R2.fastq.gz"]
+    return _result("reads", 2 * opts.read_pairs, seconds, _size(fasta), _size(*outputs))
+
+
+def bench_wholegenome(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    from .wgsim import WgsimOptions, run
+
+    fasta = _prepared(workdir, reference)
+    outputs = [os.path.join(workdir, "wgsim_R1.fq.gz"), os.path.join(workdir, "wgsim_R2.fq.gz")]
+    start = time.perf_counter()
+    run(fasta, outputs[0], outputs[1], WgsimOptions(n_pairs=opts.read_pairs, seed=opts.seed), threads=opts.threads)
+    seconds = time.perf_counter() - start
+    return _result("reads", 2 * opts.read_pairs, seconds, _size(fasta), _size(*outputs))
+
+
+def bench_wholegenome_haplotypes(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """READSIM_HAPLOTYPES: mutate the reference once and write the truth VCF."""
+    from .haplotypes import build
+    from .wgsim import WgsimOptions
+
+    fasta = _prepared(workdir, reference)
+    prefix = os.path.join(workdir, "haplotypes")
+    start = time.perf_counter()
+    counts = build(fasta, prefix, WgsimOptions(seed=opts.seed))
+    seconds = time.perf_counter() - start
+    variants = counts["snp"] + counts["mnp"] + counts["indel"]
+    return _result("variants", variants, seconds, _size(fasta), _size(f"{prefix}.rhap", f"{prefix}.vcf.gz"))
+
+
+def bench_wholegenome_prebuilt(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """`wholegenome` drawing its reads from prebuilt haplotypes instead of mutating the reference."""
+    from .haplotypes import build
+    from .wgsim import WgsimOptions, run
+
+    wgsim_opts = WgsimOptions(n_pairs=opts.read_pairs, seed=opts.seed)
+    prefix = os.path.join(workdir, "haplotypes")
+    if not os.path.exists(f"{prefix}.rhap"):
+        build(_prepared(workdir, reference), prefix, wgsim_opts)
+    outputs = [os.path.join(workdir, "prebuilt_R1.fq.gz"), os.path.join(workdir, "prebuilt_R2.fq.gz")]
+    start = time.perf_counter()
+    run(f"{prefix}.rhap", outputs[0], outputs[1], wgsim_opts, threads=opts.threads)
+    seconds = time.perf_counter() - start
+    return _result("reads", 2 * opts.read_pairs, seconds, _size(f"{prefix}.rhap"), _size(*outputs))
+
+
+def bench_wholegenome_wgsim(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """The external wgsim followed by the gzip step of the WGSIM module."""
+    if not shutil.which("wgsim") or not shutil.which("gzip"):
+        return _skipped("wgsim or gzip not found")
+    fasta = _prepared(workdir, reference)
+    outputs = [os.path.join(workdir, "external_R1.fq"), os.path.join(workdir, "external_R2.fq")]
+    start = time.perf_counter()
+    subprocess.run(
+        ["wgsim", "-N", str(opts.read_pairs), "-S", str(opts.seed), fasta, *outputs],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    subprocess.run(["gzip", "-f", *outputs], check=True)
+    seconds = time.perf_counter() - start
+    return _result("reads", 2 * opts.read_pairs, seconds, _size(fasta), _size(*(f"{p}.gz" for p in outputs)))
+
+
+def bench_merge_fastas(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """READSIM_MERGE_FASTAS (`--merge_fastas_bgzf`): stream the per-genome downloads into one BGZF reference."""
+    from .fasta import iter_fasta
+
+    genomes = []
+    for i, (name, seq) in enumerate(iter_fasta(reference)):
+        path = os.path.join(workdir, f"genome_{i}.fna.gz")
+        with gzip.open(path, "wb", compresslevel=1) as f:
+            f.write(b">%s\n%s\n" % (name.encode(), seq))
+        genomes.append(path)
+    output = os.path.join(workdir, "merged.fa.gz")
+    start = time.perf_counter()
+    with subprocess.Popen(["zcat", "-f", *genomes], stdout=subprocess.PIPE) as zcat:
+        subprocess.run(
+            [*_readsim(), "bgzip", "--threads", str(opts.threads), "--output", output], stdin=zcat.stdout, check=True
+        )
+    seconds = time.perf_counter() - start
+    if zcat.returncode:
+        raise subprocess.CalledProcessError(zcat.returncode, "zcat")
+    return _result("genomes", len(genomes), seconds, _size(*genomes), _size(output))
+
+
+def ncbi_layout(
+    root: typing.Union[str, Path],
+    genomes: typing.Sequence[typing.Tuple[str, str, str, bytes]],
+    section: str = "refseq",
+    group: str = "bacteria",
+) -> None:
+    """Lay out `(accession, taxid, organism, fasta)` genomes and the summaries listing them as on the NCBI FTP site."""
+    import hashlib
+
+    root = Path(root)
+    lines = []
+    for accession, taxid, organism, fasta in genomes:
+        prefix, digits = accession.split("_", 1)
+        digits = digits.split(".", 1)[0]
+        name = f"{accession}_{organism.replace(' ', '_')}"
+        rel = f"genomes/all/{prefix}/{digits[0:3]}/{digits[3:6]}/{digits[6:9]}/{name}"
+        directory = root / rel
+        directory.mkdir(parents=True, exist_ok=True)
+        data = gzip.compress(fasta, compresslevel=1)
+        (directory / f"{name}_genomic.fna.gz").write_bytes(data)
+        (directory / "md5checksums.txt").write_text(f"{hashlib.md5(data).hexdigest()}  ./{name}_genomic.fna.gz\n")
+        lines.append(f"{accession}\t{taxid}\t{taxid}\t{organism}\thttps://ftp.ncbi.nlm.nih.gov/{rel}\n")
+    header = "# See ftp://ftp.ncbi.nlm.nih.gov/genomes/README_assembly_summary.txt\n"
+    header += "#assembly_accession\ttaxid\tspecies_taxid\torganism_name\tftp_path\n"
+    for path in (
+        root / "genomes" / section / group / "assembly_summary.txt",
+        root / "genomes" / section / f"assembly_summary_{section}.txt",
+    ):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        existing = path.read_text() if path.exists() else header
+        path.write_text(existing + "".join(lines))
+
+
+def bench_ncbi_download(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """READSIM_NCBI_DOWNLOAD from a static local HTTP server in the NCBI layout.
+
+    The server never drops or corrupts a transfer, so this times the
+    download and merge path; resume and checksum retries are covered by the
+    tests.
+    """
+    import functools
+    import http.server
+    import threading
+
+    from .fasta import iter_fasta
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        # keep connections open, as the NCBI servers do
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args: typing.Any) -> None:
+            pass
+
+    genomes = [
+        (f"GCF_{i:09d}.1", str(i), f"genome {i}", b">%s\n%s\n" % (name.encode(), seq))
+        for i, (name, seq) in enumerate(iter_fasta(reference))
+    ]
+    mirror = os.path.join(workdir, "mirror")
+    ncbi_layout(mirror, genomes)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=mirror))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        host, port = server.server_address[:2]
+        accessions = os.path.join(workdir, "accessions.txt")
+        with open(accessions, "w") as f:
+            f.write("".join(f"{accession}\n" for accession, *_ in genomes))
+        output = os.path.join(workdir, "downloaded.fa.gz")
+        start = time.perf_counter()
+        subprocess.run(
+            [
+                *_readsim(),
+                "ncbi-download",
+                "--accessions",
+                accessions,
+                "--groups",
+                "bacteria",
+                "--base-url",
+                f"http://{host}:{port}",
+                "--threads",
+                str(opts.threads),
+                "--output",
+                output,
+            ],
+            check=True,
+        )
+        seconds = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+    return _result("genomes", len(genomes), seconds, _size(*Path(mirror).rglob("*.fna.gz")), _size(output))
+
+
+def bench_samplesheet(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    """MERGE_SAMPLESHEETS over one CREATE_SAMPLESHEET file per sample."""
+    if not shutil.which("bash"):
+        return _skipped("bash not found")
+    sheets = []
+    for i in range(opts.samples):
+        path = os.path.join(workdir, f"wholegenome_sample{i}.samplesheet.csv")
+        with open(path, "w") as f:
+            f.write(f'"sample","fastq_1","fastq_2"\n"sample{i}","wgsim/sample{i}_R1.fq.gz","wgsim/sample{i}_R2.fq.gz"')
+        sheets.append(path)
+    output = os.path.join(workdir, "wholegenome_samplesheet.csv")
+    # the script of the MERGE_SAMPLESHEETS module
+    script = (
+        f'echo \\"sample\\",\\"fastq_1\\",\\"fastq_2\\" > "{output}"\n'
+        f'for curr_sheet in "$@"; do\n'
+        f'    tail -n +2 "$curr_sheet" >> "{output}"\n'
+        f'    echo >> "{output}"\n'
+        "done\n"
+    )
+    start = time.perf_counter()
+    subprocess.run(["bash", "-c", script, "merge_samplesheets", *sheets], check=True)
+    seconds = time.perf_counter() - start
+    return _result("samples", len(sheets), seconds, _size(*sheets), _size(output))
+
+
+def bench_compression_stage(workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    return bench_compression(size_mb=opts.reference_mb, threads=opts.threads, level=opts.level)
+
+
+SUITE: typing.Dict[str, typing.Callable[[str, str, SuiteOptions], typing.Dict[str, typing.Any]]] = {
+    "compression": bench_compression_stage,
+    "prepare_reference": bench_prepare_reference,
+    "amplicon": bench_amplicon,
+    "amplicon_art": bench_amplicon_art,
+    "target_capture": bench_target_capture,
+    "target_capture_probemap": bench_target_capture_probemap,
+    "target_capture_reads": bench_target_capture_reads,
+    "metagenome": bench_metagenome,
+    "metagenome_compiled": bench_metagenome_compiled,
+    "metagenome_insilicoseq": bench_metagenome_iss,
+    "wholegenome": bench_wholegenome,
+    "wholegenome_wgsim": bench_wholegenome_wgsim,
+    "wholegenome_haplotypes": bench_wholegenome_haplotypes,
+    "wholegenome_prebuilt": bench_wholegenome_prebuilt,
+    "merge_fastas": bench_merge_fastas,
+    "ncbi_download": bench_ncbi_download,
+    "samplesheet": bench_samplesheet,
+}
+
+
+def _peak_rss_bytes() -> int:
+    """Peak RSS of this process and of its largest reaped child (Linux reports KiB)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    scale = 1 if sys.platform == "darwin" else 1024
+    return max(own, children) * scale
+
+
+def _run_stage(name: str, workdir: str, reference: str, opts: SuiteOptions) -> typing.Dict[str, typing.Any]:
+    result = SUITE[name](workdir, reference, opts)
+    if "skipped" not in result:
+        result["peak_rss_bytes"] = _peak_rss_bytes()
+    return result
+
+
+def run_suite(
+    opts: SuiteOptions,
+    stages: typing.Optional[typing.Sequence[str]] = None,
+) -> typing.Dict[str, typing.Any]:
+    """Run the named stages (all by default) on one synthetic reference."""
+    stages = list(stages or SUITE)
+    unknown = [s for s in stages if s not in SUITE]
+    if unknown:
+        raise ValueError(f"Unknown benchmark stages {', '.join(unknown)}; expected some of {', '.join(SUITE)}")
+    results: typing.Dict[str, typing.Any] = {
+        "benchmark": "suite",
+        "readsim_version": __version__,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "options": asdict(opts),
+        "reference_bytes": 0,
+        "stages": {},
+    }
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        reference = os.path.join(tmp, "reference.fa.gz")
+        synthetic_reference(reference, opts.reference_mb, opts.contigs, opts.seed)
+        results["reference_bytes"] = os.path.getsize(reference)
+        for name in stages:
+            # a fresh process per stage, so peak RSS is not carried over from earlier stages
+            with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+                results["stages"][name] = pool.submit(_run_stage, name, tmp, reference, opts).result()
+    return results
+
+
+def compare(
+    baseline: typing.Dict[str, typing.Any],
+    current: typing.Dict[str, typing.Any],
+    tolerance: float = 0.2,
+) -> typing.List[str]:
+    """Stages whose throughput fell, or whose peak RSS grew, by more than `tolerance` against `baseline`."""
+    regressions = []
+    for name, now in current.get("stages", {}).items():
+        before = baseline.get("stages", {}).get(name)
+        if not before or "skipped" in before or "skipped" in now:
+            continue
+        old_rate, new_rate = before.get("records_per_sec"), now.get("records_per_sec")
+        if old_rate and new_rate is not None and new_rate < old_rate * (1 - tolerance):
+            regressions.append(f"{name}: {new_rate:g} {now['unit']}/s, was {old_rate:g}")
+        old_rss, new_rss = before.get("peak_rss_bytes"), now.get("peak_rss_bytes")
+        if old_rss and new_rss and new_rss > old_rss * (1 + tolerance):
+            regressions.append(f"{name}: peak RSS {new_rss / 2**20:.0f} MiB, was {old_rss / 2**20:.0f} MiB")
+    return regressions
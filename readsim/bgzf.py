@@ -0,0 +1,228 @@
+"""
+Multi-threaded streaming BGZF writer with `.gzi` index output.
+
+BGZF (the blocked gzip format used by htslib) is a series of independent gzip
+members of at most 64 KiB each, so it can be decompressed by any gzip reader
+while still allowing random access. Blocks are deflated on a thread pool
+(`zlib` releases the GIL) and written in order as they complete, so a producer
+can stream reads straight into a compressed file without an intermediate
+uncompressed copy. Next to the output, a `.gzi` index in the `bgzip --index`
+layout maps uncompressed offsets to block offsets so downstream tools can
+seek into the file and split it across readers.
+"""
+
+import collections
+import concurrent.futures
+import shutil
+import struct
+import sys
+import typing
+import zlib
+
+# Uncompressed payload per block, as used by htslib
+BLOCK_SIZE = 0xFF00
+MAX_BLOCK_SIZE = 0x10000
+
+_HEADER = struct.Struct("<4BI2BH2BHH")
+_TRAILER = struct.Struct("<II")
+EOF_BLOCK = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+
+
+def compress_block(data: bytes, level: int = 6) -> bytes:
+    """Deflate `data` (at most `BLOCK_SIZE` bytes) into one BGZF block."""
+    co = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = co.compress(data) + co.flush()
+    if len(cdata) + _HEADER.size + _TRAILER.size > MAX_BLOCK_SIZE:
+        # incompressible input: store it instead
+        co = zlib.compressobj(0, zlib.DEFLATED, -15)
+        cdata = co.compress(data) + co.flush()
+    bsize = len(cdata) + _HEADER.size + _TRAILER.size
+    header = _HEADER.pack(0x1F, 0x8B, 8, 4, 0, 0, 0xFF, 6, ord("B"), ord("C"), 2, bsize - 1)
+    return header + cdata + _TRAILER.pack(zlib.crc32(data), len(data))
+
+
+def compress_blocks(data: bytes, level: int = 6) -> typing.List[typing.Tuple[bytes, int]]:
+    """Split `data` into BGZF blocks; returns `(block, uncompressed_size)` pairs."""
+    return [
+        (compress_block(data[i : i + BLOCK_SIZE], level), len(data[i : i + BLOCK_SIZE]))
+        for i in range(0, len(data), BLOCK_SIZE)
+    ]
+
+
+class BgzfWriter:
+    """File-like BGZF writer compressing blocks on `threads` worker threads.
+
+    Use as a context manager; closing writes the EOF marker and, when `index`
+    is set, the `<path>.gzi` index.
+    """
+
+    def __init__(self, path: str, threads: int = 1, level: int = 6, index: bool = True):
+        self.path = path
+        self.level = level
+        self.index = index
+        self._out = open(path, "wb")
+        self._buffer = bytearray()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(threads, 1))
+        self._pending: typing.Deque[typing.Tuple[concurrent.futures.Future, int]] = collections.deque()
+        self._max_pending = max(threads, 1) * 4
+        self._coffset = 0
+        self._uoffset = 0
+        self._entries: typing.List[typing.Tuple[int, int]] = []
+
+    def __enter__(self) -> "BgzfWriter":
+        return self
+
+    def __exit__(self, *exc: typing.Any) -> None:
+        self.close()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        if len(self._buffer) >= BLOCK_SIZE:
+            whole = len(self._buffer) - len(self._buffer) % BLOCK_SIZE
+            for i in range(0, whole, BLOCK_SIZE):
+                self._submit(bytes(self._buffer[i : i + BLOCK_SIZE]))
+            del self._buffer[:whole]
+        return len(data)
+
+    def write_blocks(self, blocks: typing.Iterable[typing.Tuple[bytes, int]]) -> None:
+        """Append blocks that were already compressed elsewhere, e.g. in worker processes."""
+        self._flush_buffer()
+        self._drain(0)
+        for block, usize in blocks:
+            self._emit(block, usize)
+
+    def flush(self) -> None:
+        self._flush_buffer()
+        self._drain(0)
+        self._out.flush()
+
+    def close(self) -> None:
+        if self._out.closed:
+            return
+        self.flush()
+        self._pool.shutdown()
+        self._out.write(EOF_BLOCK)
+        self._out.close()
+        if self.index:
+            write_gzi(self.path + ".gzi", self._entries)
+
+    def _flush_buffer(self) -> None:
+        if self._buffer:
+            self._submit(bytes(self._buffer))
+            self._buffer.clear()
+
+    def _submit(self, data: bytes) -> None:
+        self._pending.append((self._pool.submit(compress_block, data, self.level), len(data)))
+        self._drain(self._max_pending)
+
+    def _drain(self, keep: int) -> None:
+        while len(self._pending) > keep:
+            future, usize = self._pending.popleft()
+            self._emit(future.result(), usize)
+
+    def _emit(self, block: bytes, usize: int) -> None:
+        # like bgzip, the index lists the start of every block but the first
+        if self._coffset:
+            self._entries.append((self._coffset, self._uoffset))
+        self._out.write(block)
+        self._coffset += len(block)
+        self._uoffset += usize
+
+
+def write_gzi(path: str, entries: typing.Sequence[typing.Tuple[int, int]]) -> None:
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(entries)))
+        for coffset, uoffset in entries:
+            f.write(struct.pack("<QQ", coffset, uoffset))
+
+
+def read_gzi(path: str) -> typing.List[typing.Tuple[int, int]]:
+    """Return the `(compressed_offset, uncompressed_offset)` block starts of a `.gzi` index."""
+    with open(path, "rb") as f:
+        (n,) = struct.unpack("<Q", f.read(8))
+        data = f.read(16 * n)
+    return [struct.unpack_from("<QQ", data, 16 * i) for i in range(n)]
+
+
+def _block_size(extra: bytes) -> int:
+    """BSIZE of a block from the `BC` subfield of its gzip extra field."""
+    i = 0
+    while i + 4 <= len(extra):
+        (slen,) = struct.unpack_from("<H", extra, i + 2)
+        if extra[i : i + 2] == b"BC" and slen == 2:
+            (bsize,) = struct.unpack_from("<H", extra, i + 4)
+            return bsize
+        i += 4 + slen
+    raise ValueError("gzip member without a BGZF block size")
+
+
+def read_blocks(f: typing.BinaryIO) -> typing.Iterator[typing.Tuple[bytes, int]]:
+    """Yield the `(block, uncompressed_size)` pairs of a BGZF stream without inflating them."""
+    while True:
+        head = f.read(12)
+        if not head:
+            return
+        if len(head) < 12 or head[:4] != b"\x1f\x8b\x08\x04":
+            raise ValueError("not a BGZF block")
+        (xlen,) = struct.unpack_from("<H", head, 10)
+        extra = f.read(xlen)
+        rest = f.read(_block_size(extra) + 1 - len(head) - xlen)
+        if len(extra) < xlen or len(rest) < _TRAILER.size:
+            raise ValueError("truncated BGZF block")
+        (usize,) = struct.unpack_from("<I", rest, len(rest) - 4)
+        yield head + extra + rest, usize
+
+
+def _is_bgzf(path: str) -> bool:
+    with open(path, "rb") as f:
+        try:
+            next(read_blocks(f), None)
+            return True
+        except ValueError:
+            return False
+
+
+def concatenate(paths: typing.Sequence[str], path: str, index: bool = True) -> bool:
+    """Concatenate gzip files into `path`; returns whether a `.gzi` index was written.
+
+    When every input is BGZF their blocks are copied without inflating them,
+    dropping the EOF markers in between, and the index is built from the
+    block sizes as they are copied. Other gzip files are concatenated as
+    they are, which is still valid gzip but cannot be indexed.
+    """
+    if not all(_is_bgzf(p) for p in paths):
+        with open(path, "wb") as out:
+            for p in paths:
+                with open(p, "rb") as f:
+                    shutil.copyfileobj(f, out, 16 * 1024 * 1024)
+        return False
+    with BgzfWriter(path, index=index) as writer:
+        for p in paths:
+            with open(p, "rb") as f:
+                writer.write_blocks((block, usize) for block, usize in read_blocks(f) if usize)
+    return index
+
+
+def bgzip_stream(
+    src: typing.BinaryIO,
+    path: str,
+    threads: int = 1,
+    level: int = 6,
+    index: bool = True,
+    chunk_size: int = 4 * 1024 * 1024,
+) -> None:
+    """Compress everything readable from `src` into a BGZF file at `path`."""
+    with BgzfWriter(path, threads=threads, level=level, index=index) as writer:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            writer.write(chunk)
+
+
+def bgzip_file(src: str, path: str, threads: int = 1, level: int = 6, index: bool = True) -> None:
+    if src == "-":
+        bgzip_stream(sys.stdin.buffer, path, threads=threads, level=level, index=index)
+        return
+    with open(src, "rb") as f:
+        bgzip_stream(f, path, threads=threads, level=level, index=index)
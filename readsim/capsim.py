@@ -0,0 +1,513 @@
+"""
+Parallel target capture simulator.
+
+This engine follows the model of CapSim (`jsa.sim.capsim`, Japsa) and accepts
+its options. Probe alignments (BAM or SAM, as written by the probe alignment
+step, or a BED file of probe positions) are merged into a compact index of
+sorted intervals per contig. Every simulated fragment is captured by one of
+those intervals: its length is drawn from a Weibull shearing distribution
+(`fmedian`, `fshape`) thinned by a Weibull size selection window (`smedian`,
+`sshape`), or directly from the target fragment size distribution (`tmedian`,
+`tshape`) when that is given, and it is placed so that it overlaps the
+interval by at least `MIN_OVERLAP` bases.
+
+Fragments are drawn in batches of whole arrays and sequenced as Illumina
+reads (paired-end, mate-pair or single-end, with the position-dependent MiSeq
+error profile of the metagenome engine) or as PacBio reads (one read per
+fragment, cut short by the polymerase read length, with uniform substitution,
+insertion and deletion errors). Batches run on worker processes forked after
+the reference is mapped, each seeded from its own stream, so output depends
+on the seed and batch size but not on the number of workers.
+"""
+
+import dataclasses
+import gzip
+import multiprocessing
+import struct
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .bgzf import BgzfWriter, compress_blocks
+from .fasta import ALPHABET, COMPLEMENT, N_CODE, encode, iter_fasta, open_maybe_gzip
+from .metagenome import MODELS, add_errors, error_profile, format_fastq
+from .qcstats import ReadStats, read_set_name, save_stats
+from .reference import find_fai, is_prepared, read_fai
+
+DEFAULT_BATCH_SIZE = 20_000
+# Bases a fragment shares at least with the probe interval that captured it
+MIN_OVERLAP = 30
+# Size selection rounds before giving up on a fragment size distribution it rejects almost entirely
+MAX_SELECTION_ROUNDS = 1000
+
+# CLR error rates of a PacBio read, and the matching constant base quality
+PACBIO_SUBSTITUTION = 0.015
+PACBIO_INSERTION = 0.09
+PACBIO_DELETION = 0.045
+PACBIO_QUALITY = 8
+
+# CIGAR operations that consume reference bases: M, D, N, = and X
+_REF_OPS = np.array([1, 0, 1, 1, 0, 0, 0, 1, 1], dtype=bool)
+_BAM_RECORD = struct.Struct("<iiiBBHHHi")
+
+
+@dataclass
+class CaptureOptions:
+    fmedian: int = 500
+    fshape: float = 6.0
+    smedian: int = 1300
+    sshape: float = 6.0
+    tmedian: typing.Optional[int] = None
+    tshape: typing.Optional[float] = None
+    num: int = 500_000
+    # "illumina" or "pacbio"
+    platform: str = "illumina"
+    illen: int = 150
+    # "pe" (paired-end), "mp" (mate-pair) or "se" (single-end)
+    ilmode: str = "pe"
+    pblen: int = 30_000
+    read_id: str = ""
+    seed: int = 0
+
+    def validate(self) -> None:
+        if self.platform not in ("illumina", "pacbio"):
+            raise ValueError(f"Unknown platform {self.platform!r}, expected illumina or pacbio")
+        if self.ilmode not in ("pe", "mp", "se"):
+            raise ValueError(f"Unknown Illumina mode {self.ilmode!r}, expected pe, mp or se")
+        if (self.tmedian is None) != (self.tshape is None):
+            raise ValueError("tmedian and tshape must be given together")
+        if self.tmedian is None and self.sshape <= 1:
+            raise ValueError(f"sshape must be above 1, got {self.sshape}")
+
+    def outputs(self, prefix: str) -> typing.List[str]:
+        """The FASTQ files CapSim writes for `prefix`."""
+        if self.platform == "pacbio":
+            return [f"{prefix}.fastq.gz"]
+        if self.ilmode == "se":
+            return [f"{prefix}_1.fastq.gz"]
+        return [f"{prefix}_1.fastq.gz", f"{prefix}_2.fastq.gz"]
+
+
+@dataclass
+class ProbeIndex:
+    """Merged probe intervals, sorted by contig and start."""
+
+    names: typing.List[str]
+    contig: np.ndarray  # index into `names` of each interval
+    start: np.ndarray
+    end: np.ndarray
+
+    @classmethod
+    def from_intervals(
+        cls,
+        names: typing.Sequence[str],
+        contig: typing.Sequence[int],
+        start: typing.Sequence[int],
+        end: typing.Sequence[int],
+    ) -> "ProbeIndex":
+        """Merge overlapping and adjacent intervals; contigs without intervals are dropped."""
+        contig_a = np.asarray(contig, dtype=np.int64)
+        start_a = np.asarray(start, dtype=np.int64)
+        end_a = np.asarray(end, dtype=np.int64)
+        order = np.lexsort((start_a, contig_a))
+        contig_a, start_a, end_a = contig_a[order], start_a[order], end_a[order]
+
+        merged: typing.Tuple[typing.List[np.ndarray], ...] = ([], [], [])
+        used: typing.List[str] = []
+        for c in np.unique(contig_a):
+            s = start_a[contig_a == c]
+            e = np.maximum.accumulate(end_a[contig_a == c])
+            # an interval opens a new merged interval when it starts after every earlier one ended
+            first = np.concatenate(([True], s[1:] > e[:-1]))
+            last = np.concatenate((first[1:], [True]))
+            merged[0].append(np.full(int(first.sum()), len(used), dtype=np.int64))
+            merged[1].append(s[first])
+            merged[2].append(e[last])
+            used.append(names[int(c)])
+        if not used:
+            raise ValueError("No mapped probes")
+        return cls(used, np.concatenate(merged[0]), np.concatenate(merged[1]), np.concatenate(merged[2]))
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def bases(self) -> int:
+        return int((self.end - self.start).sum())
+
+
+def _read_bam(data: bytes) -> ProbeIndex:
+    (l_text,) = struct.unpack_from("<i", data, 4)
+    pos = 8 + l_text
+    (n_ref,) = struct.unpack_from("<i", data, pos)
+    pos += 4
+    names = []
+    for _ in range(n_ref):
+        (l_name,) = struct.unpack_from("<i", data, pos)
+        names.append(data[pos + 4 : pos + 3 + l_name].decode())
+        pos += 8 + l_name
+
+    contig, start, end = [], [], []
+    while pos < len(data):
+        block_size, ref_id, ref_pos, l_read_name, _, _, n_cigar, flag, _ = _BAM_RECORD.unpack_from(data, pos)
+        if not flag & 0x4 and ref_id >= 0:
+            cigar_at = pos + 4 + 32 + l_read_name
+            cigar = np.frombuffer(data, dtype="<u4", count=n_cigar, offset=cigar_at)
+            span = int((cigar >> 4)[_REF_OPS[cigar & 0xF]].sum())
+            contig.append(ref_id)
+            start.append(ref_pos)
+            end.append(ref_pos + max(span, 1))
+        pos += 4 + block_size
+    return ProbeIndex.from_intervals(names, contig, start, end)
+
+
+def _cigar_span(cigar: str) -> int:
+    span = 0
+    number = ""
+    for char in cigar:
+        if char.isdigit():
+            number += char
+        else:
+            if char in "MDN=X":
+                span += int(number)
+            number = ""
+    return span
+
+
+def _read_text(lines: typing.Iterable[str]) -> ProbeIndex:
+    """Probe intervals from SAM records or BED lines."""
+    names: typing.Dict[str, int] = {}
+    contig, start, end = [], [], []
+    for line in lines:
+        if not line.strip() or line.startswith(("@", "#", "track", "browser")):
+            continue
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) >= 11:
+            if int(fields[1]) & 0x4 or fields[2] == "*":
+                continue
+            name, first = fields[2], int(fields[3]) - 1
+            last = first + max(_cigar_span(fields[5]), 1)
+        else:
+            name, first, last = fields[0], int(fields[1]), int(fields[2])
+        contig.append(names.setdefault(name, len(names)))
+        start.append(first)
+        end.append(last)
+    return ProbeIndex.from_intervals(list(names), contig, start, end)
+
+
+def read_probes(path: typing.Union[str, Path]) -> ProbeIndex:
+    """Build the probe index from a BAM, SAM or BED file; unmapped probes are skipped."""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        # BAM is BGZF: a series of gzip members, which gzip inflates in one go
+        data = gzip.decompress(Path(path).read_bytes())
+        if data[:4] == b"BAM\x01":
+            return _read_bam(data)
+        return _read_text(data.decode().splitlines())
+    with open_maybe_gzip(path, "rt") as f:
+        return _read_text(f)
+
+
+@dataclass
+class _Reference:
+    """The raw bases of the captured contigs in one array, e.g. the memory map of a prepared reference."""
+
+    bases: np.ndarray
+    offsets: np.ndarray  # where each contig of the probe index starts in `bases`
+    lengths: np.ndarray
+
+
+def load_reference(fasta: typing.Union[str, Path], probes: ProbeIndex) -> _Reference:
+    """Map a prepared reference, or read the contigs that carry probes from any other FASTA."""
+    wanted = {name: i for i, name in enumerate(probes.names)}
+    offsets = np.full(len(wanted), -1, dtype=np.int64)
+    lengths = np.zeros(len(wanted), dtype=np.int64)
+    if is_prepared(fasta):
+        fai = find_fai(fasta)
+        assert fai is not None
+        for record in read_fai(fai):
+            if record.name in wanted:
+                offsets[wanted[record.name]] = record.offset
+                lengths[wanted[record.name]] = record.length
+        bases = np.memmap(fasta, dtype=np.uint8, mode="r")
+    else:
+        parts = []
+        offset = 0
+        for name, seq in iter_fasta(fasta):
+            if name in wanted and offsets[wanted[name]] < 0:
+                parts.append(seq)
+                offsets[wanted[name]] = offset
+                lengths[wanted[name]] = len(seq)
+                offset += len(seq)
+        bases = np.frombuffer(b"".join(parts), dtype=np.uint8)
+    missing = [name for name, i in wanted.items() if offsets[i] < 0]
+    if missing:
+        raise ValueError(f"Probes map to contigs that are not in {fasta}: {', '.join(missing[:5])}")
+    return _Reference(bases, offsets, lengths)
+
+
+def _weibull(rng: np.random.Generator, median: float, shape: float, n: int) -> np.ndarray:
+    """Weibull draws scaled so that their median is `median`."""
+    return median * rng.weibull(shape, n) / np.log(2) ** (1 / shape)
+
+
+def size_selection(length: np.ndarray, median: float, shape: float) -> np.ndarray:
+    """Probability that size selection keeps a fragment: the Weibull density of (`median`, `shape`) over its mode."""
+    scale = median / np.log(2) ** (1 / shape)
+    mode = scale * ((shape - 1) / shape) ** (1 / shape)
+    x = np.maximum(length, 1) / scale
+    log_p = (shape - 1) * np.log(x * scale / mode) - (x**shape - (shape - 1) / shape)
+    return np.exp(np.minimum(log_p, 0.0))
+
+
+def fragment_lengths(opts: CaptureOptions, rng: np.random.Generator, n: int) -> np.ndarray:
+    """Lengths of `n` captured fragments."""
+    if opts.tmedian is not None and opts.tshape is not None:
+        return np.maximum(np.rint(_weibull(rng, opts.tmedian, opts.tshape, n)), 1).astype(np.int64)
+
+    kept: typing.List[np.ndarray] = []
+    need = n
+    rate = 1.0
+    for _ in range(MAX_SELECTION_ROUNDS):
+        # draw enough sheared fragments for the remaining ones at the acceptance rate seen so far
+        draw = int(need / max(rate, 1e-3) * 1.1) + 16
+        length = np.maximum(np.rint(_weibull(rng, opts.fmedian, opts.fshape, draw)), 1).astype(np.int64)
+        accepted = length[rng.random(draw) < size_selection(length, opts.smedian, opts.sshape)]
+        rate = max(len(accepted) / draw, 1e-6)
+        kept.append(accepted[:need])
+        need -= len(kept[-1])
+        if not need:
+            return np.concatenate(kept)
+    raise ValueError(
+        f"Size selection (smedian {opts.smedian}, sshape {opts.sshape}) keeps almost no sheared fragments "
+        f"(fmedian {opts.fmedian}, fshape {opts.fshape})"
+    )
+
+
+def capture(
+    probes: ProbeIndex,
+    reference: _Reference,
+    length: np.ndarray,
+    rng: np.random.Generator,
+    typical_length: int,
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Place fragments over probe intervals; returns their contig, start and (clipped) length."""
+    # intervals capture in proportion to the fragment starts that overlap them
+    weights = (probes.end - probes.start + typical_length).astype(np.float64)
+    interval = rng.choice(len(probes), size=len(length), p=weights / weights.sum())
+    contig = probes.contig[interval]
+    a, b = probes.start[interval], probes.end[interval]
+    size = reference.lengths[contig]
+    length = np.minimum(length, size)
+    overlap = np.minimum(np.minimum(MIN_OVERLAP, b - a), length)
+    lo = np.maximum(a + overlap - length, 0)
+    hi = np.minimum(b - overlap, size - length)
+    start = lo + (rng.random(len(length)) * (hi - lo + 1)).astype(np.int64)
+    return contig, start, length
+
+
+def _gather(reference: _Reference, at: np.ndarray, lengths: np.ndarray, reverse: np.ndarray) -> np.ndarray:
+    """Encoded bases of the segments starting at the global offsets `at`, back to back.
+
+    Segments flagged in `reverse` are reverse complemented.
+    """
+    position = np.arange(int(lengths.sum())) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    flip = np.repeat(reverse, lengths)
+    offset = np.where(flip, np.repeat(lengths, lengths) - 1 - position, position)
+    codes = encode(reference.bases[np.repeat(at, lengths) + offset])
+    codes[flip] = COMPLEMENT[codes[flip]]
+    return codes
+
+
+def _names(
+    opts: CaptureOptions,
+    probes: ProbeIndex,
+    first_id: int,
+    contig: np.ndarray,
+    start: np.ndarray,
+    length: np.ndarray,
+    reverse: np.ndarray,
+) -> typing.List[bytes]:
+    """`<id>_<n>_<contig>_<first>_<last>_<strand>` of every fragment, with 1-based inclusive coordinates."""
+    prefix = f"{opts.read_id}_" if opts.read_id else ""
+    fragments = zip(contig.tolist(), start.tolist(), length.tolist(), reverse.tolist())
+    return [
+        f"{prefix}{first_id + i}_{probes.names[c]}_{s + 1}_{s + n}_{'-' if r else '+'}".encode()
+        for i, (c, s, n, r) in enumerate(fragments)
+    ]
+
+
+def illumina_batch(
+    probes: ProbeIndex,
+    reference: _Reference,
+    opts: CaptureOptions,
+    rng: np.random.Generator,
+    n: int,
+    first_id: int,
+) -> typing.Tuple[typing.List[bytes], typing.List[ReadStats]]:
+    """Sequence `n` captured fragments from both ends (one end with `se`); returns FASTQ blobs and stats."""
+    length = np.maximum(fragment_lengths(opts, rng, n), opts.illen)
+    contig, start, length = capture(probes, reference, length, rng, opts.tmedian or opts.smedian)
+    if (length < opts.illen).any():
+        raise ValueError(f"A contig with probes is shorter than the read length {opts.illen}")
+    reverse = rng.random(n) < 0.5
+
+    at = reference.offsets[contig] + start
+    read_len = np.full(n, opts.illen, dtype=np.int64)
+    head = _gather(reference, at, read_len, np.zeros(n, dtype=bool)).reshape(n, opts.illen)
+    tail = _gather(reference, at + length - opts.illen, read_len, np.ones(n, dtype=bool)).reshape(n, opts.illen)
+    r1 = np.where(reverse[:, None], tail, head)
+    r2 = np.where(reverse[:, None], head, tail)
+    if opts.ilmode == "mp":
+        # mate pairs face outwards: both reads come from the other strand
+        r1, r2 = COMPLEMENT[r1][:, ::-1], COMPLEMENT[r2][:, ::-1]
+
+    rates, quality = error_profile(dataclasses.replace(MODELS["MiSeq"], read_length=opts.illen))
+    qual = (quality + 33).tobytes()
+    names = _names(opts, probes, first_id, contig, start, length, reverse)
+    reads = [r1] if opts.ilmode == "se" else [r1, r2]
+    suffixes = [b""] if opts.ilmode == "se" else [b"/1", b"/2"]
+    blobs, stats = [], []
+    for read, suffix in zip(reads, suffixes):
+        read = np.ascontiguousarray(read)
+        add_errors(read, rates, rng)
+        read_stats = ReadStats()
+        read_stats.add(read, np.broadcast_to(quality, read.shape))
+        blobs.append(format_fastq(names, read, qual, suffix))
+        stats.append(read_stats)
+    return blobs, stats
+
+
+def pacbio_errors(
+    codes: np.ndarray, lengths: np.ndarray, rng: np.random.Generator
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Add CLR substitutions, insertions and deletions to reads held back to back; returns them and their lengths."""
+    offsets = np.cumsum(lengths) - lengths
+    u = rng.random(len(codes))
+    substituted = (u < PACBIO_SUBSTITUTION) & (codes != N_CODE)
+    codes = codes.copy()
+    codes[substituted] = (codes[substituted] + rng.integers(1, 4, int(substituted.sum()), dtype=np.uint8)) % 4
+    u -= PACBIO_SUBSTITUTION
+    deleted = (u >= 0) & (u < PACBIO_DELETION)
+    # the first base of a read is never deleted, so no read ends up empty
+    deleted[offsets] = False
+    u -= PACBIO_DELETION
+    inserted = (u >= 0) & (u < PACBIO_INSERTION)
+
+    # every base is written 0 (deleted), 1 or 2 (followed by an inserted base) times
+    copies = 1 - deleted.astype(np.int64) + inserted
+    source = np.repeat(np.arange(len(codes)), copies)
+    out = codes[source]
+    extra = np.concatenate(([False], source[1:] == source[:-1]))
+    out[extra] = rng.integers(0, 4, int(extra.sum()), dtype=np.uint8)
+    return out, np.add.reduceat(copies, offsets)
+
+
+def _format_ragged(names: typing.List[bytes], codes: np.ndarray, lengths: np.ndarray, quality: bytes) -> bytes:
+    seqs = ALPHABET[codes].tobytes()
+    ends = np.cumsum(lengths).tolist()
+    return b"".join(
+        b"@%s\n%s\n+\n%s\n" % (name, seqs[end - n : end], quality * n)
+        for name, end, n in zip(names, ends, lengths.tolist())
+    )
+
+
+def pacbio_batch(
+    probes: ProbeIndex,
+    reference: _Reference,
+    opts: CaptureOptions,
+    rng: np.random.Generator,
+    n: int,
+    first_id: int,
+) -> typing.Tuple[typing.List[bytes], typing.List[ReadStats]]:
+    """Sequence `n` captured fragments as PacBio reads; returns the FASTQ blob and stats."""
+    length = fragment_lengths(opts, rng, n)
+    contig, start, length = capture(probes, reference, length, rng, opts.tmedian or opts.smedian)
+    reverse = rng.random(n) < 0.5
+    # the polymerase stops after a gamma distributed number of bases with mean `pblen`
+    polymerase = np.maximum(np.rint(rng.gamma(2.0, opts.pblen / 2, n)), 1).astype(np.int64)
+    read_len = np.minimum(length, polymerase)
+
+    at = reference.offsets[contig] + np.where(reverse, start + length - read_len, start)
+    codes, read_len = pacbio_errors(_gather(reference, at, read_len, reverse), read_len, rng)
+    stats = ReadStats()
+    stats.add_ragged(codes, read_len, PACBIO_QUALITY)
+    names = _names(opts, probes, first_id, contig, start, length, reverse)
+    return [_format_ragged(names, codes, read_len, bytes([PACBIO_QUALITY + 33]))], [stats]
+
+
+# Worker state, inherited by forked workers so the reference map and probe index are shared
+_STATE: typing.Dict[str, typing.Any] = {}
+
+_Blocks = typing.List[typing.Tuple[bytes, int]]
+_BatchResult = typing.Tuple[typing.List[_Blocks], typing.List[ReadStats]]
+
+
+def _run_batch(task: typing.Tuple[int, int, int]) -> _BatchResult:
+    index, n, first_id = task
+    opts: CaptureOptions = _STATE["opts"]
+    rng = np.random.default_rng(np.random.SeedSequence(opts.seed, spawn_key=(1, index)))
+    simulate_batch = pacbio_batch if opts.platform == "pacbio" else illumina_batch
+    blobs, stats = simulate_batch(_STATE["probes"], _STATE["reference"], opts, rng, n, first_id)
+    return [compress_blocks(blob, _STATE["level"]) for blob in blobs], stats
+
+
+def run(
+    fasta: typing.Union[str, Path],
+    probe_file: typing.Union[str, Path],
+    prefix: str,
+    opts: CaptureOptions,
+    threads: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    compresslevel: int = 6,
+    stats_path: typing.Optional[str] = None,
+) -> ProbeIndex:
+    """Simulate `opts.num` captured fragments into the BGZF-compressed FASTQ files of `opts.outputs(prefix)`.
+
+    Output depends only on the options, the seed and `batch_size`, not on the
+    number of threads. A `.gzi` index is written next to each output, and
+    read statistics to `stats_path` if it is set. Returns the probe index.
+    """
+    from .wgsim import batch_sizes
+
+    opts.validate()
+    probes = read_probes(probe_file)
+    _STATE.update(probes=probes, reference=load_reference(fasta, probes), opts=opts, level=compresslevel)
+
+    tasks = []
+    first_id = 0
+    for index, n in enumerate(batch_sizes(opts.num, batch_size)):
+        tasks.append((index, n, first_id))
+        first_id += n
+
+    outputs = opts.outputs(prefix)
+    stats = [ReadStats() for _ in outputs]
+    writers = [BgzfWriter(path) for path in outputs]
+    try:
+        if threads <= 1:
+            _write_all(map(_run_batch, tasks), writers, stats)
+        else:
+            # workers are forked after the reference is mapped, so they share it
+            with multiprocessing.get_context("fork").Pool(threads) as pool:
+                _write_all(pool.imap(_run_batch, tasks), writers, stats)
+    finally:
+        for writer in writers:
+            writer.close()
+        _STATE.clear()
+    if stats_path is not None:
+        save_stats(stats_path, {read_set_name(path): s for path, s in zip(outputs, stats)})
+    return probes
+
+
+def _write_all(
+    results: typing.Iterable[_BatchResult],
+    writers: typing.List[BgzfWriter],
+    stats: typing.List[ReadStats],
+) -> None:
+    for blocks, batch_stats in results:
+        for writer, output_blocks in zip(writers, blocks):
+            writer.write_blocks(output_blocks)
+        for total, batch in zip(stats, batch_stats):
+            total.merge(batch)
@@ -0,0 +1,714 @@
+"""Command line interface for the readsim engines."""
+
+import argparse
+import os
+import typing
+
+from . import __version__
+
+
+def _wgsim_arguments(p: argparse.ArgumentParser) -> None:
+    p.add_argument("-e", dest="error_rate", type=float, default=0.02, help="base error rate")
+    p.add_argument("-d", dest="outer_dist", type=int, default=500, help="outer distance between the two ends")
+    p.add_argument("-s", dest="standard_dev", type=int, default=50, help="standard deviation")
+    p.add_argument("-N", dest="n_pairs", type=int, default=1_000_000, help="number of read pairs")
+    p.add_argument("-1", dest="r1_length", type=int, default=70, help="length of the first read")
+    p.add_argument("-2", dest="r2_length", type=int, default=70, help="length of the second read")
+    p.add_argument("-r", dest="mutation_rate", type=float, default=0.001, help="rate of mutations")
+    p.add_argument("-R", dest="indel_fraction", type=float, default=0.15, help="fraction of indels")
+    p.add_argument("-X", dest="indel_extended", type=float, default=0.3, help="probability an indel is extended")
+    p.add_argument("-S", dest="seed", type=int, default=0, help="seed for random generator")
+    p.add_argument("-t", "--threads", type=int, default=os.cpu_count() or 1, help="worker processes")
+    p.add_argument("--batch-size", type=int, default=None, help="read pairs simulated per batch")
+
+
+def _wgsim_options(args: argparse.Namespace) -> typing.Any:
+    from .wgsim import WgsimOptions
+
+    return WgsimOptions(
+        error_rate=args.error_rate,
+        outer_dist=args.outer_dist,
+        standard_dev=args.standard_dev,
+        n_pairs=args.n_pairs,
+        r1_length=args.r1_length,
+        r2_length=args.r2_length,
+        mutation_rate=args.mutation_rate,
+        indel_fraction=args.indel_fraction,
+        indel_extended=args.indel_extended,
+        seed=args.seed,
+    )
+
+
+def _add_wgsim(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "wgsim",
+        help="Simulate paired-end whole genome reads (wgsim compatible options).",
+    )
+    _wgsim_arguments(p)
+    p.add_argument(
+        "--sample-seed",
+        type=int,
+        default=None,
+        help="seed of the mutated genome if it differs from -S, e.g. the sample seed of a shard",
+    )
+    p.add_argument("--stats", default=None, help="write read statistics of both ends to this JSON file")
+    p.add_argument("fasta", help="reference FASTA, or haplotypes built by `readsim haplotypes`")
+    p.add_argument("out_r1")
+    p.add_argument("out_r2")
+    p.set_defaults(func=_run_wgsim)
+
+
+def _run_wgsim(args: argparse.Namespace) -> None:
+    import dataclasses
+
+    from .wgsim import DEFAULT_BATCH_SIZE, run
+
+    run(
+        args.fasta,
+        args.out_r1,
+        args.out_r2,
+        dataclasses.replace(_wgsim_options(args), sample_seed=args.sample_seed),
+        threads=args.threads,
+        batch_size=args.batch_size or DEFAULT_BATCH_SIZE,
+        stats_path=args.stats,
+    )
+
+
+def _add_wgsim_batch(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "wgsim-batch",
+        help="Simulate several whole genome samples from one read of the reference.",
+    )
+    _wgsim_arguments(p)
+    p.add_argument(
+        "--samples", required=True, help="id<TAB>seed[<TAB>pairs[<TAB>haplotypes]] table, one sample per line"
+    )
+    p.add_argument("--report", default="batch_report.json", help="JSON report of the time spent per sample")
+    p.add_argument("--no-stats", dest="stats", action="store_false", help="do not write <id>.stats.json")
+    p.add_argument("fasta", help="reference FASTA, or haplotypes built by `readsim haplotypes` shared by all samples")
+    p.set_defaults(func=_run_wgsim_batch)
+
+
+def _run_wgsim_batch(args: argparse.Namespace) -> None:
+    from .batch import read_samples, write_report
+    from .wgsim import DEFAULT_BATCH_SIZE, run_samples
+
+    report = run_samples(
+        args.fasta,
+        read_samples(args.samples),
+        _wgsim_options(args),
+        threads=args.threads,
+        batch_size=args.batch_size or DEFAULT_BATCH_SIZE,
+        stats=args.stats,
+    )
+    write_report(args.report, report)
+
+
+def _add_shard_seeds(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "shard-seeds",
+        help="Write the per-shard seeds and read counts of a sample as CSV.",
+    )
+    p.add_argument("--seed", type=int, required=True, help="sample seed from the samplesheet")
+    p.add_argument("--shards", type=int, required=True, help="number of shards")
+    p.add_argument(
+        "--count",
+        action="append",
+        default=[],
+        metavar="NAME=TOTAL",
+        help="read count to split over the shards, e.g. wholegenome=1000000 or metagenome=1M",
+    )
+    p.add_argument("-o", "--output", default="-", help="output CSV (default: stdout)")
+    p.set_defaults(func=_run_shard_seeds)
+
+
+def _run_shard_seeds(args: argparse.Namespace) -> None:
+    import csv
+    import sys
+
+    from .seeds import shard_table
+
+    counts = {}
+    for item in args.count:
+        name, sep, total = item.partition("=")
+        if not sep:
+            raise SystemExit(f"--count expects NAME=TOTAL, got {item!r}")
+        counts[name] = total
+
+    rows = shard_table(args.seed, args.shards, counts)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        writer = csv.DictWriter(out, fieldnames=["shard", "seed", *counts], lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def _add_bgzip(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "bgzip",
+        help="Compress a stream into BGZF on several threads and write a .gzi index.",
+    )
+    p.add_argument("-@", "--threads", type=int, default=os.cpu_count() or 1, help="compression threads")
+    p.add_argument("-l", "--level", type=int, default=6, help="compression level")
+    p.add_argument("--no-index", dest="index", action="store_false", help="do not write <output>.gzi")
+    p.add_argument("-o", "--output", required=True, help="output BGZF file")
+    p.add_argument("input", nargs="?", default="-", help="input file (default: stdin)")
+    p.set_defaults(func=_run_bgzip)
+
+
+def _run_bgzip(args: argparse.Namespace) -> None:
+    from .bgzf import bgzip_file
+
+    bgzip_file(args.input, args.output, threads=args.threads, level=args.level, index=args.index)
+
+
+def _add_concat(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "concat",
+        help="Concatenate gzip files; BGZF inputs are joined into one BGZF file with a .gzi index.",
+    )
+    p.add_argument("--no-index", dest="index", action="store_false", help="do not write <output>.gzi")
+    p.add_argument("-o", "--output", required=True, help="output gzip file")
+    p.add_argument("inputs", nargs="+", help="gzip files, in order")
+    p.set_defaults(func=_run_concat)
+
+
+def _run_concat(args: argparse.Namespace) -> None:
+    import sys
+
+    from .bgzf import concatenate
+
+    if not concatenate(args.inputs, args.output, index=args.index) and args.index:
+        print(f"{args.output}: not every input is BGZF, so it is not indexed", file=sys.stderr)
+
+
+def _add_benchmark(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser("benchmark", help="Measure engine and stage throughput and write JSON results.")
+    p.add_argument("stages", nargs="*", help="stages to run (default: all)")
+    p.add_argument(
+        "--reference-mb", "--size-mb", type=float, default=20, help="size of the synthetic reference and FASTQ input"
+    )
+    p.add_argument("--contigs", type=int, default=10, help="contigs in the synthetic reference")
+    p.add_argument("--read-pairs", type=int, default=100_000, help="read pairs simulated by each simulator")
+    p.add_argument("--samples", type=int, default=1000, help="samples in the samplesheet merge")
+    p.add_argument("-t", "--threads", type=int, default=os.cpu_count() or 1, help="threads for the parallel runs")
+    p.add_argument("-l", "--level", type=int, default=6, help="compression level")
+    p.add_argument("-S", "--seed", type=int, default=0, help="seed for the synthetic inputs and simulators")
+    p.add_argument("--baseline", default=None, help="results of an earlier run to check for regressions")
+    p.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown or RSS growth that is a regression")
+    p.add_argument("-o", "--output", default="-", help="output JSON (default: stdout)")
+    p.set_defaults(func=_run_benchmark)
+
+
+def _run_benchmark(args: argparse.Namespace) -> None:
+    import json
+    import sys
+
+    from .benchmark import SuiteOptions, compare, run_suite
+
+    opts = SuiteOptions(
+        reference_mb=args.reference_mb,
+        contigs=args.contigs,
+        read_pairs=args.read_pairs,
+        samples=args.samples,
+        threads=args.threads,
+        level=args.level,
+        seed=args.seed,
+    )
+    results = run_suite(opts, args.stages)
+    text = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        for line in regressions:
+            print(f"Regression: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+def _add_prepare_reference(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "prepare-reference",
+        help="Inflate a reference once into a single-line FASTA with .fai index and contig sizes.",
+    )
+    p.add_argument("fasta", help="input FASTA, optionally gzipped")
+    p.add_argument("prefix", help="writes <prefix>.fa, <prefix>.fa.fai and <prefix>.sizes")
+    p.set_defaults(func=_run_prepare_reference)
+
+
+def _run_prepare_reference(args: argparse.Namespace) -> None:
+    from .reference import prepare
+
+    prepare(args.fasta, args.prefix)
+
+
+def _add_ispcr(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "ispcr",
+        help="Extract the amplicons of a primer pair from a reference (in-silico PCR).",
+    )
+    p.add_argument("--fwd", required=True, help="forward primer, 5'-3', IUPAC codes allowed")
+    p.add_argument("--rev", required=True, help="reverse primer, 5'-3', IUPAC codes allowed")
+    p.add_argument(
+        "-e",
+        "--error",
+        type=float,
+        default=4.5,
+        help="mismatches allowed per primer site; values below 1 are a rate of the primer length",
+    )
+    p.add_argument("--max-length", type=int, default=0, help="longest amplicon to report (0: no limit)")
+    p.add_argument("-t", "--threads", type=int, default=os.cpu_count() or 1, help="worker processes")
+    p.add_argument("fasta", help="reference FASTA, optionally gzipped or prepared")
+    p.add_argument("output", help="amplicon FASTA")
+    p.set_defaults(func=_run_ispcr)
+
+
+def _run_ispcr(args: argparse.Namespace) -> None:
+    import sys
+
+    from .ispcr import run
+
+    count = run(
+        args.fasta,
+        args.output,
+        args.fwd,
+        args.rev,
+        error=args.error,
+        max_length=args.max_length,
+        threads=args.threads,
+    )
+    print(f"Wrote {count} amplicons to {args.output}", file=sys.stderr)
+
+
+def _add_capsim(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "capsim",
+        help="Simulate target capture reads from probe alignments (CapSim compatible options).",
+    )
+    p.add_argument("--reference", required=True, help="reference FASTA, optionally gzipped or prepared")
+    p.add_argument("--probe", required=True, help="probes mapped to the reference (BAM or SAM), or a BED file")
+    p.add_argument("--ID", dest="read_id", default="", help="prefix of the read names")
+    p.add_argument("--fmedian", type=int, default=500, help="median fragment size at shearing")
+    p.add_argument("--fshape", type=float, default=6.0, help="shape of the sheared fragment size distribution")
+    p.add_argument("--smedian", type=int, default=1300, help="median fragment size of the size selection")
+    p.add_argument("--sshape", type=float, default=6.0, help="shape of the size selection distribution")
+    p.add_argument("--tmedian", type=int, default=None, help="median target fragment size, overrides the above")
+    p.add_argument("--tshape", type=float, default=None, help="shape of the target fragment size distribution")
+    p.add_argument("--num", type=int, default=500_000, help="number of fragments")
+    p.add_argument("--illen", type=int, default=150, help="Illumina read length")
+    p.add_argument("--ilmode", default="pe", choices=["pe", "mp", "se"], help="paired-end, mate-pair or single-end")
+    p.add_argument("--pblen", type=int, default=30_000, help="mean PacBio polymerase read length")
+    platform = p.add_mutually_exclusive_group()
+    platform.add_argument("--miseq", action="store_true", help="simulate Illumina MiSeq reads (default)")
+    platform.add_argument("--pacbio", action="store_true", help="simulate PacBio reads")
+    p.add_argument("-S", "--seed", type=int, default=0, help="seed for random generator")
+    p.add_argument("-t", "--threads", type=int, default=os.cpu_count() or 1, help="worker processes")
+    p.add_argument("--batch-size", type=int, default=None, help="fragments simulated per batch")
+    p.add_argument("--stats", default=None, help="write read statistics to this JSON file")
+    p.add_argument("prefix", help="writes <prefix>_1.fastq.gz and <prefix>_2.fastq.gz, or <prefix>.fastq.gz")
+    p.set_defaults(func=_run_capsim)
+
+
+def _run_capsim(args: argparse.Namespace) -> None:
+    import sys
+
+    from .capsim import DEFAULT_BATCH_SIZE, CaptureOptions, run
+
+    opts = CaptureOptions(
+        fmedian=args.fmedian,
+        fshape=args.fshape,
+        smedian=args.smedian,
+        sshape=args.sshape,
+        tmedian=args.tmedian,
+        tshape=args.tshape,
+        num=args.num,
+        platform="pacbio" if args.pacbio else "illumina",
+        illen=args.illen,
+        ilmode=args.ilmode,
+        pblen=args.pblen,
+        read_id=args.read_id,
+        seed=args.seed,
+    )
+    probes = run(
+        args.reference,
+        args.probe,
+        args.prefix,
+        opts,
+        threads=args.threads,
+        batch_size=args.batch_size or DEFAULT_BATCH_SIZE,
+        stats_path=args.stats,
+    )
+    print(
+        f"Captured {opts.num} fragments from {len(probes)} probe intervals ({probes.bases()} bases)",
+        file=sys.stderr,
+    )
+
+
+def _add_probemap(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "probemap",
+        help="Place capture probes on a reference with a minimizer index and banded alignment.",
+    )
+    p.add_argument("-k", type=int, default=15, help="k-mer length of the minimizers")
+    p.add_argument("-w", type=int, default=5, help="k-mers per minimizer window")
+    p.add_argument("--band", type=int, default=15, help="diagonals an alignment may drift from its seeds")
+    p.add_argument("--min-seeds", type=int, default=2, help="minimizer hits needed to align a candidate")
+    p.add_argument("--max-hits", type=int, default=10_000, help="placements kept per probe, as Bowtie2 -k")
+    p.add_argument("--score-min", default="G,20,8", help="minimum alignment score, as Bowtie2 --score-min")
+    p.add_argument("-t", "--threads", type=int, default=os.cpu_count() or 1, help="worker processes")
+    p.add_argument("fasta", help="reference FASTA, optionally gzipped or prepared")
+    p.add_argument("probes", help="probe FASTA, optionally gzipped")
+    p.add_argument("output", help="BED file of probe placements")
+    p.set_defaults(func=_run_probemap)
+
+
+def _run_probemap(args: argparse.Namespace) -> None:
+    from .probemap import ProbemapOptions, report, run
+
+    opts = ProbemapOptions(
+        k=args.k,
+        w=args.w,
+        band=args.band,
+        min_seeds=args.min_seeds,
+        max_hits=args.max_hits,
+        score_min=args.score_min,
+    )
+    report(run(args.fasta, args.probes, args.output, opts, threads=args.threads))
+
+
+def _add_compile_model(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "compile-model",
+        help="Compile an ART profile or InSilicoSeq model into a memory-mappable quality model.",
+    )
+    source = p.add_mutually_exclusive_group(required=True)
+    source.add_argument("--iss", metavar="MODEL", help="InSilicoSeq model name (such as MiSeq) or .npz file")
+    source.add_argument(
+        "--art", action="append", metavar="PROFILE", help="ART Illumina profile; give it twice for read 1 and read 2"
+    )
+    source.add_argument("--builtin", metavar="MODEL", help="error profile of `readsim metagenome --model`")
+    p.add_argument("--name", default=None, help="model name recorded in the file")
+    p.add_argument("output", help="compiled model, conventionally <name>.rqm")
+    p.set_defaults(func=_run_compile_model)
+
+
+def _run_compile_model(args: argparse.Namespace) -> None:
+    import sys
+    from pathlib import Path
+
+    from . import qualmodel
+
+    if args.iss:
+        path = qualmodel.iss_profile(args.iss)
+        model = qualmodel.from_iss(args.name or path.stem, path)
+    elif args.art:
+        if len(args.art) > 2:
+            raise SystemExit(f"--art takes the profiles of read 1 and read 2, got {len(args.art)} files")
+        model = qualmodel.from_art(args.name or Path(args.art[0]).stem, args.art)
+    else:
+        from .metagenome import error_profile, read_model
+
+        _, quality = error_profile(read_model("kde", args.builtin))
+        model = qualmodel.from_read_model(args.name or args.builtin, len(quality), quality)
+    model.save(args.output)
+    print(
+        f"Compiled {model.name}: {model.mates} mate(s), {model.quality.shape[1]} quality bin(s), "
+        f"{model.read_length} bp, qualities up to {model.max_quality}",
+        file=sys.stderr,
+    )
+
+
+def _add_ncbi_download(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "ncbi-download",
+        help="Download NCBI genomes in parallel into one BGZF reference, resuming and verifying each transfer.",
+    )
+    ids = p.add_mutually_exclusive_group(required=True)
+    ids.add_argument("-A", "--accessions", help="file with one assembly accession per line, or a comma-separated list")
+    ids.add_argument("-t", "--taxids", help="file with one taxid per line, or a comma-separated list")
+    p.add_argument("--section", choices=["refseq", "genbank"], default="refseq", help="NCBI section")
+    p.add_argument("--groups", default="all", help="comma-separated NCBI groups, as ncbi-genome-download")
+    p.add_argument("--base-url", default=None, help="NCBI FTP site or a mirror with the same layout")
+    p.add_argument("-j", "--connections", type=int, default=None, help="concurrent downloads")
+    p.add_argument("-@", "--threads", type=int, default=os.cpu_count() or 1, help="compression threads")
+    p.add_argument("-l", "--level", type=int, default=6, help="compression level")
+    p.add_argument("--partial-dir", default=None, help="keep downloads here so a later attempt can resume them")
+    p.add_argument("--manifest", default=None, help="TSV of the merged assemblies")
+    p.add_argument("-o", "--output", required=True, help="merged BGZF FASTA; a .gzi index is written next to it")
+    p.set_defaults(func=_run_ncbi_download)
+
+
+def _run_ncbi_download(args: argparse.Namespace) -> None:
+    import sys
+
+    from . import ncbi
+
+    assemblies = ncbi.download(
+        args.output,
+        accessions=ncbi.read_ids(args.accessions),
+        taxids=ncbi.read_ids(args.taxids),
+        section=args.section,
+        groups=args.groups,
+        base_url=args.base_url or ncbi.NCBI_URL,
+        connections=args.connections or ncbi.CONNECTIONS,
+        threads=args.threads,
+        level=args.level,
+        partial_dir=args.partial_dir,
+        manifest=args.manifest,
+    )
+    print(f"Merged {len(assemblies)} {args.section} assemblies into {args.output}", file=sys.stderr)
+
+
+def _add_haplotypes(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "haplotypes",
+        help="Build the mutated diploid genome of a wgsim seed once, with its truth VCF.",
+    )
+    p.add_argument("-d", dest="outer_dist", type=int, default=500, help="outer distance between the two ends")
+    p.add_argument("-s", dest="standard_dev", type=int, default=50, help="standard deviation")
+    p.add_argument("-1", dest="r1_length", type=int, default=70, help="length of the first read")
+    p.add_argument("-2", dest="r2_length", type=int, default=70, help="length of the second read")
+    p.add_argument("-r", dest="mutation_rate", type=float, default=0.001, help="rate of mutations")
+    p.add_argument("-R", dest="indel_fraction", type=float, default=0.15, help="fraction of indels")
+    p.add_argument("-X", dest="indel_extended", type=float, default=0.3, help="probability an indel is extended")
+    p.add_argument("-S", dest="seed", type=int, default=0, help="seed for random generator")
+    p.add_argument("--sample", default="haplotypes", help="sample name in the VCF")
+    p.add_argument("fasta")
+    p.add_argument("prefix", help="writes <prefix>.rhap and <prefix>.vcf.gz")
+    p.set_defaults(func=_run_haplotypes)
+
+
+def _run_haplotypes(args: argparse.Namespace) -> None:
+    import sys
+
+    from .haplotypes import build
+    from .wgsim import WgsimOptions
+
+    opts = WgsimOptions(
+        outer_dist=args.outer_dist,
+        standard_dev=args.standard_dev,
+        r1_length=args.r1_length,
+        r2_length=args.r2_length,
+        mutation_rate=args.mutation_rate,
+        indel_fraction=args.indel_fraction,
+        indel_extended=args.indel_extended,
+        seed=args.seed,
+    )
+    counts = build(args.fasta, args.prefix, opts, args.sample)
+    print(
+        f"{counts['snp']} SNPs, {counts['mnp']} MNPs and {counts['indel']} indels "
+        f"({counts['het']} heterozygous, {counts['hom']} homozygous) in {args.prefix}.vcf.gz",
+        file=sys.stderr,
+    )
+
+
+def _add_qc_report(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "qc-report",
+        help="Merge read statistics files and write them as MultiQC custom content.",
+    )
+    p.add_argument("-o", "--outdir", default=".", help="directory for the *_mqc.json files")
+    p.add_argument("stats", nargs="+", help="statistics JSON files written by the simulators")
+    p.set_defaults(func=_run_qc_report)
+
+
+def _run_qc_report(args: argparse.Namespace) -> None:
+    from .qcstats import load_stats, write_multiqc
+
+    write_multiqc(load_stats(args.stats), args.outdir)
+
+
+def _metagenome_arguments(p: argparse.ArgumentParser) -> None:
+    source = p.add_mutually_exclusive_group()
+    source.add_argument("--genomes", action="store_true", help="every FASTA record is a genome (default)")
+    source.add_argument("--draft", action="store_true", help="all FASTA records are contigs of one draft genome")
+    p.add_argument("-n", "--n_reads", default="1M", help="reads to simulate; accepts suffixes such as 500k or 1M")
+    p.add_argument("--mode", default="kde", choices=["kde", "basic", "perfect"], help="error model")
+    p.add_argument("--model", default="MiSeq", help="instrument model: HiSeq, NextSeq, NovaSeq or MiSeq")
+    p.add_argument("--abundance", default="lognormal", help="abundance distribution of the genomes")
+    p.add_argument("--abundance_file", default=None, help="genome<TAB>abundance file, overrides --abundance")
+    p.add_argument("--coverage", default=None, help="coverage distribution of the genomes")
+    p.add_argument("--coverage_file", default=None, help="genome<TAB>coverage file, overrides --n_reads")
+    p.add_argument("--gc_bias", action="store_true", help="reject pairs with a GC content outside 20-70%%")
+    p.add_argument("-t", "--threads", type=int, default=os.cpu_count() or 1, help="worker processes")
+    p.add_argument("--batch-size", type=int, default=None, help="read pairs simulated per batch")
+    p.add_argument(
+        "--compiled-model",
+        default=None,
+        help="quality model from `readsim compile-model`; qualities and substitutions are sampled from it",
+    )
+
+
+def _add_metagenome(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "metagenome",
+        help="Simulate abundance-weighted paired-end metagenome reads (InSilicoSeq compatible options).",
+    )
+    _metagenome_arguments(p)
+    p.add_argument("-S", "--seed", type=int, default=0, help="seed for random generator")
+    p.add_argument(
+        "--sample-seed",
+        type=int,
+        default=None,
+        help="seed of the abundance profile if it differs from -S, e.g. the sample seed of a shard",
+    )
+    p.add_argument("--stats", default=None, help="write read statistics of both ends to this JSON file")
+    p.add_argument("fasta", help="reference FASTA, optionally gzipped or prepared")
+    p.add_argument("prefix", help="prefix of the _R1.fastq.gz, _R2.fastq.gz and _abundance.txt outputs")
+    p.set_defaults(func=_run_metagenome)
+
+
+def _run_metagenome(args: argparse.Namespace) -> None:
+    import sys
+
+    from .metagenome import DEFAULT_BATCH_SIZE, read_model, run
+    from .seeds import parse_read_count
+
+    pairs = run(
+        args.fasta,
+        args.prefix,
+        parse_read_count(args.n_reads),
+        read_model(args.mode, args.model),
+        seed=args.seed,
+        abundance=args.abundance,
+        abundance_file=args.abundance_file,
+        coverage=args.coverage,
+        coverage_file=args.coverage_file,
+        draft=args.draft,
+        gc_bias=args.gc_bias,
+        threads=args.threads,
+        batch_size=args.batch_size or DEFAULT_BATCH_SIZE,
+        stats_path=args.stats,
+        compiled_model=args.compiled_model,
+        sample_seed=args.sample_seed,
+    )
+    print(f"Simulated {sum(pairs.values())} read pairs from {len(pairs)} genomes", file=sys.stderr)
+
+
+def _add_metagenome_batch(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "metagenome-batch",
+        help="Simulate several metagenome samples in one pass over the reference.",
+    )
+    _metagenome_arguments(p)
+    p.add_argument("--samples", required=True, help="id<TAB>seed[<TAB>reads] table, one sample per line")
+    p.add_argument("--report", default="batch_report.json", help="JSON report of the time spent per sample")
+    p.add_argument("--no-stats", dest="stats", action="store_false", help="do not write <id>.stats.json")
+    p.add_argument("fasta", help="reference FASTA, optionally gzipped or prepared")
+    p.set_defaults(func=_run_metagenome_batch)
+
+
+def _run_metagenome_batch(args: argparse.Namespace) -> None:
+    from .batch import read_samples, write_report
+    from .metagenome import DEFAULT_BATCH_SIZE, Abundance, read_model, run_samples
+    from .seeds import parse_read_count
+
+    report = run_samples(
+        args.fasta,
+        read_samples(args.samples),
+        parse_read_count(args.n_reads),
+        read_model(args.mode, args.model),
+        Abundance(args.abundance, args.abundance_file, args.coverage, args.coverage_file),
+        draft=args.draft,
+        gc_bias=args.gc_bias,
+        threads=args.threads,
+        batch_size=args.batch_size or DEFAULT_BATCH_SIZE,
+        stats=args.stats,
+        compiled_model=args.compiled_model,
+    )
+    write_report(args.report, report)
+
+
+def _add_pack(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "pack",
+        help="Pack single-end or paired FASTQ into a 2-bit read store with binned qualities.",
+    )
+    p.add_argument("--sample", required=True, help="sample name recorded in the header")
+    p.add_argument("--seed", type=int, default=None, help="simulation seed recorded in the header")
+    p.add_argument("--chunk-size", type=int, default=None, help="records per independently decodable chunk")
+    p.add_argument("-l", "--level", type=int, default=6, help="zlib compression level")
+    p.add_argument("-o", "--output", required=True, help="store to write, conventionally <sample>.rs2")
+    p.add_argument("fastq", nargs="+", help="FASTQ file, or the R1 and R2 files of a pair")
+    p.set_defaults(func=_run_pack)
+
+
+def _run_pack(args: argparse.Namespace) -> None:
+    import sys
+
+    from .readstore import DEFAULT_CHUNK_SIZE, pack
+
+    records = pack(
+        args.fastq,
+        args.output,
+        args.sample,
+        seed=args.seed,
+        chunk_size=args.chunk_size or DEFAULT_CHUNK_SIZE,
+        level=args.level,
+    )
+    print(f"Packed {records} records of {args.sample} into {args.output}", file=sys.stderr)
+
+
+def _add_unpack(subparsers: argparse._SubParsersAction) -> None:
+    p = subparsers.add_parser(
+        "unpack",
+        help="Export a 2-bit read store to BGZF-compressed FASTQ.",
+    )
+    p.add_argument("-t", "--threads", type=int, default=os.cpu_count() or 1, help="worker processes")
+    p.add_argument("-l", "--level", type=int, default=1, help="compression level of the FASTQ output (1 is fastest)")
+    p.add_argument("--header", action="store_true", help="print the store header as JSON and exit")
+    p.add_argument("store")
+    p.add_argument("fastq", nargs="*", help="output per end: R1, and R2 for a paired store")
+    p.set_defaults(func=_run_unpack)
+
+
+def _run_unpack(args: argparse.Namespace) -> None:
+    import json
+
+    from .readstore import read_header, unpack
+
+    if args.header:
+        header, footer = read_header(args.store)
+        print(json.dumps({**header, "records": footer["records"]}, indent=2))
+        return
+    unpack(args.store, args.fastq, threads=args.threads, compresslevel=args.level)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="readsim", description=__doc__)
+    parser.add_argument("--version", action="version", version=f"readsim {__version__}")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    _add_wgsim(subparsers)
+    _add_shard_seeds(subparsers)
+    _add_bgzip(subparsers)
+    _add_concat(subparsers)
+    _add_benchmark(subparsers)
+    _add_prepare_reference(subparsers)
+    _add_ispcr(subparsers)
+    _add_qc_report(subparsers)
+    _add_metagenome(subparsers)
+    _add_wgsim_batch(subparsers)
+    _add_metagenome_batch(subparsers)
+    _add_pack(subparsers)
+    _add_unpack(subparsers)
+    _add_capsim(subparsers)
+    _add_probemap(subparsers)
+    _add_compile_model(subparsers)
+    _add_ncbi_download(subparsers)
+    _add_haplotypes(subparsers)
+    return parser
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    args.func(args)
+    return 0
@@ -0,0 +1,74 @@
+"""
+FASTA loading and nucleotide encoding shared by the simulation engines.
+
+Sequences are held as `uint8` arrays using the codes A=0, C=1, G=2, T=3 and
+N=4 (any other IUPAC symbol is collapsed to N), which lets the engines index,
+mutate and complement whole batches of reads with numpy operations.
+"""
+
+import gzip
+import typing
+from pathlib import Path
+
+import numpy as np
+
+ALPHABET = np.frombuffer(b"ACGTN", dtype=np.uint8)
+COMPLEMENT = np.array([3, 2, 1, 0, 4], dtype=np.uint8)
+N_CODE = 4
+
+_ENCODE = np.full(256, N_CODE, dtype=np.uint8)
+for _code, _base in enumerate(b"ACGT"):
+    _ENCODE[_base] = _code
+    _ENCODE[ord(chr(_base).lower())] = _code
+
+
+def open_maybe_gzip(path: typing.Union[str, Path], mode: str = "rb") -> typing.IO:
+    """Open `path` for reading, transparently inflating gzip/BGZF input."""
+    with open(path, "rb") as f:
+        magic = f.read(2)
+    if magic == b"\x1f\x8b":
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def encode(seq: typing.Union[bytes, np.ndarray]) -> np.ndarray:
+    """Encode raw sequence bytes (or a `uint8` view of them) into nucleotide codes."""
+    if isinstance(seq, np.ndarray):
+        return _ENCODE[seq]
+    return _ENCODE[np.frombuffer(seq, dtype=np.uint8)]
+
+
+def decode(codes: np.ndarray) -> bytes:
+    """Decode nucleotide codes back into upper-case sequence bytes."""
+    return ALPHABET[codes].tobytes()
+
+
+def iter_fasta(path: typing.Union[str, Path]) -> typing.Iterator[typing.Tuple[str, bytes]]:
+    """Yield `(name, sequence)` records; the name is the first word of the header."""
+    name = None
+    chunks: typing.List[bytes] = []
+    with open_maybe_gzip(path) as f:
+        for line in f:
+            if line.startswith(b">"):
+                if name is not None:
+                    yield name, b"".join(chunks)
+                name = line[1:].split(None, 1)[0].decode() if line[1:].strip() else ""
+                chunks = []
+            else:
+                chunks.append(line.rstrip())
+    if name is not None:
+        yield name, b"".join(chunks)
+
+
+def read_fasta(path: typing.Union[str, Path]) -> typing.List[typing.Tuple[str, np.ndarray]]:
+    """Load every record of a (optionally gzipped) FASTA file as encoded arrays.
+
+    References written by `readsim prepare-reference` are read through their
+    memory map rather than parsed line by line.
+    """
+    from .reference import IndexedFasta, is_prepared
+
+    if is_prepared(path):
+        with IndexedFasta(path) as fa:
+            return [(name, encode(fa.fetch(name))) for name in fa.names()]
+    return [(name, encode(seq)) for name, seq in iter_fasta(path)]
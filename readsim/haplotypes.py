@@ -0,0 +1,210 @@
+"""
+Mutated diploid haplotypes with a truth VCF, built once per reference, mutation model and seed.
+
+`readsim wgsim` mutates the reference inside every task, so every sample (and
+every shard of a sample) repeats the same work and the introduced variants
+are not recorded anywhere. `build` applies the wgsim mutation model of
+`readsim.wgsim` with the same random stream, so haplotypes built with seed S
+are exactly the genome that `readsim wgsim -S S` simulates from, and writes:
+
+- `<prefix>.rhap`, both haplotypes of every contig long enough for the insert
+  size in one memory-mappable file; `readsim wgsim` and `readsim wgsim-batch`
+  accept it in place of the reference and sample reads from it without
+  reading the reference or mutating it again,
+- `<prefix>.vcf.gz`, the truth set as a phased diploid VCF (BGZF, with a
+  `.gzi` index). Overlapping and adjacent changes on either haplotype are
+  merged into one record, and indels carry the preceding reference base, so
+  applying the records to the reference yields both haplotypes exactly.
+"""
+
+import json
+import os
+import struct
+import typing
+from pathlib import Path
+
+import numpy as np
+
+from . import __version__
+from .bgzf import BgzfWriter
+from .fasta import ALPHABET
+from .wgsim import Genome, HaplotypeEdits, WgsimOptions, build_genome, load_reference, min_contig_length
+
+MAGIC = b"RHP\x01"
+VERSION = 1
+_U32 = struct.Struct("<I")
+
+# Options that decide the haplotypes; the others only affect the reads drawn from them
+MUTATION_OPTIONS = ("seed", "mutation_rate", "indel_fraction", "indel_extended")
+
+
+def mutation_options(opts: WgsimOptions) -> typing.Dict[str, typing.Any]:
+    return {name: opts.genome_seed() if name == "seed" else getattr(opts, name) for name in MUTATION_OPTIONS}
+
+
+def is_haplotypes(path: typing.Union[str, Path]) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def save_haplotypes(path: typing.Union[str, Path], genome: Genome, opts: WgsimOptions) -> None:
+    header = {
+        "version": VERSION,
+        **mutation_options(opts),
+        "min_length": min_contig_length(opts),
+        "names": genome.names,
+        "starts": genome.starts.tolist(),
+        "lengths": genome.lengths.tolist(),
+        "weights": genome.weights.tolist(),
+        "size": int(genome.seq.size),
+    }
+    text = json.dumps(header).encode()
+    text += b" " * (-(len(MAGIC) + _U32.size + len(text)) % 8)
+    with open(path, "wb") as f:
+        f.write(MAGIC + _U32.pack(len(text)) + text)
+        f.write(np.ascontiguousarray(genome.seq, dtype=np.uint8).tobytes())
+
+
+def read_header(path: typing.Union[str, Path]) -> typing.Dict[str, typing.Any]:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a haplotype file")
+        (size,) = _U32.unpack(f.read(_U32.size))
+        header = json.loads(f.read(size))
+    if header["version"] != VERSION:
+        raise ValueError(f"{path} holds version {header['version']} haplotypes, expected version {VERSION}")
+    header["offset"] = len(MAGIC) + _U32.size + size
+    return header
+
+
+def load_haplotypes(path: typing.Union[str, Path], opts: typing.Optional[WgsimOptions] = None) -> Genome:
+    """Map the haplotypes in `path`; forked workers share the pages.
+
+    With `opts`, fail if the file was built for shorter inserts or reads, since
+    it may hold contigs too short for the fragments of `opts`.
+    """
+    header = read_header(path)
+    if opts is not None and min_contig_length(opts) > header["min_length"]:
+        raise ValueError(
+            f"{path} keeps contigs of {header['min_length']} bp and more, but outer distance {opts.outer_dist}, "
+            f"standard deviation {opts.standard_dev} and read lengths {opts.r1_length} and {opts.r2_length} "
+            f"need {min_contig_length(opts)} bp; rebuild it with those"
+        )
+    seq = np.memmap(path, dtype=np.uint8, mode="r", offset=header["offset"], shape=(header["size"],))
+    return Genome(
+        names=header["names"],
+        seq=seq,
+        starts=np.asarray(header["starts"], dtype=np.int64),
+        lengths=np.asarray(header["lengths"], dtype=np.int64),
+        weights=np.asarray(header["weights"], dtype=np.float64),
+    )
+
+
+def _haplotype_offsets(edits: HaplotypeEdits, positions: np.ndarray) -> np.ndarray:
+    """Offsets in the haplotype of the reference `positions`: kept bases plus inserted bases before each."""
+    deleted = np.flatnonzero(~edits.keep)
+    inserted = np.concatenate(([0], np.cumsum(edits.inserted_length)))
+    return positions - np.searchsorted(deleted, positions) + inserted[np.searchsorted(edits.inserted_after, positions)]
+
+
+def contig_variants(
+    seq: np.ndarray,
+    haplotypes: typing.Sequence[np.ndarray],
+    edits: typing.Sequence[HaplotypeEdits],
+) -> typing.Iterator[typing.Tuple[int, bytes, typing.List[bytes], typing.Tuple[int, int]]]:
+    """`(0-based position, REF, ALTs, genotype)` of every record that turns `seq` into its two `haplotypes`."""
+    if not edits:
+        return
+    changed = np.unique(np.concatenate([a for e in edits for a in (e.substituted, np.flatnonzero(~e.keep))]))
+    touched = np.union1d(changed, np.concatenate([e.inserted_after for e in edits]))
+    if not touched.size:
+        return
+    # runs of consecutive touched positions on either haplotype become one record each
+    split = np.flatnonzero(np.diff(touched) > 1) + 1
+    start = touched[np.concatenate(([0], split))]
+    end = touched[np.concatenate((split - 1, [touched.size - 1]))] + 1
+    ref_length = end - start
+    indel = np.zeros(start.size, dtype=bool)
+    for e in edits:
+        indel |= _haplotype_offsets(e, end) - _haplotype_offsets(e, start) != ref_length
+    # VCF indels start with a base both haplotypes keep: the base an insertion follows if it is
+    # unchanged, otherwise the reference base before the record (after it at the start of a contig)
+    pad = indel & np.isin(start, changed)
+    left = pad & (start > 0)
+    right = pad & (start == 0) & (end < len(seq))
+    start = start - left
+    end = end + right
+
+    ref_text = ALPHABET[seq].tobytes()
+    hap_text = [ALPHABET[h].tobytes() for h in haplotypes]
+    spans = [
+        list(zip(_haplotype_offsets(e, start).tolist(), _haplotype_offsets(e, end).tolist())) for e in edits
+    ]
+    for i, (a, b) in enumerate(zip(start.tolist(), end.tolist())):
+        ref = ref_text[a:b]
+        alleles = [ref]
+        genotype = []
+        for text, span in zip(hap_text, spans):
+            allele = text[span[i][0] : span[i][1]]
+            if allele not in alleles:
+                alleles.append(allele)
+            genotype.append(alleles.index(allele))
+        if any(genotype):
+            yield a, ref, alleles[1:], (genotype[0], genotype[1])
+
+
+def write_vcf(
+    path: str,
+    records: typing.Sequence[typing.Tuple[str, np.ndarray]],
+    genome: Genome,
+    edits: typing.Sequence[typing.Sequence[HaplotypeEdits]],
+    opts: WgsimOptions,
+    sample: str = "haplotypes",
+    reference: typing.Optional[str] = None,
+) -> typing.Dict[str, int]:
+    """Write the truth VCF of `genome`; returns the number of records of each kind."""
+    counts = {"snp": 0, "mnp": 0, "indel": 0, "het": 0, "hom": 0}
+    with BgzfWriter(path) as out:
+        lines = [
+            "##fileformat=VCFv4.2",
+            f"##source=readsim haplotypes {__version__}",
+            *([f"##reference={reference}"] if reference else []),
+            "##readsim_mutation=" + ",".join(f"{name}={value}" for name, value in mutation_options(opts).items()),
+            *(f"##contig=<ID={name},length={len(seq)}>" for name, seq in records),
+            '##FORMAT=<ID=GT,Number=1,Type=String,Description="Phased genotype, haplotype 1|haplotype 2">',
+            "\t".join(["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT", sample]),
+        ]
+        out.write(("\n".join(lines) + "\n").encode())
+        for (name, seq), contig_edits, (start0, start1), (length0, length1) in zip(
+            records, edits, genome.starts.tolist(), genome.lengths.tolist()
+        ):
+            haplotypes = (genome.seq[start0 : start0 + length0], genome.seq[start1 : start1 + length1])
+            batch = []
+            for pos, ref, alts, (g0, g1) in contig_variants(seq, haplotypes, contig_edits):
+                kind = "indel" if any(len(a) != len(ref) for a in alts) else "snp" if len(ref) == 1 else "mnp"
+                counts[kind] += 1
+                counts["hom" if g0 == g1 else "het"] += 1
+                alt = b",".join(alts).decode()
+                batch.append(f"{name}\t{pos + 1}\t.\t{ref.decode()}\t{alt}\t.\tPASS\t.\tGT\t{g0}|{g1}\n")
+                if len(batch) >= 10_000:
+                    out.write("".join(batch).encode())
+                    batch = []
+            out.write("".join(batch).encode())
+    return counts
+
+
+def build(
+    fasta: str,
+    prefix: str,
+    opts: WgsimOptions,
+    sample: str = "haplotypes",
+) -> typing.Dict[str, int]:
+    """Build the haplotypes of `opts.genome_seed()` from `fasta` into `<prefix>.rhap` and `<prefix>.vcf.gz`."""
+    records = load_reference(fasta, opts)
+    edits: typing.List[typing.List[HaplotypeEdits]] = []
+    genome = build_genome(records, opts, edits)
+    save_haplotypes(f"{prefix}.rhap", genome, opts)
+    return write_vcf(f"{prefix}.vcf.gz", records, genome, edits, opts, sample, os.path.basename(fasta))
@@ -0,0 +1,217 @@
+"""
+In-silico PCR: extract the amplicons of a primer pair from a reference.
+
+This is a drop-in replacement for `crabs db_import` + `crabs insilico_pcr`.
+CRABS hands the primers to cutadapt as a linked adapter with `--no-indels`, so
+a primer site is a window within a Hamming distance of the primer. Here every
+base is a 4-bit mask (A=1, C=2, G=4, T=8), so degenerate IUPAC primer bases
+are the union of their bases and a position matches when the masks share a
+bit. Mismatch counts for all windows of a contig are accumulated with one
+vectorized pass per primer position, reading the reference directly (or from
+its memory map when it was prepared with `readsim prepare-reference`).
+
+As with cutadapt, an error tolerance below 1 is a rate relative to the primer
+length and a tolerance of 1 or more is a number of mismatches. Ambiguous
+reference bases such as N never match.
+"""
+
+import multiprocessing
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .fasta import iter_fasta
+from .reference import IndexedFasta, is_prepared
+
+IUPAC = {
+    "A": "A",
+    "C": "C",
+    "G": "G",
+    "T": "T",
+    "U": "T",
+    "R": "AG",
+    "Y": "CT",
+    "S": "CG",
+    "W": "AT",
+    "K": "GT",
+    "M": "AC",
+    "B": "CGT",
+    "D": "AGT",
+    "H": "ACT",
+    "V": "ACG",
+    "N": "ACGT",
+}
+_BITS = {"A": 1, "C": 2, "G": 4, "T": 8}
+
+# Reference bytes to masks: only unambiguous bases can match a primer
+_REF_MASK = np.zeros(256, dtype=np.uint8)
+for _base, _bit in _BITS.items():
+    _REF_MASK[ord(_base)] = _bit
+    _REF_MASK[ord(_base.lower())] = _bit
+
+_COMPLEMENT = bytes.maketrans(b"ACGTURYSWKMBDHVNacgturyswkmbdhvn", b"TGCAAYRSWMKVHDBNtgcaayrswmkvhdbn")
+
+# Contigs are scanned in windows of this many positions to bound memory use
+CHUNK_SIZE = 1 << 24
+
+
+@dataclass
+class Primer:
+    sequence: str
+    masks: np.ndarray
+    max_mismatches: int
+
+    def __len__(self) -> int:
+        return len(self.sequence)
+
+
+def reverse_complement(seq: bytes) -> bytes:
+    return seq.translate(_COMPLEMENT)[::-1]
+
+
+def primer_masks(sequence: str) -> np.ndarray:
+    try:
+        return np.array([sum(_BITS[b] for b in IUPAC[c]) for c in sequence.upper()], dtype=np.uint8)
+    except KeyError as e:
+        raise ValueError(f"Primer {sequence} contains the non-IUPAC symbol {e.args[0]!r}") from None
+
+
+def max_mismatches(error: float, length: int) -> int:
+    """Mismatches allowed in a primer site, following cutadapt's `-e` convention."""
+    if error >= 1:
+        return int(error)
+    return int(error * length)
+
+
+def make_primer(sequence: str, error: float) -> Primer:
+    return Primer(sequence.upper(), primer_masks(sequence), max_mismatches(error, len(sequence)))
+
+
+def reverse_complement_primer(primer: Primer) -> Primer:
+    bits = primer.masks[::-1]
+    # complementing a mask reverses its bit order (A<->T, C<->G)
+    masks = ((bits & 1) << 3) | ((bits & 2) << 1) | ((bits & 4) >> 1) | ((bits & 8) >> 3)
+    return Primer(reverse_complement(primer.sequence.encode()).decode(), masks, primer.max_mismatches)
+
+
+def find_sites(masks: np.ndarray, primer: Primer) -> np.ndarray:
+    """Start positions of every window of `masks` matching `primer` within its tolerance."""
+    m = len(primer)
+    hits = []
+    for start in range(0, max(len(masks) - m + 1, 0), CHUNK_SIZE):
+        width = min(CHUNK_SIZE, len(masks) - m + 1 - start)
+        mismatches = np.zeros(width, dtype=np.uint8)
+        for j, bits in enumerate(primer.masks):
+            mismatches += (masks[start + j : start + j + width] & bits) == 0
+        hits.append(np.flatnonzero(mismatches <= primer.max_mismatches) + start)
+    return np.concatenate(hits) if hits else np.empty(0, dtype=np.int64)
+
+
+def pair_sites(
+    fw_sites: np.ndarray,
+    rv_sites: np.ndarray,
+    fw_len: int,
+    max_length: int = 0,
+) -> typing.List[typing.Tuple[int, int]]:
+    """Pair forward sites with the next downstream reverse site into `(start, end)` amplicons.
+
+    `start` is the first base after the forward primer and `end` the first
+    base of the reverse primer site. Several forward sites upstream of the
+    same reverse site yield only the shortest product.
+    """
+    if not len(fw_sites) or not len(rv_sites):
+        return []
+    starts = fw_sites + fw_len
+    idx = np.searchsorted(rv_sites, starts)
+    ok = idx < len(rv_sites)
+    starts, ends = starts[ok], rv_sites[idx[ok]]
+    if max_length:
+        keep = ends - starts <= max_length
+        starts, ends = starts[keep], ends[keep]
+    products: typing.Dict[int, int] = {}
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        products[end] = max(start, products.get(end, start))
+    return sorted((start, end) for end, start in products.items())
+
+
+def amplify(
+    name: str,
+    seq: typing.Union[bytes, np.ndarray],
+    fw: Primer,
+    rv: Primer,
+    max_length: int = 0,
+) -> typing.List[typing.Tuple[str, bytes]]:
+    """All amplicons of one contig, on both strands, with the primers trimmed off."""
+    raw = np.frombuffer(seq, dtype=np.uint8) if isinstance(seq, bytes) else seq
+    masks = _REF_MASK[raw]
+    fw_rc, rv_rc = reverse_complement_primer(fw), reverse_complement_primer(rv)
+
+    amplicons = []
+    for start, end in pair_sites(find_sites(masks, fw), find_sites(masks, rv_rc), len(fw), max_length):
+        amplicons.append((f"{name}_{start + 1}_{end}_+", raw[start:end].tobytes().upper()))
+    # on the reverse strand the reverse primer comes first along the reference
+    for start, end in pair_sites(find_sites(masks, rv), find_sites(masks, fw_rc), len(rv), max_length):
+        amplicons.append((f"{name}_{start + 1}_{end}_-", reverse_complement(raw[start:end].tobytes()).upper()))
+    return amplicons
+
+
+_worker_fasta: typing.Optional[IndexedFasta] = None
+
+
+def _init_worker(path: typing.Optional[str]) -> None:
+    global _worker_fasta
+    _worker_fasta = IndexedFasta(path) if path else None
+
+
+def _amplify_task(
+    task: typing.Tuple[str, typing.Optional[bytes], Primer, Primer, int]
+) -> typing.List[typing.Tuple[str, bytes]]:
+    name, seq, fw, rv, max_length = task
+    if seq is None:
+        assert _worker_fasta is not None
+        return amplify(name, _worker_fasta.fetch(name), fw, rv, max_length)
+    return amplify(name, seq, fw, rv, max_length)
+
+
+def run(
+    fasta: typing.Union[str, Path],
+    output: typing.Union[str, Path],
+    fwd: str,
+    rev: str,
+    error: float = 4.5,
+    max_length: int = 0,
+    threads: int = 1,
+) -> int:
+    """Write every amplicon of `fasta` to `output`; returns the amplicon count."""
+    fw, rv = make_primer(fwd, error), make_primer(rev, error)
+    prepared = is_prepared(fasta)
+    if prepared:
+        with IndexedFasta(fasta) as fa:
+            names = fa.names()
+        # workers fetch contigs from their own memory map, so only names are sent
+        tasks: typing.Iterable = ((name, None, fw, rv, max_length) for name in names)
+    else:
+        tasks = ((name, seq, fw, rv, max_length) for name, seq in iter_fasta(fasta))
+
+    count = 0
+    init_args = (str(fasta) if prepared else None,)
+    with open(output, "wb") as out:
+        if threads > 1:
+            ctx = multiprocessing.get_context("fork")
+            with ctx.Pool(threads, initializer=_init_worker, initargs=init_args) as pool:
+                results = pool.imap(_amplify_task, tasks)
+                for amplicons in results:
+                    count += _write(out, amplicons)
+        else:
+            _init_worker(*init_args)
+            for task in tasks:
+                count += _write(out, _amplify_task(task))
+    return count
+
+
+def _write(out: typing.BinaryIO, amplicons: typing.List[typing.Tuple[str, bytes]]) -> int:
+    for name, seq in amplicons:
+        out.write(b">" + name.encode() + b"\n" + seq + b"\n")
+    return len(amplicons)
@@ -0,0 +1,555 @@
+"""
+Streaming, abundance-weighted metagenome simulator.
+
+The read budget is split over the genomes up front, following the InSilicoSeq
+conventions: relative abundances come from a distribution (`uniform`,
+`halfnormal`, `exponential`, `lognormal`, `zero_inflated_lognormal`) or an
+abundance file, or reads follow per-genome coverages from a distribution or a
+coverage file. Each genome's reads are then simulated in batches on worker
+processes, which read only that genome (from the memory map of a prepared
+reference, or from one record of a streamed FASTA), so the merged reference is
+never held in memory. Batches are written in a fixed order, so output depends
+on the seed and batch size but not on the number of workers.
+
+Reads carry position-dependent substitution errors whose rate grows along the
+read, with matching base qualities. With `gc_bias`, pairs whose combined GC
+content falls outside 20-70% are rejected and redrawn as a whole array, as
+InSilicoSeq does one pair at a time.
+
+With a model compiled by `readsim compile-model` (for example from the
+InSilicoSeq KDE model of the same name), every base gets a quality drawn from
+the model's per-position distributions instead, and is substituted with the
+error probability of that quality. Workers map the model file, so it is
+compiled once rather than in every task.
+"""
+
+import collections
+import concurrent.futures
+import contextlib
+import dataclasses
+import multiprocessing
+import sys
+import time
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .batch import Sample, SampleTiming, batch_report
+from .bgzf import BgzfWriter, compress_blocks
+from .fasta import ALPHABET, COMPLEMENT, N_CODE, encode, iter_fasta
+from .qcstats import ReadStats, read_set_name, save_stats
+from .qualmodel import QualityModel
+from .reference import IndexedFasta, is_prepared, read_fai
+
+DISTRIBUTIONS = ("uniform", "halfnormal", "exponential", "lognormal", "zero_inflated_lognormal")
+GC_BIAS_RANGE = (20.0, 70.0)
+# Redraw rounds before giving up on pairs of a genome whose GC content is mostly out of range
+GC_BIAS_MAX_ROUNDS = 100
+DEFAULT_BATCH_SIZE = 50_000
+
+
+@dataclass
+class ReadModel:
+    read_length: int
+    insert_mean: float
+    insert_sd: float
+    # substitution rate at the first and at the last base of a read
+    error_start: float
+    error_end: float
+
+
+# Read lengths follow the InSilicoSeq models of the same name
+MODELS = {
+    "basic": ReadModel(125, 200, 20, 1e-4, 1e-4),
+    "HiSeq": ReadModel(125, 350, 50, 1e-3, 1e-2),
+    "NextSeq": ReadModel(300, 550, 80, 2e-3, 2e-2),
+    "NovaSeq": ReadModel(150, 350, 50, 1e-3, 5e-3),
+    "MiSeq": ReadModel(300, 550, 80, 1e-3, 2e-2),
+}
+
+
+def read_model(mode: str, model: str = "MiSeq") -> ReadModel:
+    """The read model for InSilicoSeq's `--mode` and `--model` options."""
+    if mode == "basic":
+        return MODELS["basic"]
+    if model not in MODELS:
+        raise ValueError(f"Unknown model {model!r}, expected one of {', '.join(MODELS)}")
+    if mode == "perfect":
+        return ReadModel(MODELS[model].read_length, MODELS[model].insert_mean, MODELS[model].insert_sd, 0.0, 0.0)
+    if mode == "kde":
+        return MODELS[model]
+    raise ValueError(f"Unknown mode {mode!r}, expected kde, basic or perfect")
+
+
+@dataclass
+class Contig:
+    name: str
+    length: int
+    genome: str
+
+
+def abundance_distribution(name: str, n: int, rng: np.random.Generator) -> np.ndarray:
+    """Relative abundances of `n` genomes drawn from the named distribution."""
+    if name == "uniform":
+        values = np.ones(n)
+    elif name == "halfnormal":
+        values = np.abs(rng.normal(0, 1, n))
+    elif name == "exponential":
+        values = rng.exponential(1, n)
+    elif name == "lognormal":
+        values = rng.lognormal(0, 1, n)
+    elif name == "zero_inflated_lognormal":
+        values = rng.lognormal(0, 1, n) * (rng.random(n) >= 0.2)
+        if not values.any():
+            values = rng.lognormal(0, 1, n)
+    else:
+        raise ValueError(f"Unknown distribution {name!r}, expected one of {', '.join(DISTRIBUTIONS)}")
+    return values / values.sum()
+
+
+def read_table(path: typing.Union[str, Path]) -> typing.Dict[str, float]:
+    """Read a two-column `name<TAB>value` abundance or coverage file."""
+    values = {}
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) >= 2 and not line.startswith("#"):
+                values[fields[0]] = float(fields[1])
+    return values
+
+
+def apportion(total: int, weights: np.ndarray) -> np.ndarray:
+    """Split `total` into integers proportional to `weights` (largest remainder)."""
+    weights = np.asarray(weights, dtype=np.float64)
+    if total <= 0 or weights.sum() <= 0:
+        return np.zeros(len(weights), dtype=np.int64)
+    exact = total * weights / weights.sum()
+    counts = np.floor(exact).astype(np.int64)
+    remainder = total - int(counts.sum())
+    if remainder:
+        counts[np.argsort(-(exact - counts), kind="stable")[:remainder]] += 1
+    return counts
+
+
+def genome_pairs(
+    genomes: typing.List[str],
+    genome_lengths: np.ndarray,
+    n_reads: int,
+    model: ReadModel,
+    rng: np.random.Generator,
+    abundance: str = "lognormal",
+    abundance_file: typing.Optional[str] = None,
+    coverage: typing.Optional[str] = None,
+    coverage_file: typing.Optional[str] = None,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Read pairs per genome and the relative abundance reported for each genome."""
+    n_pairs = n_reads // 2
+    if coverage_file:
+        table = read_table(coverage_file)
+        cov = np.array([table.get(g, 0.0) for g in genomes])
+        pairs = np.rint(cov * genome_lengths / (2 * model.read_length)).astype(np.int64)
+    elif coverage:
+        cov = abundance_distribution(coverage, len(genomes), rng)
+        pairs = apportion(n_pairs, cov * genome_lengths)
+    else:
+        if abundance_file:
+            table = read_table(abundance_file)
+            weights = np.array([table.get(g, 0.0) for g in genomes])
+        else:
+            weights = abundance_distribution(abundance, len(genomes), rng)
+        pairs = apportion(n_pairs, weights)
+    total = pairs.sum()
+    return pairs, (pairs / total if total else pairs.astype(np.float64))
+
+
+def error_profile(model: ReadModel) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Per-position substitution rates and the matching Phred qualities."""
+    x = np.linspace(0, 1, model.read_length) ** 2
+    rates = model.error_start + (model.error_end - model.error_start) * x
+    # error-free reads get the highest quality InSilicoSeq writes
+    quality = np.minimum(np.rint(-10 * np.log10(np.maximum(rates, 1e-5))), 40).astype(np.uint8)
+    return rates, quality
+
+
+def simulate_pairs(
+    seq: np.ndarray,
+    n: int,
+    model: ReadModel,
+    rng: np.random.Generator,
+    gc_bias: bool = False,
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Draw `n` pairs from one contig; returns reads 1 and 2, fragment starts and strands."""
+    length = model.read_length
+    starts = np.empty(n, dtype=np.int64)
+    frags = np.empty(n, dtype=np.int64)
+    todo = np.arange(n)
+    for _ in range(GC_BIAS_MAX_ROUNDS if gc_bias else 1):
+        frag = np.rint(rng.normal(model.insert_mean, model.insert_sd, todo.size)).astype(np.int64)
+        frag = np.clip(frag, length, len(seq))
+        start = (rng.random(todo.size) * (len(seq) - frag + 1)).astype(np.int64)
+        starts[todo], frags[todo] = start, frag
+        if not gc_bias:
+            break
+        # InSilicoSeq judges the GC content of both reads stitched together
+        idx = np.arange(length)
+        left = seq[start[:, None] + idx]
+        right = seq[(start + frag - length)[:, None] + idx]
+        gc = ((left == 1) | (left == 2)).sum(axis=1) + ((right == 1) | (right == 2)).sum(axis=1)
+        pct = 100.0 * gc / (2 * length)
+        rejected = (pct <= GC_BIAS_RANGE[0]) | (pct >= GC_BIAS_RANGE[1])
+        todo = todo[rejected]
+        if not todo.size:
+            break
+    if gc_bias and todo.size:
+        keep = np.setdiff1d(np.arange(n), todo)
+        starts, frags = starts[keep], frags[keep]
+
+    idx = np.arange(length)
+    r1 = seq[starts[:, None] + idx]
+    r2 = COMPLEMENT[seq[(starts + frags - length)[:, None] + idx]][:, ::-1]
+    reverse = rng.random(len(starts)) < 0.5
+    r1[reverse], r2[reverse] = r2[reverse], r1[reverse].copy()
+    return r1, r2, starts, reverse
+
+
+def add_errors(reads: np.ndarray, rates: np.ndarray, rng: np.random.Generator) -> None:
+    err = (rng.random(reads.shape) < rates) & (reads != N_CODE)
+    reads[err] = (reads[err] + rng.integers(1, 4, int(err.sum()), dtype=np.uint8)) % 4
+
+
+def format_fastq(
+    names: typing.List[bytes],
+    reads: np.ndarray,
+    quality: typing.Union[bytes, np.ndarray],
+    suffix: bytes,
+) -> bytes:
+    """FASTQ records of `reads`, with one Phred+33 quality string for all or an `(n, length)` array of Phred scores."""
+    length = reads.shape[1] if reads.ndim == 2 else 0
+    seqs = ALPHABET[reads].tobytes()
+    quals, step = (quality, 0) if isinstance(quality, bytes) else ((quality + 33).astype(np.uint8).tobytes(), length)
+    return b"".join(
+        b"@%s%s\n%s\n+\n%s\n" % (name, suffix, seqs[i * length : (i + 1) * length], quals[i * step : i * step + length])
+        for i, name in enumerate(names)
+    )
+
+
+# Worker state: the options, the prepared reference if any, and the last contig used
+_STATE: typing.Dict[str, typing.Any] = {}
+
+
+def _init_worker(
+    fasta: typing.Optional[str],
+    model: ReadModel,
+    gc_bias: bool,
+    level: int,
+    compiled_model: typing.Optional[str] = None,
+) -> None:
+    _STATE.clear()
+    _STATE.update(
+        fasta=IndexedFasta(fasta) if fasta else None,
+        model=model,
+        quality_model=QualityModel.load(compiled_model) if compiled_model else None,
+        gc_bias=gc_bias,
+        level=level,
+        contig=None,
+    )
+
+
+def _contig_codes(name: str, seq: typing.Optional[bytes]) -> np.ndarray:
+    cached = _STATE["contig"]
+    if cached is not None and cached[0] == name:
+        return cached[1]
+    codes = encode(seq) if seq is not None else encode(_STATE["fasta"].fetch(name))
+    _STATE["contig"] = (name, codes)
+    return codes
+
+
+# (sample, seed, batch index, pairs, first read id)
+_Batch = typing.Tuple[int, int, int, int, int]
+_Task = typing.Tuple[int, str, typing.Optional[bytes], typing.List[_Batch]]
+_Blocks = typing.List[typing.Tuple[bytes, int]]
+_Result = typing.List[typing.Tuple[int, _Blocks, _Blocks, ReadStats, ReadStats]]
+
+
+def _run_task(task: _Task) -> _Result:
+    """Simulate the batches of one contig; returns the sample, BGZF blocks and stats per batch."""
+    contig_index, name, seq, batches = task
+    model: ReadModel = _STATE["model"]
+    codes = _contig_codes(name, seq)
+    rates, quality = error_profile(model)
+    qual = (quality + 33).tobytes()
+    results = []
+    for sample, seed, batch_index, n, first_id in batches:
+        rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(2, contig_index, batch_index)))
+        r1, r2, starts, reverse = simulate_pairs(codes, n, model, rng, _STATE["gc_bias"])
+        quality_model: typing.Optional[QualityModel] = _STATE["quality_model"]
+        if quality_model is not None:
+            q1, q2 = quality_model.sample_qualities(r1, 0, rng), quality_model.sample_qualities(r2, 1, rng)
+            quality_model.add_errors(r1, q1, 0, rng)
+            quality_model.add_errors(r2, q2, 1, rng)
+        else:
+            add_errors(r1, rates, rng)
+            add_errors(r2, rates, rng)
+            q1 = q2 = np.broadcast_to(quality, r1.shape)
+        names = [
+            b"%s_%d_%d_%s" % (name.encode(), first_id + i, s + 1, b"-" if rev else b"+")
+            for i, (s, rev) in enumerate(zip(starts.tolist(), reverse.tolist()))
+        ]
+        s1, s2 = ReadStats(), ReadStats()
+        s1.add(r1, q1)
+        s2.add(r2, q2)
+        results.append(
+            (
+                sample,
+                compress_blocks(format_fastq(names, r1, qual if quality_model is None else q1, b"/1"), _STATE["level"]),
+                compress_blocks(format_fastq(names, r2, qual if quality_model is None else q2, b"/2"), _STATE["level"]),
+                s1,
+                s2,
+            )
+        )
+    return results
+
+
+def load_contigs(fasta: typing.Union[str, Path], draft: bool) -> typing.List[Contig]:
+    """Contig names and lengths; in draft mode all contigs form one genome named after the file."""
+    genome = read_set_name(fasta).rsplit(".", 1)[0] if draft else None
+    if is_prepared(fasta):
+        from .reference import find_fai
+
+        fai = find_fai(fasta)
+        assert fai is not None
+        records = [(r.name, r.length) for r in read_fai(fai)]
+    else:
+        records = [(name, len(seq)) for name, seq in iter_fasta(fasta)]
+    return [Contig(name, length, genome or name) for name, length in records]
+
+
+@dataclass
+class _Job:
+    prefix: str
+    seed: int
+    n_reads: int
+    stats_path: typing.Optional[str]
+    # seed of the abundance profile, if not `seed`
+    sample_seed: typing.Optional[int] = None
+
+
+@dataclass
+class Abundance:
+    abundance: str = "lognormal"
+    abundance_file: typing.Optional[str] = None
+    coverage: typing.Optional[str] = None
+    coverage_file: typing.Optional[str] = None
+
+
+def run(
+    fasta: str,
+    prefix: str,
+    n_reads: int,
+    model: ReadModel,
+    seed: int = 0,
+    abundance: str = "lognormal",
+    abundance_file: typing.Optional[str] = None,
+    coverage: typing.Optional[str] = None,
+    coverage_file: typing.Optional[str] = None,
+    draft: bool = False,
+    gc_bias: bool = False,
+    threads: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    compresslevel: int = 6,
+    stats_path: typing.Optional[str] = None,
+    compiled_model: typing.Optional[str] = None,
+    sample_seed: typing.Optional[int] = None,
+) -> typing.Dict[str, int]:
+    """Simulate a metagenome into `<prefix>_R1.fastq.gz`, `<prefix>_R2.fastq.gz` and `<prefix>_abundance.txt`.
+
+    The abundance profile is drawn from `sample_seed` if it is set and from
+    `seed` otherwise, so the shards of a sample share the profile of the
+    sample. Returns the number of pairs simulated per genome.
+    """
+    profile = Abundance(abundance, abundance_file, coverage, coverage_file)
+    pairs, _ = _simulate(
+        fasta,
+        [_Job(prefix, seed, n_reads, stats_path, sample_seed)],
+        model,
+        profile,
+        draft,
+        gc_bias,
+        threads,
+        batch_size,
+        compresslevel,
+        compiled_model,
+    )
+    return pairs[0]
+
+
+def run_samples(
+    fasta: str,
+    samples: typing.Sequence[Sample],
+    n_reads: int,
+    model: ReadModel,
+    profile: Abundance,
+    draft: bool = False,
+    gc_bias: bool = False,
+    threads: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    compresslevel: int = 6,
+    stats: bool = True,
+    compiled_model: typing.Optional[str] = None,
+) -> typing.Dict[str, typing.Any]:
+    """Simulate several samples in one pass over `fasta`; returns the batch report.
+
+    Every contig is read once and simulated for all samples. Sample `s` is
+    written to `<s.id>_R1.fastq.gz`, `<s.id>_R2.fastq.gz`, `<s.id>_abundance.txt`
+    (and `<s.id>.stats.json`), identical to `run` with `s.seed` and `s.count` reads.
+    """
+    jobs = [_Job(s.id, s.seed, s.count or n_reads, f"{s.id}.stats.json" if stats else None) for s in samples]
+    pairs, (load_seconds, simulate_seconds) = _simulate(
+        fasta, jobs, model, profile, draft, gc_bias, threads, batch_size, compresslevel, compiled_model
+    )
+    # batches of all samples are interleaved, so simulation time is shared out by reads
+    reads = [2 * sum(p.values()) for p in pairs]
+    total = max(sum(reads), 1)
+    timings = [SampleTiming(s.id, r, simulate_seconds * r / total) for s, r in zip(samples, reads)]
+    return batch_report("metagenome", load_seconds, timings)
+
+
+def _simulate(
+    fasta: str,
+    jobs: typing.Sequence[_Job],
+    model: ReadModel,
+    profile: Abundance,
+    draft: bool,
+    gc_bias: bool,
+    threads: int,
+    batch_size: int,
+    compresslevel: int,
+    compiled_model: typing.Optional[str] = None,
+) -> typing.Tuple[typing.List[typing.Dict[str, int]], typing.Tuple[float, float]]:
+    """Simulate every job; returns pairs per genome per job, and the seconds spent reading and simulating."""
+    started = time.perf_counter()
+    if compiled_model:
+        # reads are as long as the model's positions
+        model = dataclasses.replace(model, read_length=QualityModel.load(compiled_model).read_length)
+    contigs = [c for c in load_contigs(fasta, draft) if c.length >= model.read_length]
+    if not contigs:
+        raise ValueError(f"No sequence in {fasta} is at least as long as a read ({model.read_length} bp)")
+    genomes = list(dict.fromkeys(c.genome for c in contigs))
+    genome_lengths = np.array([sum(c.length for c in contigs if c.genome == g) for g in genomes], dtype=np.int64)
+    load_seconds = time.perf_counter() - started
+
+    # batches per contig, for all jobs in job order
+    contig_batches: typing.List[typing.List[_Batch]] = [[] for _ in contigs]
+    job_pairs = []
+    for job_index, job in enumerate(jobs):
+        profile_seed = job.seed if job.sample_seed is None else job.sample_seed
+        rng = np.random.default_rng(np.random.SeedSequence(profile_seed, spawn_key=(0,)))
+        pairs, abundances = genome_pairs(
+            genomes,
+            genome_lengths,
+            job.n_reads,
+            model,
+            rng,
+            profile.abundance,
+            profile.abundance_file,
+            profile.coverage,
+            profile.coverage_file,
+        )
+        job_pairs.append(pairs)
+        with open(f"{job.prefix}_abundance.txt", "w") as f:
+            for genome, value in zip(genomes, abundances):
+                f.write(f"{genome}\t{value}\n")
+
+        # split every genome's pairs over its contigs by length, then into batches
+        contig_pairs: typing.Dict[str, int] = {}
+        for genome, n in zip(genomes, pairs.tolist()):
+            members = [c for c in contigs if c.genome == genome]
+            for contig, m in zip(members, apportion(n, np.array([c.length for c in members])).tolist()):
+                contig_pairs[contig.name] = m
+        first_id = 0
+        for index, contig in enumerate(contigs):
+            n = contig_pairs[contig.name]
+            for batch_index, start in enumerate(range(0, n, batch_size)):
+                size = min(batch_size, n - start)
+                contig_batches[index].append((job_index, job.seed, batch_index, size, first_id))
+                first_id += size
+
+    prepared = is_prepared(fasta)
+    reading = [0.0]
+
+    def tasks() -> typing.Iterator[_Task]:
+        if prepared:
+            # workers read contigs from their own memory map; one task per batch
+            for index, contig in enumerate(contigs):
+                for batch in contig_batches[index]:
+                    yield index, contig.name, None, [batch]
+        else:
+            wanted = {contig.name: index for index, contig in enumerate(contigs) if contig_batches[index]}
+            records = iter_fasta(fasta)
+            while wanted:
+                began = time.perf_counter()
+                record = next(records, None)
+                reading[0] += time.perf_counter() - began
+                if record is None:
+                    break
+                name, seq = record
+                if name in wanted:
+                    index = wanted.pop(name)
+                    yield index, name, seq, contig_batches[index]
+
+    started = time.perf_counter()
+    init_args = (fasta if prepared else None, model, gc_bias, compresslevel, compiled_model)
+    stats = [(ReadStats(), ReadStats()) for _ in jobs]
+    outputs = [(f"{job.prefix}_R1.fastq.gz", f"{job.prefix}_R2.fastq.gz") for job in jobs]
+    with contextlib.ExitStack() as stack:
+        writers = [(stack.enter_context(BgzfWriter(r1)), stack.enter_context(BgzfWriter(r2))) for r1, r2 in outputs]
+        for result in _map_ordered(_run_task, tasks(), threads, _init_worker, init_args):
+            for job_index, blocks1, blocks2, s1, s2 in result:
+                writers[job_index][0].write_blocks(blocks1)
+                writers[job_index][1].write_blocks(blocks2)
+                stats[job_index][0].merge(s1)
+                stats[job_index][1].merge(s2)
+    load_seconds += reading[0]
+    simulate_seconds = time.perf_counter() - started - reading[0]
+
+    for job, pairs, (out_r1, out_r2), (s1, s2) in zip(jobs, job_pairs, outputs, stats):
+        if s1.reads < int(pairs.sum()):
+            print(
+                f"Warning: {int(pairs.sum()) - s1.reads} pairs of {job.prefix} were not simulated because their "
+                f"GC content stayed outside {GC_BIAS_RANGE[0]:g}-{GC_BIAS_RANGE[1]:g}%",
+                file=sys.stderr,
+            )
+        if job.stats_path is not None:
+            save_stats(job.stats_path, {read_set_name(out_r1): s1, read_set_name(out_r2): s2})
+    return [dict(zip(genomes, pairs.tolist())) for pairs in job_pairs], (load_seconds, simulate_seconds)
+
+
+def _map_ordered(
+    func: typing.Callable[[_Task], _Result],
+    tasks: typing.Iterator[_Task],
+    threads: int,
+    initializer: typing.Callable[..., None],
+    initargs: typing.Tuple[typing.Any, ...],
+) -> typing.Iterator[_Result]:
+    """Like `Pool.imap`, but only `2 * threads` tasks are in flight.
+
+    `Pool.imap` drains its input eagerly, which would read every contig of a
+    streamed reference into memory at once.
+    """
+    if threads <= 1:
+        initializer(*initargs)
+        yield from map(func, tasks)
+        return
+    ctx = multiprocessing.get_context("fork")
+    with concurrent.futures.ProcessPoolExecutor(
+        threads, mp_context=ctx, initializer=initializer, initargs=initargs
+    ) as pool:
+        pending: typing.Deque[concurrent.futures.Future] = collections.deque()
+        for task in tasks:
+            pending.append(pool.submit(func, task))
+            if len(pending) >= 2 * threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
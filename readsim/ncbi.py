@@ -0,0 +1,383 @@
+"""
+Parallel NCBI genome download straight into one merged BGZF reference.
+
+This is the readsim engine for `--ncbidownload_accessions`/`--ncbidownload_taxids`,
+replacing ncbi-genome-download followed by MERGE_FASTAS. The assembly summary
+of each requested group is fetched once and the assemblies are resolved from
+it, by assembly accession or by taxid. Their
+`*_genomic.fna.gz` files are then fetched by a bounded pool of worker threads,
+each keeping one persistent HTTP connection per host:
+
+- a transfer is written to `<name>.part` and, when the connection drops,
+  continues from the bytes already on disk with a `Range` request; with a
+  `partial_dir` that outlives the task, finished and partial files also carry
+  over to the next task attempt,
+- the result is checked against the MD5 listed in the assembly's
+  `md5checksums.txt`, and a mismatch discards the file and fetches it again.
+
+Finished genomes are decompressed into the merged BGZF output while later ones
+are still downloading, so the concatenation overlaps the network transfer
+instead of following it. They are merged in file name order, the order in
+which MERGE_FASTAS concatenated the ncbi-genome-download output, so both
+engines build the same reference. `base_url` can point at any server
+with the NCBI FTP layout, such as a local mirror.
+"""
+
+import concurrent.futures
+import gzip
+import hashlib
+import http.client
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import typing
+import urllib.parse
+from dataclasses import dataclass
+from pathlib import Path
+
+from .bgzf import BgzfWriter
+
+NCBI_URL = "https://ftp.ncbi.nlm.nih.gov"
+GROUPS = (
+    "archaea",
+    "bacteria",
+    "fungi",
+    "invertebrate",
+    "metagenomes",
+    "plant",
+    "protozoa",
+    "vertebrate_mammalian",
+    "vertebrate_other",
+    "viral",
+)
+CONNECTIONS = 8
+MAX_ATTEMPTS = 5
+MAX_REDIRECTS = 5
+TIMEOUT = 60
+CHUNK_SIZE = 1024 * 1024
+
+class DownloadError(Exception):
+    """A transfer that should be retried: a dropped connection, a server error or a checksum mismatch."""
+
+
+@dataclass
+class Assembly:
+    accession: str
+    taxid: str
+    species_taxid: str
+    organism: str
+    ftp_path: str
+
+    @property
+    def name(self) -> str:
+        return self.ftp_path.rstrip("/").rsplit("/", 1)[-1]
+
+    @property
+    def fasta(self) -> str:
+        return f"{self.name}_genomic.fna.gz"
+
+
+def summary_urls(base_url: str, section: str = "refseq", groups: str = "all") -> typing.List[str]:
+    """The assembly summaries covering `groups`, a comma-separated list as taken by ncbi-genome-download."""
+    names = [g.strip() for g in groups.split(",") if g.strip()] or ["all"]
+    unknown = [g for g in names if g != "all" and g not in GROUPS]
+    if unknown:
+        raise ValueError(f"Unknown NCBI group(s): {', '.join(unknown)}")
+    base = f"{base_url.rstrip('/')}/genomes/{section}"
+    if "all" in names:
+        return [f"{base}/assembly_summary_{section}.txt"]
+    return [f"{base}/{g}/assembly_summary.txt" for g in dict.fromkeys(names)]
+
+
+def parse_summary(
+    lines: typing.Iterable[str],
+    accessions: typing.Optional[typing.Collection[str]] = None,
+    taxids: typing.Optional[typing.Collection[str]] = None,
+) -> typing.List[Assembly]:
+    """Assemblies in an assembly summary matching `accessions` or `taxids` (all of them if both are None)."""
+    columns: typing.Optional[typing.List[str]] = None
+    found = []
+    for line in lines:
+        if line.startswith("#"):
+            header = line.lstrip("#").strip().split("\t")
+            if "assembly_accession" in header:
+                columns = header
+            continue
+        if columns is None or not line.strip():
+            continue
+        row = dict(zip(columns, line.rstrip("\n").split("\t")))
+        if row.get("ftp_path", "na") == "na":
+            continue
+        if accessions is not None and row["assembly_accession"] not in accessions:
+            continue
+        if taxids is not None and row["taxid"] not in taxids:
+            continue
+        found.append(
+            Assembly(
+                accession=row["assembly_accession"],
+                taxid=row["taxid"],
+                species_taxid=row.get("species_taxid", ""),
+                organism=row.get("organism_name", ""),
+                ftp_path=row["ftp_path"],
+            )
+        )
+    if columns is None:
+        raise ValueError("Assembly summary has no header line")
+    return found
+
+
+def parse_md5(text: str) -> typing.Dict[str, str]:
+    """File name to MD5 from an `md5checksums.txt`."""
+    sums = {}
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) == 2:
+            sums[parts[1].rsplit("/", 1)[-1]] = parts[0].lower()
+    return sums
+
+
+def read_ids(value: typing.Optional[str]) -> typing.Optional[typing.List[str]]:
+    """Ids from a file with one per line, or from a comma-separated list."""
+    if value is None:
+        return None
+    if os.path.isfile(value):
+        with open(value) as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def _md5(path: Path) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Fetcher:
+    """HTTP GETs over one persistent connection per worker thread and host.
+
+    `ftp://` URLs, as found in older assembly summaries, and the NCBI host are
+    rewritten onto `base_url`, so the same summary can be served by a mirror.
+    """
+
+    def __init__(self, base_url: str = NCBI_URL, timeout: float = TIMEOUT, backoff: float = 1.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.backoff = backoff
+        self.requests = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def url(self, path: str) -> str:
+        """`path` (an NCBI URL or a path below the base URL) as a URL on the base URL."""
+        parts = urllib.parse.urlsplit(path)
+        if parts.netloc:
+            path = parts.path
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        pool = self._local.__dict__.setdefault("connections", {})
+        conn = pool.get((scheme, netloc))
+        if conn is None:
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = pool[(scheme, netloc)] = cls(netloc, timeout=self.timeout)
+        return conn
+
+    def _drop(self, scheme: str, netloc: str) -> None:
+        conn = self._local.__dict__.get("connections", {}).pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def _open(
+        self,
+        url: str,
+        headers: typing.Dict[str, str],
+        consume: typing.Callable[[http.client.HTTPResponse], typing.Any],
+    ) -> typing.Any:
+        """GET `url`, following redirects, and hand the response to `consume`."""
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            path = parts.path + (f"?{parts.query}" if parts.query else "")
+            conn = self._connection(parts.scheme, parts.netloc)
+            with self._lock:
+                self.requests += 1
+            try:
+                conn.request("GET", path or "/", headers=headers)
+                response = conn.getresponse()
+                if response.status in (301, 302, 303, 307, 308) and response.getheader("Location"):
+                    response.read()
+                    url = urllib.parse.urljoin(url, response.getheader("Location"))
+                    continue
+                if response.status >= 500 or response.status == 429:
+                    response.read()
+                    raise DownloadError(f"HTTP {response.status} for {url}")
+                if response.status >= 400 and response.status != 416:
+                    response.read()
+                    raise FileNotFoundError(f"HTTP {response.status} for {url}")
+                result = consume(response)
+                if response.getheader("Connection", "").lower() == "close":
+                    self._drop(parts.scheme, parts.netloc)
+                return result
+            except (OSError, http.client.HTTPException, DownloadError) as e:
+                # the connection is in an unknown state: reconnect on the next request
+                self._drop(parts.scheme, parts.netloc)
+                if isinstance(e, FileNotFoundError):
+                    raise
+                raise DownloadError(f"{url}: {e}") from e
+        raise DownloadError(f"Too many redirects for {url}")
+
+    def _retry(self, what: str, func: typing.Callable[[], typing.Any]) -> typing.Any:
+        """Call `func`, retrying `DownloadError`s with exponential backoff."""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                return func()
+            except DownloadError as e:
+                if attempt == MAX_ATTEMPTS:
+                    raise RuntimeError(f"{what} failed after {MAX_ATTEMPTS} attempts: {e}") from e
+                time.sleep(self.backoff * min(2 ** (attempt - 1), 30))
+
+    def get(self, url: str) -> bytes:
+        """The body of `url`, for small files such as checksum lists."""
+        return self._retry(url, lambda: self._open(url, {}, lambda r: r.read()))
+
+    def download(self, url: str, path: Path, md5: typing.Optional[str] = None) -> Path:
+        """Fetch `url` to `path` through `path.part`, resuming partial transfers and checking `md5`."""
+        if path.exists() and (md5 is None or _md5(path) == md5):
+            return path
+        part = path.with_name(path.name + ".part")
+
+        def attempt() -> Path:
+            offset = part.stat().st_size if part.exists() else 0
+
+            def consume(response: http.client.HTTPResponse) -> None:
+                if response.status == 416:
+                    # nothing left to fetch: the part file is complete (or wrong, which the checksum catches)
+                    response.read()
+                    return
+                mode = "ab" if response.status == 206 else "wb"
+                length = response.getheader("Content-Length")
+                received = 0
+                with open(part, mode) as f:
+                    while True:
+                        chunk = response.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        received += len(chunk)
+                # http.client returns a short body when the connection closes early; keep it and resume
+                if length is not None and received < int(length):
+                    raise DownloadError(f"connection closed after {received} of {length} bytes")
+
+            self._open(url, {"Range": f"bytes={offset}-"} if offset else {}, consume)
+            if md5 is not None and _md5(part) != md5:
+                part.unlink()
+                raise DownloadError(f"MD5 mismatch for {url}")
+            os.replace(part, path)
+            return path
+
+        return self._retry(url, attempt)
+
+
+def resolve(
+    fetcher: Fetcher,
+    workdir: Path,
+    accessions: typing.Optional[typing.Sequence[str]] = None,
+    taxids: typing.Optional[typing.Sequence[str]] = None,
+    section: str = "refseq",
+    groups: str = "all",
+) -> typing.List[Assembly]:
+    """The requested assemblies, each once and in file name order, from one pass over the assembly summaries."""
+    wanted_accessions = set(accessions) if accessions is not None else None
+    wanted_taxids = set(taxids) if taxids is not None else None
+    found: typing.Dict[str, Assembly] = {}
+    for url in summary_urls(fetcher.base_url, section, groups):
+        path = workdir / url.split("/genomes/", 1)[-1].replace("/", "_")
+        fetcher.download(url, path)
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for assembly in parse_summary(f, wanted_accessions, wanted_taxids):
+                found.setdefault(assembly.accession, assembly)
+    if wanted_accessions is not None:
+        missing = sorted(wanted_accessions - set(found))
+        if missing:
+            print(
+                f"warning: {len(missing)} accession(s) not in the {section} summary: {', '.join(missing[:10])}",
+                file=sys.stderr,
+            )
+    if not found:
+        raise ValueError(f"No {section} assemblies in group(s) '{groups}' match the requested ids")
+    return sorted(found.values(), key=lambda a: a.fasta)
+
+
+def _fetch_genome(fetcher: Fetcher, assembly: Assembly, partial_dir: Path) -> Path:
+    base = fetcher.url(assembly.ftp_path)
+    sums = parse_md5(fetcher.get(f"{base}/md5checksums.txt").decode())
+    md5 = sums.get(assembly.fasta)
+    if md5 is None:
+        raise RuntimeError(f"{assembly.accession}: {assembly.fasta} is not listed in md5checksums.txt")
+    return fetcher.download(f"{base}/{assembly.fasta}", partial_dir / assembly.fasta, md5)
+
+
+def download(
+    output: str,
+    accessions: typing.Optional[typing.Sequence[str]] = None,
+    taxids: typing.Optional[typing.Sequence[str]] = None,
+    section: str = "refseq",
+    groups: str = "all",
+    base_url: str = NCBI_URL,
+    connections: int = CONNECTIONS,
+    threads: int = 1,
+    level: int = 6,
+    partial_dir: typing.Optional[str] = None,
+    manifest: typing.Optional[str] = None,
+    fetcher: typing.Optional[Fetcher] = None,
+) -> typing.List[Assembly]:
+    """Download the requested genomes into one BGZF FASTA at `output`, with a `.gzi` index next to it.
+
+    Genomes are merged in file name order. Downloads go to `partial_dir`, which
+    keeps them for later attempts when given; otherwise to a temporary
+    directory, with each genome removed once merged. `manifest` lists the
+    merged assemblies as TSV.
+    """
+    if connections < 1:
+        raise ValueError("connections must be at least 1")
+    fetcher = fetcher or Fetcher(base_url)
+    keep = partial_dir is not None
+    if partial_dir is not None:
+        os.makedirs(partial_dir, exist_ok=True)
+    workdir = Path(partial_dir or tempfile.mkdtemp(prefix="readsim_ncbi_", dir=os.path.dirname(output) or "."))
+    try:
+        assemblies = resolve(fetcher, workdir, accessions, taxids, section, groups)
+        with concurrent.futures.ThreadPoolExecutor(connections) as pool, BgzfWriter(
+            output, threads=threads, level=level
+        ) as writer:
+            futures = [pool.submit(_fetch_genome, fetcher, a, workdir) for a in assemblies]
+            try:
+                sizes = []
+                for future in futures:
+                    path = future.result()
+                    sizes.append(path.stat().st_size)
+                    with gzip.open(path, "rb") as f:
+                        while True:
+                            chunk = f.read(4 * CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            writer.write(chunk if chunk.endswith(b"\n") or f.peek(1) else chunk + b"\n")
+                    if not keep:
+                        path.unlink()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+    finally:
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    if manifest is not None:
+        with open(manifest, "w") as f:
+            f.write("accession\ttaxid\tspecies_taxid\torganism\tfile\tbytes\n")
+            for a, size in zip(assemblies, sizes):
+                f.write(f"{a.accession}\t{a.taxid}\t{a.species_taxid}\t{a.organism}\t{a.fasta}\t{size}\n")
+    return assemblies
@@ -0,0 +1,427 @@
+"""
+Probe placement: find where capture probes land on a reference.
+
+This replaces building a Bowtie2 index of the whole reference only to align a
+few thousand probes to it. Instead the probes, which are small, are indexed:
+the minimizers (the smallest hashed k-mer of every `w` consecutive k-mers) of
+both strands of every probe go into one sorted array. The reference is then
+streamed past that index in chunks on worker processes, read from the memory
+map of a prepared reference or from the FASTA. Each chunk's minimizers are
+looked up with a binary search, the hits are grouped by probe and diagonal,
+and every group with enough seeds is verified by a banded local alignment
+that runs on all candidates of a chunk at once, one probe position per step.
+
+Alignments are scored like the pipeline's Bowtie2 settings (`--local --mp 32
+--rdg 10,8 --rfg 10,8`, minimum score `G,20,8`), and at most `max_hits`
+placements per probe are kept, as `-k 10000` does. Placements are written as
+a BED file of contig, start, end, probe, score and strand, which is what the
+capture simulator reads.
+"""
+
+import multiprocessing
+import sys
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .fasta import COMPLEMENT, N_CODE, encode, iter_fasta
+from .reference import IndexedFasta, is_prepared
+
+# Reference positions scanned per task
+CHUNK_SIZE = 1 << 22
+# Candidates aligned together, bounding the memory of the alignment matrices
+ALIGN_BATCH = 4096
+# Size of the table that rules out most reference minimizers before the binary search
+FILTER_BITS = 24
+_NEG = -(1 << 20)
+_PAD = 5
+
+
+@dataclass
+class ProbemapOptions:
+    k: int = 15
+    w: int = 5
+    # diagonals an alignment may drift from its seeds, i.e. the longest indel it spans
+    band: int = 15
+    min_seeds: int = 2
+    max_hits: int = 10_000
+    match: int = 2
+    mismatch: int = 32
+    n_penalty: int = 1
+    gap_open: int = 10
+    gap_extend: int = 8
+    score_min: str = "G,20,8"
+
+    def validate(self) -> None:
+        # 2k bits of a k-mer must fit the 64-bit hash, below the value reserved for k-mers with N
+        if not 1 <= self.k <= 31:
+            raise ValueError(f"k must be between 1 and 31, got {self.k}")
+        for name in ("w", "min_seeds", "max_hits"):
+            if getattr(self, name) < 1:
+                raise ValueError(f"{name} must be positive, got {getattr(self, name)}")
+        if self.band < 0:
+            raise ValueError(f"band must not be negative, got {self.band}")
+        self.min_score(np.array([100]))
+
+    def min_score(self, lengths: np.ndarray) -> np.ndarray:
+        """Minimum alignment scores of probes of `lengths`, from a Bowtie2 `--score-min` function."""
+        func, const, coef = self.score_min.split(",")
+        x = np.asarray(lengths, dtype=np.float64)
+        functions = {"C": np.zeros_like, "L": np.asarray, "S": np.sqrt, "G": np.log}
+        if func not in functions:
+            raise ValueError(f"Unknown score function {func!r} in {self.score_min!r}, expected C, L, S or G")
+        return float(const) + float(coef) * functions[func](x)
+
+
+@dataclass
+class Probes:
+    """Both strands of every probe, padded into one matrix, and their minimizer index."""
+
+    names: typing.List[str]
+    codes: np.ndarray  # (2 * n_probes, max_length): probe i forward at row 2i, reverse complement at 2i + 1
+    lengths: np.ndarray
+    keys: np.ndarray  # sorted minimizer hashes
+    rows: np.ndarray  # row of `codes` of each key
+    offsets: np.ndarray  # position of each key in its row
+    present: np.ndarray  # whether any key has the low FILTER_BITS bits of a hash
+
+
+def kmer_hashes(codes: np.ndarray, k: int) -> np.ndarray:
+    """Invertible hashes of every k-mer of `codes`; k-mers containing N hash to the largest value."""
+    n = len(codes) - k + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint64)
+    c = codes.astype(np.uint64) & np.uint64(3)
+    key = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        key = (key << np.uint64(2)) | c[j : j + n]
+    # the integer hash of minimap2, so that minimizers are not biased towards poly-A
+    mask = np.uint64((1 << (2 * k)) - 1)
+    key = (~key + (key << np.uint64(21))) & mask
+    key ^= key >> np.uint64(24)
+    key = (key + (key << np.uint64(3)) + (key << np.uint64(8))) & mask
+    key ^= key >> np.uint64(14)
+    key = (key + (key << np.uint64(2)) + (key << np.uint64(4))) & mask
+    key ^= key >> np.uint64(28)
+    key = (key + (key << np.uint64(31))) & mask
+
+    ambiguous = np.concatenate(([0], np.cumsum(codes >= N_CODE)))
+    key[ambiguous[k:] - ambiguous[:n] > 0] = np.iinfo(np.uint64).max
+    return key
+
+
+def _window_minima(hashes: np.ndarray, w: int) -> np.ndarray:
+    """Position of the smallest hash of every window of `w` consecutive hashes."""
+    windows = np.lib.stride_tricks.sliding_window_view(hashes, w)
+    return np.arange(len(windows)) + windows.argmin(axis=1)
+
+
+def _distinct(positions: np.ndarray) -> np.ndarray:
+    # the minimum of a window is never left of that of the previous window, so repeats are adjacent
+    return positions[np.concatenate(([True], positions[1:] != positions[:-1]))] if len(positions) else positions
+
+
+def minimizers(codes: np.ndarray, k: int, w: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Positions and hashes of the minimizers of `codes`, without those of k-mers containing N."""
+    hashes = kmer_hashes(codes, k)
+    if len(hashes) < w:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64)
+    positions = _distinct(_window_minima(hashes, w))
+    positions = positions[hashes[positions] != np.iinfo(np.uint64).max]
+    return positions, hashes[positions]
+
+
+def load_probes(path: typing.Union[str, Path], opts: ProbemapOptions) -> Probes:
+    """Read the probe FASTA and index the minimizers of both strands."""
+    records = [(name, encode(seq)) for name, seq in iter_fasta(path)]
+    records = [(name, codes) for name, codes in records if len(codes) >= opts.k + opts.w - 1]
+    if not records:
+        raise ValueError(f"No probe in {path} is at least {opts.k + opts.w - 1} bases long")
+    strands = [strand for _, codes in records for strand in (codes, COMPLEMENT[codes][::-1])]
+    lengths = np.array([len(strand) for strand in strands], dtype=np.int64)
+    matrix = np.full((len(strands), lengths.max()), _PAD, dtype=np.uint8)
+    for row, strand in enumerate(strands):
+        matrix[row, : len(strand)] = strand
+
+    # hash all strands at once, separated by an N so that no k-mer spans two of them
+    starts = np.cumsum(lengths + 1) - (lengths + 1)
+    joined = np.full(int(lengths.sum() + len(strands)), N_CODE, dtype=np.uint8)
+    owner = np.full(len(joined), -1, dtype=np.int64)
+    for row, strand in enumerate(strands):
+        joined[starts[row] : starts[row] + len(strand)] = strand
+        owner[starts[row] : starts[row] + len(strand)] = row
+    hashes = kmer_hashes(joined, opts.k)
+    minima = _window_minima(hashes, opts.w)
+    # only windows whose k-mers all lie within one strand, as if each strand were indexed alone
+    span = opts.w + opts.k - 2
+    inside = (owner[: len(minima)] >= 0) & (owner[: len(minima)] == owner[span : span + len(minima)])
+    positions = _distinct(minima[inside])
+    positions = positions[hashes[positions] != np.iinfo(np.uint64).max]
+    rows = owner[positions]
+
+    key = hashes[positions]
+    order = np.argsort(key, kind="stable")
+    present = np.zeros(1 << FILTER_BITS, dtype=bool)
+    present[key & np.uint64((1 << FILTER_BITS) - 1)] = True
+    return Probes(
+        names=[name for name, _ in records],
+        codes=matrix,
+        lengths=lengths,
+        keys=key[order],
+        rows=rows[order],
+        offsets=(positions - starts[rows])[order],
+        present=present,
+    )
+
+
+def seed_candidates(
+    probes: Probes,
+    codes: np.ndarray,
+    scan: typing.Tuple[int, int],
+    opts: ProbemapOptions,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Probe rows and diagonals (reference position of probe base 0) with at least `min_seeds` seeds.
+
+    Minimizers are taken from `codes[scan[0]:scan[1]]`; diagonals are relative to `codes`.
+    """
+    positions, hashes = minimizers(codes[scan[0] : scan[1]], opts.k, opts.w)
+    candidate = probes.present[hashes & np.uint64((1 << FILTER_BITS) - 1)]
+    positions, hashes = positions[candidate], hashes[candidate]
+    lo = np.searchsorted(probes.keys, hashes, side="left")
+    hi = np.searchsorted(probes.keys, hashes, side="right")
+    counts = hi - lo
+    if not counts.sum():
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # every (reference minimizer, probe minimizer) pair with the same hash
+    first = np.repeat(lo - np.cumsum(counts) + counts, counts) + np.arange(int(counts.sum()))
+    ref_pos = np.repeat(positions + scan[0], counts)
+    rows = probes.rows[first]
+    diagonals = ref_pos - probes.offsets[first]
+
+    order = np.lexsort((diagonals, rows))
+    rows, diagonals = rows[order], diagonals[order]
+    # seeds of one alignment stay within the band of each other's diagonal
+    start = np.concatenate(([True], (rows[1:] != rows[:-1]) | (diagonals[1:] - diagonals[:-1] > opts.band)))
+    cluster = np.cumsum(start) - 1
+    seeds = np.bincount(cluster)
+    keep = seeds >= opts.min_seeds
+    # the median diagonal of a cluster is the center of its band
+    middle = (np.flatnonzero(start) + seeds // 2)[keep]
+    return rows[middle], diagonals[middle]
+
+
+def banded_align(
+    probe: np.ndarray,
+    window: np.ndarray,
+    opts: ProbemapOptions,
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Local alignments of probes to reference windows within a diagonal band, all candidates at once.
+
+    `probe` is an `(n, L)` matrix of probe codes (padded with 5) and `window`
+    an `(n, L + 2 * band)` matrix of the reference around each candidate's
+    diagonal, padded with 5 outside the contig. Returns the best score and
+    the window positions of the first and last aligned reference bases.
+    Gaps cost `gap_open + gap_extend * length`, as in Bowtie2.
+    """
+    n, length = probe.shape
+    width = 2 * opts.band + 1
+    band = np.arange(width)
+    ext = opts.gap_extend
+    first_gap = opts.gap_open + opts.gap_extend
+
+    h = np.zeros((n, width), dtype=np.int32)
+    e = np.full((n, width), _NEG, dtype=np.int32)
+    h_origin = np.zeros((n, width), dtype=np.int64)
+    e_origin = np.zeros((n, width), dtype=np.int64)
+    best = np.zeros(n, dtype=np.int32)
+    best_end = np.zeros(n, dtype=np.int64)
+    best_origin = np.zeros(n, dtype=np.int64)
+    rows = np.arange(n)[:, None]
+
+    for i in range(length):
+        p = probe[:, i : i + 1]
+        r = window[:, i : i + width]
+        score = np.where(p == r, opts.match, -opts.mismatch).astype(np.int32)
+        score[(p == N_CODE) | (r == N_CODE)] = -opts.n_penalty
+        score[(p == _PAD) | (r == _PAD)] = _NEG
+        here = i + band  # window position of every band cell
+
+        # a gap in the reference comes from the row above, one band cell to the right
+        e_open = np.concatenate((h[:, 1:] - first_gap, np.full((n, 1), _NEG, dtype=np.int32)), axis=1)
+        e_ext = np.concatenate((e[:, 1:] - ext, np.full((n, 1), _NEG, dtype=np.int32)), axis=1)
+        e_new = np.maximum(e_open, e_ext)
+        e_origin = np.where(
+            e_open >= e_ext,
+            np.concatenate((h_origin[:, 1:], h_origin[:, -1:]), axis=1),
+            np.concatenate((e_origin[:, 1:], e_origin[:, -1:]), axis=1),
+        )
+        e = e_new
+
+        diag = h + score
+        # an alignment that starts here has its origin here
+        diag_origin = np.where(h > 0, h_origin, here)
+        h_new = np.maximum(np.maximum(diag, e), 0)
+        origin = np.where(diag >= e, diag_origin, e_origin)
+
+        # a gap in the probe comes from the left in the same row: the best earlier cell minus the gap cost
+        lifted = np.where(h_new > 0, h_new + ext * band, _NEG)
+        running = np.maximum.accumulate(lifted, axis=1)
+        source = np.maximum.accumulate(np.where(lifted == running, band, 0), axis=1)
+        f = np.concatenate((np.full((n, 1), _NEG), running[:, :-1] - ext * band[1:] - opts.gap_open), axis=1)
+        f_source = np.concatenate((np.zeros((n, 1), dtype=np.int64), source[:, :-1]), axis=1)
+        use_f = f > h_new
+        h = np.where(use_f, f, h_new).astype(np.int32)
+        h_origin = np.where(use_f, origin[rows, f_source], origin)
+        h_origin = np.where(h > 0, h_origin, here)
+
+        cell = h.argmax(axis=1)
+        top = h[rows[:, 0], cell]
+        better = top > best
+        best = np.where(better, top, best)
+        best_end = np.where(better, i + cell, best_end)
+        best_origin = np.where(better, h_origin[rows[:, 0], cell], best_origin)
+
+    return best, best_origin, best_end
+
+
+@dataclass
+class Hit:
+    probe: int
+    strand: str
+    start: int
+    end: int
+    score: int
+
+
+def place(
+    probes: Probes,
+    codes: np.ndarray,
+    scan: typing.Tuple[int, int],
+    opts: ProbemapOptions,
+) -> typing.List[Hit]:
+    """Placements of the probes whose seeds fall in `codes[scan[0]:scan[1]]`; coordinates are relative to `codes`."""
+    rows, diagonals = seed_candidates(probes, codes, scan, opts)
+    width = probes.codes.shape[1] + 2 * opts.band
+    hits = []
+    for at in range(0, len(rows), ALIGN_BATCH):
+        row, diagonal = rows[at : at + ALIGN_BATCH], diagonals[at : at + ALIGN_BATCH]
+        ref = diagonal[:, None] - opts.band + np.arange(width)
+        inside = (ref >= 0) & (ref < len(codes))
+        window = np.where(inside, codes[np.clip(ref, 0, max(len(codes) - 1, 0))], _PAD).astype(np.uint8)
+        score, first, last = banded_align(probes.codes[row], window, opts)
+        for j in np.flatnonzero(score >= opts.min_score(probes.lengths[row])).tolist():
+            start = int(diagonal[j]) - opts.band
+            hits.append(
+                Hit(
+                    probe=int(row[j]) // 2,
+                    strand="-" if row[j] % 2 else "+",
+                    start=start + int(first[j]),
+                    end=start + int(last[j]) + 1,
+                    score=int(score[j]),
+                )
+            )
+    return hits
+
+
+_STATE: typing.Dict[str, typing.Any] = {}
+
+
+def _init_worker(probes: Probes, opts: ProbemapOptions, fasta: typing.Optional[str]) -> None:
+    _STATE.update(probes=probes, opts=opts, fasta=IndexedFasta(fasta) if fasta else None)
+
+
+# (contig, segment start, scan start, scan end, segment bases if the reference is not memory-mapped)
+_Task = typing.Tuple[str, int, int, int, typing.Optional[bytes]]
+
+
+def _place_task(task: _Task) -> typing.Tuple[str, typing.List[Hit]]:
+    name, offset, scan_start, scan_end, seq = task
+    probes: Probes = _STATE["probes"]
+    opts: ProbemapOptions = _STATE["opts"]
+    if seq is None:
+        margin = probes.codes.shape[1] + 2 * opts.band
+        seq = _STATE["fasta"].fetch(name, offset, scan_end + margin)
+    hits = place(probes, encode(seq), (scan_start - offset, scan_end - offset), opts)
+    for hit in hits:
+        hit.start += offset
+        hit.end += offset
+    return name, hits
+
+
+def _tasks(
+    fasta: typing.Union[str, Path],
+    prepared: bool,
+    margin: int,
+    overlap: int,
+) -> typing.Iterator[_Task]:
+    """Chunks of every contig; each scans `overlap` bases before its chunk and carries `margin` bases of context."""
+    if prepared:
+        with IndexedFasta(fasta) as fa:
+            contigs: typing.Iterable = [(r.name, r.length, None) for r in fa.records]
+    else:
+        contigs = ((name, len(seq), seq) for name, seq in iter_fasta(fasta))
+    for name, length, seq in contigs:
+        for start in range(0, max(length, 1), CHUNK_SIZE):
+            scan_start = max(start - overlap, 0)
+            scan_end = min(start + CHUNK_SIZE, length)
+            offset = max(scan_start - margin, 0)
+            segment = None if seq is None else seq[offset : scan_end + margin]
+            yield name, offset, scan_start, scan_end, segment
+
+
+def run(
+    fasta: typing.Union[str, Path],
+    probe_fasta: typing.Union[str, Path],
+    output: typing.Union[str, Path],
+    opts: ProbemapOptions,
+    threads: int = 1,
+) -> typing.Dict[str, int]:
+    """Write the placements of every probe of `probe_fasta` on `fasta` as BED; returns counts for the log."""
+    opts.validate()
+    probes = load_probes(probe_fasta, opts)
+    prepared = is_prepared(fasta)
+    margin = probes.codes.shape[1] + 2 * opts.band
+    # an alignment's seeds are all within one chunk when chunks overlap by a probe length
+    tasks = _tasks(fasta, prepared, margin, overlap=probes.codes.shape[1])
+    init_args = (probes, opts, str(fasta) if prepared else None)
+
+    contigs: typing.List[str] = []
+    found: typing.Dict[typing.Tuple[int, str, int, int, int], int] = {}
+    if threads > 1:
+        ctx = multiprocessing.get_context("fork")
+        with ctx.Pool(threads, initializer=_init_worker, initargs=init_args) as pool:
+            results: typing.Iterable = list(pool.imap(_place_task, tasks))
+    else:
+        _init_worker(*init_args)
+        results = map(_place_task, tasks)
+    for name, hits in results:
+        if not contigs or contigs[-1] != name:
+            contigs.append(name)
+        for hit in hits:
+            # chunks overlap, so a placement can be found twice
+            found[(len(contigs) - 1, hit.strand, hit.start, hit.end, hit.probe)] = hit.score
+    _STATE.clear()
+
+    # like `-k`, keep the best `max_hits` placements of every probe
+    by_probe: typing.Dict[int, typing.List[typing.Tuple[int, typing.Tuple[int, str, int, int, int]]]] = {}
+    for key, score in found.items():
+        by_probe.setdefault(key[4], []).append((score, key))
+    kept = []
+    for placements in by_probe.values():
+        placements.sort(key=lambda item: (-item[0], item[1]))
+        kept.extend(placements[: opts.max_hits])
+    kept.sort(key=lambda item: (item[1][0], item[1][2], item[1][3], item[1][4]))
+
+    with open(output, "w") as out:
+        for score, (contig, strand, start, end, probe) in kept:
+            out.write(f"{contigs[contig]}\t{start}\t{end}\t{probes.names[probe]}\t{min(score, 1000)}\t{strand}\n")
+    return {"probes": len(probes.names), "placed": len(by_probe), "placements": len(kept)}
+
+
+def report(counts: typing.Dict[str, int]) -> None:
+    print(
+        f"Placed {counts['placed']} of {counts['probes']} probes at {counts['placements']} positions",
+        file=sys.stderr,
+    )
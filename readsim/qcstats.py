@@ -0,0 +1,271 @@
+"""
+Read statistics collected inline while simulators write their reads.
+
+`ReadStats` accumulates the histograms FastQC reports (per-position quality
+and base content, per-read GC and mean quality, read lengths) in fixed-size
+arrays. Simulators update it with whole batches of encoded reads, so QC costs
+a few array reductions per batch instead of a second pass that decompresses
+every FASTQ. Stats are saved as JSON per task, merged by read set (which sums
+the shards of a sample), and turned into MultiQC custom content files.
+"""
+
+import json
+import typing
+from pathlib import Path
+
+import numpy as np
+
+from .fasta import N_CODE
+
+# Positions beyond this are folded into the length histogram only
+MAX_LENGTH = 1000
+MAX_QUALITY = 60
+
+
+class ReadStats:
+    """Histograms of one read set, e.g. the R1 reads of a sample."""
+
+    def __init__(self) -> None:
+        self.reads = 0
+        self.base_counts = np.zeros((N_CODE + 1, MAX_LENGTH), dtype=np.int64)
+        self.quality_sum = np.zeros(MAX_LENGTH, dtype=np.int64)
+        self.length_hist = np.zeros(MAX_LENGTH + 1, dtype=np.int64)
+        self.gc_hist = np.zeros(101, dtype=np.int64)
+        self.quality_hist = np.zeros(MAX_QUALITY + 1, dtype=np.int64)
+
+    def add(self, codes: np.ndarray, quality: typing.Union[int, np.ndarray]) -> None:
+        """Add a batch of equal-length reads.
+
+        `codes` is an `(n, length)` array of nucleotide codes and `quality`
+        either an `(n, length)` array of Phred scores or one score for all bases.
+        """
+        n, length = codes.shape
+        if not n:
+            return
+        cols = min(length, MAX_LENGTH)
+        self.reads += n
+        self.length_hist[cols] += n
+
+        head = codes[:, :cols].astype(np.int64)
+        self.base_counts[:, :cols] += np.bincount(
+            (head * cols + np.arange(cols)).ravel(), minlength=(N_CODE + 1) * cols
+        ).reshape(N_CODE + 1, cols)
+
+        gc = ((codes == 1) | (codes == 2)).sum(axis=1)
+        called = np.maximum((codes != N_CODE).sum(axis=1), 1)
+        self.gc_hist += np.bincount(np.rint(100 * gc / called).astype(np.int64), minlength=101)
+
+        if np.ndim(quality) == 0:
+            q = min(int(quality), MAX_QUALITY)
+            self.quality_sum[:cols] += q * n
+            self.quality_hist[q] += n
+        else:
+            self.quality_sum[:cols] += quality[:, :cols].sum(axis=0, dtype=np.int64)
+            mean = np.minimum(np.rint(quality.mean(axis=1)).astype(np.int64), MAX_QUALITY)
+            self.quality_hist += np.bincount(mean, minlength=MAX_QUALITY + 1)
+
+    def add_ragged(self, codes: np.ndarray, lengths: np.ndarray, quality: int) -> None:
+        """Add a batch of reads of different lengths with one quality score for all bases.
+
+        `codes` holds the nucleotide codes of the reads back to back and
+        `lengths` the length of each read.
+        """
+        n = len(lengths)
+        if not n:
+            return
+        self.reads += n
+        self.length_hist += np.bincount(np.minimum(lengths, MAX_LENGTH), minlength=MAX_LENGTH + 1)
+
+        offsets = np.cumsum(lengths) - lengths
+        position = np.arange(len(codes)) - np.repeat(offsets, lengths)
+        head = position < MAX_LENGTH
+        self.base_counts += np.bincount(
+            codes[head].astype(np.int64) * MAX_LENGTH + position[head], minlength=(N_CODE + 1) * MAX_LENGTH
+        ).reshape(N_CODE + 1, MAX_LENGTH)
+
+        # reads are never empty, so every offset starts a segment of its own read
+        gc = np.add.reduceat(((codes == 1) | (codes == 2)).astype(np.int64), offsets)
+        called = np.maximum(np.add.reduceat((codes != N_CODE).astype(np.int64), offsets), 1)
+        self.gc_hist += np.bincount(np.rint(100 * gc / called).astype(np.int64), minlength=101)
+
+        q = min(int(quality), MAX_QUALITY)
+        self.quality_sum += q * np.bincount(position[head], minlength=MAX_LENGTH)
+        self.quality_hist[q] += n
+
+    def merge(self, other: "ReadStats") -> None:
+        self.reads += other.reads
+        self.base_counts += other.base_counts
+        self.quality_sum += other.quality_sum
+        self.length_hist += other.length_hist
+        self.gc_hist += other.gc_hist
+        self.quality_hist += other.quality_hist
+
+    def position_reads(self) -> np.ndarray:
+        """Number of reads covering each position."""
+        return self.base_counts.sum(axis=0)
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        cols = int(np.flatnonzero(self.position_reads()).max() + 1) if self.reads else 0
+        return {
+            "reads": self.reads,
+            "base_counts": self.base_counts[:, :cols].tolist(),
+            "quality_sum": self.quality_sum[:cols].tolist(),
+            "length_hist": {str(i): int(c) for i, c in enumerate(self.length_hist) if c},
+            "gc_hist": self.gc_hist.tolist(),
+            "quality_hist": self.quality_hist.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: typing.Dict[str, typing.Any]) -> "ReadStats":
+        stats = cls()
+        stats.reads = data["reads"]
+        counts = np.array(data["base_counts"], dtype=np.int64).reshape(N_CODE + 1, -1)
+        stats.base_counts[:, : counts.shape[1]] = counts
+        stats.quality_sum[: len(data["quality_sum"])] = data["quality_sum"]
+        for length, count in data["length_hist"].items():
+            stats.length_hist[int(length)] = count
+        stats.gc_hist[:] = data["gc_hist"]
+        stats.quality_hist[:] = data["quality_hist"]
+        return stats
+
+
+def save_stats(path: typing.Union[str, Path], stats: typing.Dict[str, ReadStats]) -> None:
+    """Write the stats of several read sets, keyed by read set name, as JSON."""
+    with open(path, "w") as f:
+        json.dump({name: s.to_dict() for name, s in stats.items()}, f)
+
+
+def load_stats(paths: typing.Iterable[typing.Union[str, Path]]) -> typing.Dict[str, ReadStats]:
+    """Load and merge stats files; read sets with the same name are summed."""
+    merged: typing.Dict[str, ReadStats] = {}
+    for path in paths:
+        with open(path) as f:
+            for name, data in json.load(f).items():
+                stats = ReadStats.from_dict(data)
+                if name in merged:
+                    merged[name].merge(stats)
+                else:
+                    merged[name] = stats
+    return merged
+
+
+def read_set_name(fastq: typing.Union[str, Path]) -> str:
+    """Name a read set after its FASTQ file, as FastQC names its reports."""
+    name = Path(fastq).name
+    for suffix in (".gz", ".fq", ".fastq"):
+        if name.endswith(suffix):
+            name = name[: -len(suffix)]
+    return name
+
+
+def _linegraph(
+    plot: str,
+    title: str,
+    description: str,
+    data: typing.Dict[str, typing.Dict[int, float]],
+    xlab: str,
+    ylab: str,
+) -> typing.Dict[str, typing.Any]:
+    return {
+        "id": f"readsim_{plot}",
+        "section_name": f"readsim: {title}",
+        "description": description,
+        "plot_type": "linegraph",
+        "pconfig": {"id": f"readsim_{plot}_plot", "title": f"readsim: {title}", "xlab": xlab, "ylab": ylab},
+        "data": data,
+    }
+
+
+def multiqc_sections(stats: typing.Dict[str, ReadStats]) -> typing.List[typing.Dict[str, typing.Any]]:
+    """MultiQC custom content for the read sets in `stats`, one dict per report section."""
+    general: typing.Dict[str, typing.Dict[str, float]] = {}
+    quality: typing.Dict[str, typing.Dict[int, float]] = {}
+    n_content: typing.Dict[str, typing.Dict[int, float]] = {}
+    gc: typing.Dict[str, typing.Dict[int, float]] = {}
+    read_quality: typing.Dict[str, typing.Dict[int, float]] = {}
+    lengths: typing.Dict[str, typing.Dict[int, float]] = {}
+
+    for name, s in sorted(stats.items()):
+        covered = s.position_reads()
+        pos = np.flatnonzero(covered)
+        bases = s.base_counts.sum()
+        called = s.base_counts[:N_CODE].sum()
+        general[name] = {
+            "total_sequences": s.reads,
+            "percent_gc": round(100 * float(s.base_counts[1:3].sum()) / max(called, 1), 2),
+            "mean_quality": round(float(s.quality_sum.sum()) / max(bases, 1), 2),
+            "avg_sequence_length": round(float(bases) / max(s.reads, 1), 2),
+        }
+        quality[name] = {int(p) + 1: round(float(s.quality_sum[p] / covered[p]), 2) for p in pos}
+        n_content[name] = {int(p) + 1: round(100 * float(s.base_counts[N_CODE, p] / covered[p]), 3) for p in pos}
+        gc[name] = {i: int(c) for i, c in enumerate(s.gc_hist)}
+        read_quality[name] = {q: int(c) for q, c in enumerate(s.quality_hist) if c}
+        lengths[name] = {i: int(c) for i, c in enumerate(s.length_hist) if c}
+
+    headers = {
+        "total_sequences": {"title": "Seqs", "description": "Simulated reads", "format": "{:,.0f}"},
+        "percent_gc": {"title": "% GC", "description": "Average % GC content", "suffix": "%", "max": 100},
+        "mean_quality": {"title": "Mean Q", "description": "Mean base quality (Phred)"},
+        "avg_sequence_length": {"title": "Length", "description": "Average read length", "suffix": " bp"},
+    }
+    return [
+        {
+            "id": "readsim_general_stats",
+            "plot_type": "generalstats",
+            "pconfig": [{key: value} for key, value in headers.items()],
+            "data": general,
+        },
+        _linegraph(
+            "per_base_quality",
+            "Per base quality",
+            "Mean base quality at each read position, collected while the reads were simulated.",
+            quality,
+            "Position (bp)",
+            "Phred score",
+        ),
+        _linegraph(
+            "per_base_n_content",
+            "Per base N content",
+            "Percentage of N calls at each read position.",
+            n_content,
+            "Position (bp)",
+            "% N",
+        ),
+        _linegraph(
+            "per_sequence_gc",
+            "Per sequence GC content",
+            "Distribution of the GC content of the reads.",
+            gc,
+            "% GC",
+            "Reads",
+        ),
+        _linegraph(
+            "per_sequence_quality",
+            "Per sequence quality scores",
+            "Distribution of the mean base quality of the reads.",
+            read_quality,
+            "Mean Phred score",
+            "Reads",
+        ),
+        _linegraph(
+            "length_distribution",
+            "Sequence length distribution",
+            "Distribution of read lengths.",
+            lengths,
+            "Read length (bp)",
+            "Reads",
+        ),
+    ]
+
+
+def write_multiqc(stats: typing.Dict[str, ReadStats], outdir: typing.Union[str, Path]) -> typing.List[Path]:
+    """Write one `*_mqc.json` custom content file per report section into `outdir`."""
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for section in multiqc_sections(stats):
+        path = outdir / f"{section['id']}_mqc.json"
+        with open(path, "w") as f:
+            json.dump(section, f, indent=1)
+        paths.append(path)
+    return paths
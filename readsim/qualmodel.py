@@ -0,0 +1,312 @@
+"""
+Compiled quality models (`.rqm`): per-position quality tables ready to sample.
+
+ART parses its text profiles and InSilicoSeq unpickles its KDE models in every
+task, for every sample. `readsim compile-model` does this once: it turns a
+profile into cumulative tables of
+
+- the quality at every read position, per mate, per quality bin (InSilicoSeq
+  draws one bin per read, keeping the qualities of a read correlated) and per
+  read base (ART profiles are conditional on the base; other sources repeat
+  one table for A, C, G, T and N), and
+- the base a substitution at every read position turns each base into.
+
+    magic "RQM\\x01" | header length (u32) | header JSON | padding to 8 bytes | quality keys | substitution keys | guide
+
+Every row of a table is stored as 64-bit keys `row << 33 | cumulative`, with
+the cumulative probabilities scaled to 2**32. Keys increase across rows, so a
+batch of bases is sampled with one binary search of the flat table. Most
+quality draws skip the search: a guide table holds the quality at the start
+of each of 256 equal slices of every row's cumulative range, and a draw whose
+slice starts and ends on the same quality takes it from there. Simulators map
+the file instead of loading it, so concurrent tasks share a single
+page-cached copy. A base is substituted with the error
+probability of its sampled quality, `10 ** (-q / 10)`, as ART and InSilicoSeq
+do; insertions and deletions are not modelled.
+"""
+
+import importlib.util
+import json
+import struct
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .fasta import N_CODE
+
+MAGIC = b"RQM\x01"
+VERSION = 1
+# ART profiles list the quality distributions of A, C, G, T and of all bases, written "."
+PROFILE_BASES = "ACGT."
+_SCALE = 1 << 32
+_ROW_SHIFT = np.uint64(33)
+# Slices of the cumulative range per row in the guide table
+GUIDE_SLICES = 256
+_SLICE_SHIFT = np.uint64(24)
+_U32 = struct.Struct("<I")
+# Substitution probability of every Phred quality
+ERROR_PROBABILITY = 10.0 ** (-np.arange(256) / 10.0)
+
+
+def _keys(pdf: np.ndarray) -> np.ndarray:
+    """Cumulative keys of the distributions along the last axis of `pdf`, which must not be all zero."""
+    weights = np.asarray(pdf, dtype=np.float64)
+    totals = weights.sum(axis=-1, keepdims=True)
+    if (totals <= 0).any():
+        raise ValueError("Every quality and substitution distribution needs a positive weight")
+    cumulative = np.rint(np.cumsum(weights, axis=-1) / totals * _SCALE).astype(np.uint64)
+    cumulative[..., -1] = _SCALE
+    rows = np.arange(cumulative.size // cumulative.shape[-1], dtype=np.uint64).reshape(cumulative.shape[:-1])
+    return (rows[..., None] << _ROW_SHIFT) | cumulative
+
+
+def _guide(keys: np.ndarray) -> np.ndarray:
+    """The index drawn at the start of every slice of each row of `keys`, and at the end of its last slice."""
+    width = keys.shape[-1]
+    rows = np.arange(keys.size // width, dtype=np.uint64)[:, None]
+    edges = np.append(np.arange(GUIDE_SLICES, dtype=np.uint64) << _SLICE_SHIFT, np.uint64(_SCALE - 1))
+    found = np.searchsorted(keys.reshape(-1), (rows << _ROW_SHIFT) | edges, side="right")
+    return (found - rows.astype(np.int64) * width).astype(np.uint8)
+
+
+@dataclass
+class QualityModel:
+    name: str
+    read_length: int
+    # (mates, bins, 5 bases, read_length, qualities) keys
+    quality: np.ndarray
+    # (mates, 4 bases, read_length, 4 bases) keys; a base never turns into itself
+    substitution: np.ndarray
+    # (mates, bins) cumulative probability of each quality bin
+    bins: np.ndarray
+    # (quality rows, GUIDE_SLICES + 1) quality at the edges of the slices of every row
+    guide: np.ndarray
+
+    @classmethod
+    def compile(
+        cls,
+        name: str,
+        quality: np.ndarray,
+        substitution: typing.Optional[np.ndarray] = None,
+        bin_weights: typing.Optional[np.ndarray] = None,
+    ) -> "QualityModel":
+        """Compile weights of shape `(mates, bins, 5, length, qualities)`, `(mates, 4, length, 4)` and `(mates, bins)`.
+
+        Substitutions default to the three other bases with equal weight, bins to equal weights.
+        """
+        quality = np.asarray(quality, dtype=np.float64)
+        mates, n_bins, _, length, _ = quality.shape
+        if substitution is None:
+            substitution = np.ones((mates, 4, length, 4))
+        substitution = np.array(substitution, dtype=np.float64)
+        substitution[:, np.arange(4), :, np.arange(4)] = 0
+        if bin_weights is None:
+            bin_weights = np.ones((mates, n_bins))
+        bins = np.cumsum(bin_weights, axis=1, dtype=np.float64)
+        if quality.shape[-1] > 256:
+            raise ValueError(f"Qualities above 255 cannot be written to FASTQ, got up to {quality.shape[-1] - 1}")
+        keys = _keys(quality)
+        return cls(name, length, keys, _keys(substitution), bins / bins[:, -1:], _guide(keys))
+
+    @property
+    def mates(self) -> int:
+        return self.quality.shape[0]
+
+    @property
+    def max_quality(self) -> int:
+        return self.quality.shape[-1] - 1
+
+    def save(self, path: typing.Union[str, Path]) -> None:
+        header = {
+            "version": VERSION,
+            "name": self.name,
+            "read_length": self.read_length,
+            "bins": self.bins.tolist(),
+            "quality": list(self.quality.shape),
+            "substitution": list(self.substitution.shape),
+        }
+        text = json.dumps(header).encode()
+        text += b" " * (-(len(MAGIC) + _U32.size + len(text)) % 8)
+        with open(path, "wb") as f:
+            f.write(MAGIC + _U32.pack(len(text)) + text)
+            f.write(np.ascontiguousarray(self.quality, dtype="<u8").tobytes())
+            f.write(np.ascontiguousarray(self.substitution, dtype="<u8").tobytes())
+            f.write(np.ascontiguousarray(self.guide, dtype=np.uint8).tobytes())
+
+    @classmethod
+    def load(cls, path: typing.Union[str, Path]) -> "QualityModel":
+        """Map a compiled model; the tables are read from the page cache as they are sampled."""
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a compiled quality model")
+            (size,) = _U32.unpack(f.read(_U32.size))
+            header = json.loads(f.read(size))
+        if header["version"] != VERSION:
+            raise ValueError(f"{path} is a version {header['version']} model, expected version {VERSION}")
+        offset = len(MAGIC) + _U32.size + size
+        quality = np.memmap(path, dtype="<u8", mode="r", offset=offset, shape=tuple(header["quality"]))
+        offset += quality.nbytes
+        substitution = np.memmap(path, dtype="<u8", mode="r", offset=offset, shape=tuple(header["substitution"]))
+        offset += substitution.nbytes
+        rows = quality.size // quality.shape[-1]
+        guide = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(rows, GUIDE_SLICES + 1))
+        return cls(header["name"], header["read_length"], quality, substitution, np.array(header["bins"]), guide)
+
+    def sample_qualities(self, codes: np.ndarray, mate: int, rng: np.random.Generator) -> np.ndarray:
+        """Phred qualities for the `(n, length)` reads `codes` of the first (0) or second (1) mate."""
+        n, length = codes.shape
+        if length > self.read_length:
+            raise ValueError(f"Reads of {length} bp are longer than the {self.read_length} bp of model {self.name}")
+        mate = min(mate, self.mates - 1)
+        _, n_bins, n_bases, _, n_qualities = self.quality.shape
+        read_bin = np.searchsorted(self.bins[mate], rng.random(n), side="right")
+        row = ((mate * n_bins + read_bin[:, None]) * n_bases + codes) * self.read_length + np.arange(length)
+        draw = rng.integers(0, _SCALE, size=(n, length), dtype=np.uint32)
+        edge = row * (GUIDE_SLICES + 1)
+        edge += draw >> np.uint32(_SLICE_SHIFT)
+        guide = self.guide.reshape(-1)
+        quality = guide[edge]
+        # slices that span several qualities need the binary search
+        unsure = np.flatnonzero(quality != guide[edge + 1])
+        if len(unsure):
+            rows = row.reshape(-1)[unsure]
+            target = (rows.astype(np.uint64) << _ROW_SHIFT) | draw.reshape(-1)[unsure].astype(np.uint64)
+            found = np.searchsorted(self.quality.reshape(-1), target, side="right")
+            quality.reshape(-1)[unsure] = found - rows * n_qualities
+        return quality
+
+    def add_errors(self, codes: np.ndarray, quality: np.ndarray, mate: int, rng: np.random.Generator) -> None:
+        """Substitute bases of `codes` in place with the error probabilities of their qualities."""
+        error = (rng.random(codes.shape) < ERROR_PROBABILITY[quality]) & (codes != N_CODE)
+        reads, positions = np.nonzero(error)
+        if not len(reads):
+            return
+        mate = min(mate, self.mates - 1)
+        row = ((mate * 4 + codes[reads, positions].astype(np.int64)) * self.read_length + positions).astype(np.uint64)
+        target = (row << _ROW_SHIFT) | rng.integers(0, _SCALE, size=len(row), dtype=np.uint64)
+        found = np.searchsorted(self.substitution.reshape(-1), target, side="right")
+        codes[reads, positions] = found - row.astype(np.int64) * 4
+
+
+def from_read_model(name: str, read_length: int, quality: np.ndarray) -> QualityModel:
+    """A model that always writes the per-position `quality`, as the built-in readsim error profiles do."""
+    table = np.zeros((1, 1, N_CODE + 1, read_length, int(quality.max()) + 1))
+    table[..., np.arange(read_length), quality] = 1
+    return QualityModel.compile(name, table)
+
+
+def read_art_profile(path: typing.Union[str, Path]) -> np.ndarray:
+    """Quality weights `(5, length, qualities)` of an ART Illumina profile, e.g. from art_profiler_illumina.
+
+    Every base and position has two lines, `<base> <position> <qualities...>`
+    and `<base> <position> <cumulative counts...>`. Rows of A, C, G, T or N
+    without a distribution of their own use the distribution of all bases.
+    """
+    dists: typing.Dict[typing.Tuple[str, int], typing.Tuple[np.ndarray, np.ndarray]] = {}
+    with open(path) as f:
+        lines = [line.split() for line in f if line.strip() and not line.startswith("#")]
+    for qualities, counts in zip(lines[::2], lines[1::2]):
+        if qualities[:2] != counts[:2] or qualities[0] not in PROFILE_BASES:
+            raise ValueError(f"{path}: expected quality and count lines of the same base and position")
+        cumulative = np.array(counts[2:], dtype=np.float64)
+        dists[qualities[0], int(qualities[1])] = (
+            np.array(qualities[2:], dtype=np.int64),
+            np.diff(cumulative, prepend=0.0),
+        )
+    if not dists:
+        raise ValueError(f"{path}: no quality distributions")
+    length = max(position for _, position in dists) + 1
+    max_quality = max(int(q.max()) for q, _ in dists.values())
+    table = np.zeros((len(PROFILE_BASES), length, max_quality + 1))
+    for (base, position), (qualities, weights) in dists.items():
+        np.add.at(table[PROFILE_BASES.index(base), position], qualities, weights)
+    no_total = table[-1].sum(axis=-1) <= 0
+    table[-1][no_total] = table[:-1].sum(axis=0)[no_total]
+    missing = table.sum(axis=-1) <= 0
+    table[missing] = np.broadcast_to(table[-1], table.shape)[missing]
+    if (table.sum(axis=-1) <= 0).any():
+        raise ValueError(f"{path}: positions without any quality distribution")
+    # the "." row doubles as the row of N bases
+    return table
+
+
+def from_art(name: str, profiles: typing.Sequence[typing.Union[str, Path]]) -> QualityModel:
+    """Compile the ART profiles of read 1 and, optionally, read 2."""
+    tables = [read_art_profile(path) for path in profiles]
+    length = min(t.shape[1] for t in tables)
+    width = max(t.shape[2] for t in tables)
+    quality = np.zeros((len(tables), 1, N_CODE + 1, length, width))
+    for mate, table in enumerate(tables):
+        quality[mate, 0, :, :, : table.shape[2]] = table[:, :length]
+    return QualityModel.compile(name, quality)
+
+
+def iss_profile(model: str) -> Path:
+    """The `.npz` file of an InSilicoSeq model name such as MiSeq, or `model` itself when it is a path."""
+    if Path(model).suffix == ".npz":
+        return Path(model)
+    spec = importlib.util.find_spec("iss")
+    if spec is None or not spec.submodule_search_locations:
+        raise ValueError(f"InSilicoSeq is not installed, so its {model} model cannot be found; pass an .npz file")
+    path = Path(list(spec.submodule_search_locations)[0]) / "profiles" / f"{model}.npz"
+    if not path.exists():
+        raise ValueError(f"InSilicoSeq has no {model} model ({path} does not exist)")
+    return path
+
+
+def _iss_quality(cdfs: typing.Any) -> np.ndarray:
+    """Quality weights `(bins, length, qualities)` from InSilicoSeq per-position quality CDFs."""
+    cdf = np.asarray(cdfs, dtype=np.float64)
+    if cdf.ndim == 2:
+        cdf = cdf[None]
+    if cdf.ndim != 3:
+        raise ValueError(f"Expected quality CDFs per bin and position, got an array of shape {cdf.shape}")
+    return np.clip(np.diff(cdf, prepend=0.0, axis=-1), 0.0, None)
+
+
+def _iss_substitution(choices: typing.Any, length: int) -> np.ndarray:
+    """Substitution weights `(4, length, 4)` from InSilicoSeq `{base: (bases, weights)}` dicts per position."""
+    table = np.ones((4, length, 4))
+    for position, options in enumerate(list(choices)[:length]):
+        for base, (targets, weights) in dict(options).items():
+            row = np.zeros(4)
+            for target, weight in zip(targets, weights):
+                row["ACGT".index(str(target))] = weight
+            if base in "ACGT" and row.sum() > 0:
+                table["ACGT".index(base), position] = row
+    return table
+
+
+def from_iss(name: str, path: typing.Union[str, Path]) -> QualityModel:
+    """Compile an InSilicoSeq KDE model (`.npz`, as shipped with InSilicoSeq or written by `iss model`).
+
+    The file holds pickled objects, so only compile models from trusted sources.
+    """
+    with np.load(path, allow_pickle=True) as data:
+        missing = [key for key in ("read_length", "quality_hist_forward", "quality_hist_reverse") if key not in data]
+        if missing:
+            raise ValueError(f"{path} is not an InSilicoSeq KDE model: no {', '.join(missing)}")
+        mates = [_iss_quality(data["quality_hist_forward"]), _iss_quality(data["quality_hist_reverse"])]
+        length = min(int(data["read_length"]), *(m.shape[1] for m in mates))
+        n_bins = max(m.shape[0] for m in mates)
+        width = max(m.shape[2] for m in mates)
+        quality = np.zeros((2, n_bins, N_CODE + 1, length, width))
+        for mate, table in enumerate(mates):
+            # a model with fewer bins for one mate repeats them
+            quality[mate, :, :, :, : table.shape[2]] = table[np.arange(n_bins) % len(table), None, :length]
+
+        bin_weights = np.ones((2, n_bins))
+        for mate, key in enumerate(("mean_count_forward", "mean_count_reverse")):
+            if key in data and np.size(data[key]) == n_bins and np.sum(data[key]) > 0:
+                bin_weights[mate] = np.asarray(data[key], dtype=np.float64)
+        substitution = np.ones((2, 4, length, 4))
+        for mate, key in enumerate(("subst_choices_forward", "subst_choices_reverse")):
+            if key in data:
+                substitution[mate] = _iss_substitution(data[key], length)
+
+    # positions where a bin has no qualities fall back to the average of the other bins
+    empty = quality.sum(axis=-1) <= 0
+    quality[empty] = np.broadcast_to(quality.sum(axis=1, keepdims=True), quality.shape)[empty]
+    return QualityModel.compile(name, quality, substitution, bin_weights)
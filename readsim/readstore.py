@@ -0,0 +1,274 @@
+"""
+Compact 2-bit read store (`.rs2`) with binned qualities, and its FASTQ export.
+
+A store holds the single or paired reads of one sample in independent chunks
+of `chunk_size` records. Within a chunk every end is kept as separate zlib
+streams: the read names, the read lengths, the bases packed four to a byte
+(A=0, C=1, G=2, T=3), the positions of N bases, and the qualities mapped to
+the eight Illumina quality bins and packed two to a byte. Mate names that
+only differ by their /1 and /2 suffix are not stored twice.
+
+    magic "RS2\\x01" | header length (u32) | header JSON | chunk ... | footer JSON | footer offset (u64) | "RS2E"
+
+The header records the sample, its seed and the quality bins; the footer
+lists the offset and record count of every chunk, so export decodes chunks
+in parallel worker processes and compresses them straight into BGZF blocks.
+Bases other than A, C, G and T are stored as N and qualities are binned, so
+a round trip is lossless for simulated reads up to the quality bins.
+"""
+
+import contextlib
+import itertools
+import json
+import multiprocessing
+import struct
+import typing
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from .bgzf import BgzfWriter, compress_blocks
+from .fasta import N_CODE, encode, open_maybe_gzip
+
+MAGIC = b"RS2\x01"
+END_MAGIC = b"RS2E"
+VERSION = 1
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Illumina 8-level binning: (lowest quality, highest quality, value written)
+QUALITY_BINS = [
+    (0, 2, 2),
+    (3, 9, 6),
+    (10, 19, 15),
+    (20, 24, 22),
+    (25, 29, 27),
+    (30, 34, 33),
+    (35, 39, 37),
+    (40, 93, 40),
+]
+
+_U32 = struct.Struct("<I")
+_TRAILER = struct.Struct("<Q4s")
+# sections stored per end of a chunk
+_SECTIONS = ("names", "lengths", "bases", "n_positions", "qualities")
+
+
+def _bin_table(bins: typing.Sequence[typing.Sequence[int]]) -> np.ndarray:
+    """Lookup table from Phred+33 bytes to bin index."""
+    to_bin = np.zeros(256, dtype=np.uint8)
+    for index, (low, high, _) in enumerate(bins):
+        to_bin[low + 33 : high + 34] = index
+    return to_bin
+
+
+def _pack(values: np.ndarray, per_byte: int) -> np.ndarray:
+    """Pack small integers (2 bits for 4 per byte, 4 bits for 2 per byte), first value in the high bits."""
+    bits = 8 // per_byte
+    padded = np.zeros(-(-len(values) // per_byte) * per_byte, dtype=np.uint8)
+    padded[: len(values)] = values
+    grouped = padded.reshape(-1, per_byte)
+    shifts = np.arange(per_byte - 1, -1, -1, dtype=np.uint8) * bits
+    return np.bitwise_or.reduce(grouped << shifts, axis=1).astype(np.uint8)
+
+
+def _unpack_table(per_byte: int, symbols: np.ndarray) -> np.ndarray:
+    """The symbols of the values packed in every possible byte, one row of `per_byte` symbols per byte.
+
+    Rows are viewed as a single 16 or 32-bit word, so unpacking is one flat gather.
+    """
+    bits = 8 // per_byte
+    shifts = np.arange(per_byte - 1, -1, -1, dtype=np.uint8) * bits
+    values = (np.arange(256, dtype=np.uint8)[:, None] >> shifts) & np.uint8((1 << bits) - 1)
+    padded = np.zeros(1 << bits, dtype=np.uint8)
+    padded[: len(symbols)] = symbols
+    return np.ascontiguousarray(padded[values]).view(np.uint16 if per_byte == 2 else np.uint32).reshape(-1)
+
+
+def _unpack(packed: np.ndarray, table: np.ndarray, n: int) -> np.ndarray:
+    return table[packed].view(np.uint8)[:n]
+
+
+_BASES = _unpack_table(4, np.frombuffer(b"ACGT", dtype=np.uint8))
+
+
+def _mate_names(names: typing.Sequence[bytes]) -> typing.List[bytes]:
+    """The R2 names the R1 names imply: `x/1` becomes `x/2`, other names are shared."""
+    return [name[:-1] + b"2" if name.endswith(b"/1") else name for name in names]
+
+
+class Chunk(typing.NamedTuple):
+    names: typing.List[bytes]
+    sequences: bytes
+    qualities: bytes
+    lengths: np.ndarray
+
+
+def _encode_end(chunk: Chunk, to_bin: np.ndarray, level: int, names: bool) -> typing.List[bytes]:
+    codes = encode(chunk.sequences)
+    n_positions = np.flatnonzero(codes == N_CODE).astype(np.uint32)
+    codes[n_positions] = 0
+    bins = to_bin[np.frombuffer(chunk.qualities, dtype=np.uint8)]
+    return [
+        zlib.compress(b"\n".join(chunk.names), level) if names else b"",
+        zlib.compress(chunk.lengths.astype(np.uint32).tobytes(), level),
+        zlib.compress(_pack(codes, 4).tobytes(), level),
+        zlib.compress(n_positions.tobytes(), level),
+        zlib.compress(_pack(bins, 2).tobytes(), level),
+    ]
+
+
+def _decode_end(sections: typing.Sequence[bytes], qualities: np.ndarray) -> Chunk:
+    lengths = np.frombuffer(zlib.decompress(sections[1]), dtype=np.uint32)
+    total = int(lengths.sum())
+    bases = _unpack(np.frombuffer(zlib.decompress(sections[2]), dtype=np.uint8), _BASES, total).copy()
+    bases[np.frombuffer(zlib.decompress(sections[3]), dtype=np.uint32)] = ord("N")
+    quals = _unpack(np.frombuffer(zlib.decompress(sections[4]), dtype=np.uint8), qualities, total)
+    names = zlib.decompress(sections[0]).split(b"\n") if sections[0] else []
+    return Chunk(names, bases.tobytes(), quals.tobytes(), lengths)
+
+
+def _read_fastq_chunks(path: typing.Union[str, Path], chunk_size: int) -> typing.Iterator[Chunk]:
+    """Yield chunks of up to `chunk_size` records of a (gzipped) FASTQ file."""
+    with open_maybe_gzip(path) as f:
+        while True:
+            lines = [line.rstrip(b"\r\n") for line in itertools.islice(f, 4 * chunk_size)]
+            if not lines:
+                return
+            if len(lines) % 4 or not all(name.startswith(b"@") for name in lines[0::4]):
+                raise ValueError(f"{path} is not a FASTQ file with four lines per record")
+            sequences = lines[1::4]
+            yield Chunk(
+                [name[1:] for name in lines[0::4]],
+                b"".join(sequences),
+                b"".join(lines[3::4]),
+                np.fromiter(map(len, sequences), dtype=np.uint32, count=len(sequences)),
+            )
+
+
+def pack(
+    fastqs: typing.Sequence[typing.Union[str, Path]],
+    path: typing.Union[str, Path],
+    sample: str,
+    seed: typing.Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    level: int = 6,
+) -> int:
+    """Pack single-end or paired FASTQ files into a store at `path`; returns the number of records."""
+    if len(fastqs) not in (1, 2):
+        raise ValueError("pack takes one FASTQ file, or the R1 and R2 files of a pair")
+    to_bin = _bin_table(QUALITY_BINS)
+    header = {
+        "version": VERSION,
+        "sample": sample,
+        "seed": seed,
+        "ends": len(fastqs),
+        "sources": [Path(f).name for f in fastqs],
+        "quality_bins": QUALITY_BINS,
+    }
+    chunks = []
+    records = 0
+    with open(path, "wb") as out:
+        data = json.dumps(header).encode()
+        out.write(MAGIC + _U32.pack(len(data)) + data)
+        readers = [_read_fastq_chunks(f, chunk_size) for f in fastqs]
+        for ends in itertools.zip_longest(*readers):
+            if any(end is None for end in ends) or len({len(end.names) for end in ends}) > 1:
+                raise ValueError(f"{fastqs[0]} and {fastqs[1]} have different numbers of reads")
+            shared = len(ends) == 2 and _mate_names(ends[0].names) == ends[1].names
+            sections = [
+                s for index, end in enumerate(ends) for s in _encode_end(end, to_bin, level, not (shared and index))
+            ]
+            chunks.append([out.tell(), len(ends[0].names)])
+            out.write(_U32.pack(len(sections)) + b"".join(_U32.pack(len(s)) + s for s in sections))
+            records += len(ends[0].names)
+        footer_offset = out.tell()
+        out.write(json.dumps({"records": records, "chunks": chunks}).encode())
+        out.write(_TRAILER.pack(footer_offset, END_MAGIC))
+    return records
+
+
+_Json = typing.Dict[str, typing.Any]
+
+
+def read_header(path: typing.Union[str, Path]) -> typing.Tuple[_Json, _Json]:
+    """Return the header and footer of a store."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a readsim 2-bit store")
+        (size,) = _U32.unpack(f.read(_U32.size))
+        header = json.loads(f.read(size))
+        f.seek(-_TRAILER.size, 2)
+        end = f.tell()
+        footer_offset, magic = _TRAILER.unpack(f.read(_TRAILER.size))
+        if magic != END_MAGIC:
+            raise ValueError(f"{path} is truncated")
+        f.seek(footer_offset)
+        footer = json.loads(f.read(end - footer_offset))
+    return header, footer
+
+
+def read_chunk(path: typing.Union[str, Path], offset: int, header: _Json) -> typing.List[Chunk]:
+    """Decode the chunk at `offset` into one `Chunk` per end."""
+    qualities = _unpack_table(2, np.array([value + 33 for _, _, value in header["quality_bins"]], dtype=np.uint8))
+    with open(path, "rb") as f:
+        f.seek(offset)
+        (n,) = _U32.unpack(f.read(_U32.size))
+        sections = []
+        for _ in range(n):
+            (size,) = _U32.unpack(f.read(_U32.size))
+            sections.append(f.read(size))
+    step = len(_SECTIONS)
+    ends = [_decode_end(sections[i : i + step], qualities) for i in range(0, len(sections), step)]
+    if len(ends) == 2 and not ends[1].names:
+        ends[1] = ends[1]._replace(names=_mate_names(ends[0].names))
+    return ends
+
+
+def format_fastq(chunk: Chunk) -> bytes:
+    ends = np.zeros(len(chunk.lengths) + 1, dtype=np.int64)
+    np.cumsum(chunk.lengths, out=ends[1:])
+    seq, qual = chunk.sequences, chunk.qualities
+    return b"".join(
+        [
+            b"@%s\n%s\n+\n%s\n" % (name, seq[start:end], qual[start:end])
+            for name, start, end in zip(chunk.names, ends[:-1].tolist(), ends[1:].tolist())
+        ]
+    )
+
+
+def _export_chunk(
+    task: typing.Tuple[str, int, _Json, int],
+) -> typing.List[typing.List[typing.Tuple[bytes, int]]]:
+    path, offset, header, level = task
+    return [compress_blocks(format_fastq(end), level) for end in read_chunk(path, offset, header)]
+
+
+def unpack(
+    path: typing.Union[str, Path],
+    outputs: typing.Sequence[str],
+    threads: int = 1,
+    compresslevel: int = 6,
+) -> int:
+    """Export a store to BGZF-compressed FASTQ, one output per end; returns the number of records."""
+    header, footer = read_header(path)
+    if len(outputs) != header["ends"]:
+        raise ValueError(f"{path} holds {header['ends']} read end(s) but {len(outputs)} output(s) were given")
+    tasks = [(str(path), offset, header, compresslevel) for offset, _ in footer["chunks"]]
+    with contextlib.ExitStack() as stack:
+        writers = [stack.enter_context(BgzfWriter(output)) for output in outputs]
+        if threads <= 1:
+            _write_chunks(map(_export_chunk, tasks), writers)
+        else:
+            with multiprocessing.get_context("fork").Pool(threads) as pool:
+                _write_chunks(pool.imap(_export_chunk, tasks), writers)
+    return footer["records"]
+
+
+def _write_chunks(
+    results: typing.Iterable[typing.List[typing.List[typing.Tuple[bytes, int]]]],
+    writers: typing.Sequence[BgzfWriter],
+) -> None:
+    for blocks in results:
+        for writer, end in zip(writers, blocks):
+            writer.write_blocks(end)
@@ -0,0 +1,147 @@
+"""
+One-time reference preparation and memory-mapped access.
+
+`prepare` inflates a (gzipped) FASTA once into an uncompressed copy with every
+sequence on a single line, plus a samtools-compatible `.fai` index and a
+`.sizes` contig length table. Because each sequence is contiguous on disk,
+`IndexedFasta` can hand out zero-copy views of any contig straight from a
+memory map. Tasks that share the prepared file then share one page-cached copy
+instead of each inflating their own, and references larger than RAM can still
+be read.
+"""
+
+import mmap
+import os
+import typing
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .fasta import open_maybe_gzip
+
+
+@dataclass
+class FaiRecord:
+    name: str
+    length: int
+    offset: int
+    line_bases: int
+    line_width: int
+
+
+def prepare(src: typing.Union[str, Path], prefix: typing.Union[str, Path]) -> typing.List[FaiRecord]:
+    """Write `<prefix>.fa`, `<prefix>.fa.fai` and `<prefix>.sizes` from `src`."""
+    fa_path = Path(f"{prefix}.fa")
+    records: typing.List[FaiRecord] = []
+    with open_maybe_gzip(src) as f_in, open(fa_path, "wb") as f_out:
+        offset = 0
+        name = None
+        length = 0
+        seq_offset = 0
+        for line in f_in:
+            if line.startswith(b">"):
+                if name is not None:
+                    f_out.write(b"\n")
+                    offset += 1
+                    records.append(FaiRecord(name, length, seq_offset, length, length + 1))
+                header = line.rstrip(b"\r\n")
+                name = header[1:].split(None, 1)[0].decode() if header[1:].strip() else ""
+                f_out.write(header + b"\n")
+                offset += len(header) + 1
+                seq_offset = offset
+                length = 0
+            else:
+                seq = line.rstrip()
+                if seq and name is None:
+                    raise ValueError(f"{src} has sequence data before the first FASTA header")
+                f_out.write(seq)
+                offset += len(seq)
+                length += len(seq)
+        if name is not None:
+            f_out.write(b"\n")
+            records.append(FaiRecord(name, length, seq_offset, length, length + 1))
+
+    with open(f"{fa_path}.fai", "w") as fai:
+        for r in records:
+            fai.write(f"{r.name}\t{r.length}\t{r.offset}\t{r.line_bases}\t{r.line_width}\n")
+    with open(f"{prefix}.sizes", "w") as sizes:
+        for r in records:
+            sizes.write(f"{r.name}\t{r.length}\n")
+    return records
+
+
+def read_fai(path: typing.Union[str, Path]) -> typing.List[FaiRecord]:
+    records = []
+    with open(path) as f:
+        for line in f:
+            name, length, offset, line_bases, line_width = line.rstrip("\n").split("\t")[:5]
+            records.append(FaiRecord(name, int(length), int(offset), int(line_bases), int(line_width)))
+    return records
+
+
+def find_fai(path: typing.Union[str, Path]) -> typing.Optional[Path]:
+    """Locate the `.fai` of `path`, also looking next to the file a staged symlink points to.
+
+    Nextflow stages task inputs as symlinks, so the index written by the
+    preparation task is found beside the original file even when it was not
+    staged itself.
+    """
+    for candidate in (Path(path), Path(os.path.realpath(path))):
+        fai = Path(f"{candidate}.fai")
+        if fai.exists():
+            return fai
+    return None
+
+
+class IndexedFasta:
+    """Memory-mapped access to a prepared (single-line, faidx-indexed) FASTA."""
+
+    def __init__(self, path: typing.Union[str, Path]):
+        self.path = Path(path)
+        fai = find_fai(self.path)
+        if fai is None:
+            raise FileNotFoundError(f"No .fai index found for {self.path}")
+        self.records = read_fai(fai)
+        for r in self.records:
+            if r.length and r.line_bases != r.length:
+                raise ValueError(f"{self.path} is not a prepared reference: {r.name} spans several lines")
+        self._file = open(self.path, "rb")
+        size = self.path.stat().st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self._by_name = {r.name: r for r in self.records}
+
+    def __enter__(self) -> "IndexedFasta":
+        return self
+
+    def __exit__(self, *exc: typing.Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def names(self) -> typing.List[str]:
+        return [r.name for r in self.records]
+
+    def fetch(self, name: str, start: int = 0, end: typing.Optional[int] = None) -> np.ndarray:
+        """Zero-copy `uint8` view of the raw bases of `name[start:end]`."""
+        r = self._by_name[name]
+        end = r.length if end is None else min(end, r.length)
+        if self._mmap is None or end <= start:
+            return np.empty(0, dtype=np.uint8)
+        return np.frombuffer(self._mmap, dtype=np.uint8, count=end - start, offset=r.offset + start)
+
+
+def is_prepared(path: typing.Union[str, Path]) -> bool:
+    """Whether `path` has a `.fai` index describing single-line sequences."""
+    fai = find_fai(path)
+    if fai is None:
+        return False
+    records = read_fai(fai)
+    if not all(r.line_bases == r.length for r in records):
+        return False
+    # an index left over from another file with the same name does not count
+    end = records[-1].offset + records[-1].length + 1 if records else 0
+    return Path(path).stat().st_size == end
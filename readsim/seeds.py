@@ -0,0 +1,58 @@
+"""
+Per-shard seed streams for scatter/gather simulation.
+
+A sample's read count can be split over several tasks. Each shard needs its
+own seed that depends only on the sample seed and the shard index, so that a
+given (seed, shards) pair always reproduces the same output and no two shards
+share a random stream. Seeds are taken from a Philox counter-based generator
+keyed by the sample seed, with the shard index as the counter: shard `i` is
+always the `i`-th block of the stream whatever the total number of shards.
+"""
+
+import typing
+
+import numpy as np
+
+# Largest seed accepted by every wrapped tool (wgsim and art use a C `long`,
+# insilicoseq and capsim use 32-bit seeds)
+MAX_TOOL_SEED = 2**31 - 1
+
+
+def shard_seed(seed: int, shard: int) -> int:
+    """Seed for the `shard`-th shard of the sample seeded with `seed`."""
+    bitgen = np.random.Philox(key=seed % 2**64, counter=shard)
+    return int(np.random.Generator(bitgen).integers(1, MAX_TOOL_SEED, endpoint=True))
+
+
+def shard_sizes(total: int, shards: int) -> typing.List[int]:
+    """Split `total` reads into `shards` near-equal parts, larger parts first."""
+    if shards < 1:
+        raise ValueError(f"shards must be at least 1, got {shards}")
+    size, rest = divmod(total, shards)
+    return [size + 1 if i < rest else size for i in range(shards)]
+
+
+def parse_read_count(value: typing.Union[str, int]) -> int:
+    """Parse counts such as `1M` or `250k` (the insilicoseq `--n_reads` syntax)."""
+    text = str(value).strip()
+    multipliers = {"k": 10**3, "m": 10**6, "g": 10**9}
+    suffix = text[-1:].lower()
+    if suffix in multipliers:
+        return int(float(text[:-1]) * multipliers[suffix])
+    return int(text)
+
+
+def shard_table(
+    seed: int,
+    shards: int,
+    counts: typing.Optional[typing.Dict[str, typing.Union[str, int]]] = None,
+) -> typing.List[typing.Dict[str, int]]:
+    """One row per shard with its seed and its share of every named read count."""
+    counts = counts or {}
+    splits = {name: shard_sizes(parse_read_count(total), shards) for name, total in counts.items()}
+    rows = []
+    for shard in range(shards):
+        row = {"shard": shard, "seed": shard_seed(seed, shard)}
+        row.update({name: sizes[shard] for name, sizes in splits.items()})
+        rows.append(row)
+    return rows
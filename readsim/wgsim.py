@@ -0,0 +1,442 @@
+"""
+Vectorized paired-end whole genome simulator.
+
+This engine reproduces the model of `wgsim` (Heng Li): a diploid genome is
+derived from the reference by introducing SNPs and indels, fragments are drawn
+from a normal insert size distribution, and uniform substitution errors are
+added to the reads. Instead of generating one pair at a time it draws whole
+batches of pairs with numpy and spreads the batches over worker processes,
+each batch compressed in the worker into BGZF blocks.
+
+The genome and the reads have separate random streams. The shards of a
+sample each draw their reads from their own seed but pass the sample seed as
+`sample_seed`, so that they all sample one genome, the one an unsharded run
+of the sample would mutate.
+"""
+
+import dataclasses
+import math
+import multiprocessing
+import time
+import typing
+from dataclasses import dataclass
+
+import numpy as np
+
+from .batch import Sample, SampleTiming, batch_report
+from .bgzf import BgzfWriter, compress_blocks
+from .fasta import ALPHABET, COMPLEMENT, N_CODE, read_fasta
+from .qcstats import ReadStats, read_set_name, save_stats
+
+DEFAULT_BATCH_SIZE = 100_000
+
+
+@dataclass
+class WgsimOptions:
+    error_rate: float = 0.02
+    outer_dist: int = 500
+    standard_dev: int = 50
+    n_pairs: int = 1_000_000
+    r1_length: int = 70
+    r2_length: int = 70
+    mutation_rate: float = 0.001
+    indel_fraction: float = 0.15
+    indel_extended: float = 0.3
+    seed: int = 0
+    # seed of the mutated genome when it differs from the read seed, as for the shards of a sample
+    sample_seed: typing.Optional[int] = None
+
+    def genome_seed(self) -> int:
+        return self.seed if self.sample_seed is None else self.sample_seed
+
+
+def quality_char(error_rate: float) -> bytes:
+    """The constant base quality wgsim writes for `error_rate`: its Phred score, or 'I' without errors."""
+    if error_rate <= 0:
+        return b"I"
+    return bytes([int(-10 * math.log10(error_rate) + 0.499) + 33])
+
+
+@dataclass
+class Genome:
+    """Both haplotypes of every usable contig, concatenated into one array."""
+
+    names: typing.List[str]
+    seq: np.ndarray
+    starts: np.ndarray  # (n_contigs, 2) offsets into `seq`
+    lengths: np.ndarray  # (n_contigs, 2) haplotype lengths
+    weights: np.ndarray  # probability of drawing a pair from each contig
+
+
+@dataclass
+class HaplotypeEdits:
+    """Where `mutate` changed one haplotype, in reference coordinates."""
+
+    keep: np.ndarray  # reference bases that are not deleted
+    substituted: np.ndarray  # positions of SNPs
+    inserted_after: np.ndarray  # sorted positions followed by inserted bases
+    inserted_length: np.ndarray
+
+
+def mutate(
+    seq: np.ndarray,
+    rng: np.random.Generator,
+    rate: float,
+    indel_fraction: float,
+    indel_extended: float,
+    edits: typing.Optional[typing.List[HaplotypeEdits]] = None,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Return the two haplotypes of a diploid copy of `seq`.
+
+    If `edits` is given, the changes made to each haplotype are appended to it.
+    """
+    if rate <= 0:
+        return seq, seq
+
+    (candidates,) = np.nonzero(seq != N_CODE)
+    n_mut = rng.binomial(len(candidates), rate)
+    pos = np.sort(rng.choice(candidates, size=n_mut, replace=False))
+
+    is_indel = rng.random(n_mut) < indel_fraction
+    is_insertion = is_indel & (rng.random(n_mut) < 0.5)
+    is_deletion = is_indel & ~is_insertion
+    # one third of mutations are homozygous, the rest land on a random haplotype
+    homozygous = rng.random(n_mut) < 1 / 3
+    het_hap = rng.integers(0, 2, n_mut)
+
+    snp_base = (seq[pos] + rng.integers(1, 4, n_mut)) % 4
+    if indel_extended > 0:
+        indel_len = rng.geometric(1.0 - indel_extended, n_mut)
+    else:
+        indel_len = np.ones(n_mut, dtype=np.int64)
+
+    haplotypes = []
+    for hap in (0, 1):
+        on_hap = homozygous | (het_hap == hap)
+        out = seq.copy()
+
+        snp = on_hap & ~is_indel
+        out[pos[snp]] = snp_base[snp]
+
+        keep = np.ones(len(seq), dtype=bool)
+        dele = on_hap & is_deletion
+        del_len = indel_len[dele]
+        if del_len.size:
+            run = np.arange(del_len.sum()) - np.repeat(np.cumsum(del_len) - del_len, del_len)
+            idx = np.repeat(pos[dele], del_len) + run
+            keep[idx[idx < len(seq)]] = False
+
+        ref_keep = keep
+        ins = on_hap & is_insertion
+        ins_len = indel_len[ins]
+        if ins_len.size:
+            where = np.repeat(pos[ins] + 1, ins_len)
+            bases = rng.integers(0, 4, int(ins_len.sum()), dtype=np.uint8)
+            out = np.insert(out, where, bases)
+            keep = np.insert(keep, where, True)
+
+        if edits is not None:
+            edits.append(HaplotypeEdits(ref_keep, pos[snp], pos[ins], ins_len))
+        haplotypes.append(out[keep])
+
+    return haplotypes[0], haplotypes[1]
+
+
+def min_contig_length(opts: WgsimOptions) -> int:
+    # fragments are never shorter than the longer read, so shorter contigs could never hold one
+    return max(opts.outer_dist + 3 * opts.standard_dev, opts.r1_length, opts.r2_length)
+
+
+def load_reference(fasta: str, opts: WgsimOptions) -> typing.List[typing.Tuple[str, np.ndarray]]:
+    """Read the contigs of `fasta` that are long enough for the insert size and the reads."""
+    min_len = min_contig_length(opts)
+    # same rule as wgsim: contigs too short for the insert size are skipped
+    records = [(name, seq) for name, seq in read_fasta(fasta) if len(seq) >= min_len]
+    if not records:
+        raise ValueError(
+            f"No sequence in {fasta} is longer than outer_dist + 3 * standard_dev and the read lengths ({min_len})"
+        )
+    return records
+
+
+def load_genome(fasta: str, opts: WgsimOptions) -> Genome:
+    """Read the reference and build the mutated diploid genome, or map one built by `readsim haplotypes`."""
+    from .haplotypes import is_haplotypes, load_haplotypes
+
+    if is_haplotypes(fasta):
+        return load_haplotypes(fasta, opts)
+    return build_genome(load_reference(fasta, opts), opts)
+
+
+def build_genome(
+    records: typing.Sequence[typing.Tuple[str, np.ndarray]],
+    opts: WgsimOptions,
+    edits: typing.Optional[typing.List[typing.List[HaplotypeEdits]]] = None,
+) -> Genome:
+    """Build the mutated diploid genome of `opts.genome_seed()` from reference contigs.
+
+    If `edits` is given, the changes to the haplotypes of every contig are appended to it.
+    """
+    rng = np.random.default_rng(np.random.SeedSequence(opts.genome_seed(), spawn_key=(0,)))
+
+    names: typing.List[str] = []
+    parts: typing.List[np.ndarray] = []
+    starts: typing.List[typing.Tuple[int, int]] = []
+    lengths: typing.List[typing.Tuple[int, int]] = []
+    ref_lengths: typing.List[int] = []
+    offset = 0
+    for name, seq in records:
+        contig_edits: typing.Optional[typing.List[HaplotypeEdits]] = None if edits is None else []
+        hap0, hap1 = mutate(seq, rng, opts.mutation_rate, opts.indel_fraction, opts.indel_extended, contig_edits)
+        if edits is not None:
+            edits.append(contig_edits)
+        if hap1 is hap0:
+            parts.append(hap0)
+            starts.append((offset, offset))
+            offset += len(hap0)
+        else:
+            parts.extend((hap0, hap1))
+            starts.append((offset, offset + len(hap0)))
+            offset += len(hap0) + len(hap1)
+        names.append(name)
+        lengths.append((len(hap0), len(hap1)))
+        ref_lengths.append(len(seq))
+
+    weights = np.asarray(ref_lengths, dtype=np.float64)
+    return Genome(
+        names=names,
+        seq=np.concatenate(parts),
+        starts=np.asarray(starts, dtype=np.int64),
+        lengths=np.asarray(lengths, dtype=np.int64),
+        weights=weights / weights.sum(),
+    )
+
+
+def _add_errors(reads: np.ndarray, rng: np.random.Generator, rate: float) -> np.ndarray:
+    """Substitute bases in place with probability `rate`; return per-read error counts."""
+    err = (rng.random(reads.shape) < rate) & (reads != N_CODE)
+    reads[err] = (reads[err] + rng.integers(1, 4, int(err.sum()), dtype=np.uint8)) % 4
+    return err.sum(axis=1)
+
+
+def _extract(genome: Genome, start: np.ndarray, length: int, reverse: np.ndarray) -> np.ndarray:
+    reads = genome.seq[start[:, None] + np.arange(length)]
+    if reverse.any():
+        reads[reverse] = COMPLEMENT[reads[reverse]][:, ::-1]
+    return reads
+
+
+def simulate_batch(
+    genome: Genome,
+    opts: WgsimOptions,
+    rng: np.random.Generator,
+    n: int,
+    first_id: int,
+    stats: typing.Optional[typing.Tuple[ReadStats, ReadStats]] = None,
+) -> typing.Tuple[bytes, bytes]:
+    """Simulate `n` read pairs and return them as two uncompressed FASTQ blobs.
+
+    When `stats` is given, the reads are also added to those R1 and R2 stats.
+    """
+    l1, l2 = opts.r1_length, opts.r2_length
+    max_len = max(l1, l2)
+
+    contig = rng.choice(len(genome.names), size=n, p=genome.weights)
+    hap = rng.integers(0, 2, n)
+    hap_len = genome.lengths[contig, hap]
+
+    frag = np.empty(n, dtype=np.int64)
+    todo = np.arange(n)
+    while todo.size:
+        draw = np.rint(rng.normal(opts.outer_dist, opts.standard_dev, todo.size)).astype(np.int64)
+        draw = np.maximum(draw, max_len)
+        frag[todo] = draw
+        todo = todo[draw > hap_len[todo]]
+
+    pos = (rng.random(n) * (hap_len - frag + 1)).astype(np.int64)
+    base = genome.starts[contig, hap] + pos
+    flip = rng.random(n) < 0.5
+
+    # read 1 comes from the left end unless the pair is flipped, read 2 from the other end
+    r1 = _extract(genome, np.where(flip, base + frag - l1, base), l1, flip)
+    r2 = _extract(genome, np.where(flip, base, base + frag - l2), l2, ~flip)
+    e1 = _add_errors(r1, rng, opts.error_rate)
+    e2 = _add_errors(r2, rng, opts.error_rate)
+    qual = quality_char(opts.error_rate)
+    if stats is not None:
+        stats[0].add(r1, qual[0] - 33)
+        stats[1].add(r2, qual[0] - 33)
+
+    names = genome.names
+    headers = [
+        f"{names[c]}_{p + 1}_{p + f}_{a}:0:0_{b}:0:0_{i:x}"
+        for c, p, f, a, b, i in zip(
+            contig.tolist(), pos.tolist(), frag.tolist(), e1.tolist(), e2.tolist(), range(first_id, first_id + n)
+        )
+    ]
+    return _format_fastq(headers, r1, "/1", qual), _format_fastq(headers, r2, "/2", qual)
+
+
+def _format_fastq(headers: typing.List[str], reads: np.ndarray, suffix: str, quality: bytes) -> bytes:
+    length = reads.shape[1]
+    seqs = ALPHABET[reads].tobytes()
+    qual = quality * length
+    return b"".join(
+        b"@%s%s\n%s\n+\n%s\n" % (h.encode(), suffix.encode(), seqs[i * length : (i + 1) * length], qual)
+        for i, h in enumerate(headers)
+    )
+
+
+def batch_sizes(n_pairs: int, batch_size: int) -> typing.List[int]:
+    full, rest = divmod(n_pairs, batch_size)
+    return [batch_size] * full + ([rest] if rest else [])
+
+
+# Worker state, inherited by forked workers so the genome is shared copy-on-write
+_GENOME: typing.Optional[Genome] = None
+_OPTS: typing.Optional[WgsimOptions] = None
+
+_Blocks = typing.List[typing.Tuple[bytes, int]]
+_BatchResult = typing.Tuple[_Blocks, _Blocks, typing.Optional[typing.Tuple[ReadStats, ReadStats]]]
+
+
+def _run_batch(task: typing.Tuple[int, int, int, int, bool]) -> _BatchResult:
+    index, n, first_id, level, collect_stats = task
+    assert _GENOME is not None and _OPTS is not None
+    rng = np.random.default_rng(np.random.SeedSequence(_OPTS.seed, spawn_key=(1, index)))
+    stats = (ReadStats(), ReadStats()) if collect_stats else None
+    fq1, fq2 = simulate_batch(_GENOME, _OPTS, rng, n, first_id, stats)
+    return compress_blocks(fq1, level), compress_blocks(fq2, level), stats
+
+
+def run(
+    fasta: str,
+    out_r1: str,
+    out_r2: str,
+    opts: WgsimOptions,
+    threads: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    compresslevel: int = 6,
+    stats_path: typing.Optional[str] = None,
+) -> None:
+    """Simulate `opts.n_pairs` pairs from `fasta` into two BGZF-compressed FASTQ files.
+
+    Output depends only on the options, the seed and `batch_size`; the number
+    of threads changes how fast it is produced, not what is produced. A `.gzi`
+    index is written next to each output, and read statistics of both ends
+    are written to `stats_path` if it is set.
+    """
+    simulate(load_genome(fasta, opts), opts, out_r1, out_r2, threads, batch_size, compresslevel, stats_path)
+
+
+def run_samples(
+    fasta: str,
+    samples: typing.Sequence[Sample],
+    opts: WgsimOptions,
+    threads: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    compresslevel: int = 6,
+    suffix: str = ".fq.gz",
+    stats: bool = True,
+) -> typing.Dict[str, typing.Any]:
+    """Simulate several samples from one read of `fasta`; returns the batch report.
+
+    Sample `s` is written to `<s.id>_R1<suffix>` and `<s.id>_R2<suffix>` (and
+    `<s.id>.stats.json`), identical to `run` with `s.seed` and `s.count` pairs.
+    If `fasta` holds haplotypes built by `readsim haplotypes`, every sample is
+    drawn from them; otherwise samples with their own `haplotypes` are drawn
+    from those and the others from the reference mutated with their seed.
+    """
+    from .haplotypes import is_haplotypes, load_haplotypes
+
+    start = time.perf_counter()
+    shared = load_haplotypes(fasta, opts) if is_haplotypes(fasta) else None
+    records = None
+    if shared is None and not all(sample.haplotypes for sample in samples):
+        records = load_reference(fasta, opts)
+    load_seconds = time.perf_counter() - start
+
+    timings = []
+    for sample in samples:
+        start = time.perf_counter()
+        sample_opts = dataclasses.replace(
+            opts, seed=sample.seed, sample_seed=None, n_pairs=sample.count or opts.n_pairs
+        )
+        if shared is not None:
+            genome = shared
+        elif sample.haplotypes:
+            genome = load_haplotypes(sample.haplotypes, sample_opts)
+        else:
+            assert records is not None
+            genome = build_genome(records, sample_opts)
+        simulate(
+            genome,
+            sample_opts,
+            f"{sample.id}_R1{suffix}",
+            f"{sample.id}_R2{suffix}",
+            threads,
+            batch_size,
+            compresslevel,
+            f"{sample.id}.stats.json" if stats else None,
+        )
+        timings.append(SampleTiming(sample.id, 2 * sample_opts.n_pairs, time.perf_counter() - start))
+    return batch_report("wgsim", load_seconds, timings)
+
+
+def simulate(
+    genome: Genome,
+    opts: WgsimOptions,
+    out_r1: str,
+    out_r2: str,
+    threads: int = 1,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    compresslevel: int = 6,
+    stats_path: typing.Optional[str] = None,
+) -> None:
+    """Simulate `opts.n_pairs` pairs from an already built genome; see `run`."""
+    global _GENOME, _OPTS
+    # fragments are redrawn until they fit their haplotype, which never happens if the reads do not fit
+    max_len = max(opts.r1_length, opts.r2_length)
+    short = np.flatnonzero((genome.lengths.min(axis=1) < max_len) & (genome.weights > 0))
+    if short.size:
+        contig = int(short[0])
+        raise ValueError(
+            f"A haplotype of {genome.names[contig]} is {int(genome.lengths[contig].min())} bp long, "
+            f"shorter than the {max_len} bp reads"
+        )
+    _GENOME = genome
+    _OPTS = opts
+
+    tasks = []
+    first_id = 0
+    for index, n in enumerate(batch_sizes(opts.n_pairs, batch_size)):
+        tasks.append((index, n, first_id, compresslevel, stats_path is not None))
+        first_id += n
+
+    stats = (ReadStats(), ReadStats())
+    with BgzfWriter(out_r1) as w1, BgzfWriter(out_r2) as w2:
+        if threads <= 1:
+            _write_all(map(_run_batch, tasks), w1, w2, stats)
+        else:
+            # workers are forked after the genome is set, so they share it copy-on-write
+            with multiprocessing.get_context("fork").Pool(threads) as pool:
+                _write_all(pool.imap(_run_batch, tasks), w1, w2, stats)
+    if stats_path is not None:
+        save_stats(stats_path, {read_set_name(out_r1): stats[0], read_set_name(out_r2): stats[1]})
+
+    _GENOME = None
+    _OPTS = None
+
+
+def _write_all(
+    results: typing.Iterable[_BatchResult],
+    w1: BgzfWriter,
+    w2: BgzfWriter,
+    stats: typing.Tuple[ReadStats, ReadStats],
+) -> None:
+    for blocks1, blocks2, batch_stats in results:
+        w1.write_blocks(blocks1)
+        w2.write_blocks(blocks2)
+        if batch_stats is not None:
+            stats[0].merge(batch_stats[0])
+            stats[1].merge(batch_stats[1])
@@ -4,6 +4,7 @@
 
 include { CRABS_DBIMPORT    } from '../../modules/local/crabs/dbimport/main'
 include { CRABS_INSILICOPCR } from '../../modules/local/crabs/insilicopcr/main'
+include { READSIM_ISPCR     } from '../../modules/local/readsim/ispcr/main'
 include { ART_ILLUMINA      } from '../../modules/nf-core/art/illumina/main'
 
 workflow AMPLICON_WORKFLOW {
@@ -16,32 +17,44 @@ workflow AMPLICON_WORKFLOW {
     ch_ref_fasta = Channel.empty()
     ch_versions = Channel.empty()
 
-    //
-    // MODULE: Run Crabs db_import
-    //
     ch_meta_fasta = ch_fasta
         .map {
             fasta ->
                 return [ [id:"amplicon"], fasta ]
         }
 
-    CRABS_DBIMPORT (
-        ch_meta_fasta
-    )
-    ch_versions  = ch_versions.mix(CRABS_DBIMPORT.out.versions)
-    ch_ref_fasta = CRABS_DBIMPORT.out.fasta
+    if ( params.amplicon_engine == 'readsim' ) {
+        //
+        // MODULE: Extract amplicons straight from the reference
+        //
+        READSIM_ISPCR (
+            ch_meta_fasta
+        )
+        ch_versions  = ch_versions.mix(READSIM_ISPCR.out.versions)
+        ch_amplicons = READSIM_ISPCR.out.fasta
+    } else {
+        //
+        // MODULE: Run Crabs db_import
+        //
+        CRABS_DBIMPORT (
+            ch_meta_fasta
+        )
+        ch_versions  = ch_versions.mix(CRABS_DBIMPORT.out.versions)
+        ch_ref_fasta = CRABS_DBIMPORT.out.fasta
 
-    //
-    // MODULE: Run Crabs insilico_pcr
-    //
-    CRABS_INSILICOPCR (
-        ch_ref_fasta
-    )
-    ch_versions = ch_versions.mix(CRABS_INSILICOPCR.out.versions)
+        //
+        // MODULE: Run Crabs insilico_pcr
+        //
+        CRABS_INSILICOPCR (
+            ch_ref_fasta
+        )
+        ch_versions  = ch_versions.mix(CRABS_INSILICOPCR.out.versions)
+        ch_amplicons = CRABS_INSILICOPCR.out.fasta
+    }
 
     // Now that we have processed our fasta file,
     // we need to map it to our sample data
-    ch_art_input = CRABS_INSILICOPCR.out.fasta
+    ch_art_input = ch_amplicons
         .combine ( ch_input )
         .map {
             it = [ it[2], it[1] ]
@@ -7,33 +7,45 @@ include { BOWTIE2_BUILD                   } from '../../modules/nf-core/bowtie2/
 include { BOWTIE2_ALIGN                   } from '../../modules/nf-core/bowtie2/align/main'
 include { SAMTOOLS_INDEX                  } from '../../modules/nf-core/samtools/index/main'
 include { JAPSA_CAPSIM                    } from '../../modules/local/japsa/capsim/main'
+include { READSIM_CAPSIM                  } from '../../modules/local/readsim/capsim/main'
+include { READSIM_PROBEMAP                } from '../../modules/local/readsim/probemap/main'
 include { UNZIP                           } from '../../modules/local/unzip/main'
+include { EXTRACT_ZIP                     } from '../../modules/local/custom/extract_zip/main'
 include { UNCOMPRESS_FASTA                } from '../../modules/local/uncompress_fasta/main'
 
 workflow TARGET_CAPTURE_WORKFLOW {
     take:
-    ch_fasta  // file: /path/to/reference.fasta
-    ch_input  // channel: [ meta ]
-    ch_probes // file: /path/to/probes.fasta
+    ch_fasta        // file: /path/to/reference.fasta
+    ch_fasta_sha256 // val: SHA-256 of the reference, with --bowtie2_index_cache
+    ch_input        // channel: [ meta ]
+    ch_probes       // file: /path/to/probes.fasta
 
     main:
-    ch_versions = Channel.empty()
+    ch_versions   = Channel.empty()
+    ch_read_stats = Channel.empty()
 
     //
     // MODULE: Unzip probes file if user is downloading a reference probe file
     //
     if ( !params.probe_file ) {
         ch_zip_file = Channel.fromPath(params.probe_ref_db[params.probe_ref_name]["url"])
-        ch_probes = UNZIP (
-            ch_zip_file
-        ).file
+        if ( params.local_bookkeeping ) {
+            ch_probes = EXTRACT_ZIP (
+                ch_zip_file
+            ).file
+        } else {
+            ch_probes = UNZIP (
+                ch_zip_file
+            ).file
+        }
     } else {
         //
         // MODULE: Run bedtools_getfasta if the probe file is a bed file
         //
         if ( params.probe_file.endsWith('.bed') ) {
-            // Bedtools_getfasta requires an uncompressed fasta file
-            ch_uncompressed_fasta = UNCOMPRESS_FASTA (
+            // Bedtools_getfasta requires an uncompressed fasta file,
+            // which the prepared reference already is
+            ch_uncompressed_fasta = params.prepare_reference ? ch_fasta : UNCOMPRESS_FASTA (
                 ch_fasta
             ).fasta
 
@@ -61,60 +73,122 @@ workflow TARGET_CAPTURE_WORKFLOW {
                 return [ [id:"target_capture"], fasta ]
         }
 
-    //
-    // MODULE: Create Bowtie index
-    //
-    BOWTIE2_BUILD (
-        ch_meta_fasta
-    )
-    ch_versions = ch_versions.mix(BOWTIE2_BUILD.out.versions.first())
+    ch_index_cache = Channel.empty()
 
-    //
-    // MODULE: Align probes to genome
-    //
-    BOWTIE2_ALIGN (
-        ch_probes,
-        BOWTIE2_BUILD.out.index,
-        false,
-        false
-    )
-    ch_versions = ch_versions.mix(BOWTIE2_ALIGN.out.versions.first())
+    if ( params.target_capture_engine == 'readsim' ) {
+        //
+        // MODULE: Place the probes on the reference with a minimizer index of the probes,
+        // instead of building a Bowtie2 index of the whole reference
+        //
+        READSIM_PROBEMAP (
+            ch_probes,
+            ch_meta_fasta
+        )
+        ch_versions = ch_versions.mix(READSIM_PROBEMAP.out.versions.first())
 
-    //
-    // MODULES: Get SAM index
-    //
-    SAMTOOLS_INDEX (
-        BOWTIE2_ALIGN.out.aligned
-    )
-    ch_versions = ch_versions.mix(SAMTOOLS_INDEX.out.versions.first())
-
-    // Now that we have our fasta file + BAM file + index,
-    // we need to map them to our sample data
-    ch_capsim_input = ch_meta_fasta.map { it = it[1] }
-        .combine ( BOWTIE2_ALIGN.out.aligned.map { it = it[1] } )
-        .combine ( SAMTOOLS_INDEX.out.bai.map { it = it[1] } )
-        .combine ( ch_input )
-        .map {
-            fasta, bam, index, meta -> [ meta, fasta, bam, index ]
-        }
+        //
+        // MODULE: Simulate target capture reads from the probe placements on all task CPUs
+        //
+        ch_capsim_input = ch_meta_fasta.map { it = it[1] }
+            .combine ( READSIM_PROBEMAP.out.bed.map { it = it[1] } )
+            .combine ( ch_input )
+            .map {
+                fasta, bed, meta -> [ meta, fasta, bed ]
+            }
 
-    //
-    // MODULE: Simulate target capture reads
-    //
-    ch_reads = Channel.empty()
-    JAPSA_CAPSIM (
-        ch_capsim_input
-    )
-    ch_versions = ch_versions.mix(JAPSA_CAPSIM.out.versions.first())
-    ch_reads    = JAPSA_CAPSIM.out.fastq
+        READSIM_CAPSIM (
+            ch_capsim_input
+        )
+        ch_versions   = ch_versions.mix(READSIM_CAPSIM.out.versions.first())
+        ch_capsim     = READSIM_CAPSIM.out.fastq
+        ch_read_stats = READSIM_CAPSIM.out.stats.map { meta, stats -> stats }
+    } else {
+        //
+        // Look up a previously built index for this reference in the index cache
+        //
+        ch_index_lookup = ch_meta_fasta
+            .combine(params.bowtie2_index_cache ? ch_fasta_sha256 : Channel.of(''))
+            .map {
+                meta, fasta, key ->
+                    if ( !key ) {
+                        return [ meta, fasta, null ]
+                    }
+                    def cached = file("${params.bowtie2_index_cache}/${key}/bowtie2")
+                    def hit    = cached.exists() && cached.list().size() > 0
+                    log.info "Bowtie2 index cache ${hit ? 'hit' : 'miss'} for ${fasta.name} (${key})"
+                    return [ meta + [ index_key: key, index_cache: hit ? 'hit' : 'miss' ], fasta, hit ? cached : null ]
+            }
+            .branch {
+                meta, fasta, cached ->
+                    hit:  cached
+                        return [ meta, cached ]
+                    miss: true
+                        return [ meta, fasta ]
+            }
+
+        //
+        // MODULE: Create Bowtie index
+        //
+        BOWTIE2_BUILD (
+            ch_index_lookup.miss
+        )
+        ch_versions = ch_versions.mix(BOWTIE2_BUILD.out.versions.first())
+        ch_index    = ch_index_lookup.hit.mix(BOWTIE2_BUILD.out.index)
+
+        ch_index_cache = ch_index
+            .filter { meta, index -> meta.index_key }
+            .map { meta, index -> "${meta.index_key}\t${meta.index_cache}" }
+
+        //
+        // MODULE: Align probes to genome
+        //
+        BOWTIE2_ALIGN (
+            ch_probes,
+            ch_index,
+            false,
+            false
+        )
+        ch_versions = ch_versions.mix(BOWTIE2_ALIGN.out.versions.first())
+
+        //
+        // MODULES: Get SAM index
+        //
+        SAMTOOLS_INDEX (
+            BOWTIE2_ALIGN.out.aligned
+        )
+        ch_versions = ch_versions.mix(SAMTOOLS_INDEX.out.versions.first())
+
+        // Now that we have our fasta file + BAM file + index,
+        // we need to map them to our sample data
+        ch_capsim_input = ch_meta_fasta.map { it = it[1] }
+            .combine ( BOWTIE2_ALIGN.out.aligned.map { it = it[1] } )
+            .combine ( SAMTOOLS_INDEX.out.bai.map { it = it[1] } )
+            .combine ( ch_input )
+            .map {
+                fasta, bam, index, meta -> [ meta, fasta, bam, index ]
+            }
+
+        //
+        // MODULE: Simulate target capture reads
+        //
+        JAPSA_CAPSIM (
+            ch_capsim_input
+        )
+        ch_versions = ch_versions.mix(JAPSA_CAPSIM.out.versions.first())
+        ch_capsim   = JAPSA_CAPSIM.out.fastq
+    }
+
+    ch_reads = ch_capsim
         .map {
             meta, fastqs ->
-                meta.outdir   = "capsim"
+                meta.outdir   = params.target_capture_engine == 'readsim' ? "readsim_capsim" : "capsim"
                 meta.datatype = "target_capture"
                 return [ meta, fastqs ]
         }
 
     emit:
-    reads    = ch_reads    // channel: [ meta, fastq ]
-    versions = ch_versions // channel: [ versions.yml ]
+    reads       = ch_reads       // channel: [ meta, fastq ]
+    index_cache = ch_index_cache // channel: [ "sha256\thit|miss" ]
+    stats       = ch_read_stats  // channel: [ stats.json ]
+    versions    = ch_versions    // channel: [ versions.yml ]
 }
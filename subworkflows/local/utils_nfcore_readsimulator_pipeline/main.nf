@@ -140,6 +140,9 @@ workflow PIPELINE_COMPLETION {
 //
 def validateInputParameters() {
     genomeExistsError()
+    batchSamplesError()
+    shardsEngineError()
+    haplotypesEngineError()
 }
 
 //
@@ -148,6 +151,7 @@ def validateInputParameters() {
 def validateInputSamplesheet(input) {
     return [ input[0] ]
 }
+
 //
 // Get attribute from genome config file e.g. fasta
 //
@@ -174,6 +178,50 @@ def genomeExistsError() {
     }
 }
 
+//
+// Exit pipeline if samples are both batched and sharded
+//
+def batchSamplesError() {
+    if (params.batch_samples && params.simulation_shards > 1) {
+        def error_string = "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~\n" +
+            "  '--batch_samples' simulates every sample in one task and cannot be\n" +
+            "  combined with '--simulation_shards ${params.simulation_shards}', which splits them over tasks.\n" +
+            "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
+        error(error_string)
+    }
+}
+
+//
+// Exit pipeline if samples are sharded for a tool that draws the genome or abundances from the shard seed
+//
+def shardsEngineError() {
+    def engines = [
+        params.wholegenome && params.wholegenome_engine != 'readsim' ? params.wholegenome_engine : null,
+        params.metagenome && params.metagenome_engine != 'readsim' ? params.metagenome_engine : null
+    ].findAll()
+    if (params.simulation_shards > 1 && engines) {
+        def error_string = "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~\n" +
+            "  '--simulation_shards ${params.simulation_shards}' needs the readsim engine for whole genome and\n" +
+            "  metagenome simulation: ${engines.join(' and ')} would draw a different genome or abundance\n" +
+            "  profile in every shard of a sample.\n" +
+            "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
+        error(error_string)
+    }
+}
+
+//
+// Exit pipeline if prebuilt haplotypes are requested from wgsim, which mutates the reference itself
+//
+def haplotypesEngineError() {
+    if (params.wholegenome && params.wholegenome_haplotypes && params.wholegenome_engine != 'readsim') {
+        def error_string = "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~\n" +
+            "  '--wholegenome_haplotypes' needs '--wholegenome_engine readsim';\n" +
+            "  '${params.wholegenome_engine}' mutates the reference itself in every task.\n" +
+            "~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~"
+        error(error_string)
+    }
+}
+
 //
 // Generate methods description for MultiQC
 //
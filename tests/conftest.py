@@ -0,0 +1,52 @@
+import gzip
+import typing
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Contig lengths of the synthetic reference; all are long enough for the default wgsim insert size
+CONTIGS = {"chr1": 6000, "chr2": 4000, "plasmid": 2500}
+
+
+def random_bases(rng: np.random.Generator, n: int) -> bytes:
+    return np.frombuffer(b"ACGT", dtype=np.uint8)[rng.integers(0, 4, n)].tobytes()
+
+
+def write_fasta(path: Path, records: typing.Iterable[typing.Tuple[str, bytes]], width: int = 60) -> Path:
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "wb") as f:
+        for name, seq in records:
+            f.write(b">" + name.encode() + b" synthetic\n")
+            for i in range(0, len(seq), width):
+                f.write(seq[i : i + width] + b"\n")
+    return path
+
+
+def read_fastq(path: typing.Union[str, Path]) -> typing.List[typing.Tuple[bytes, bytes, bytes]]:
+    """`(name, sequence, quality)` of every record of a (gzipped) FASTQ file."""
+    with gzip.open(path, "rb") as f:
+        lines = f.read().splitlines()
+    return [(lines[i][1:], lines[i + 1], lines[i + 3]) for i in range(0, len(lines), 4)]
+
+
+@pytest.fixture
+def sequences() -> typing.Dict[str, bytes]:
+    rng = np.random.default_rng(7)
+    records = {name: random_bases(rng, length) for name, length in CONTIGS.items()}
+    # a run of Ns, as found in assembly gaps
+    records["chr1"] = records["chr1"][:3000] + b"N" * 50 + records["chr1"][3050:]
+    return records
+
+
+@pytest.fixture
+def reference(tmp_path: Path, sequences: typing.Dict[str, bytes]) -> Path:
+    return write_fasta(tmp_path / "reference.fa.gz", sequences.items())
+
+
+@pytest.fixture
+def prepared_reference(tmp_path: Path, reference: Path) -> Path:
+    from readsim.reference import prepare
+
+    prepare(reference, tmp_path / "prepared")
+    return tmp_path / "prepared.fa"
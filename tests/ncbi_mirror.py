@@ -0,0 +1,111 @@
+import http.server
+import re
+import threading
+import typing
+import urllib.parse
+from pathlib import Path
+
+from readsim.benchmark import ncbi_layout
+
+_RANGE = re.compile(r"bytes=(\d+)-$")
+
+
+class LocalNcbiMirror:
+    """Stand-in for the NCBI FTP site serving files under a local directory.
+
+    Supports `Range` requests as the NCBI servers do. Set `drop_transfers` to
+    cut that many file transfers off halfway through the body, and
+    `corrupt_transfers` to flip a byte in that many, to exercise resume and
+    checksum handling. `add_genomes` lays out a summary and assembly
+    directories in the NCBI layout.
+
+        with LocalNcbiMirror(root, drop_transfers=2) as mirror:
+            download("ref.fa.gz", accessions=["GCF_000001.1"], base_url=mirror.url)
+    """
+
+    def __init__(self, root: Path, drop_transfers: int = 0, corrupt_transfers: int = 0):
+        self.root = Path(root)
+        self.drop_transfers = drop_transfers
+        self.corrupt_transfers = corrupt_transfers
+        self.requests: typing.Dict[str, int] = {"get": 0, "range": 0}
+        self._lock = threading.Lock()
+        mirror = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: typing.Any) -> None:
+                pass
+
+            def _reply(self, status: int, body: bytes = b"", headers: typing.Optional[dict] = None) -> None:
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                path = mirror.root / urllib.parse.unquote(urllib.parse.urlsplit(self.path).path).lstrip("/")
+                if not path.is_file() or mirror.root.resolve() not in path.resolve().parents:
+                    self._reply(404)
+                    return
+                data = path.read_bytes()
+                match = _RANGE.match(self.headers.get("Range", ""))
+                with mirror._lock:
+                    mirror.requests["get"] += 1
+                    mirror.requests["range"] += bool(match)
+                    drop = corrupt = False
+                    if len(data) > 1 and not path.name.endswith(".txt"):
+                        if mirror.drop_transfers > 0:
+                            mirror.drop_transfers -= 1
+                            drop = True
+                        elif mirror.corrupt_transfers > 0:
+                            mirror.corrupt_transfers -= 1
+                            corrupt = True
+                start = int(match.group(1)) if match else 0
+                if start >= len(data) and match:
+                    self._reply(416, headers={"Content-Range": f"bytes */{len(data)}"})
+                    return
+                body = data[start:]
+                if corrupt:
+                    body = bytes([body[0] ^ 0xFF]) + body[1:]
+                status, headers = 200, {}
+                if match:
+                    status, headers = 206, {"Content-Range": f"bytes {start}-{len(data) - 1}/{len(data)}"}
+                if not drop:
+                    self._reply(status, body, headers)
+                    return
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body[: len(body) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def add_genomes(
+        self,
+        genomes: typing.Sequence[typing.Tuple[str, str, str, bytes]],
+        section: str = "refseq",
+        group: str = "bacteria",
+    ) -> None:
+        """Publish `(accession, taxid, organism, fasta)` genomes and the summaries listing them."""
+        ncbi_layout(self.root, genomes, section, group)
+
+    def __enter__(self) -> "LocalNcbiMirror":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: typing.Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
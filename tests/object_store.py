@@ -0,0 +1,126 @@
+import hashlib
+import http.server
+import json
+import threading
+import typing
+import uuid
+from pathlib import Path
+
+
+class LocalObjectStore:
+    """Stand-in for the upload API that stores objects under a local directory.
+
+    `latch://` and other scheme prefixes are dropped from object paths. Set
+    `fail_puts` to make that many part uploads fail with a 503 first.
+
+        with LocalObjectStore(root) as store:
+            publish_tree(src, "latch:///results", UploadClient(store.url, {}))
+
+    `connections` counts the TCP connections the clients opened.
+    """
+
+    def __init__(self, root: Path, fail_puts: int = 0):
+        self.root = Path(root)
+        self.fail_puts = fail_puts
+        self.requests: typing.Dict[str, int] = {"start": 0, "put": 0, "end": 0}
+        self.connections = 0
+        self._uploads: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+        self._lock = threading.Lock()
+        store = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                with store._lock:
+                    store.connections += 1
+
+            def log_message(self, *args: typing.Any) -> None:
+                pass
+
+            def _reply(self, status: int, body: bytes = b"", etag: typing.Optional[str] = None) -> None:
+                self.send_response(status)
+                if etag is not None:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self) -> bytes:
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_POST(self) -> None:
+                request = json.loads(self._body())
+                if self.path == "/ldata/start-upload":
+                    self._reply(200, json.dumps({"data": store._start(request)}).encode())
+                elif self.path == "/ldata/end-upload":
+                    try:
+                        store._end(request)
+                    except (KeyError, ValueError) as e:
+                        self._reply(400, str(e).encode())
+                        return
+                    self._reply(200, b"{}")
+                else:
+                    self._reply(404)
+
+            def do_PUT(self) -> None:
+                data = self._body()
+                _, _, upload_id, n = self.path.split("/")
+                with store._lock:
+                    store.requests["put"] += 1
+                    if store.fail_puts > 0:
+                        store.fail_puts -= 1
+                        self._reply(503)
+                        return
+                    store._uploads[upload_id]["parts"][int(n)] = data
+                self._reply(200, etag=f'"{hashlib.md5(data).hexdigest()}"')
+
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def object_path(self, path: str) -> Path:
+        return self.root / path.split("://", 1)[-1].lstrip("/")
+
+    def _start(self, request: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+        with self._lock:
+            self.requests["start"] += 1
+        if request["part_count"] == 0:
+            target = self.object_path(request["path"])
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(b"")
+            return {"version_id": uuid.uuid4().hex}
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {"path": request["path"], "parts": {}}
+        urls = [f"{self.url}/parts/{upload_id}/{n}" for n in range(request["part_count"])]
+        return {"upload_id": upload_id, "urls": urls}
+
+    def _end(self, request: typing.Dict[str, typing.Any]) -> None:
+        with self._lock:
+            self.requests["end"] += 1
+            upload = self._uploads[request["upload_id"]]
+        parts = []
+        for part in sorted(request["parts"], key=lambda p: p["PartNumber"]):
+            data = upload["parts"][part["PartNumber"] - 1]
+            if part["ETag"] != f'"{hashlib.md5(data).hexdigest()}"':
+                raise ValueError(f"ETag mismatch in part {part['PartNumber']} of {upload['path']}")
+            parts.append(data)
+        target = self.object_path(upload["path"])
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(b"".join(parts))
+        with self._lock:
+            self._uploads.pop(request["upload_id"], None)
+
+    def __enter__(self) -> "LocalObjectStore":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: typing.Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,99 @@
+import gzip
+import io
+import struct
+
+import numpy as np
+import pytest
+
+from readsim.bgzf import BLOCK_SIZE, EOF_BLOCK, BgzfWriter, bgzip_stream, compress_blocks, concatenate, read_gzi
+
+
+@pytest.fixture
+def payload() -> bytes:
+    # compressible enough to be realistic, large enough for several blocks
+    rng = np.random.default_rng(1)
+    return np.frombuffer(b"ACGT\n", dtype=np.uint8)[rng.integers(0, 5, 5 * BLOCK_SIZE + 123)].tobytes()
+
+
+def block_starts(data: bytes):
+    """`(compressed, uncompressed)` offsets of every BGZF block, read from the block headers."""
+    starts = []
+    coffset = uoffset = 0
+    while coffset < len(data):
+        assert data[coffset : coffset + 4] == b"\x1f\x8b\x08\x04"
+        (bsize,) = struct.unpack_from("<H", data, coffset + 16)
+        (isize,) = struct.unpack_from("<I", data, coffset + bsize + 1 - 4)
+        starts.append((coffset, uoffset))
+        coffset += bsize + 1
+        uoffset += isize
+    return starts
+
+
+@pytest.mark.parametrize("threads", [1, 3])
+def test_round_trip(tmp_path, payload, threads):
+    path = str(tmp_path / "out.gz")
+    with BgzfWriter(path, threads=threads) as writer:
+        for i in range(0, len(payload), 10_000):
+            writer.write(payload[i : i + 10_000])
+    data = open(path, "rb").read()
+    assert gzip.decompress(data) == payload
+    assert data.endswith(EOF_BLOCK)
+
+
+def test_output_does_not_depend_on_threads(tmp_path, payload):
+    outputs = []
+    for threads in (1, 4):
+        path = str(tmp_path / f"out{threads}.gz")
+        bgzip_stream(io.BytesIO(payload), path, threads=threads, chunk_size=7777)
+        outputs.append((open(path, "rb").read(), open(path + ".gzi", "rb").read()))
+    assert outputs[0] == outputs[1]
+
+
+def test_gzi_lists_every_block_but_the_first(tmp_path, payload):
+    path = str(tmp_path / "out.gz")
+    bgzip_stream(io.BytesIO(payload), path)
+    starts = block_starts(open(path, "rb").read())
+    # the last block is the empty EOF marker, which bgzip does not index
+    assert read_gzi(path + ".gzi") == starts[1:-1]
+    assert [u for _, u in starts[:-1]] == list(range(0, len(payload), BLOCK_SIZE))
+
+
+def test_precompressed_blocks_are_indexed(tmp_path, payload):
+    path = str(tmp_path / "out.gz")
+    with BgzfWriter(path) as writer:
+        writer.write(b"header\n")
+        writer.write_blocks(compress_blocks(payload))
+    data = open(path, "rb").read()
+    assert gzip.decompress(data) == b"header\n" + payload
+    assert read_gzi(path + ".gzi") == block_starts(data)[1:-1]
+
+
+def test_no_index(tmp_path):
+    path = tmp_path / "out.gz"
+    with BgzfWriter(str(path), index=False) as writer:
+        writer.write(b"ACGT\n")
+    assert gzip.decompress(path.read_bytes()) == b"ACGT\n"
+    assert not (tmp_path / "out.gz.gzi").exists()
+
+
+def test_concatenated_shards_are_indexed(tmp_path, payload):
+    shards = []
+    for i, part in enumerate((payload[:100_000], payload[100_000:], b"")):
+        shards.append(str(tmp_path / f"shard{i}.gz"))
+        bgzip_stream(io.BytesIO(part), shards[-1])
+    path = str(tmp_path / "out.gz")
+    assert concatenate(shards, path)
+    data = open(path, "rb").read()
+    assert gzip.decompress(data) == payload
+    # only the EOF marker of the last shard is kept
+    assert data.count(EOF_BLOCK) == 1 and data.endswith(EOF_BLOCK)
+    assert read_gzi(path + ".gzi") == block_starts(data)[1:-1]
+
+
+def test_plain_gzip_shards_are_not_indexed(tmp_path, payload):
+    (tmp_path / "shard0.gz").write_bytes(gzip.compress(payload[:1000]))
+    bgzip_stream(io.BytesIO(payload[1000:]), str(tmp_path / "shard1.gz"))
+    path = tmp_path / "out.gz"
+    assert not concatenate([str(tmp_path / "shard0.gz"), str(tmp_path / "shard1.gz")], str(path))
+    assert gzip.decompress(path.read_bytes()) == payload
+    assert not (tmp_path / "out.gz.gzi").exists()
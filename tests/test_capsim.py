@@ -0,0 +1,59 @@
+import dataclasses
+
+import pytest
+from conftest import read_fastq
+
+from readsim.capsim import CaptureOptions, read_probes, run
+
+OPTS = CaptureOptions(num=400, fmedian=300, smedian=400, illen=100, seed=9)
+
+
+@pytest.fixture
+def probe_bed(tmp_path):
+    path = tmp_path / "probes.bed"
+    path.write_text("chr1\t1000\t1120\tp1\nchr1\t1100\t1220\tp2\nplasmid\t500\t620\tp3\n")
+    return path
+
+
+def simulate(tmp_path, reference, probe_bed, opts, name, **kwargs):
+    run(reference, probe_bed, str(tmp_path / name), opts, **kwargs)
+    return [tmp_path / path for path in opts.outputs(name)]
+
+
+def test_probe_intervals_are_merged(probe_bed):
+    probes = read_probes(probe_bed)
+    assert probes.names == ["chr1", "plasmid"]
+    assert list(zip(probes.start.tolist(), probes.end.tolist())) == [(1000, 1220), (500, 620)]
+    assert probes.bases() == 340
+
+
+def test_paired_reads(tmp_path, reference, probe_bed):
+    r1, r2 = simulate(tmp_path, reference, probe_bed, OPTS, "sample", stats_path=str(tmp_path / "stats.json"))
+    reads1, reads2 = read_fastq(r1), read_fastq(r2)
+    assert len(reads1) == len(reads2) == OPTS.num
+    assert max(len(seq) for _, seq, _ in reads1) <= OPTS.illen
+
+
+def test_output_does_not_depend_on_threads(tmp_path, reference, probe_bed):
+    single = simulate(tmp_path, reference, probe_bed, OPTS, "single", batch_size=64)
+    forked = simulate(tmp_path, reference, probe_bed, OPTS, "forked", batch_size=64, threads=3)
+    for a, b in zip(single, forked):
+        assert a.read_bytes() == b.read_bytes()
+
+
+@pytest.mark.parametrize(
+    "changes, outputs",
+    [({"ilmode": "se"}, ["se_1.fastq.gz"]), ({"platform": "pacbio", "pblen": 500}, ["se.fastq.gz"])],
+)
+def test_single_read_modes(tmp_path, reference, probe_bed, changes, outputs):
+    opts = dataclasses.replace(OPTS, **changes)
+    paths = simulate(tmp_path, reference, probe_bed, opts, "se")
+    assert [p.name for p in paths] == outputs
+    assert len(read_fastq(paths[0])) == OPTS.num
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError, match="tmedian and tshape"):
+        CaptureOptions(tmedian=300).validate()
+    with pytest.raises(ValueError, match="Unknown platform"):
+        CaptureOptions(platform="nanopore").validate()
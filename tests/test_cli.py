@@ -0,0 +1,63 @@
+import csv
+import gzip
+import json
+import os
+
+import pytest
+from conftest import read_fastq
+
+from readsim.cli import main
+
+WGSIM = ["-N", "200", "-1", "100", "-2", "100", "-d", "300", "-s", "30", "-t", "1"]
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_wgsim(reference):
+    assert main(["wgsim", *WGSIM, "-S", "40", "--stats", "stats.json", str(reference), "r1.fq.gz", "r2.fq.gz"]) == 0
+    assert len(read_fastq("r1.fq.gz")) == len(read_fastq("r2.fq.gz")) == 200
+    assert json.load(open("stats.json"))["r1"]["reads"] == 200
+
+
+def test_wgsim_batch_matches_wgsim(reference, workdir):
+    (workdir / "samples.tsv").write_text("first\t40\nsecond\t41\t50\n")
+    main(["wgsim-batch", *WGSIM, "--samples", "samples.tsv", str(reference)])
+    main(["wgsim", *WGSIM, "-S", "41", "-N", "50", str(reference), "r1.fq.gz", "r2.fq.gz"])
+    assert (workdir / "second_R1.fq.gz").read_bytes() == (workdir / "r1.fq.gz").read_bytes()
+    report = json.load(open("batch_report.json"))
+    assert [s["reads"] for s in report["samples"]] == [400, 100]
+
+
+def test_metagenome(reference):
+    main(["metagenome", "-n", "100", "--model", "NovaSeq", "-S", "3", "-t", "1", str(reference), "meta"])
+    assert len(read_fastq("meta_R1.fastq.gz")) == 50
+    assert len(open("meta_abundance.txt").read().splitlines()) == 3
+
+
+def test_shard_seeds():
+    main(["shard-seeds", "--seed", "40", "--shards", "3", "--count", "wholegenome=10", "-o", "shards.csv"])
+    rows = list(csv.DictReader(open("shards.csv")))
+    assert [row["wholegenome"] for row in rows] == ["4", "3", "3"]
+    with pytest.raises(SystemExit):
+        main(["shard-seeds", "--seed", "40", "--shards", "3", "--count", "wholegenome"])
+
+
+def test_prepare_reference_and_bgzip(reference, sequences):
+    main(["prepare-reference", str(reference), "prepared"])
+    assert open("prepared.fa.fai").read().split("\n")[0].split("\t")[:2] == ["chr1", str(len(sequences["chr1"]))]
+    main(["bgzip", "-@", "2", "-o", "prepared.fa.gz", "prepared.fa"])
+    assert gzip.open("prepared.fa.gz").read() == open("prepared.fa", "rb").read()
+    main(["concat", "-o", "twice.fa.gz", "prepared.fa.gz", "prepared.fa.gz"])
+    assert gzip.open("twice.fa.gz").read() == open("prepared.fa", "rb").read() * 2
+    assert os.path.exists("twice.fa.gz.gzi")
+
+
+def test_pack_and_unpack(reference):
+    main(["wgsim", *WGSIM, str(reference), "r1.fq.gz", "r2.fq.gz"])
+    main(["pack", "--sample", "s", "-o", "s.rs2", "r1.fq.gz", "r2.fq.gz"])
+    main(["unpack", "-t", "1", "s.rs2", "o1.fq.gz", "o2.fq.gz"])
+    assert [seq for _, seq, _ in read_fastq("o2.fq.gz")] == [seq for _, seq, _ in read_fastq("r2.fq.gz")]
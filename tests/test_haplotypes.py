@@ -0,0 +1,90 @@
+import dataclasses
+import gzip
+
+import pytest
+
+from readsim.batch import Sample
+from readsim.fasta import decode
+from readsim.haplotypes import build, is_haplotypes, load_haplotypes
+from readsim.wgsim import WgsimOptions, run, run_samples
+
+OPTS = WgsimOptions(
+    n_pairs=300,
+    outer_dist=300,
+    standard_dev=30,
+    r1_length=100,
+    r2_length=100,
+    mutation_rate=0.01,
+    indel_fraction=0.3,
+    seed=5,
+)
+
+
+def apply_vcf(reference, records, haplotype):
+    """Apply the records of one haplotype to the reference contig."""
+    parts = []
+    end = 0
+    for pos, ref, alts, genotype in records:
+        assert pos >= end, "records overlap"
+        assert reference[pos : pos + len(ref)] == ref
+        allele = int(genotype.split("|")[haplotype])
+        parts.append(reference[end:pos])
+        parts.append(ref if allele == 0 else alts[allele - 1])
+        end = pos + len(ref)
+    parts.append(reference[end:])
+    return b"".join(parts)
+
+
+def read_vcf(path):
+    records = {}
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            chrom, pos, _, ref, alt, *_, genotype = line.rstrip("\n").split("\t")
+            records.setdefault(chrom, []).append(
+                (int(pos) - 1, ref.encode(), [a.encode() for a in alt.split(",")], genotype)
+            )
+    return records
+
+
+def test_vcf_reproduces_both_haplotypes(tmp_path, reference, sequences):
+    counts = build(str(reference), str(tmp_path / "hap"), OPTS)
+    assert counts["snp"] and counts["indel"]
+    genome = load_haplotypes(tmp_path / "hap.rhap")
+    records = read_vcf(tmp_path / "hap.vcf.gz")
+    assert sum(len(r) for r in records.values()) == counts["het"] + counts["hom"]
+    for contig, name in enumerate(genome.names):
+        for haplotype in (0, 1):
+            start = int(genome.starts[contig, haplotype])
+            length = int(genome.lengths[contig, haplotype])
+            expected = decode(genome.seq[start : start + length])
+            assert apply_vcf(sequences[name], records.get(name, []), haplotype) == expected
+
+
+def test_reads_from_haplotypes_match_reads_from_the_reference(tmp_path, reference):
+    build(str(reference), str(tmp_path / "hap"), OPTS)
+    assert is_haplotypes(tmp_path / "hap.rhap")
+    outputs = []
+    for source in (reference, tmp_path / "hap.rhap"):
+        r1, r2 = tmp_path / f"{source.name}_R1.fq.gz", tmp_path / f"{source.name}_R2.fq.gz"
+        run(str(source), str(r1), str(r2), OPTS, batch_size=100)
+        outputs.append((r1.read_bytes(), r2.read_bytes()))
+    assert outputs[0] == outputs[1]
+
+
+def test_samples_with_their_own_haplotypes(tmp_path, reference, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    build(str(reference), "first", dataclasses.replace(OPTS, seed=40))
+    run_samples(str(reference), [Sample("first", 40, haplotypes="first.rhap"), Sample("second", 41)], OPTS)
+    for sample, seed in (("first", 40), ("second", 41)):
+        opts = dataclasses.replace(OPTS, seed=seed)
+        run(str(reference), f"{sample}.r1.fq.gz", f"{sample}.r2.fq.gz", opts)
+        assert (tmp_path / f"{sample}_R1.fq.gz").read_bytes() == (tmp_path / f"{sample}.r1.fq.gz").read_bytes()
+
+
+def test_haplotypes_built_for_shorter_fragments_are_rejected(tmp_path, reference):
+    build(str(reference), str(tmp_path / "hap"), OPTS)
+    longer = dataclasses.replace(OPTS, r1_length=2000, r2_length=100, outer_dist=2000)
+    with pytest.raises(ValueError, match="rebuild it"):
+        load_haplotypes(tmp_path / "hap.rhap", longer)
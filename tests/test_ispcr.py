@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from conftest import random_bases, write_fasta
+
+from readsim.ispcr import make_primer, max_mismatches, reverse_complement, run
+
+FWD = "GTGYCAGCMGCCGCGGTAA"
+REV = "GGACTACNVGGGTWTCTAAT"
+
+
+@pytest.fixture
+def amplicon_reference(tmp_path):
+    rng = np.random.default_rng(2)
+    insert = random_bases(rng, 250)
+    # one product on the forward strand, one with a mismatch on the reverse strand
+    forward = b"GTGCCAGCAGCCGCGGTAA" + insert + reverse_complement(b"GGACTACAAGGGTATCTAAT")
+    mismatched = b"GTGCCAGCAGCCGCGGTTA" + insert[:200] + reverse_complement(b"GGACTACAAGGGTATCTAAT")
+    records = [
+        ("first", random_bases(rng, 500) + forward + random_bases(rng, 500)),
+        ("second", random_bases(rng, 300) + reverse_complement(mismatched) + random_bases(rng, 300)),
+    ]
+    return write_fasta(tmp_path / "amplicons.fa", records), insert
+
+
+def read_amplicons(path):
+    lines = path.read_bytes().splitlines()
+    return dict(zip((line[1:].decode() for line in lines[::2]), lines[1::2]))
+
+
+def test_amplicons_on_both_strands(tmp_path, amplicon_reference):
+    fasta, insert = amplicon_reference
+    assert run(fasta, tmp_path / "out.fa", FWD, REV, error=1) == 2
+    amplicons = read_amplicons(tmp_path / "out.fa")
+    assert amplicons == {"first_520_769_+": insert, "second_321_520_-": insert[:200]}
+
+
+def test_mismatch_tolerance(tmp_path, amplicon_reference):
+    fasta, insert = amplicon_reference
+    assert run(fasta, tmp_path / "out.fa", FWD, REV, error=0) == 1
+    assert run(fasta, tmp_path / "out.fa", FWD, REV, error=1, max_length=220) == 1
+
+
+def test_prepared_reference_and_threads(tmp_path, amplicon_reference):
+    from readsim.reference import prepare
+
+    fasta, _ = amplicon_reference
+    prepare(fasta, tmp_path / "prepared")
+    run(fasta, tmp_path / "streamed.fa", FWD, REV, error=1)
+    run(tmp_path / "prepared.fa", tmp_path / "mapped.fa", FWD, REV, error=1, threads=2)
+    assert (tmp_path / "streamed.fa").read_bytes() == (tmp_path / "mapped.fa").read_bytes()
+
+
+def test_primers():
+    assert max_mismatches(4.5, 20) == 4
+    assert max_mismatches(0.1, 20) == 2
+    assert make_primer("acgn", 0).sequence == "ACGN"
+    with pytest.raises(ValueError, match="non-IUPAC"):
+        make_primer("ACGX", 0)
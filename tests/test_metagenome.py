@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from conftest import read_fastq
+
+from readsim.batch import Sample
+from readsim.metagenome import Abundance, apportion, read_model, run, run_samples
+from readsim.qcstats import load_stats
+from readsim.seeds import shard_seed, shard_sizes
+
+MODEL = read_model("kde", "NovaSeq")
+
+
+def simulate(tmp_path, fasta, name, n_reads=600, **kwargs):
+    # like InSilicoSeq, `n_reads` counts both reads of a pair
+    prefix = str(tmp_path / name)
+    pairs = run(str(fasta), prefix, n_reads, MODEL, **kwargs)
+    return pairs, (tmp_path / f"{name}_R1.fastq.gz", tmp_path / f"{name}_R2.fastq.gz")
+
+
+def read_abundance(path):
+    return {name: float(value) for name, value in (line.split("\t") for line in path.read_text().splitlines())}
+
+
+def test_reads_follow_the_abundances(tmp_path, reference, sequences):
+    pairs, (r1, r2) = simulate(tmp_path, reference, "sample", seed=3, stats_path=str(tmp_path / "stats.json"))
+    abundance = read_abundance(tmp_path / "sample_abundance.txt")
+    assert list(abundance) == list(pairs) == list(sequences)
+    assert sum(abundance.values()) == pytest.approx(1)
+    assert sum(pairs.values()) == 300
+    reads1, reads2 = read_fastq(r1), read_fastq(r2)
+    assert len(reads1) == len(reads2) == 300
+    assert {len(seq) for _, seq, _ in reads1} == {MODEL.read_length}
+    stats = load_stats([tmp_path / "stats.json"])
+    assert stats["sample_R1"].reads == 300
+
+
+def test_output_does_not_depend_on_threads(tmp_path, reference):
+    _, single = simulate(tmp_path, reference, "single", seed=3, threads=1, batch_size=50)
+    _, forked = simulate(tmp_path, reference, "forked", seed=3, threads=3, batch_size=50)
+    for a, b in zip(single, forked):
+        assert a.read_bytes() == b.read_bytes()
+
+
+def test_prepared_reference_gives_the_same_reads(tmp_path, reference, prepared_reference):
+    _, streamed = simulate(tmp_path, reference, "streamed", seed=3, batch_size=50)
+    _, mapped = simulate(tmp_path, prepared_reference, "mapped", seed=3, batch_size=50, threads=2)
+    for a, b in zip(streamed, mapped):
+        assert a.read_bytes() == b.read_bytes()
+
+
+def test_uniform_and_file_abundances(tmp_path, reference):
+    pairs, _ = simulate(tmp_path, reference, "uniform", abundance="uniform")
+    assert set(pairs.values()) == {100}
+    table = tmp_path / "abundance.tsv"
+    table.write_text("chr1\t0.5\nchr2\t0.5\nplasmid\t0\n")
+    pairs, _ = simulate(tmp_path, reference, "file", abundance_file=str(table))
+    assert pairs == {"chr1": 150, "chr2": 150, "plasmid": 0}
+
+
+def test_draft_genomes_are_one_genome(tmp_path, reference):
+    pairs, _ = simulate(tmp_path, reference, "draft", draft=True)
+    assert pairs == {"reference": 300}
+
+
+def test_run_samples_matches_run(tmp_path, reference, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    samples = [Sample("first", 40), Sample("second", 41, count=100)]
+    report = run_samples(str(reference), samples, 600, MODEL, Abundance(), batch_size=50)
+    assert [s["reads"] for s in report["samples"]] == [600, 100]
+    for sample in samples:
+        _, expected = simulate(
+            tmp_path, reference, f"{sample.id}.single", sample.count or 600, seed=sample.seed, batch_size=50
+        )
+        assert (tmp_path / f"{sample.id}_R1.fastq.gz").read_bytes() == expected[0].read_bytes()
+        assert (tmp_path / f"{sample.id}_R2.fastq.gz").read_bytes() == expected[1].read_bytes()
+
+
+def simulate_shards(tmp_path, fasta, name, shards, seed, n_reads=600):
+    """Pairs per genome and abundance tables of a sample split over `shards` tasks."""
+    outputs = []
+    for shard, count in enumerate(shard_sizes(n_reads, shards)):
+        prefix = f"{name}_{shard}"
+        pairs, paths = simulate(tmp_path, fasta, prefix, count, seed=shard_seed(seed, shard), sample_seed=seed)
+        outputs.append((pairs, paths, tmp_path / f"{prefix}_abundance.txt"))
+    return outputs
+
+
+def test_shards_are_reproducible(tmp_path, reference):
+    first = simulate_shards(tmp_path, reference, "first", 3, seed=5)
+    second = simulate_shards(tmp_path, reference, "second", 3, seed=5)
+    for (_, a, _), (_, b, _) in zip(first, second):
+        assert a[0].read_bytes() == b[0].read_bytes()
+        assert a[1].read_bytes() == b[1].read_bytes()
+
+
+def test_shards_share_the_abundance_profile_of_the_sample(tmp_path, reference):
+    expected, _ = simulate(tmp_path, reference, "sample", seed=5)
+    profile = read_abundance(tmp_path / "sample_abundance.txt")
+    for shards in (2, 3):
+        outputs = simulate_shards(tmp_path, reference, f"shards{shards}", shards, seed=5)
+        # every shard splits its reads by the same weights, so the shares only differ by rounding
+        for _, _, table in outputs:
+            assert read_abundance(table) == pytest.approx(profile, abs=0.01)
+        for name, count in expected.items():
+            assert abs(sum(pairs[name] for pairs, _, _ in outputs) - count) <= shards
+
+
+def test_apportion():
+    counts = apportion(10, np.array([1.0, 1.0, 1.0]))
+    assert counts.tolist() == [4, 3, 3]
+    assert apportion(0, np.array([1.0])).tolist() == [0]
+
+
+def test_unknown_model():
+    with pytest.raises(ValueError, match="Unknown model"):
+        read_model("kde", "HiFi")
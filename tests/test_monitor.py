@@ -0,0 +1,56 @@
+import os
+
+from wf.monitor import ResourceMonitor, jvm_stats, process_tree
+
+GIB = 2**30
+
+
+def fake_proc(path, processes):
+    """A /proc with `pid -> (command, parent, utime)` entries."""
+    for pid, (command, parent, utime) in processes.items():
+        directory = path / str(pid)
+        (directory / "fd").mkdir(parents=True)
+        for fd in range(3):
+            (directory / "fd" / str(fd)).touch()
+        fields = ["S", str(parent)] + ["0"] * 9 + [str(utime), "0", "0", "0"] + ["0"] * 10
+        (directory / "stat").write_text(f"{pid} ({command}) {' '.join(fields)}\n")
+        (directory / "statm").write_text("100 10 0 0 0 0 0\n")
+    return path
+
+
+def test_process_tree(tmp_path):
+    proc = fake_proc(tmp_path, {1: ("init", 0, 5), 10: ("java", 1, 100), 11: ("bash", 10, 7), 20: ("other", 1, 3)})
+    assert process_tree(10, proc) == {10: ("java", 100), 11: ("bash", 7)}
+
+
+def test_samples_sum_the_tree(tmp_path):
+    proc = fake_proc(tmp_path / "proc", {10: ("java", 1, 100), 11: ("my (odd) task", 10, 7)})
+    monitor = ResourceMonitor(10, tmp_path, proc=proc, perfdata_dir=tmp_path)
+    sample = monitor.sample()
+    assert sample.processes == 2
+    assert sample.open_fds == 6
+    assert sample.rss_bytes == 20 * os.sysconf("SC_PAGE_SIZE")
+    assert monitor.peaks()["open_fds"] == 6
+
+
+def test_g1_heap_limit():
+    counters = {
+        "sun.gc.policy.name": "GarbageFirst",
+        "sun.gc.generation.0.capacity": GIB,
+        "sun.gc.generation.1.capacity": 2 * GIB,
+        "sun.gc.generation.0.maxCapacity": 4 * GIB,
+        "sun.gc.generation.1.maxCapacity": 4 * GIB,
+        "sun.gc.generation.0.space.0.used": GIB // 2,
+        "sun.gc.generation.1.space.0.used": GIB,
+        "sun.gc.collector.0.invocations": 3,
+        "sun.gc.collector.0.time": 2_000_000,
+        "sun.os.hrt.frequency": 1_000_000,
+    }
+    stats = jvm_stats(counters)
+    assert stats is not None
+    assert stats.heap_max_bytes == 4 * GIB
+    assert stats.heap_used_bytes == GIB + GIB // 2
+    assert (stats.gc_count, stats.gc_seconds) == (3, 2.0)
+    counters["sun.gc.policy.name"] = "ParallelGC"
+    assert jvm_stats(counters).heap_max_bytes == 8 * GIB
+    assert jvm_stats({}) is None
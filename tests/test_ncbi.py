@@ -0,0 +1,77 @@
+import gzip
+
+import numpy as np
+import pytest
+from conftest import random_bases
+from ncbi_mirror import LocalNcbiMirror
+
+from readsim.ncbi import Fetcher, download
+
+
+@pytest.fixture
+def genomes():
+    rng = np.random.default_rng(5)
+    # listed out of file name order, and of very different sizes so they finish out of order too
+    return [
+        (f"GCF_{i:09d}.1", str(100 + i), f"genome {i}", b">contig%d\n%s\n" % (i, random_bases(rng, size)))
+        for i, size in zip((3, 1, 4, 2, 5), (200_000, 500, 50_000, 20, 5_000))
+    ]
+
+
+def merged(genomes):
+    """The merged reference: the genomes in file name order, which is accession order here."""
+    return b"".join(fasta for _, _, _, fasta in sorted(genomes))
+
+
+def download_from(mirror, tmp_path, genomes, **kwargs):
+    output = tmp_path / "reference.fa.gz"
+    accessions = [accession for accession, *_ in genomes]
+    fetcher = Fetcher(mirror.url, backoff=0)
+    download(str(output), accessions=accessions, groups="bacteria", fetcher=fetcher, **kwargs)
+    return output
+
+
+def test_genomes_are_merged_in_file_name_order(tmp_path, genomes):
+    with LocalNcbiMirror(tmp_path / "mirror") as mirror:
+        mirror.add_genomes(genomes)
+        output = download_from(mirror, tmp_path, genomes, connections=4, manifest=str(tmp_path / "manifest.tsv"))
+    assert gzip.decompress(output.read_bytes()) == merged(genomes)
+    assert (tmp_path / "reference.fa.gz.gzi").exists()
+    rows = (tmp_path / "manifest.tsv").read_text().splitlines()[1:]
+    assert [row.split("\t")[0] for row in rows] == sorted(accession for accession, *_ in genomes)
+
+
+def test_dropped_transfers_resume_with_range_requests(tmp_path, genomes):
+    with LocalNcbiMirror(tmp_path / "mirror", drop_transfers=3) as mirror:
+        mirror.add_genomes(genomes)
+        output = download_from(mirror, tmp_path, genomes, connections=2)
+    assert gzip.decompress(output.read_bytes()) == merged(genomes)
+    assert mirror.requests["range"] >= 3
+
+
+def test_partial_files_of_an_earlier_attempt_are_resumed(tmp_path, genomes):
+    partial_dir = tmp_path / "partial"
+    with LocalNcbiMirror(tmp_path / "mirror") as mirror:
+        mirror.add_genomes(genomes)
+        largest = max(mirror.root.rglob("*.fna.gz"), key=lambda path: path.stat().st_size)
+        partial_dir.mkdir()
+        (partial_dir / f"{largest.name}.part").write_bytes(largest.read_bytes()[:1000])
+        output = download_from(mirror, tmp_path, genomes, partial_dir=str(partial_dir))
+    assert gzip.decompress(output.read_bytes()) == merged(genomes)
+    assert mirror.requests["range"] == 1
+    assert (partial_dir / largest.name).read_bytes() == largest.read_bytes()
+
+
+def test_checksum_mismatches_are_fetched_again(tmp_path, genomes):
+    with LocalNcbiMirror(tmp_path / "mirror", corrupt_transfers=2) as mirror:
+        mirror.add_genomes(genomes)
+        output = download_from(mirror, tmp_path, genomes, connections=2)
+    assert gzip.decompress(output.read_bytes()) == merged(genomes)
+    assert mirror.corrupt_transfers == 0
+
+
+def test_persistent_checksum_mismatches_fail(tmp_path, genomes):
+    with LocalNcbiMirror(tmp_path / "mirror", corrupt_transfers=100) as mirror:
+        mirror.add_genomes(genomes[:1])
+        with pytest.raises(RuntimeError, match="MD5 mismatch"):
+            download_from(mirror, tmp_path, genomes[:1])
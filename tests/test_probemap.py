@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from conftest import write_fasta
+
+from readsim.ispcr import reverse_complement
+from readsim.probemap import ProbemapOptions, run
+
+
+@pytest.fixture
+def probes(tmp_path, sequences):
+    chr1, chr2 = sequences["chr1"], sequences["chr2"]
+    mutated = bytearray(chr2[1000:1100])
+    mutated[50] = ord("A") if mutated[50] != ord("A") else ord("C")
+    records = [
+        ("exact", chr1[200:320]),
+        ("reverse", reverse_complement(chr2[3000:3120])),
+        ("mismatch", bytes(mutated)),
+        ("absent", b"ACGT" * 30),
+    ]
+    return write_fasta(tmp_path / "probes.fa", records)
+
+
+def read_bed(path):
+    return [line.split("\t") for line in path.read_text().splitlines()]
+
+
+def test_probes_are_placed(tmp_path, reference, probes):
+    counts = run(reference, probes, tmp_path / "probes.bed", ProbemapOptions())
+    assert counts == {"probes": 4, "placed": 3, "placements": 3}
+    placements = {
+        name: (contig, int(start), int(end), strand)
+        for contig, start, end, name, _, strand in read_bed(tmp_path / "probes.bed")
+    }
+    assert placements == {
+        "exact": ("chr1", 200, 320, "+"),
+        "reverse": ("chr2", 3000, 3120, "-"),
+        "mismatch": ("chr2", 1000, 1100, "+"),
+    }
+
+
+def test_prepared_reference_and_threads(tmp_path, reference, prepared_reference, probes):
+    run(reference, probes, tmp_path / "streamed.bed", ProbemapOptions())
+    run(prepared_reference, probes, tmp_path / "mapped.bed", ProbemapOptions(), threads=2)
+    assert (tmp_path / "streamed.bed").read_text() == (tmp_path / "mapped.bed").read_text()
+
+
+def test_score_min():
+    opts = ProbemapOptions()
+    assert opts.min_score(np.array([100]))[0] == pytest.approx(20 + 8 * np.log(100))
+    with pytest.raises(ValueError, match="Unknown score function"):
+        ProbemapOptions(score_min="X,1,1").validate()
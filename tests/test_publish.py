@@ -0,0 +1,106 @@
+import hashlib
+import json
+
+import pytest
+from object_store import LocalObjectStore
+
+from wf import publish
+from wf.publish import MANIFEST, UploadClient, publish_tree
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(publish.time, "sleep", lambda seconds: None)
+
+
+@pytest.fixture
+def results(tmp_path):
+    src = tmp_path / "results"
+    (src / "wgsim").mkdir(parents=True)
+    (src / "wgsim" / "first_R1.fq.gz").write_bytes(bytes(range(256)) * 10)
+    (src / "wgsim" / "first_R2.fq.gz").write_bytes(b"ACGT" * 100)
+    (src / "samplesheet.csv").write_text("sample,fastq_1\n")
+    (src / "empty.txt").touch()
+    return src
+
+
+def publish_to(store, src, threads=4, part_size=1000):
+    return publish_tree(src, "latch:///results", UploadClient(store.url, {}, threads), threads, part_size)
+
+
+def test_files_are_split_into_parts(tmp_path, results):
+    with LocalObjectStore(tmp_path / "store") as store:
+        report = publish_to(store, results)
+    assert not report.failed
+    files = {f.path: f for f in report.files}
+    assert (files["wgsim/first_R1.fq.gz"].parts, files["wgsim/first_R2.fq.gz"].parts) == (3, 1)
+    assert len(files["wgsim/first_R1.fq.gz"].etags) == 3
+    assert files["empty.txt"].parts == 0
+    for path in files:
+        assert (tmp_path / "store" / "results" / path).read_bytes() == (results / path).read_bytes()
+
+
+def test_parts_grow_past_the_part_limit(tmp_path, results, monkeypatch):
+    monkeypatch.setattr(publish, "MAX_PARTS", 2)
+    with LocalObjectStore(tmp_path / "store") as store:
+        report = publish_to(store, results)
+    assert {f.path: f.parts for f in report.files}["wgsim/first_R1.fq.gz"] == 2
+    assert (tmp_path / "store" / "results" / "wgsim" / "first_R1.fq.gz").read_bytes() == bytes(range(256)) * 10
+
+
+def test_failed_parts_are_retried(tmp_path, results):
+    with LocalObjectStore(tmp_path / "store", fail_puts=3) as store:
+        report = publish_to(store, results)
+    assert not report.failed
+    parts = sum(f.parts for f in report.files) + 1  # and the manifest
+    assert store.requests["put"] == parts + 3
+    assert (tmp_path / "store" / "results" / "wgsim" / "first_R1.fq.gz").read_bytes() == bytes(range(256)) * 10
+
+
+def test_parts_that_keep_failing_are_reported(tmp_path, results):
+    with LocalObjectStore(tmp_path / "store", fail_puts=publish.MAX_ATTEMPTS) as store:
+        report = publish_to(store, results, threads=1, part_size=10_000)
+    assert len(report.failed) == 1
+    assert "failed after" in report.failed[0].error
+    assert not (tmp_path / "store" / "results" / report.failed[0].path).exists()
+
+
+def test_unexpected_errors_fail_only_their_file(tmp_path, results):
+    class Client(UploadClient):
+        def put(self, url, data):
+            if data.startswith(b"ACGT"):
+                raise KeyError("ETag")
+            return super().put(url, data)
+
+    with LocalObjectStore(tmp_path / "store") as store:
+        report = publish_tree(results, "latch:///results", Client(store.url, {}, 4), 4, 1000)
+    assert [f.path for f in report.failed] == ["wgsim/first_R2.fq.gz"]
+    assert report.failed[0].error == "KeyError: 'ETag'"
+    assert (tmp_path / "store" / "results" / "wgsim" / "first_R1.fq.gz").exists()
+    assert (tmp_path / "store" / "results" / "pipeline_info" / MANIFEST).exists()
+
+
+def test_connections_are_reused(tmp_path, results):
+    for n in range(40):
+        (results / f"extra_{n}.txt").write_text(str(n))
+    with LocalObjectStore(tmp_path / "store") as store:
+        publish_to(store, results, threads=4)
+    assert sum(store.requests.values()) > 100
+    assert store.connections <= 4
+
+
+def test_manifest_lists_sizes_and_checksums(tmp_path, results):
+    with LocalObjectStore(tmp_path / "store") as store:
+        publish_to(store, results)
+    manifest = json.loads((results / "pipeline_info" / MANIFEST).read_text())
+    uploaded = tmp_path / "store" / "results" / "pipeline_info" / MANIFEST
+    assert uploaded.read_bytes() == (results / "pipeline_info" / MANIFEST).read_bytes()
+    assert manifest["destination"] == "latch:///results"
+    files = {f["path"]: f for f in manifest["files"]}
+    assert MANIFEST not in {path.rsplit("/", 1)[-1] for path in files}
+    for path, entry in files.items():
+        data = (results / path).read_bytes()
+        assert entry["size"] == len(data)
+        assert entry["sha256"] == hashlib.sha256(data).hexdigest()
+        assert entry["error"] is None
+    assert manifest["bytes"] == sum(entry["size"] for entry in files.values())
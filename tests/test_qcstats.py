@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+
+from readsim.fasta import encode
+from readsim.qcstats import ReadStats, load_stats, read_set_name, save_stats, write_multiqc
+
+
+def test_ragged_reads_match_equal_length_reads():
+    rng = np.random.default_rng(0)
+    codes = rng.integers(0, 5, (20, 30)).astype(np.uint8)
+    fixed, ragged = ReadStats(), ReadStats()
+    fixed.add(codes, 30)
+    ragged.add_ragged(codes.ravel(), np.full(20, 30), 30)
+    assert fixed.to_dict() == ragged.to_dict()
+
+
+def test_histograms():
+    stats = ReadStats()
+    stats.add(encode(b"GGCC").reshape(1, 4), np.array([[30, 30, 20, 20]]))
+    stats.add(encode(b"AANT").reshape(1, 4), 10)
+    assert stats.reads == 2
+    assert stats.gc_hist[100] == 1 and stats.gc_hist[0] == 1
+    assert stats.quality_hist[25] == 1 and stats.quality_hist[10] == 1
+    assert stats.position_reads()[:5].tolist() == [2, 2, 2, 2, 0]
+    assert stats.base_counts[4, 2] == 1
+
+
+def test_shards_are_summed(tmp_path):
+    codes = encode(b"ACGTACGT").reshape(2, 4)
+    for shard in range(3):
+        stats = ReadStats()
+        stats.add(codes, 35)
+        save_stats(tmp_path / f"shard{shard}.json", {"sample_R1": stats})
+    merged = load_stats(sorted(tmp_path.glob("shard*.json")))
+    assert merged["sample_R1"].reads == 6
+    assert ReadStats.from_dict(merged["sample_R1"].to_dict()).to_dict() == merged["sample_R1"].to_dict()
+
+
+def test_multiqc_sections(tmp_path):
+    stats = ReadStats()
+    stats.add(encode(b"GGCCAATT").reshape(2, 4), 30)
+    paths = write_multiqc({"sample_R1": stats}, tmp_path)
+    assert {p.name for p in paths} >= {"readsim_general_stats_mqc.json", "readsim_per_base_quality_mqc.json"}
+    general = json.loads((tmp_path / "readsim_general_stats_mqc.json").read_text())
+    assert general["data"]["sample_R1"] == {
+        "total_sequences": 2,
+        "percent_gc": 50.0,
+        "mean_quality": 30.0,
+        "avg_sequence_length": 4.0,
+    }
+
+
+def test_read_set_name():
+    assert read_set_name("/work/sample_R1.fastq.gz") == "sample_R1"
+    assert read_set_name("sample_1.fq") == "sample_1"
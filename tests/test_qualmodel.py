@@ -0,0 +1,58 @@
+import gzip
+
+import numpy as np
+import pytest
+
+from readsim.metagenome import read_model, run
+from readsim.qualmodel import QualityModel, from_read_model
+
+
+@pytest.fixture
+def model():
+    # position 0 is always Q10, the other positions Q20 or Q40 with equal weight
+    table = np.zeros((1, 1, 5, 50, 41))
+    table[..., 0, 10] = 1
+    table[..., 1:, 20] = 1
+    table[..., 1:, 40] = 1
+    return QualityModel.compile("test", table)
+
+
+def test_save_and_load(tmp_path, model):
+    model.save(tmp_path / "test.rqm")
+    loaded = QualityModel.load(tmp_path / "test.rqm")
+    assert (loaded.name, loaded.read_length, loaded.max_quality) == ("test", 50, 40)
+    codes = np.zeros((10, 50), dtype=np.uint8)
+    a = model.sample_qualities(codes, 0, np.random.default_rng(1))
+    b = loaded.sample_qualities(codes, 0, np.random.default_rng(1))
+    assert np.array_equal(a, b)
+
+
+def test_sampled_qualities_follow_the_table(model):
+    quality = model.sample_qualities(np.zeros((2000, 50), dtype=np.uint8), 1, np.random.default_rng(2))
+    assert set(quality[:, 0].tolist()) == {10}
+    assert set(np.unique(quality[:, 1:]).tolist()) == {20, 40}
+    assert 0.45 < (quality[:, 1:] == 40).mean() < 0.55
+    with pytest.raises(ValueError, match="longer than"):
+        model.sample_qualities(np.zeros((1, 60), dtype=np.uint8), 0, np.random.default_rng(2))
+
+
+def test_errors_never_keep_the_base(model):
+    codes = np.zeros((500, 50), dtype=np.uint8)
+    quality = np.zeros((500, 50), dtype=np.uint8)
+    model.add_errors(codes, quality, 0, np.random.default_rng(3))
+    # Q0 is an error probability of 1
+    assert set(np.unique(codes).tolist()) == {1, 2, 3}
+
+
+def test_fixed_profile():
+    model = from_read_model("fixed", 4, np.array([30, 30, 20, 10]))
+    quality = model.sample_qualities(np.zeros((3, 4), dtype=np.uint8), 0, np.random.default_rng(4))
+    assert quality.tolist() == [[30, 30, 20, 10]] * 3
+
+
+def test_metagenome_with_a_compiled_model(tmp_path, reference, model):
+    model.save(tmp_path / "test.rqm")
+    run(str(reference), str(tmp_path / "m"), 40, read_model("kde", "MiSeq"), compiled_model=str(tmp_path / "test.rqm"))
+    lines = gzip.open(tmp_path / "m_R1.fastq.gz").read().splitlines()
+    assert {len(line) for line in lines[1::4]} == {50}
+    assert {line[0] for line in lines[3::4]} == {10 + 33}
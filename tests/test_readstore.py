@@ -0,0 +1,57 @@
+import gzip
+
+import pytest
+from conftest import read_fastq
+
+from readsim.readstore import QUALITY_BINS, pack, read_header, unpack
+
+
+def write_fastq(path, records):
+    with gzip.open(path, "wb") as f:
+        for name, seq, qual in records:
+            f.write(b"@%s\n%s\n+\n%s\n" % (name, seq, qual))
+    return path
+
+
+def binned(qual):
+    table = {}
+    for low, high, value in QUALITY_BINS:
+        for q in range(low, high + 1):
+            table[q + 33] = value + 33
+    return bytes(table[q] for q in qual)
+
+
+@pytest.fixture
+def pairs(tmp_path):
+    r1 = [(b"read%d/1" % i, b"ACGTN"[i % 5 :] + b"ACGT" * (i % 7 + 1), b"I#5?"[i % 4 :] * 10) for i in range(250)]
+    r1 = [(name, seq, (qual * 10)[: len(seq)]) for name, seq, qual in r1]
+    r2 = [(name[:-1] + b"2", seq[::-1], qual[::-1]) for name, seq, qual in r1]
+    return write_fastq(tmp_path / "r1.fq.gz", r1), write_fastq(tmp_path / "r2.fq.gz", r2)
+
+
+@pytest.mark.parametrize("threads", [1, 2])
+def test_round_trip(tmp_path, pairs, threads):
+    store = tmp_path / "sample.rs2"
+    assert pack(pairs, store, "sample", seed=3, chunk_size=64) == 250
+    header, footer = read_header(store)
+    assert (header["sample"], header["seed"], header["ends"]) == ("sample", 3, 2)
+    assert [n for _, n in footer["chunks"]] == [64, 64, 64, 58]
+
+    outputs = [str(tmp_path / "out_R1.fq.gz"), str(tmp_path / "out_R2.fq.gz")]
+    assert unpack(store, outputs, threads=threads) == 250
+    for source, output in zip(pairs, outputs):
+        expected = [(name, seq, binned(qual)) for name, seq, qual in read_fastq(source)]
+        assert read_fastq(output) == expected
+
+
+def test_single_end(tmp_path, pairs):
+    store = tmp_path / "single.rs2"
+    pack(pairs[:1], store, "single")
+    with pytest.raises(ValueError, match="1 read end"):
+        unpack(store, ["a.fq.gz", "b.fq.gz"])
+
+
+def test_mismatched_pairs(tmp_path, pairs):
+    short = write_fastq(tmp_path / "short.fq.gz", read_fastq(pairs[1])[:10])
+    with pytest.raises(ValueError, match="different numbers of reads"):
+        pack([pairs[0], short], tmp_path / "bad.rs2", "bad")
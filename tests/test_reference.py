@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from readsim.fasta import decode, read_fasta
+from readsim.reference import IndexedFasta, is_prepared, prepare, read_fai
+
+
+def test_prepare_writes_single_line_fasta_and_index(tmp_path, reference, sequences):
+    records = prepare(reference, tmp_path / "ref")
+    fa = tmp_path / "ref.fa"
+    assert [r.name for r in records] == list(sequences)
+    assert read_fai(f"{fa}.fai") == records
+    lines = fa.read_bytes().splitlines()
+    assert lines[1::2] == list(sequences.values())
+    for r, seq in zip(records, sequences.values()):
+        # samtools faidx layout: offset of the first base, one line per sequence
+        assert fa.read_bytes()[r.offset : r.offset + r.length] == seq
+        assert (r.length, r.line_bases, r.line_width) == (len(seq), len(seq), len(seq) + 1)
+    sizes = (tmp_path / "ref.sizes").read_text().splitlines()
+    assert sizes == [f"{name}\t{len(seq)}" for name, seq in sequences.items()]
+
+
+def test_sequence_before_the_first_header_is_rejected(tmp_path):
+    (tmp_path / "headless.fa").write_bytes(b"\nACGT\n>chr1\nACGT\n")
+    with pytest.raises(ValueError, match="before the first FASTA header"):
+        prepare(tmp_path / "headless.fa", tmp_path / "ref")
+
+
+def test_indexed_fasta_fetch(prepared_reference, sequences):
+    assert is_prepared(prepared_reference)
+    with IndexedFasta(prepared_reference) as fa:
+        assert fa.names() == list(sequences)
+        assert fa.fetch("chr2").tobytes() == sequences["chr2"]
+        assert fa.fetch("chr1", 2990, 3060).tobytes() == sequences["chr1"][2990:3060]
+        assert fa.fetch("plasmid", 2400, 10_000).tobytes() == sequences["plasmid"][2400:]
+        assert fa.fetch("plasmid", 10, 10).size == 0
+
+
+def test_read_fasta_is_the_same_for_prepared_references(reference, prepared_reference, sequences):
+    streamed = read_fasta(reference)
+    mapped = read_fasta(prepared_reference)
+    assert [name for name, _ in mapped] == [name for name, _ in streamed] == list(sequences)
+    for (_, a), (_, b), seq in zip(streamed, mapped, sequences.values()):
+        assert np.array_equal(a, b)
+        assert decode(a) == seq
+
+
+def test_stale_index_is_not_prepared(tmp_path, prepared_reference):
+    prepared_reference.write_bytes(prepared_reference.read_bytes() + b">extra\nACGT\n")
+    assert not is_prepared(prepared_reference)
+    assert not is_prepared(tmp_path / "reference.fa.gz")
@@ -0,0 +1,52 @@
+import pytest
+
+from readsim.batch import Sample, SampleTiming, batch_report, read_samples
+from readsim.seeds import MAX_TOOL_SEED, parse_read_count, shard_seed, shard_sizes, shard_table
+
+
+def test_shard_seeds_do_not_depend_on_the_shard_count():
+    four = shard_table(40, 4)
+    eight = shard_table(40, 8)
+    assert [row["seed"] for row in four] == [row["seed"] for row in eight[:4]]
+    assert len({row["seed"] for row in eight}) == 8
+    assert all(1 <= row["seed"] <= MAX_TOOL_SEED for row in eight)
+    assert shard_seed(40, 0) != shard_seed(41, 0)
+
+
+def test_shard_sizes():
+    assert shard_sizes(10, 3) == [4, 3, 3]
+    assert sum(shard_sizes(1_000_001, 7)) == 1_000_001
+    with pytest.raises(ValueError):
+        shard_sizes(10, 0)
+
+
+def test_shard_table_splits_every_count():
+    rows = shard_table(1, 3, {"wholegenome": 10, "metagenome": "1k"})
+    assert [row["shard"] for row in rows] == [0, 1, 2]
+    assert [row["wholegenome"] for row in rows] == [4, 3, 3]
+    assert sum(row["metagenome"] for row in rows) == 1000
+
+
+@pytest.mark.parametrize("value, count", [("1M", 1_000_000), ("250k", 250_000), ("2.5m", 2_500_000), (42, 42)])
+def test_parse_read_count(value, count):
+    assert parse_read_count(value) == count
+
+
+def test_read_samples(tmp_path):
+    path = tmp_path / "samples.tsv"
+    path.write_text("# id\tseed\tcount\nfirst\t40\nsecond\t41\t1k\nthird\t42\t\thap.rhap\n")
+    assert read_samples(path) == [
+        Sample("first", 40),
+        Sample("second", 41, 1000),
+        Sample("third", 42, None, "hap.rhap"),
+    ]
+    path.write_text("first\t40\nfirst\t41\n")
+    with pytest.raises(ValueError, match="Duplicate sample ids"):
+        read_samples(path)
+
+
+def test_batch_report_estimates_the_fan_out():
+    report = batch_report("wgsim", 4.0, [SampleTiming("first", 10, 2.0), SampleTiming("second", 10, 6.0)])
+    assert [s["seconds"] for s in report["samples"]] == [4.0, 8.0]
+    assert [s["estimated_fan_out_seconds"] for s in report["samples"]] == [6.0, 10.0]
+    assert (report["seconds"], report["estimated_fan_out_seconds"], report["estimated_speedup"]) == (12.0, 16.0, 1.333)
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import pytest
+
+from wf.trace import TRACE_FIELDS, latest_trace, parse_trace, summarize, write_summary
+
+PREFIX = "NFCORE_READSIMULATOR:READSIMULATOR:"
+ROWS = [
+    # name, status, submit, start, realtime, %cpu, peak_rss, rchar
+    (f"{PREFIX}READSIM_WGSIM (first)", "COMPLETED", 1000, 3000, 60_000, "390.5%", 2 * 2**30, 100),
+    (f"{PREFIX}READSIM_WGSIM (second)", "COMPLETED", 1000, 2000, 30_000, "200.0%", 2**30, 50),
+    (f"{PREFIX}FASTQC (first)", "CACHED", 0, 0, 90_000, "100%", 2**20, 1),
+    (f"{PREFIX}MULTIQC", "FAILED", 0, 0, 1000, "-", "-", "-"),
+]
+
+# how the nf-core trace (without `raw`) writes the values of ROWS
+EPOCH = datetime(2026, 10, 18, 12, 0, 0)
+HUMAN = {
+    "timestamp": lambda ms: datetime.fromtimestamp(EPOCH.timestamp() + ms / 1000).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+    "duration": {60_000: "1m", 30_000: "30s", 90_000: "1m 30s", 1000: "1s"}.get,
+    "size": {2 * 2**30: "2 GB", 2**30: "1 GB", 2**20: "1 MB", 100: "100 B", 50: "50 B", 1: "1 B"}.get,
+}
+
+
+def write_trace(path, human=False, fields=TRACE_FIELDS):
+    lines = ["\t".join(fields)]
+    for task_id, (name, status, submit, start, realtime, cpu, rss, rchar) in enumerate(ROWS, 1):
+        row = dict.fromkeys(fields, "-")
+        if human:
+            submit, start = HUMAN["timestamp"](submit), HUMAN["timestamp"](start)
+            realtime = HUMAN["duration"](realtime)
+            rss, rchar = HUMAN["size"](rss, rss), HUMAN["size"](rchar, rchar)
+        row.update(
+            task_id=task_id,
+            name=name,
+            process=name.split(" (")[0],
+            status=status,
+            submit=submit,
+            start=start,
+            realtime=realtime,
+            peak_rss=rss,
+            rchar=rchar,
+            **{"%cpu": cpu},
+        )
+        lines.append("\t".join(str(row[f]) for f in fields))
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+@pytest.mark.parametrize("human", [True, False], ids=["human", "raw"])
+def test_summary_by_module(tmp_path, human):
+    records = parse_trace(write_trace(tmp_path / "trace.txt", human))
+    assert [r.module for r in records] == ["READSIM_WGSIM", "READSIM_WGSIM", "FASTQC", "MULTIQC"]
+    summaries = {s.module: s for s in summarize(records)}
+    wgsim = summaries["READSIM_WGSIM"]
+    assert (wgsim.tasks, wgsim.realtime_total_s, wgsim.realtime_max_s) == (2, 90.0, 60.0)
+    assert (wgsim.queue_total_s, wgsim.queue_max_s) == pytest.approx((3.0, 2.0))
+    assert wgsim.cpu_percent_mean == 295.25
+    assert wgsim.peak_rss_max == 2 * 2**30
+    assert wgsim.rchar == 150
+    # cached tasks did not run, so they add no time
+    assert summaries["FASTQC"].statuses == {"CACHED": 1}
+    assert summaries["FASTQC"].realtime_total_s == 0
+    assert summaries["MULTIQC"].cpu_percent_mean is None
+
+
+def test_default_nf_core_columns(tmp_path):
+    # a trace with only the default columns has no process or start column
+    fields = TRACE_FIELDS[: TRACE_FIELDS.index("process")]
+    summaries = {s.module: s for s in summarize(parse_trace(write_trace(tmp_path / "trace.txt", True, fields)))}
+    assert summaries["READSIM_WGSIM"].realtime_total_s == 90.0
+    assert summaries["READSIM_WGSIM"].queue_total_s == 0
+
+
+def test_write_summary(tmp_path):
+    _, table_path, table = write_summary(write_trace(tmp_path / "trace.txt"), tmp_path)
+    assert table_path.read_text() == table
+    assert table.splitlines()[1].startswith("READSIM_WGSIM")
+    assert (tmp_path / "process_summary.json").exists()
+
+
+def test_latest_trace(tmp_path):
+    assert latest_trace(tmp_path / "pipeline_info") is None
+    (tmp_path / "execution_trace_2026-10-17_09-00-00.txt").write_text("")
+    (tmp_path / "execution_timeline_2026-10-18_09-00-00.html").write_text("")
+    assert latest_trace(tmp_path).name == "execution_trace_2026-10-17_09-00-00.txt"
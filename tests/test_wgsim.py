@@ -0,0 +1,150 @@
+import dataclasses
+
+import numpy as np
+import pytest
+from conftest import read_fastq, write_fasta
+
+from readsim.batch import Sample
+from readsim.qcstats import load_stats
+from readsim.seeds import shard_seed, shard_sizes
+from readsim.wgsim import (
+    Genome,
+    WgsimOptions,
+    build_genome,
+    load_reference,
+    quality_char,
+    run,
+    run_samples,
+    simulate,
+)
+
+OPTS = WgsimOptions(n_pairs=500, outer_dist=300, standard_dev=30, r1_length=100, r2_length=80, seed=11)
+
+
+def simulate_to(tmp_path, fasta, opts, name, **kwargs):
+    r1, r2 = tmp_path / f"{name}_R1.fq.gz", tmp_path / f"{name}_R2.fq.gz"
+    run(str(fasta), str(r1), str(r2), opts, **kwargs)
+    return r1, r2
+
+
+def test_reads_match_the_options(tmp_path, reference):
+    r1, r2 = simulate_to(tmp_path, reference, OPTS, "sample")
+    reads1, reads2 = read_fastq(r1), read_fastq(r2)
+    assert len(reads1) == len(reads2) == OPTS.n_pairs
+    assert {len(seq) for _, seq, _ in reads1} == {OPTS.r1_length}
+    assert {len(seq) for _, seq, _ in reads2} == {OPTS.r2_length}
+    assert [name[:-2] for name, _, _ in reads1] == [name[:-2] for name, _, _ in reads2]
+    assert (tmp_path / "sample_R1.fq.gz.gzi").exists()
+
+
+@pytest.mark.parametrize("error_rate, quality", [(0.0, "I"), (0.02, "2"), (0.001, "?")])
+def test_quality_follows_the_error_rate(tmp_path, reference, error_rate, quality):
+    # wgsim writes -10 log10(e), rounded, as a constant quality, and 'I' without errors
+    assert quality_char(error_rate) == quality.encode()
+    opts = dataclasses.replace(OPTS, n_pairs=50, error_rate=error_rate)
+    r1, r2 = simulate_to(tmp_path, reference, opts, "sample", stats_path=str(tmp_path / "stats.json"))
+    for path in (r1, r2):
+        assert all(qual == quality.encode() * len(seq) for _, seq, qual in read_fastq(path))
+    stats = load_stats([tmp_path / "stats.json"])
+    assert int(np.flatnonzero(stats["sample_R1"].quality_hist)[0]) == ord(quality) - 33
+
+
+def test_output_does_not_depend_on_threads(tmp_path, reference):
+    single = simulate_to(tmp_path, reference, OPTS, "single", threads=1, batch_size=128)
+    forked = simulate_to(tmp_path, reference, OPTS, "forked", threads=3, batch_size=128)
+    for a, b in zip(single, forked):
+        assert a.read_bytes() == b.read_bytes()
+
+
+def test_seed_changes_the_reads(tmp_path, reference):
+    a = simulate_to(tmp_path, reference, OPTS, "a")
+    b = simulate_to(tmp_path, reference, dataclasses.replace(OPTS, seed=12), "b")
+    assert read_fastq(a[0]) != read_fastq(b[0])
+
+
+def test_prepared_reference_gives_the_same_reads(tmp_path, reference, prepared_reference):
+    streamed = simulate_to(tmp_path, reference, OPTS, "streamed")
+    mapped = simulate_to(tmp_path, prepared_reference, OPTS, "mapped")
+    for a, b in zip(streamed, mapped):
+        assert a.read_bytes() == b.read_bytes()
+
+
+def test_run_samples_matches_run(tmp_path, reference, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    samples = [Sample("first", 40), Sample("second", 41, count=200)]
+    report = run_samples(str(reference), samples, OPTS, batch_size=128)
+    assert [s["id"] for s in report["samples"]] == ["first", "second"]
+    for sample in samples:
+        opts = dataclasses.replace(OPTS, seed=sample.seed, n_pairs=sample.count or OPTS.n_pairs)
+        expected = simulate_to(tmp_path, reference, opts, f"{sample.id}_single", batch_size=128)
+        assert (tmp_path / f"{sample.id}_R1.fq.gz").read_bytes() == expected[0].read_bytes()
+        assert (tmp_path / f"{sample.id}_R2.fq.gz").read_bytes() == expected[1].read_bytes()
+    stats = load_stats([tmp_path / "second.stats.json"])
+    assert stats["second_R1"].reads == stats["second_R2"].reads == 200
+
+
+def simulate_shards(tmp_path, fasta, opts, shards, name):
+    """The reads of `opts` split over `shards` tasks the way the pipeline splits a sample."""
+    outputs = []
+    for shard, n_pairs in enumerate(shard_sizes(opts.n_pairs, shards)):
+        shard_opts = dataclasses.replace(
+            opts, seed=shard_seed(opts.seed, shard), sample_seed=opts.seed, n_pairs=n_pairs
+        )
+        outputs.append((shard_opts, simulate_to(tmp_path, fasta, shard_opts, f"{name}_{shard}", batch_size=128)))
+    return outputs
+
+
+def test_shards_are_reproducible(tmp_path, reference):
+    first = simulate_shards(tmp_path, reference, OPTS, 3, "first")
+    second = simulate_shards(tmp_path, reference, OPTS, 3, "second")
+    for (_, a), (_, b) in zip(first, second):
+        assert a[0].read_bytes() == b[0].read_bytes()
+        assert a[1].read_bytes() == b[1].read_bytes()
+
+
+def test_shards_share_the_genome_of_the_sample(tmp_path, reference):
+    opts = dataclasses.replace(OPTS, mutation_rate=0.01)
+    records = load_reference(str(reference), opts)
+    expected = build_genome(records, opts)
+    for shards in (2, 3):
+        outputs = simulate_shards(tmp_path, reference, opts, shards, f"shards{shards}")
+        assert len({shard_opts.seed for shard_opts, _ in outputs}) == shards
+        assert sum(len(read_fastq(r1)) for _, (r1, _) in outputs) == opts.n_pairs
+        for shard_opts, _ in outputs:
+            genome = build_genome(records, shard_opts)
+            assert np.array_equal(genome.seq, expected.seq)
+            assert np.array_equal(genome.starts, expected.starts)
+
+
+def test_mutation_rate(reference):
+    opts = dataclasses.replace(OPTS, mutation_rate=0.01, indel_fraction=0.0)
+    records = load_reference(str(reference), opts)
+    genome = build_genome(records, opts)
+    differences = 0
+    for (name, seq), (start0, start1) in zip(records, genome.starts.tolist()):
+        assert name in genome.names
+        for start in (start0, start1):
+            differences += int((genome.seq[start : start + len(seq)] != seq).sum())
+    bases = 2 * sum(len(seq) for _, seq in records)
+    # Ns are never mutated, so the observed rate is slightly below the option
+    assert 0.005 < differences / bases < 0.015
+
+
+def test_contigs_shorter_than_the_reads_are_rejected(tmp_path, sequences):
+    fasta = write_fasta(tmp_path / "tiny.fa", [("tiny", sequences["plasmid"][:280])])
+    opts = WgsimOptions(n_pairs=10, outer_dist=100, standard_dev=10, r1_length=300, r2_length=300)
+    with pytest.raises(ValueError, match="No sequence"):
+        run(str(fasta), str(tmp_path / "r1.fq.gz"), str(tmp_path / "r2.fq.gz"), opts)
+
+
+def test_haplotypes_shorter_than_the_reads_are_rejected(tmp_path):
+    genome = Genome(
+        names=["a"],
+        seq=np.zeros(590, dtype=np.uint8),
+        starts=np.array([[0, 300]]),
+        lengths=np.array([[300, 290]]),
+        weights=np.array([1.0]),
+    )
+    opts = WgsimOptions(n_pairs=10, outer_dist=100, standard_dev=10, r1_length=300, r2_length=300)
+    with pytest.raises(ValueError, match="290 bp long"):
+        simulate(genome, opts, str(tmp_path / "r1.fq.gz"), str(tmp_path / "r2.fq.gz"))
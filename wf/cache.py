@@ -0,0 +1,153 @@
+import hashlib
+import json
+import time
+import typing
+from pathlib import Path
+
+from latch.ldata.path import LPath
+from latch.ldata.type import LatchPathError
+from latch_cli.utils import urljoins
+
+CACHE_ROOT = "latch:///nf_nf_core_readsimulator_cache"
+MANIFEST = "manifest.json"
+
+
+def sha256sum(path: Path, chunk_size: int = 16 * 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _normalized_lines(path: typing.Optional[Path]) -> typing.List[str]:
+    if path is None:
+        return []
+    lines = (line.strip() for line in Path(path).read_text().splitlines())
+    return sorted({line for line in lines if line and not line.startswith("#")})
+
+
+def reference_cache_key(
+    accessions: typing.Optional[Path],
+    taxids: typing.Optional[Path],
+    group: typing.Optional[str],
+    section: typing.Optional[str],
+) -> str:
+    """Key of the merged NCBI reference for a download request.
+
+    Order, duplicates and blank lines in the id lists and in the comma-separated
+    group list do not change the key.
+    """
+    groups = sorted({g.strip() for g in (group or "all").split(",") if g.strip()})
+    request = {
+        "accessions": _normalized_lines(accessions),
+        "taxids": _normalized_lines(taxids),
+        "group": groups,
+        "section": (section or "refseq").strip(),
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+
+class LatchCache:
+    """Content-addressed file cache kept in Latch Data.
+
+    Every entry is a directory `<root>/<key>/` holding the cached files and a
+    manifest with their checksums, total size and last access time. Entries are
+    checked against the manifest when fetched, and the least recently used ones
+    are evicted once the cache grows beyond `max_bytes`.
+    """
+
+    def __init__(self, name: str, max_bytes: int, root: str = CACHE_ROOT):
+        self.root = urljoins(root, name)
+        self.max_bytes = max_bytes
+
+    def _entry(self, key: str, *parts: str) -> LPath:
+        return LPath(urljoins(self.root, key, *parts))
+
+    def _read_manifest(self, key: str, dst: Path) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        dst.mkdir(parents=True, exist_ok=True)
+        try:
+            path = self._entry(key, MANIFEST).download(dst / MANIFEST)
+        except LatchPathError:
+            return None
+        return json.loads(path.read_text())
+
+    def _write_manifest(self, key: str, manifest: typing.Dict[str, typing.Any], dst: Path) -> None:
+        path = dst / MANIFEST
+        path.write_text(json.dumps(manifest, indent=2))
+        self._entry(key, MANIFEST).upload_from(path)
+
+    def fetch(self, key: str, dst: Path) -> typing.Optional[typing.List[Path]]:
+        """Download the entry for `key` into `dst`; returns None on a miss or a corrupt entry."""
+        manifest = self._read_manifest(key, dst)
+        if manifest is None:
+            return None
+
+        paths = []
+        for name, info in manifest["files"].items():
+            path = self._entry(key, name).download(dst / name)
+            if path.stat().st_size != info["size"] or sha256sum(path) != info["sha256"]:
+                print(f"Cache entry {key} failed its integrity check, discarding it")
+                self._entry(key).rmr()
+                return None
+            paths.append(path)
+
+        manifest["last_used"] = time.time()
+        self._write_manifest(key, manifest, dst)
+        return paths
+
+    def store(self, key: str, files: typing.Sequence[Path], info: typing.Dict[str, typing.Any]) -> None:
+        """Upload `files` as the entry for `key`, then evict old entries if needed."""
+        manifest: typing.Dict[str, typing.Any] = {
+            "key": key,
+            "info": info,
+            "files": {},
+            "created": time.time(),
+            "last_used": time.time(),
+        }
+        for path in files:
+            manifest["files"][path.name] = {"size": path.stat().st_size, "sha256": sha256sum(path)}
+            self._entry(key, path.name).upload_from(path)
+        manifest["size"] = sum(f["size"] for f in manifest["files"].values())
+        # the manifest goes last so a partially uploaded entry is never considered a hit
+        self._write_manifest(key, manifest, files[0].parent)
+        self.evict(keep=key)
+
+    def evict(
+        self,
+        keep: typing.Optional[str] = None,
+        max_age: typing.Optional[float] = None,
+        stale: typing.Callable[[str], bool] = lambda key: False,
+    ) -> None:
+        """Delete least recently used entries until the cache fits in `max_bytes`.
+
+        Entries not used for `max_age` seconds, and entries whose key is `stale`,
+        are deleted first regardless of the cache size.
+        """
+        entries = []
+        scratch = Path("/tmp") / "latch_cache_manifests"
+        for entry in LPath(self.root).iterdir():
+            key = entry.path.rstrip("/").rsplit("/", 1)[-1]
+            manifest = self._read_manifest(key, scratch / key)
+            if manifest is None:
+                # still being uploaded by another run, or left over from an interrupted one
+                continue
+            expired = max_age is not None and time.time() - manifest["last_used"] > max_age
+            if key != keep and (expired or stale(key)):
+                print(f"Deleting stale cache entry {key} ({manifest['size'] / 2**30:.2f} GiB)")
+                self._entry(key).rmr()
+                continue
+            entries.append((manifest["last_used"], manifest["size"], key))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            print(f"Evicting cache entry {key} ({size / 2**30:.2f} GiB)")
+            self._entry(key).rmr()
+            total -= size
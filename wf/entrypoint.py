@@ -1,5 +1,4 @@
 import os
-import shutil
 import subprocess
 import typing
 from pathlib import Path
@@ -18,24 +17,160 @@ from latch_cli.nextflow.workflow import get_flag
 from latch_cli.services.register.utils import import_module_by_path
 from latch_cli.utils import urljoins
 
+from wf.cache import CACHE_ROOT, LatchCache, reference_cache_key
+from wf.monitor import ResourceMonitor
+from wf.preflight import preflight
+from wf.publish import MANIFEST, UploadClient, publish_tree
+from wf.resume import RESUME_CONFIG, WorkDirCache, completed_tasks, resume_key
+from wf.sizing import (
+    RUNTIME_CPUS,
+    RUNTIME_MEMORY_GIB,
+    ResourceEstimate,
+    SimulationPlan,
+    count_samples,
+    estimate,
+    reference_size,
+)
+from wf.sync import sync_tree
+from wf.trace import latest_trace, trace_config, write_summary
+
 meta = Path("latch_metadata") / "__init__.py"
 import_module_by_path(meta)
 
+REFERENCE_CACHE_MAX_GIB = 500
+
+
+def estimate_resources(
+    input: LatchFile,
+    fasta: typing.Optional[LatchFile],
+    ncbidownload_accessions: typing.Optional[LatchFile],
+    **options: typing.Any,
+) -> ResourceEstimate:
+    """Size the run from its parameters; options left unset fall back to the pipeline defaults."""
+    reference_bytes, compressed = reference_size(fasta, ncbidownload_accessions)
+    shards = options.pop("simulation_shards", None) or 1
+    plan = SimulationPlan(
+        samples=count_samples(Path(input)),
+        reference_bytes=reference_bytes,
+        reference_compressed=compressed,
+        shards=shards,
+        **{name: value for name, value in options.items() if value is not None},
+    )
+    return estimate(plan)
+
 
 @custom_task(cpu=0.25, memory=0.5, storage_gib=1)
-def initialize() -> str:
+def initialize(
+    input: LatchFile,
+    fasta: typing.Optional[LatchFile],
+    ncbidownload_accessions: typing.Optional[LatchFile],
+    prepare_reference: typing.Optional[bool],
+    output_format: typing.Optional[str],
+    simulation_shards: typing.Optional[int],
+    amplicon: typing.Optional[bool],
+    amplicon_read_count: typing.Optional[int],
+    amplicon_read_length: typing.Optional[int],
+    target_capture: typing.Optional[bool],
+    target_capture_engine: typing.Optional[str],
+    target_capture_mode: typing.Optional[str],
+    target_capture_num: typing.Optional[int],
+    target_capture_illen: typing.Optional[int],
+    target_capture_pblen: typing.Optional[int],
+    target_capture_ilmode: typing.Optional[str],
+    metagenome: typing.Optional[bool],
+    metagenome_n_reads: typing.Optional[str],
+    metagenome_model: typing.Optional[str],
+    wholegenome: typing.Optional[bool],
+    wholegenome_n_reads: typing.Optional[int],
+    wholegenome_r1_length: typing.Optional[int],
+    wholegenome_r2_length: typing.Optional[int],
+    outdir: LatchDir,
+    email: typing.Optional[str],
+    multiqc_title: typing.Optional[str],
+    skip_fastqc: typing.Optional[bool],
+    probe_file: typing.Optional[LatchFile],
+    target_capture_tmedian: typing.Optional[int],
+    target_capture_tshape: typing.Optional[float],
+    metagenome_abundance_file: typing.Optional[LatchFile],
+    metagenome_coverage: typing.Optional[str],
+    metagenome_coverage_file: typing.Optional[LatchFile],
+    metagenome_gc_bias: typing.Optional[bool],
+    genome: typing.Optional[str],
+    ncbidownload_taxids: typing.Optional[LatchFile],
+    multiqc_methods_description: typing.Optional[str],
+    amplicon_engine: typing.Optional[str],
+    amplicon_fw_primer: typing.Optional[str],
+    amplicon_rv_primer: typing.Optional[str],
+    amplicon_seq_system: typing.Optional[str],
+    amplicon_crabs_ispcr_error: typing.Optional[float],
+    probe_ref_name: typing.Optional[str],
+    target_capture_fmedian: typing.Optional[int],
+    target_capture_fshape: typing.Optional[float],
+    target_capture_smedian: typing.Optional[int],
+    target_capture_sshape: typing.Optional[float],
+    metagenome_engine: typing.Optional[str],
+    metagenome_abundance: typing.Optional[str],
+    metagenome_input_format: typing.Optional[str],
+    metagenome_mode: typing.Optional[str],
+    wholegenome_engine: typing.Optional[str],
+    wholegenome_error_rate: typing.Optional[float],
+    wholegenome_outer_dist: typing.Optional[int],
+    wholegenome_standard_dev: typing.Optional[int],
+    wholegenome_mutation_rate: typing.Optional[float],
+    wholegenome_indel_fraction: typing.Optional[float],
+    wholegenome_indel_extended: typing.Optional[float],
+    wholegenome_haplotypes: typing.Optional[bool],
+    ncbidownload_group: typing.Optional[str],
+    ncbidownload_section: typing.Optional[str],
+    ncbidownload_engine: typing.Optional[str],
+    merge_fastas_bgzf: typing.Optional[bool],
+    reference_cache: typing.Optional[bool],
+    local_bookkeeping: typing.Optional[bool],
+    batch_samples: typing.Optional[bool],
+    resume: typing.Optional[bool],
+    resource_monitor: typing.Optional[bool],
+) -> str:
+    # fail on bad inputs within seconds, before a volume is provisioned and Nextflow starts
+    preflight(dict(locals()), Path(input))
+    print("Parameters and samplesheet are valid.")
+
     token = os.environ.get("FLYTE_INTERNAL_EXECUTION_ID")
     if token is None:
         raise RuntimeError("failed to get execution token")
 
     headers = {"Authorization": f"Latch-Execution-Token {token}"}
 
-    print("Provisioning shared storage volume... ", end="")
+    resources = estimate_resources(
+        input,
+        fasta,
+        ncbidownload_accessions,
+        prepare_reference=prepare_reference,
+        output_format=output_format,
+        simulation_shards=simulation_shards,
+        amplicon=amplicon,
+        amplicon_read_count=amplicon_read_count,
+        amplicon_read_length=amplicon_read_length,
+        target_capture=target_capture,
+        target_capture_mode=target_capture_mode,
+        target_capture_num=target_capture_num,
+        target_capture_illen=target_capture_illen,
+        target_capture_pblen=target_capture_pblen,
+        target_capture_ilmode=target_capture_ilmode,
+        metagenome=metagenome,
+        metagenome_n_reads=metagenome_n_reads,
+        metagenome_model=metagenome_model,
+        wholegenome=wholegenome,
+        wholegenome_n_reads=wholegenome_n_reads,
+        wholegenome_r1_length=wholegenome_r1_length,
+        wholegenome_r2_length=wholegenome_r2_length,
+    )
+
+    print(f"Provisioning shared storage volume ({resources.storage_gib} GiB)... ", end="")
     resp = requests.post(
         "http://nf-dispatcher-service.flyte.svc.cluster.local/provision-storage",
         headers=headers,
         json={
-            "storage_gib": 100,
+            "storage_gib": resources.storage_gib,
         },
     )
     resp.raise_for_status()
@@ -44,17 +179,22 @@ def initialize() -> str:
     return resp.json()["name"]
 
 
-@nextflow_runtime_task(cpu=4, memory=8, storage_gib=100)
+@nextflow_runtime_task(cpu=RUNTIME_CPUS, memory=RUNTIME_MEMORY_GIB, storage_gib=100)
 def nextflow_runtime(
     pvc_name: str,
     input: LatchFile,
     outdir: typing_extensions.Annotated[LatchDir, FlyteAnnotation({"output": True})],
     email: typing.Optional[str],
     multiqc_title: typing.Optional[str],
+    skip_fastqc: typing.Optional[bool],
+    local_bookkeeping: typing.Optional[bool],
+    output_format: typing.Optional[str],
     amplicon: typing.Optional[bool],
     target_capture: typing.Optional[bool],
     metagenome: typing.Optional[bool],
     wholegenome: typing.Optional[bool],
+    simulation_shards: typing.Optional[int],
+    batch_samples: typing.Optional[bool],
     probe_file: typing.Optional[LatchFile],
     target_capture_tmedian: typing.Optional[int],
     target_capture_tshape: typing.Optional[float],
@@ -64,9 +204,11 @@ def nextflow_runtime(
     metagenome_gc_bias: typing.Optional[bool],
     genome: typing.Optional[str],
     fasta: typing.Optional[LatchFile],
+    prepare_reference: typing.Optional[bool],
     ncbidownload_accessions: typing.Optional[LatchFile],
     ncbidownload_taxids: typing.Optional[LatchFile],
     multiqc_methods_description: typing.Optional[str],
+    amplicon_engine: typing.Optional[str],
     amplicon_fw_primer: typing.Optional[str],
     amplicon_rv_primer: typing.Optional[str],
     amplicon_read_count: typing.Optional[int],
@@ -74,6 +216,7 @@ def nextflow_runtime(
     amplicon_seq_system: typing.Optional[str],
     amplicon_crabs_ispcr_error: typing.Optional[float],
     probe_ref_name: typing.Optional[str],
+    target_capture_engine: typing.Optional[str],
     target_capture_mode: typing.Optional[str],
     target_capture_fmedian: typing.Optional[int],
     target_capture_fshape: typing.Optional[float],
@@ -83,11 +226,13 @@ def nextflow_runtime(
     target_capture_illen: typing.Optional[int],
     target_capture_pblen: typing.Optional[int],
     target_capture_ilmode: typing.Optional[str],
+    metagenome_engine: typing.Optional[str],
     metagenome_abundance: typing.Optional[str],
     metagenome_input_format: typing.Optional[str],
     metagenome_n_reads: typing.Optional[str],
     metagenome_mode: typing.Optional[str],
     metagenome_model: typing.Optional[str],
+    wholegenome_engine: typing.Optional[str],
     wholegenome_error_rate: typing.Optional[float],
     wholegenome_outer_dist: typing.Optional[int],
     wholegenome_standard_dev: typing.Optional[int],
@@ -97,11 +242,23 @@ def nextflow_runtime(
     wholegenome_mutation_rate: typing.Optional[float],
     wholegenome_indel_fraction: typing.Optional[float],
     wholegenome_indel_extended: typing.Optional[float],
+    wholegenome_haplotypes: typing.Optional[bool],
     ncbidownload_group: typing.Optional[str],
     ncbidownload_section: typing.Optional[str],
+    ncbidownload_engine: typing.Optional[str],
+    merge_fastas_bgzf: typing.Optional[bool],
+    reference_cache: typing.Optional[bool],
+    resume: typing.Optional[bool],
+    resource_monitor: typing.Optional[bool],
 ) -> None:
+    parameters = dict(locals())
+    shared_dir = Path("/nf-workdir")
+    local_outdir = shared_dir / "outdir"
+    succeeded = False
+    work_cache = None
+    work_key = None
+    monitor = None
     try:
-        shared_dir = Path("/nf-workdir")
 
         ignore_list = [
             "latch",
@@ -115,13 +272,96 @@ def nextflow_runtime(
             "mambaforge",
         ]
 
-        shutil.copytree(
-            Path("/root"),
-            shared_dir,
-            ignore=lambda src, names: ignore_list,
-            ignore_dangling_symlinks=True,
-            dirs_exist_ok=True,
+        staging = sync_tree(Path("/root"), shared_dir, ignore=ignore_list)
+        print(staging.summary())
+
+        resources = estimate_resources(
+            input,
+            fasta,
+            ncbidownload_accessions,
+            prepare_reference=prepare_reference,
+            output_format=output_format,
+            simulation_shards=simulation_shards,
+            amplicon=amplicon,
+            amplicon_read_count=amplicon_read_count,
+            amplicon_read_length=amplicon_read_length,
+            target_capture=target_capture,
+            target_capture_mode=target_capture_mode,
+            target_capture_num=target_capture_num,
+            target_capture_illen=target_capture_illen,
+            target_capture_pblen=target_capture_pblen,
+            target_capture_ilmode=target_capture_ilmode,
+            metagenome=metagenome,
+            metagenome_n_reads=metagenome_n_reads,
+            metagenome_model=metagenome_model,
+            wholegenome=wholegenome,
+            wholegenome_n_reads=wholegenome_n_reads,
+            wholegenome_r1_length=wholegenome_r1_length,
+            wholegenome_r2_length=wholegenome_r2_length,
+        )
+        resources.write_config(shared_dir / "sizing.config")
+        (shared_dir / "trace.config").write_text(trace_config())
+        print(
+            f"Sized run: {resources.storage_gib} GiB work volume, "
+            f"{resources.java_heap_gib} GiB Nextflow heap on {resources.runtime_cpus} CPUs"
         )
+        if not resources.fits_runtime():
+            print(
+                f"Warning: this run would benefit from a {resources.runtime_cpus} CPU, "
+                f"{resources.runtime_memory_gib} GiB runtime; it is limited to {RUNTIME_CPUS} CPUs "
+                f"and {RUNTIME_MEMORY_GIB} GiB"
+            )
+
+        reference_flags = [
+            *get_flag("fasta", fasta),
+            *get_flag("ncbidownload_accessions", ncbidownload_accessions),
+            *get_flag("ncbidownload_taxids", ncbidownload_taxids),
+        ]
+
+        cache = None
+        cache_key = None
+        cache_dir = None
+        if reference_cache and fasta is None and genome is None:
+            cache = LatchCache("references", REFERENCE_CACHE_MAX_GIB * 2**30)
+            cache_key = reference_cache_key(
+                Path(ncbidownload_accessions) if ncbidownload_accessions is not None else None,
+                Path(ncbidownload_taxids) if ncbidownload_taxids is not None else None,
+                ncbidownload_group,
+                ncbidownload_section,
+            )
+            cache_dir = shared_dir / "reference_cache" / cache_key
+
+            print(f"Looking up reference {cache_key} in the cache... ", end="")
+            cached = cache.fetch(cache_key, cache_dir)
+            if cached is not None:
+                print("Hit, skipping NCBI download.")
+                fasta_path = next(path for path in cached if path.name.endswith(".fa.gz"))
+                reference_flags = ["--fasta", str(fasta_path)]
+                cache = None
+            else:
+                print("Miss.")
+                reference_flags.extend(["--reference_cache_dir", str(cache_dir)])
+
+        if reference_cache and target_capture:
+            reference_flags.extend(["--bowtie2_index_cache", urljoins(CACHE_ROOT, "bowtie2")])
+        if reference_cache and wholegenome and wholegenome_haplotypes:
+            reference_flags.extend(["--haplotype_cache", urljoins(CACHE_ROOT, "haplotypes")])
+
+        resume_flags = []
+        if resume:
+            version = Path("version").read_text().strip()
+            work_cache = WorkDirCache(version)
+            work_key = resume_key(version, parameters)
+            (shared_dir / "resume.config").write_text(RESUME_CONFIG)
+            resume_flags = ["-c", "resume.config"]
+
+            print(f"Looking up work directory {work_key}... ", end="")
+            restored = work_cache.restore(work_key, shared_dir)
+            if restored is not None:
+                print(f"Hit, resuming with {restored} task directories.")
+                resume_flags.append("-resume")
+            else:
+                print("Miss, starting from scratch.")
 
         cmd = [
             "/root/nextflow",
@@ -133,14 +373,31 @@ def nextflow_runtime(
             "docker",
             "-c",
             "latch.config",
+            "-c",
+            "trace.config",
+            *resume_flags,
             *get_flag("input", input),
-            *get_flag("outdir", outdir),
+            "--outdir",
+            str(local_outdir),
+            # the samplesheets list the reads where publish_tree uploads them
+            "--samplesheet_outdir",
+            outdir.remote_path.rstrip("/"),
+            "--sizing_config",
+            str(shared_dir / "sizing.config"),
+            "--publish_dir_mode",
+            "link",
             *get_flag("email", email),
             *get_flag("multiqc_title", multiqc_title),
+            *get_flag("skip_fastqc", skip_fastqc),
+            *get_flag("local_bookkeeping", local_bookkeeping),
+            *get_flag("output_format", output_format),
             *get_flag("amplicon", amplicon),
             *get_flag("target_capture", target_capture),
             *get_flag("metagenome", metagenome),
             *get_flag("wholegenome", wholegenome),
+            *get_flag("simulation_shards", simulation_shards),
+            *get_flag("batch_samples", batch_samples),
+            *get_flag("amplicon_engine", amplicon_engine),
             *get_flag("amplicon_fw_primer", amplicon_fw_primer),
             *get_flag("amplicon_rv_primer", amplicon_rv_primer),
             *get_flag("amplicon_read_count", amplicon_read_count),
@@ -149,6 +406,7 @@ def nextflow_runtime(
             *get_flag("amplicon_crabs_ispcr_error", amplicon_crabs_ispcr_error),
             *get_flag("probe_file", probe_file),
             *get_flag("probe_ref_name", probe_ref_name),
+            *get_flag("target_capture_engine", target_capture_engine),
             *get_flag("target_capture_mode", target_capture_mode),
             *get_flag("target_capture_fmedian", target_capture_fmedian),
             *get_flag("target_capture_fshape", target_capture_fshape),
@@ -160,6 +418,7 @@ def nextflow_runtime(
             *get_flag("target_capture_illen", target_capture_illen),
             *get_flag("target_capture_pblen", target_capture_pblen),
             *get_flag("target_capture_ilmode", target_capture_ilmode),
+            *get_flag("metagenome_engine", metagenome_engine),
             *get_flag("metagenome_abundance", metagenome_abundance),
             *get_flag("metagenome_abundance_file", metagenome_abundance_file),
             *get_flag("metagenome_coverage", metagenome_coverage),
@@ -169,6 +428,7 @@ def nextflow_runtime(
             *get_flag("metagenome_mode", metagenome_mode),
             *get_flag("metagenome_model", metagenome_model),
             *get_flag("metagenome_gc_bias", metagenome_gc_bias),
+            *get_flag("wholegenome_engine", wholegenome_engine),
             *get_flag("wholegenome_error_rate", wholegenome_error_rate),
             *get_flag("wholegenome_outer_dist", wholegenome_outer_dist),
             *get_flag("wholegenome_standard_dev", wholegenome_standard_dev),
@@ -178,12 +438,14 @@ def nextflow_runtime(
             *get_flag("wholegenome_mutation_rate", wholegenome_mutation_rate),
             *get_flag("wholegenome_indel_fraction", wholegenome_indel_fraction),
             *get_flag("wholegenome_indel_extended", wholegenome_indel_extended),
+            *get_flag("wholegenome_haplotypes", wholegenome_haplotypes),
             *get_flag("genome", genome),
-            *get_flag("fasta", fasta),
-            *get_flag("ncbidownload_accessions", ncbidownload_accessions),
-            *get_flag("ncbidownload_taxids", ncbidownload_taxids),
+            *get_flag("prepare_reference", prepare_reference),
+            *reference_flags,
             *get_flag("ncbidownload_group", ncbidownload_group),
             *get_flag("ncbidownload_section", ncbidownload_section),
+            *get_flag("ncbidownload_engine", ncbidownload_engine),
+            *get_flag("merge_fastas_bgzf", merge_fastas_bgzf),
             *get_flag("multiqc_methods_description", multiqc_methods_description),
         ]
 
@@ -194,28 +456,95 @@ def nextflow_runtime(
         env = {
             **os.environ,
             "NXF_HOME": "/root/.nextflow",
-            "NXF_OPTS": "-Xms2048M -Xmx8G -XX:ActiveProcessorCount=4",
+            "NXF_OPTS": resources.nxf_opts(),
             "K8S_STORAGE_CLAIM_NAME": pvc_name,
             "NXF_DISABLE_CHECK_LATEST": "true",
         }
-        subprocess.run(
-            cmd,
-            env=env,
-            check=True,
-            cwd=str(shared_dir),
-        )
+        process = subprocess.Popen(cmd, env=env, cwd=str(shared_dir))
+        if resource_monitor:
+            monitor = ResourceMonitor(process.pid, shared_dir)
+            monitor.start()
+        try:
+            returncode = process.wait()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        finally:
+            if monitor is not None:
+                monitor.stop()
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, cmd)
+
+        if cache is not None:
+            files = sorted(cache_dir.glob("*.fa.gz*"))
+            if files:
+                print(f"Storing reference {cache_key} in the cache")
+                cache.store(
+                    cache_key,
+                    files,
+                    {"ncbidownload_group": ncbidownload_group, "ncbidownload_section": ncbidownload_section},
+                )
+        succeeded = True
     finally:
         print()
 
+        # Nextflow publishes to the work volume; results (partial ones too, if the run failed) are uploaded from there
+        publish_error = None
+        if local_outdir.exists():
+            print(f"Publishing results to {outdir.remote_path}")
+            try:
+                report = publish_tree(local_outdir, outdir.remote_path, UploadClient.from_execution())
+                print(report.summary())
+                if report.failed:
+                    publish_error = RuntimeError(f"{len(report.failed)} result file(s) failed to upload")
+            except RuntimeError as e:
+                print(f"Failed to publish results: {e}")
+                publish_error = e
+
+        # the nf-core execution trace, which is also published with the results
+        trace_file = latest_trace(local_outdir / "pipeline_info")
+        if work_cache is not None and (shared_dir / ".nextflow").exists():
+            try:
+                new, total = work_cache.save(work_key, shared_dir, completed_tasks(trace_file), prune=succeeded)
+                print(f"Saved work directory {work_key}: {new} new of {total} task directories")
+            except Exception as e:
+                print(f"Failed to save the work directory for -resume: {e}")
+
         nextflow_log = shared_dir / ".nextflow.log"
+        uploads = []
+        manifest = local_outdir / "pipeline_info" / MANIFEST
+        if manifest.exists():
+            uploads.append((manifest, MANIFEST))
         if nextflow_log.exists():
+            uploads.append((nextflow_log, "nextflow.log"))
+        if trace_file is not None:
+            try:
+                json_path, table_path, table = write_summary(trace_file, shared_dir)
+                print("Per-process summary:")
+                print(table)
+                uploads.extend([(trace_file, "trace.tsv"), (json_path, json_path.name), (table_path, table_path.name)])
+            except (OSError, ValueError) as e:
+                print(f"Failed to summarize the Nextflow trace: {e}")
+        if monitor is not None and monitor.samples:
+            print(monitor.summary())
+            for warning in monitor.warnings:
+                print(f"  {warning}")
+            timeline, summary = monitor.write(shared_dir)
+            uploads.extend([(timeline, timeline.name), (summary, summary.name)])
+
+        if uploads:
             name = _get_execution_name()
             if name is None:
                 print("Skipping logs upload, failed to get execution name")
             else:
-                remote = LPath(urljoins("latch:///your_log_dir/nf_nf_core_readsimulator", name, "nextflow.log"))
-                print(f"Uploading .nextflow.log to {remote.path}")
-                remote.upload_from(nextflow_log)
+                for local, filename in uploads:
+                    remote = LPath(urljoins("latch:///your_log_dir/nf_nf_core_readsimulator", name, filename))
+                    print(f"Uploading {local.name} to {remote.path}")
+                    remote.upload_from(local)
+
+        if publish_error is not None and succeeded:
+            raise publish_error
 
 
 @workflow(metadata._nextflow_metadata)
@@ -224,6 +553,7 @@ def nf_nf_core_readsimulator(
     outdir: typing_extensions.Annotated[LatchDir, FlyteAnnotation({"output": True})],
     email: typing.Optional[str],
     multiqc_title: typing.Optional[str],
+    skip_fastqc: typing.Optional[bool],
     amplicon: typing.Optional[bool],
     target_capture: typing.Optional[bool],
     metagenome: typing.Optional[bool],
@@ -240,6 +570,8 @@ def nf_nf_core_readsimulator(
     ncbidownload_accessions: typing.Optional[LatchFile],
     ncbidownload_taxids: typing.Optional[LatchFile],
     multiqc_methods_description: typing.Optional[str],
+    simulation_shards: typing.Optional[int] = 1,
+    amplicon_engine: typing.Optional[str] = "crabs",
     amplicon_fw_primer: typing.Optional[str] = "GTCGGTAAAACTCGTGCCAGC",
     amplicon_rv_primer: typing.Optional[str] = "CATAGTGGGGTATCTAATCCCAGTTTG",
     amplicon_read_count: typing.Optional[int] = 500,
@@ -247,6 +579,7 @@ def nf_nf_core_readsimulator(
     amplicon_seq_system: typing.Optional[str] = "HS25",
     amplicon_crabs_ispcr_error: typing.Optional[float] = 4.5,
     probe_ref_name: typing.Optional[str] = "Tetrapods-UCE-5Kv1",
+    target_capture_engine: typing.Optional[str] = "capsim",
     target_capture_mode: typing.Optional[str] = "illumina",
     target_capture_fmedian: typing.Optional[int] = 500,
     target_capture_fshape: typing.Optional[float] = 6.0,
@@ -256,11 +589,13 @@ def nf_nf_core_readsimulator(
     target_capture_illen: typing.Optional[int] = 150,
     target_capture_pblen: typing.Optional[int] = 30000,
     target_capture_ilmode: typing.Optional[str] = "pe",
+    metagenome_engine: typing.Optional[str] = "insilicoseq",
     metagenome_abundance: typing.Optional[str] = "lognormal",
     metagenome_input_format: typing.Optional[str] = "genomes",
     metagenome_n_reads: typing.Optional[str] = "1M",
     metagenome_mode: typing.Optional[str] = "kde",
     metagenome_model: typing.Optional[str] = "MiSeq",
+    wholegenome_engine: typing.Optional[str] = "wgsim",
     wholegenome_error_rate: typing.Optional[float] = 0.02,
     wholegenome_outer_dist: typing.Optional[int] = 500,
     wholegenome_standard_dev: typing.Optional[int] = 50,
@@ -270,8 +605,18 @@ def nf_nf_core_readsimulator(
     wholegenome_mutation_rate: typing.Optional[float] = 0.001,
     wholegenome_indel_fraction: typing.Optional[float] = 0.15,
     wholegenome_indel_extended: typing.Optional[float] = 0.3,
+    wholegenome_haplotypes: typing.Optional[bool] = False,
     ncbidownload_group: typing.Optional[str] = "all",
     ncbidownload_section: typing.Optional[str] = "refseq",
+    ncbidownload_engine: typing.Optional[str] = "ncbi-genome-download",
+    merge_fastas_bgzf: typing.Optional[bool] = True,
+    prepare_reference: typing.Optional[bool] = True,
+    reference_cache: typing.Optional[bool] = True,
+    local_bookkeeping: typing.Optional[bool] = True,
+    batch_samples: typing.Optional[bool] = False,
+    output_format: typing.Optional[str] = "fastq",
+    resume: typing.Optional[bool] = False,
+    resource_monitor: typing.Optional[bool] = True,
 ) -> None:
     """
     nf-core/readsimulator
@@ -279,17 +624,92 @@ def nf_nf_core_readsimulator(
     Sample Description
     """
 
-    pvc_name: str = initialize()
+    pvc_name: str = initialize(
+        input=input,
+        fasta=fasta,
+        ncbidownload_accessions=ncbidownload_accessions,
+        prepare_reference=prepare_reference,
+        output_format=output_format,
+        simulation_shards=simulation_shards,
+        amplicon=amplicon,
+        amplicon_read_count=amplicon_read_count,
+        amplicon_read_length=amplicon_read_length,
+        target_capture=target_capture,
+        target_capture_engine=target_capture_engine,
+        target_capture_mode=target_capture_mode,
+        target_capture_num=target_capture_num,
+        target_capture_illen=target_capture_illen,
+        target_capture_pblen=target_capture_pblen,
+        target_capture_ilmode=target_capture_ilmode,
+        metagenome=metagenome,
+        metagenome_n_reads=metagenome_n_reads,
+        metagenome_model=metagenome_model,
+        wholegenome=wholegenome,
+        wholegenome_n_reads=wholegenome_n_reads,
+        wholegenome_r1_length=wholegenome_r1_length,
+        wholegenome_r2_length=wholegenome_r2_length,
+        outdir=outdir,
+        email=email,
+        multiqc_title=multiqc_title,
+        skip_fastqc=skip_fastqc,
+        probe_file=probe_file,
+        target_capture_tmedian=target_capture_tmedian,
+        target_capture_tshape=target_capture_tshape,
+        metagenome_abundance_file=metagenome_abundance_file,
+        metagenome_coverage=metagenome_coverage,
+        metagenome_coverage_file=metagenome_coverage_file,
+        metagenome_gc_bias=metagenome_gc_bias,
+        genome=genome,
+        ncbidownload_taxids=ncbidownload_taxids,
+        multiqc_methods_description=multiqc_methods_description,
+        amplicon_engine=amplicon_engine,
+        amplicon_fw_primer=amplicon_fw_primer,
+        amplicon_rv_primer=amplicon_rv_primer,
+        amplicon_seq_system=amplicon_seq_system,
+        amplicon_crabs_ispcr_error=amplicon_crabs_ispcr_error,
+        probe_ref_name=probe_ref_name,
+        target_capture_fmedian=target_capture_fmedian,
+        target_capture_fshape=target_capture_fshape,
+        target_capture_smedian=target_capture_smedian,
+        target_capture_sshape=target_capture_sshape,
+        metagenome_engine=metagenome_engine,
+        metagenome_abundance=metagenome_abundance,
+        metagenome_input_format=metagenome_input_format,
+        metagenome_mode=metagenome_mode,
+        wholegenome_engine=wholegenome_engine,
+        wholegenome_error_rate=wholegenome_error_rate,
+        wholegenome_outer_dist=wholegenome_outer_dist,
+        wholegenome_standard_dev=wholegenome_standard_dev,
+        wholegenome_mutation_rate=wholegenome_mutation_rate,
+        wholegenome_indel_fraction=wholegenome_indel_fraction,
+        wholegenome_indel_extended=wholegenome_indel_extended,
+        wholegenome_haplotypes=wholegenome_haplotypes,
+        ncbidownload_group=ncbidownload_group,
+        ncbidownload_section=ncbidownload_section,
+        ncbidownload_engine=ncbidownload_engine,
+        merge_fastas_bgzf=merge_fastas_bgzf,
+        reference_cache=reference_cache,
+        local_bookkeeping=local_bookkeeping,
+        batch_samples=batch_samples,
+        resume=resume,
+        resource_monitor=resource_monitor,
+    )
     nextflow_runtime(
         pvc_name=pvc_name,
         input=input,
         outdir=outdir,
         email=email,
         multiqc_title=multiqc_title,
+        skip_fastqc=skip_fastqc,
+        local_bookkeeping=local_bookkeeping,
+        output_format=output_format,
         amplicon=amplicon,
         target_capture=target_capture,
         metagenome=metagenome,
         wholegenome=wholegenome,
+        simulation_shards=simulation_shards,
+        batch_samples=batch_samples,
+        amplicon_engine=amplicon_engine,
         amplicon_fw_primer=amplicon_fw_primer,
         amplicon_rv_primer=amplicon_rv_primer,
         amplicon_read_count=amplicon_read_count,
@@ -298,6 +718,7 @@ def nf_nf_core_readsimulator(
         amplicon_crabs_ispcr_error=amplicon_crabs_ispcr_error,
         probe_file=probe_file,
         probe_ref_name=probe_ref_name,
+        target_capture_engine=target_capture_engine,
         target_capture_mode=target_capture_mode,
         target_capture_fmedian=target_capture_fmedian,
         target_capture_fshape=target_capture_fshape,
@@ -309,6 +730,7 @@ def nf_nf_core_readsimulator(
         target_capture_illen=target_capture_illen,
         target_capture_pblen=target_capture_pblen,
         target_capture_ilmode=target_capture_ilmode,
+        metagenome_engine=metagenome_engine,
         metagenome_abundance=metagenome_abundance,
         metagenome_abundance_file=metagenome_abundance_file,
         metagenome_coverage=metagenome_coverage,
@@ -318,6 +740,7 @@ def nf_nf_core_readsimulator(
         metagenome_mode=metagenome_mode,
         metagenome_model=metagenome_model,
         metagenome_gc_bias=metagenome_gc_bias,
+        wholegenome_engine=wholegenome_engine,
         wholegenome_error_rate=wholegenome_error_rate,
         wholegenome_outer_dist=wholegenome_outer_dist,
         wholegenome_standard_dev=wholegenome_standard_dev,
@@ -327,11 +750,18 @@ def nf_nf_core_readsimulator(
         wholegenome_mutation_rate=wholegenome_mutation_rate,
         wholegenome_indel_fraction=wholegenome_indel_fraction,
         wholegenome_indel_extended=wholegenome_indel_extended,
+        wholegenome_haplotypes=wholegenome_haplotypes,
         genome=genome,
         fasta=fasta,
+        prepare_reference=prepare_reference,
         ncbidownload_accessions=ncbidownload_accessions,
         ncbidownload_taxids=ncbidownload_taxids,
         ncbidownload_group=ncbidownload_group,
         ncbidownload_section=ncbidownload_section,
+        ncbidownload_engine=ncbidownload_engine,
+        merge_fastas_bgzf=merge_fastas_bgzf,
         multiqc_methods_description=multiqc_methods_description,
+        reference_cache=reference_cache,
+        resume=resume,
+        resource_monitor=resource_monitor,
     )
@@ -0,0 +1,359 @@
+import json
+import os
+import re
+import shutil
+import struct
+import threading
+import time
+import typing
+from dataclasses import asdict, dataclass, fields
+from pathlib import Path
+
+GIB = 2**30
+
+SAMPLE_INTERVAL = 10
+TIMELINE = "resource_timeline.tsv"
+SUMMARY = "resource_summary.json"
+
+# Warn once the old generation (the live heap after collections) or the work
+# volume fills this fraction of its limit, or collections take this fraction of
+# the time between two samples
+HEAP_WARN_FRACTION = 0.9
+DISK_WARN_FRACTION = 0.9
+GC_WARN_FRACTION = 0.25
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+# The JVM publishes its heap and GC counters in a memory-mapped hsperfdata file
+# (the source `jstat` reads); see PerfDataPrologue and PerfDataEntry in
+# hotspot's perfMemory.hpp
+_PERFDATA_MAGIC = b"\xca\xfe\xc0\xc0"
+# entry_offset and num_entries, after magic, byte order, versions, used, overflow and mod_time_stamp
+_PERFDATA_ENTRIES = (24, "ii")
+# entry_length, name_offset, vector_length, data_type, flags, data_units, data_variability, data_offset
+_PERFDATA_ENTRY = "iiiBBBBi"
+_YOUNG_OLD_SPACE = re.compile(r"sun\.gc\.generation\.([01])\.space\.\d+\.used")
+_COLLECTOR = re.compile(r"sun\.gc\.collector\.\d+\.invocations")
+
+
+@dataclass
+class ResourceSample:
+    elapsed_s: float
+    processes: int
+    # percent of one CPU over the last interval, summed over the process tree
+    cpu_percent: float
+    rss_bytes: int
+    open_fds: int
+    disk_used_bytes: int
+    disk_total_bytes: int
+    heap_used_bytes: typing.Optional[int] = None
+    heap_old_bytes: typing.Optional[int] = None
+    heap_committed_bytes: typing.Optional[int] = None
+    heap_old_max_bytes: typing.Optional[int] = None
+    heap_max_bytes: typing.Optional[int] = None
+    gc_count: typing.Optional[int] = None
+    gc_seconds: typing.Optional[float] = None
+
+
+@dataclass
+class JvmStats:
+    heap_used_bytes: int
+    heap_old_bytes: int
+    heap_committed_bytes: int
+    heap_old_max_bytes: int
+    heap_max_bytes: int
+    gc_count: int
+    gc_seconds: float
+
+
+def _read_stat(proc: Path, pid: int) -> typing.Optional[typing.Tuple[str, int, int]]:
+    """`(command, parent pid, CPU ticks of the process and its reaped children)` from /proc/<pid>/stat."""
+    try:
+        text = (proc / str(pid) / "stat").read_text()
+    except OSError:
+        return None
+    # the command is in parentheses and may itself contain spaces and parentheses
+    head, _, rest = text.rpartition(")")
+    fields_ = rest.split()
+    ticks = sum(int(value) for value in fields_[11:15])
+    return head.partition("(")[2], int(fields_[1]), ticks
+
+
+def process_tree(root: int, proc: Path = Path("/proc")) -> typing.Dict[int, typing.Tuple[str, int]]:
+    """`pid -> (command, CPU ticks)` of `root` and all of its descendants."""
+    stats = {}
+    children: typing.Dict[int, typing.List[int]] = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        stat = _read_stat(proc, int(entry.name))
+        if stat is None:
+            continue
+        stats[int(entry.name)] = stat
+        children.setdefault(stat[1], []).append(int(entry.name))
+    tree = {}
+    pending = [root]
+    while pending:
+        pid = pending.pop()
+        if pid in stats and pid not in tree:
+            tree[pid] = (stats[pid][0], stats[pid][2])
+            pending.extend(children.get(pid, []))
+    return tree
+
+
+def _rss_bytes(proc: Path, pid: int) -> int:
+    try:
+        return int((proc / str(pid) / "statm").read_text().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _open_fds(proc: Path, pid: int) -> int:
+    try:
+        return len(os.listdir(proc / str(pid) / "fd"))
+    except OSError:
+        return 0
+
+
+def read_perfdata(path: Path) -> typing.Dict[str, typing.Union[int, str]]:
+    """The scalar long counters and the strings of an hsperfdata file."""
+    data = path.read_bytes()
+    if data[:4] != _PERFDATA_MAGIC:
+        raise ValueError(f"{path} is not an hsperfdata file")
+    order = "<" if data[4] == 1 else ">"
+    position, layout = _PERFDATA_ENTRIES
+    entry_offset, num_entries = struct.unpack_from(order + layout, data, position)
+    counters = {}
+    offset = entry_offset
+    for _ in range(num_entries):
+        length, name_offset, vector_length, data_type, _, _, _, data_offset = struct.unpack_from(
+            order + _PERFDATA_ENTRY, data, offset
+        )
+        if length <= 0:
+            break
+        start = offset + name_offset
+        name = data[start : data.index(b"\0", start)].decode("ascii", "replace")
+        if data_type == ord("J") and vector_length == 0:
+            counters[name] = struct.unpack_from(order + "q", data, offset + data_offset)[0]
+        elif data_type == ord("B") and vector_length > 0:
+            value = data[offset + data_offset : offset + data_offset + vector_length]
+            counters[name] = value.split(b"\0", 1)[0].decode("ascii", "replace")
+        offset += length
+    return counters
+
+
+def jvm_stats(counters: typing.Dict[str, typing.Union[int, str]]) -> typing.Optional[JvmStats]:
+    """Heap and GC totals from hsperfdata counters, computed as `jstat -gc` does."""
+    if "sun.gc.generation.0.capacity" not in counters:
+        return None
+    longs = {name: value for name, value in counters.items() if isinstance(value, int)}
+    used = {"0": 0, "1": 0}
+    for name, value in longs.items():
+        match = _YOUNG_OLD_SPACE.fullmatch(name)
+        if match:
+            used[match.group(1)] += value
+    young_max = longs.get("sun.gc.generation.0.maxCapacity", 0)
+    old_max = longs.get("sun.gc.generation.1.maxCapacity", 0)
+    # G1 regions move between the generations, so both report the whole heap as their maximum
+    g1 = counters.get("sun.gc.policy.name") == "GarbageFirst"
+    collectors = [name[: -len(".invocations")] for name in longs if _COLLECTOR.fullmatch(name)]
+    return JvmStats(
+        heap_used_bytes=used["0"] + used["1"],
+        heap_old_bytes=used["1"],
+        heap_committed_bytes=sum(longs.get(f"sun.gc.generation.{g}.capacity", 0) for g in "01"),
+        heap_old_max_bytes=old_max,
+        heap_max_bytes=max(young_max, old_max) if g1 else young_max + old_max,
+        gc_count=sum(longs.get(f"{c}.invocations", 0) for c in collectors),
+        gc_seconds=sum(longs.get(f"{c}.time", 0) for c in collectors) / (longs.get("sun.os.hrt.frequency") or 1),
+    )
+
+
+def _perfdata_path(directory: Path, pid: int) -> typing.Optional[Path]:
+    for path in directory.glob(f"hsperfdata_*/{pid}"):
+        return path
+    return None
+
+
+def _gib(nbytes: float) -> str:
+    return f"{nbytes / GIB:.1f} GiB"
+
+
+class ResourceMonitor:
+    """Samples a process tree and its work volume from /proc on a background thread.
+
+    Every `interval` seconds it records the CPU use, RSS and open file
+    descriptors summed over `pid` and its descendants, the usage of `volume`
+    and, for a JVM in the tree that publishes hsperfdata, its heap and GC
+    totals. A warning is printed the first time the old generation or the
+    volume nears its limit, or collections take a large share of an interval,
+    and is kept in `warnings`.
+
+        monitor = ResourceMonitor(process.pid, Path("/nf-workdir"))
+        monitor.start()
+        process.wait()
+        monitor.stop()
+        timeline, summary = monitor.write(Path("/nf-workdir"))
+    """
+
+    def __init__(
+        self,
+        pid: int,
+        volume: Path,
+        interval: float = SAMPLE_INTERVAL,
+        proc: Path = Path("/proc"),
+        perfdata_dir: Path = Path("/tmp"),
+    ):
+        self.pid = pid
+        self.volume = volume
+        self.interval = interval
+        self.proc = proc
+        self.perfdata_dir = perfdata_dir
+        self.samples: typing.List[ResourceSample] = []
+        self.warnings: typing.List[str] = []
+        self._warned: typing.Set[str] = set()
+        self._started = time.monotonic()
+        self._previous: typing.Optional[ResourceSample] = None
+        self._previous_ticks = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="resource-monitor", daemon=True)
+
+    def start(self) -> None:
+        self._started = time.monotonic()
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the sampler thread."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                # monitoring must never take the run down with it
+                print(f"Resource monitor: sampling failed: {e}", flush=True)
+            if self._stop.wait(self.interval):
+                break
+
+    def sample(self) -> ResourceSample:
+        now = time.monotonic()
+        tree = process_tree(self.pid, self.proc)
+        ticks = sum(t for _, t in tree.values())
+        disk = shutil.disk_usage(self.volume)
+        sample = ResourceSample(
+            elapsed_s=round(now - self._started, 1),
+            processes=len(tree),
+            cpu_percent=0.0,
+            rss_bytes=sum(_rss_bytes(self.proc, pid) for pid in tree),
+            open_fds=sum(_open_fds(self.proc, pid) for pid in tree),
+            disk_used_bytes=disk.used,
+            disk_total_bytes=disk.total,
+        )
+        previous = self._previous
+        if previous is not None and sample.elapsed_s > previous.elapsed_s:
+            # exited children's time moves to their parent's reaped-children counters, so the sum stays continuous
+            seconds = max(ticks - self._previous_ticks, 0) / _CLOCK_TICKS
+            sample.cpu_percent = round(100 * seconds / (sample.elapsed_s - previous.elapsed_s), 1)
+        for pid, (command, _) in tree.items():
+            path = _perfdata_path(self.perfdata_dir, pid) if command == "java" else None
+            if path is None:
+                continue
+            try:
+                jvm = jvm_stats(read_perfdata(path))
+            except (OSError, ValueError, struct.error):
+                continue
+            if jvm is not None:
+                for name, value in asdict(jvm).items():
+                    setattr(sample, name, value)
+                break
+        self._check(sample, previous)
+        self.samples.append(sample)
+        self._previous = sample
+        self._previous_ticks = ticks
+        return sample
+
+    def _warn(self, kind: str, message: str) -> None:
+        if kind in self._warned:
+            return
+        self._warned.add(kind)
+        self.warnings.append(message)
+        print(f"Warning: {message}", flush=True)
+
+    def _check(self, sample: ResourceSample, previous: typing.Optional[ResourceSample]) -> None:
+        at = f"after {sample.elapsed_s:.0f} s"
+        if sample.disk_total_bytes and sample.disk_used_bytes >= DISK_WARN_FRACTION * sample.disk_total_bytes:
+            self._warn(
+                "disk",
+                f"the work volume is {sample.disk_used_bytes / sample.disk_total_bytes:.0%} full "
+                f"({_gib(sample.disk_used_bytes)} of {_gib(sample.disk_total_bytes)}) {at}",
+            )
+        if sample.heap_old_bytes is not None and sample.heap_old_max_bytes:
+            if sample.heap_old_bytes >= HEAP_WARN_FRACTION * sample.heap_old_max_bytes:
+                self._warn(
+                    "heap",
+                    f"the Nextflow heap holds {_gib(sample.heap_old_bytes)} in its old generation, "
+                    f"{sample.heap_old_bytes / sample.heap_old_max_bytes:.0%} of the "
+                    f"{_gib(sample.heap_old_max_bytes)} it may grow to, {at}",
+                )
+        if previous is not None and sample.gc_seconds is not None and previous.gc_seconds is not None:
+            share = (sample.gc_seconds - previous.gc_seconds) / max(sample.elapsed_s - previous.elapsed_s, 1e-9)
+            if share >= GC_WARN_FRACTION:
+                self._warn("gc", f"Nextflow spent {share:.0%} of its time in garbage collection {at}")
+
+    def peaks(self) -> typing.Dict[str, typing.Any]:
+        if not self.samples:
+            return {}
+        peaks: typing.Dict[str, typing.Any] = {}
+        for name in ("cpu_percent", "rss_bytes", "open_fds", "disk_used_bytes", "heap_used_bytes", "heap_old_bytes"):
+            values = [getattr(s, name) for s in self.samples if getattr(s, name) is not None]
+            peaks[name] = max(values) if values else None
+        cpu = [s.cpu_percent for s in self.samples[1:]]
+        peaks["mean_cpu_percent"] = round(sum(cpu) / len(cpu), 1) if cpu else None
+        last = self.samples[-1]
+        peaks.update(
+            disk_total_bytes=last.disk_total_bytes,
+            heap_max_bytes=last.heap_max_bytes,
+            gc_count=last.gc_count,
+            gc_seconds=last.gc_seconds,
+        )
+        return peaks
+
+    def summary(self) -> str:
+        peaks = self.peaks()
+        if not peaks:
+            return "Runtime resources: no samples"
+        parts = [
+            f"{len(self.samples)} samples over {self.samples[-1].elapsed_s:.0f} s",
+            f"CPU {(peaks['mean_cpu_percent'] or 0) / 100:.1f} mean / {peaks['cpu_percent'] / 100:.1f} peak CPUs",
+            f"RSS {_gib(peaks['rss_bytes'])}",
+            f"{peaks['open_fds']} open files",
+            f"work volume {_gib(peaks['disk_used_bytes'])} of {_gib(peaks['disk_total_bytes'])}",
+        ]
+        if peaks["heap_used_bytes"] is not None:
+            parts.append(
+                f"heap {_gib(peaks['heap_used_bytes'])} of {_gib(peaks['heap_max_bytes'] or 0)}, "
+                f"{peaks['gc_count']} GCs in {peaks['gc_seconds']:.1f} s"
+            )
+        return "Runtime resources (peak): " + ", ".join(parts)
+
+    def write(self, directory: Path) -> typing.Tuple[Path, Path]:
+        """Write the timeline as TSV and the peaks and warnings as JSON."""
+        timeline = directory / TIMELINE
+        names = [f.name for f in fields(ResourceSample)]
+        with open(timeline, "w") as f:
+            f.write("\t".join(names) + "\n")
+            for sample in self.samples:
+                row = asdict(sample)
+                f.write("\t".join("" if row[name] is None else str(row[name]) for name in names) + "\n")
+        summary = directory / SUMMARY
+        summary.write_text(
+            json.dumps(
+                {"interval_s": self.interval, "peaks": self.peaks(), "warnings": self.warnings},
+                indent=2,
+            )
+            + "\n"
+        )
+        return timeline, summary
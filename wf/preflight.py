@@ -0,0 +1,197 @@
+import csv
+import json
+import re
+import typing
+from pathlib import Path
+
+from latch.types.directory import LatchDir
+from latch.types.file import LatchFile
+
+from readsim.seeds import parse_read_count
+
+PIPELINE_ROOT = Path(__file__).resolve().parent.parent
+
+MODES = ("amplicon", "target_capture", "metagenome", "wholegenome")
+FASTA_SUFFIX = re.compile(r"\.(fa|fasta|fna|fas)(\.gz)?$")
+
+_JSON_TYPES: typing.Dict[str, typing.Tuple[type, ...]] = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+}
+
+
+def _value(value: typing.Any) -> typing.Any:
+    if isinstance(value, (LatchFile, LatchDir)):
+        return value.remote_path
+    return value
+
+
+def check_value(name: str, value: typing.Any, spec: typing.Dict[str, typing.Any]) -> typing.Optional[str]:
+    """Check a value against the `type`, `enum`, `pattern`, `minimum` and `maximum` of its JSON schema."""
+    expected = _JSON_TYPES.get(spec.get("type", ""))
+    if expected is not None and (not isinstance(value, expected) or (isinstance(value, bool) and bool not in expected)):
+        return f"{name}: expected {spec['type']}, got {value!r}"
+    if "enum" in spec and value not in spec["enum"]:
+        return f"{name}: {value!r} is not one of {', '.join(map(str, spec['enum']))}"
+    if "pattern" in spec and isinstance(value, str) and not re.search(spec["pattern"], value):
+        return f"{name}: {value!r} does not match {spec['pattern']}"
+    if "minimum" in spec and value < spec["minimum"]:
+        return f"{name}: {value} is below the minimum of {spec['minimum']}"
+    if "maximum" in spec and value > spec["maximum"]:
+        return f"{name}: {value} is above the maximum of {spec['maximum']}"
+    return None
+
+
+def check_parameters(
+    parameters: typing.Dict[str, typing.Any],
+    schema_path: Path = PIPELINE_ROOT / "nextflow_schema.json",
+) -> typing.List[str]:
+    """Problems with the parameters according to `nextflow_schema.json`; unset parameters are not checked."""
+    schema = json.loads(schema_path.read_text())
+    problems = []
+    for section in schema["definitions"].values():
+        for name in section.get("required", []):
+            if parameters.get(name) is None and name in parameters:
+                problems.append(f"{name}: required")
+        for name, spec in section["properties"].items():
+            value = _value(parameters.get(name))
+            if value is None:
+                continue
+            problem = check_value(name, value, spec)
+            if problem is not None:
+                problems.append(problem)
+    return problems
+
+
+def _cell(value: str, spec: typing.Dict[str, typing.Any]) -> typing.Any:
+    if spec.get("type") == "integer":
+        return int(value)
+    if spec.get("type") == "number":
+        return float(value)
+    return value
+
+
+def check_samplesheet(
+    path: Path,
+    schema_path: Path = PIPELINE_ROOT / "assets" / "schema_input.json",
+) -> typing.List[str]:
+    """Problems with a samplesheet according to `schema_input.json`, reported by line."""
+    schema = json.loads(schema_path.read_text())["items"]
+    properties = schema["properties"]
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    if not rows:
+        return [f"{path.name}: no samples"]
+    missing = [column for column in schema.get("required", []) if column not in rows[0]]
+    if missing:
+        return [f"{path.name}: missing column(s) {', '.join(missing)}"]
+
+    problems = []
+    seen: typing.Dict[str, typing.Dict[typing.Any, int]] = {column: {} for column in properties}
+    # line 1 is the header
+    for line, row in enumerate(rows, start=2):
+        for column, spec in properties.items():
+            text = (row.get(column) or "").strip()
+            if not text:
+                if column in schema.get("required", []):
+                    problems.append(f"{path.name} line {line}: {spec.get('errorMessage', f'{column} is required')}")
+                continue
+            try:
+                value = _cell(text, spec)
+            except ValueError:
+                problems.append(f"{path.name} line {line}: {column} {text!r} is not an {spec['type']}")
+                continue
+            if check_value(column, value, spec) is not None:
+                problems.append(f"{path.name} line {line}: {spec.get('errorMessage', f'invalid {column} {text!r}')}")
+                continue
+            if spec.get("unique") and value in seen[column]:
+                first = seen[column][value]
+                problems.append(f"{path.name} line {line}: {column} {text!r} is already used on line {first}")
+                continue
+            seen[column][value] = line
+    return problems
+
+
+def _config_keys(path: Path, block: str) -> typing.List[str]:
+    """The quoted keys of a `block { 'key' { ... } ... }` in a Nextflow config."""
+    text = path.read_text()
+    start = text.index(f"{block} {{")
+    keys = []
+    depth = 0
+    for match in re.finditer(r"'([^']+)'\s*\{|\{|\}", text[start:]):
+        if match.group(1) is not None:
+            if depth == 1:
+                keys.append(match.group(1))
+            depth += 1
+        elif match.group(0) == "{":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                break
+    return keys
+
+
+def check_rules(parameters: typing.Dict[str, typing.Any]) -> typing.List[str]:
+    """Problems with combinations of parameters that the schema cannot express."""
+    p = {name: _value(value) for name, value in parameters.items()}
+    problems = []
+    if not any(p.get(mode) for mode in MODES):
+        problems.append(f"Nothing to simulate: enable at least one of {', '.join(MODES)}")
+
+    has_reference = any(p.get(name) for name in ("fasta", "genome", "ncbidownload_accessions", "ncbidownload_taxids"))
+    if not has_reference:
+        problem = "No reference: set fasta, genome, ncbidownload_accessions or ncbidownload_taxids"
+        if p.get("target_capture") and str(p.get("probe_file") or "").endswith(".bed"):
+            problem += " (the probe sequences of the BED probe_file are extracted from the reference)"
+        problems.append(problem)
+    if p.get("genome"):
+        genomes = _config_keys(PIPELINE_ROOT / "conf" / "igenomes.config", "genomes")
+        if p["genome"] not in genomes:
+            problems.append(f"genome: {p['genome']!r} is not an iGenomes key ({', '.join(genomes)})")
+
+    if p.get("target_capture"):
+        probe_file = p.get("probe_file")
+        if probe_file:
+            if not (probe_file.endswith(".bed") or FASTA_SUFFIX.search(probe_file)):
+                problems.append(f"probe_file: {probe_file} is neither a BED nor a FASTA file")
+        else:
+            probe_refs = _config_keys(PIPELINE_ROOT / "conf" / "ref_databases.config", "probe_ref_db")
+            if p.get("probe_ref_name") not in probe_refs:
+                problems.append(f"probe_ref_name: {p.get('probe_ref_name')!r} is not one of {', '.join(probe_refs)}")
+
+    if p.get("batch_samples") and (p.get("simulation_shards") or 1) > 1:
+        problems.append(
+            f"batch_samples simulates every sample in one task and cannot be combined with "
+            f"simulation_shards {p['simulation_shards']}, which splits them over tasks"
+        )
+    if (p.get("simulation_shards") or 1) > 1:
+        for mode, default in (("wholegenome", "wgsim"), ("metagenome", "insilicoseq")):
+            engine = p.get(f"{mode}_engine") or default
+            if p.get(mode) and engine != "readsim":
+                problems.append(
+                    f"simulation_shards {p['simulation_shards']} needs {mode}_engine readsim; {engine} would draw "
+                    f"a different {'genome' if mode == 'wholegenome' else 'abundance profile'} in every shard"
+                )
+    if p.get("wholegenome") and p.get("wholegenome_haplotypes") and p.get("wholegenome_engine") != "readsim":
+        problems.append(
+            f"wholegenome_haplotypes needs wholegenome_engine readsim; {p.get('wholegenome_engine')} mutates "
+            f"the reference itself"
+        )
+    if p.get("metagenome") and p.get("metagenome_n_reads"):
+        try:
+            parse_read_count(p["metagenome_n_reads"])
+        except ValueError:
+            problems.append(f"metagenome_n_reads: {p['metagenome_n_reads']!r} is not a read count such as 500000 or 1M")
+    return problems
+
+
+def preflight(parameters: typing.Dict[str, typing.Any], samplesheet: Path) -> None:
+    """Check the parameters and the (downloaded) samplesheet; raises ValueError listing every problem."""
+    # rules repeat some schema checks (such as probe_ref_name) with their own source of truth
+    problems = [*check_parameters(parameters), *check_samplesheet(samplesheet), *check_rules(parameters)]
+    problems = list(dict.fromkeys(problems))
+    if problems:
+        raise ValueError("Invalid parameters:\n" + "\n".join(f"  - {problem}" for problem in problems))
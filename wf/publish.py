@@ -0,0 +1,251 @@
+import concurrent.futures
+import hashlib
+import json
+import math
+import mimetypes
+import os
+import time
+import typing
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+LATCH_API = "https://nucleus.latch.bio"
+MANIFEST = "publish_manifest.json"
+
+PUBLISH_THREADS = 16
+# Parts are read into memory, so at most threads * PART_SIZE bytes are in flight
+PART_SIZE = 32 * 2**20
+MAX_PARTS = 10_000
+MAX_ATTEMPTS = 5
+
+
+def _retry(what: str, func: typing.Callable[[], typing.Any], attempts: int = MAX_ATTEMPTS) -> typing.Any:
+    """Call `func`, retrying connection errors and error responses with exponential backoff."""
+    for attempt in range(1, attempts + 1):
+        try:
+            return func()
+        except requests.RequestException as e:
+            if attempt == attempts:
+                raise RuntimeError(f"{what} failed after {attempts} attempts: {e}") from e
+            time.sleep(min(2 ** (attempt - 1), 30))
+
+
+class UploadClient:
+    """The Latch Data upload API over one pooled HTTP session.
+
+    `start-upload` returns a presigned URL per part, the parts are PUT to
+    those URLs, and `end-upload` assembles them from their ETags. Empty files
+    are created by `start-upload` alone. `api` can point at any server with
+    the same endpoints, such as the local object store of the tests.
+    """
+
+    def __init__(self, api: str, headers: typing.Dict[str, str], threads: int = PUBLISH_THREADS):
+        self.api = api.rstrip("/")
+        self.headers = headers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=threads)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @classmethod
+    def from_execution(cls, threads: int = PUBLISH_THREADS) -> "UploadClient":
+        token = os.environ.get("FLYTE_INTERNAL_EXECUTION_ID")
+        if token is None:
+            raise RuntimeError("failed to get execution token")
+        return cls(LATCH_API, {"Authorization": f"Latch-Execution-Token {token}"}, threads)
+
+    def start(
+        self,
+        path: str,
+        part_count: int,
+        content_type: str,
+    ) -> typing.Tuple[typing.Optional[str], typing.List[str]]:
+        """Start an upload; returns its id and part URLs, or no id when the file was created empty."""
+        resp = self.session.post(
+            f"{self.api}/ldata/start-upload",
+            headers=self.headers,
+            json={"path": path, "part_count": part_count, "content_type": content_type},
+        )
+        resp.raise_for_status()
+        data = resp.json()["data"]
+        if "version_id" in data:
+            return None, []
+        return data["upload_id"], data["urls"]
+
+    def put(self, url: str, data: bytes) -> str:
+        resp = self.session.put(url, data=data)
+        resp.raise_for_status()
+        return resp.headers["ETag"]
+
+    def end(self, path: str, upload_id: str, etags: typing.Sequence[str]) -> None:
+        resp = self.session.post(
+            f"{self.api}/ldata/end-upload",
+            headers=self.headers,
+            json={
+                "path": path,
+                "upload_id": upload_id,
+                "parts": [{"ETag": etag, "PartNumber": n + 1} for n, etag in enumerate(etags)],
+            },
+        )
+        resp.raise_for_status()
+
+
+@dataclass
+class PublishedFile:
+    path: str
+    size: int
+    sha256: str = ""
+    parts: int = 0
+    etags: typing.List[str] = field(default_factory=list)
+    error: typing.Optional[str] = None
+
+
+@dataclass
+class PublishReport:
+    destination: str
+    files: typing.List[PublishedFile]
+    seconds: float
+
+    @property
+    def bytes(self) -> int:
+        return sum(f.size for f in self.files)
+
+    @property
+    def failed(self) -> typing.List[PublishedFile]:
+        return [f for f in self.files if f.error is not None]
+
+    def summary(self) -> str:
+        rate = self.bytes / 2**20 / self.seconds if self.seconds else 0.0
+        text = (
+            f"Published {len(self.files) - len(self.failed)} files ({self.bytes / 2**30:.2f} GiB) "
+            f"to {self.destination} in {self.seconds:.1f}s ({rate:.1f} MiB/s)"
+        )
+        if self.failed:
+            text += f"; {len(self.failed)} failed: {', '.join(f.path for f in self.failed)}"
+        return text
+
+    def to_json(self) -> str:
+        manifest = {
+            "destination": self.destination,
+            "seconds": round(self.seconds, 3),
+            "bytes": self.bytes,
+            "files": [asdict(f) for f in self.files],
+        }
+        return json.dumps(manifest, indent=2) + "\n"
+
+
+def _sha256(path: Path, chunk_size: int = 16 * 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_part(path: Path, offset: int, size: int) -> bytes:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.pread(fd, size, offset)
+    finally:
+        os.close(fd)
+
+
+def publish_tree(
+    src: Path,
+    dest: str,
+    client: UploadClient,
+    threads: int = PUBLISH_THREADS,
+    part_size: int = PART_SIZE,
+) -> PublishReport:
+    """Upload every file under `src` to the same relative path under `dest`.
+
+    Starting uploads, sending parts and checksumming share one pool of
+    `threads` workers, so many small files and the parts of a few large ones
+    both keep every connection busy. Each request is retried on its own; a
+    file whose parts still fail is reported in the manifest and not assembled.
+    The manifest is written to `src/pipeline_info/publish_manifest.json` and
+    uploaded last.
+    """
+    started = time.perf_counter()
+    paths = sorted(p for p in src.rglob("*") if p.is_file() and p.name != MANIFEST)
+    files = {p: PublishedFile(p.relative_to(src).as_posix(), p.stat().st_size) for p in paths}
+    sessions: typing.Dict[Path, typing.Tuple[typing.Optional[str], typing.List[str]]] = {}
+
+    def remote(path: Path) -> str:
+        return f"{dest.rstrip('/')}/{files[path].path}"
+
+    def start(path: Path) -> None:
+        # parts grow past `part_size` only when a file would need more than MAX_PARTS
+        size = files[path].size
+        part = max(part_size, math.ceil(size / MAX_PARTS))
+        files[path].parts = math.ceil(size / part)
+        content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        sessions[path] = _retry(
+            f"Starting the upload of {files[path].path}",
+            lambda: client.start(remote(path), files[path].parts, content_type),
+        )
+        files[path].etags = [""] * len(sessions[path][1])
+
+    def put(path: Path, n: int) -> None:
+        size = files[path].size
+        part = math.ceil(size / files[path].parts)
+        data = _read_part(path, n * part, min(part, size - n * part))
+        url = sessions[path][1][n]
+        files[path].etags[n] = _retry(f"Uploading part {n + 1} of {files[path].path}", lambda: client.put(url, data))
+
+    def checksum(path: Path) -> None:
+        files[path].sha256 = _sha256(path)
+
+    def end(path: Path) -> None:
+        upload_id = sessions[path][0]
+        if upload_id is not None:
+            _retry(
+                f"Completing the upload of {files[path].path}",
+                lambda: client.end(remote(path), upload_id, files[path].etags),
+            )
+
+    def record(path: Path, future: concurrent.futures.Future) -> bool:
+        # any failure, not only exhausted retries, fails this file and lets the others and the manifest finish
+        try:
+            future.result()
+        except Exception as e:
+            error = str(e) if isinstance(e, RuntimeError) else f"{type(e).__name__}: {e}"
+            files[path].error = files[path].error or error
+            return False
+        return True
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(threads, 1)) as pool:
+        starts = {pool.submit(start, p): p for p in paths}
+        work: typing.List[typing.Tuple[Path, concurrent.futures.Future]] = []
+        for future in concurrent.futures.as_completed(starts):
+            path = starts[future]
+            work.append((path, pool.submit(checksum, path)))
+            if record(path, future):
+                work.extend((path, pool.submit(put, path, n)) for n in range(len(sessions[path][1])))
+        for path, future in work:
+            record(path, future)
+        ends = [(p, pool.submit(end, p)) for p in paths if files[p].error is None]
+        for path, future in ends:
+            record(path, future)
+
+    report = PublishReport(dest, [files[p] for p in paths], time.perf_counter() - started)
+    manifest = src / "pipeline_info" / MANIFEST
+    manifest.parent.mkdir(parents=True, exist_ok=True)
+    manifest.write_text(report.to_json())
+    _upload_small(client, manifest, f"{dest.rstrip('/')}/pipeline_info/{MANIFEST}")
+    return report
+
+
+def _upload_small(client: UploadClient, path: Path, remote: str) -> None:
+    """Upload a file in a single part."""
+    data = path.read_bytes()
+    upload_id, urls = _retry(f"Starting the upload of {path.name}", lambda: client.start(remote, 1, "application/json"))
+    if upload_id is not None:
+        etag = _retry(f"Uploading {path.name}", lambda: client.put(urls[0], data))
+        _retry(f"Completing the upload of {path.name}", lambda: client.end(remote, upload_id, [etag]))
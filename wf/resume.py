@@ -0,0 +1,215 @@
+import concurrent.futures
+import csv
+import hashlib
+import json
+import os
+import re
+import shutil
+import tarfile
+import time
+import typing
+from pathlib import Path
+
+from latch.types.directory import LatchDir
+from latch.types.file import LatchFile
+
+from wf.cache import LatchCache, sha256sum
+
+RESUME_MAX_GIB = 2000
+RESUME_MAX_AGE_DAYS = 14
+TRANSFER_THREADS = 8
+SESSION_ARCHIVE = "nextflow_session.tar"
+
+# Parameters that do not change what the tasks compute. The samplesheet is left
+# out so that a rerun which adds samples reuses the work of the samples it shares
+# with the earlier run: Nextflow's task hashes decide which tasks actually rerun.
+UNKEYED_PARAMETERS = {
+    "pvc_name",
+    "input",
+    "outdir",
+    "email",
+    "multiqc_title",
+    "multiqc_methods_description",
+    "resume",
+    "resource_monitor",
+}
+
+# `process.cache = 'lenient'` hashes input files by path and size only, because
+# inputs downloaded by the entrypoint get a new timestamp every execution
+RESUME_CONFIG = "// Generated by wf/resume.py\nprocess.cache = 'lenient'\n"
+
+_TASK_DIR = re.compile(r"[0-9a-f]{2}/[0-9a-f]{30}")
+
+
+def _version_slug(version: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._]", "_", version.strip())
+
+
+def resume_key(version: str, parameters: typing.Dict[str, typing.Any]) -> str:
+    """`<version>-<sha256>` of the parameters; unset and unkeyed parameters do not change it."""
+    normalized = {}
+    for name, value in parameters.items():
+        if name in UNKEYED_PARAMETERS or value is None:
+            continue
+        if isinstance(value, (LatchFile, LatchDir)):
+            value = value.remote_path
+        normalized[name] = value
+    digest = hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{_version_slug(version)}-{digest}"
+
+
+def completed_tasks(trace_file: typing.Optional[Path]) -> typing.Optional[typing.Set[str]]:
+    """Short hashes (`ab/cdef12`) of the completed and cached tasks in a trace, or None without a trace."""
+    if trace_file is None or not trace_file.exists():
+        return None
+    with open(trace_file, newline="") as f:
+        rows = csv.DictReader(f, delimiter="\t")
+        return {row["hash"] for row in rows if row.get("status") in ("COMPLETED", "CACHED") and row.get("hash")}
+
+
+def task_dirs(work_dir: Path, hashes: typing.Optional[typing.Set[str]] = None) -> typing.List[Path]:
+    """The task directories of a Nextflow work directory, limited to `hashes` if given."""
+    dirs = []
+    for path in sorted(work_dir.glob("??/*")):
+        name = path.relative_to(work_dir).as_posix()
+        if _TASK_DIR.fullmatch(name) and path.is_dir() and (hashes is None or name[:9] in hashes):
+            dirs.append(path)
+    return dirs
+
+
+def _archive(src: Path, work_dir: Path, dst: Path) -> None:
+    # uncompressed: task outputs are mostly gzipped already
+    with tarfile.open(dst, "w") as tar:
+        tar.add(src, arcname=src.relative_to(work_dir).as_posix())
+
+
+def _inside(path: str, roots: typing.Collection[str]) -> bool:
+    path = os.path.normpath(path)
+    return any(os.path.commonpath([path, root]) == root for root in roots)
+
+
+def _extract(tar: tarfile.TarFile, work_dir: Path) -> None:
+    """Unpack `tar` into `work_dir`, refusing members that would be written or link outside it.
+
+    Nextflow stages task inputs as absolute symlinks into the work directory,
+    so those are allowed as long as they point inside `work_dir`.
+    """
+    roots = {str(work_dir.absolute()), str(work_dir.resolve())}
+    members = tar.getmembers()
+    for member in members:
+        name = Path(member.name)
+        if name.is_absolute() or ".." in name.parts:
+            raise ValueError(f"{member.name} is outside the work directory")
+        if not (member.isfile() or member.isdir() or member.issym() or member.islnk()):
+            raise ValueError(f"{member.name} is not a file, directory or link")
+        if member.issym():
+            target = os.path.join(work_dir.absolute(), os.path.dirname(member.name), member.linkname)
+        elif member.islnk():
+            target = os.path.join(work_dir.absolute(), member.linkname)
+        else:
+            continue
+        if not _inside(target, roots):
+            raise ValueError(f"{member.name} links to {member.linkname}, outside the work directory")
+    if hasattr(tarfile, "data_filter"):
+        # the data filter refuses absolute symlinks, which were checked above
+        tar.extractall(work_dir, members, filter=lambda m, path: m if m.issym() else tarfile.data_filter(m, path))
+    else:
+        tar.extractall(work_dir, members)
+
+
+class WorkDirCache(LatchCache):
+    """Nextflow work directories kept in Latch Data for `-resume`.
+
+    An entry holds one archive per task directory and one of the `.nextflow`
+    session cache. Finished task directories never change, so saving a run
+    only uploads the archives the entry does not have yet. Entries expire
+    after `RESUME_MAX_AGE_DAYS` without use, entries of other pipeline
+    versions can never be resumed and are deleted, and the least recently
+    used ones go once the entries exceed `RESUME_MAX_GIB`.
+    """
+
+    def __init__(self, version: str, threads: int = TRANSFER_THREADS):
+        super().__init__("work", RESUME_MAX_GIB * 2**30)
+        self.version = _version_slug(version)
+        self.threads = threads
+
+    def restore(self, key: str, work_dir: Path) -> typing.Optional[int]:
+        """Unpack the entry for `key` into `work_dir`; returns the number of task directories, None on a miss."""
+        scratch = work_dir / ".resume" / "restore"
+        manifest = self._read_manifest(key, scratch)
+        if manifest is None or SESSION_ARCHIVE not in manifest["files"]:
+            shutil.rmtree(scratch.parent, ignore_errors=True)
+            return None
+
+        def fetch(name: str, info: typing.Dict[str, typing.Any]) -> bool:
+            path = self._entry(key, name).download(scratch / name)
+            try:
+                # a bad task archive only means that task runs again
+                if path.stat().st_size != info["size"] or sha256sum(path) != info["sha256"]:
+                    print(f"Archive {name} of work directory {key} failed its integrity check, skipping it")
+                    return False
+                with tarfile.open(path) as tar:
+                    _extract(tar, work_dir)
+                return True
+            except (ValueError, tarfile.TarError) as e:
+                print(f"Archive {name} of work directory {key} could not be unpacked, skipping it: {e}")
+                return False
+            finally:
+                path.unlink(missing_ok=True)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.threads) as pool:
+            futures = {name: pool.submit(fetch, name, info) for name, info in manifest["files"].items()}
+            restored = {name: future.result() for name, future in futures.items()}
+        if restored.pop(SESSION_ARCHIVE):
+            manifest["last_used"] = time.time()
+            self._write_manifest(key, manifest, scratch)
+        shutil.rmtree(scratch.parent, ignore_errors=True)
+        return sum(restored.values()) if (work_dir / ".nextflow").exists() else None
+
+    def save(
+        self,
+        key: str,
+        work_dir: Path,
+        hashes: typing.Optional[typing.Set[str]],
+        prune: bool,
+    ) -> typing.Tuple[int, int]:
+        """Upload the task directories in `hashes` not stored yet, and the session cache; returns (new, total).
+
+        With `prune`, archives of tasks the run did not use are deleted from the entry.
+        """
+        scratch = work_dir / ".resume" / "save"
+        manifest = self._read_manifest(key, scratch) or {"key": key, "info": {}, "files": {}, "created": time.time()}
+        dirs = {f"{path.parent.name}_{path.name}.tar": path for path in task_dirs(work_dir, hashes)}
+        new = [name for name in dirs if name not in manifest["files"]]
+
+        def upload(name: str, src: Path) -> typing.Dict[str, typing.Any]:
+            path = scratch / name
+            try:
+                _archive(src, work_dir, path)
+                self._entry(key, name).upload_from(path)
+                return {"size": path.stat().st_size, "sha256": sha256sum(path)}
+            finally:
+                path.unlink(missing_ok=True)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.threads) as pool:
+            uploads = {name: pool.submit(upload, name, dirs[name]) for name in new}
+            uploads[SESSION_ARCHIVE] = pool.submit(upload, SESSION_ARCHIVE, work_dir / ".nextflow")
+            for name, future in uploads.items():
+                manifest["files"][name] = future.result()
+
+        if prune:
+            for name in [n for n in manifest["files"] if n not in dirs and n != SESSION_ARCHIVE]:
+                self._entry(key, name).rmr()
+                del manifest["files"][name]
+
+        manifest["size"] = sum(f["size"] for f in manifest["files"].values())
+        manifest["last_used"] = time.time()
+        # the manifest goes last so an archive that is still uploading is never restored
+        self._write_manifest(key, manifest, scratch)
+        shutil.rmtree(scratch.parent, ignore_errors=True)
+        self.evict(
+            keep=key,
+            max_age=RESUME_MAX_AGE_DAYS * 24 * 3600,
+            stale=lambda other: not other.startswith(f"{self.version}-"),
+        )
+        return len(new), len(dirs)
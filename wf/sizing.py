@@ -0,0 +1,230 @@
+import math
+import typing
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from latch.ldata.path import LPath
+from latch.ldata.type import LatchPathError
+from latch.types.file import LatchFile
+
+from readsim.seeds import parse_read_count
+
+GIB = 2**30
+
+# Resources of the nextflow_runtime pod, also listed in latch_metadata
+RUNTIME_CPUS = 4
+RUNTIME_MEMORY_GIB = 8
+
+MIN_STORAGE_GIB = 20
+MAX_STORAGE_GIB = 4949
+MAX_PROCESS_MEMORY_GIB = 128
+# Memory of the first attempt of each process label in conf/base.config
+LABEL_MEMORY_GIB = {"process_single": 6, "process_low": 12, "process_medium": 36, "process_high": 72}
+
+# Header, separator and newline bytes of a FASTQ record
+FASTQ_RECORD_OVERHEAD = 64
+# Simulated qualities are noisy, so FASTQ compresses worse than real data
+FASTQ_GZIP_RATIO = 0.35
+FASTA_GZIP_RATIO = 0.3
+# Size of one NCBI assembly when only accessions are known, and of the whole
+# download when it is selected by taxid
+ACCESSION_BYTES = 10 * 2**20
+UNKNOWN_REFERENCE_BYTES = 4 * GIB
+# Amplicons are not known before in-silico PCR; assume one per 10 kb of reference
+AMPLICON_SPACING = 10_000
+MAX_AMPLICONS = 100_000
+ISS_READ_LENGTH = {"HiSeq": 125, "NextSeq": 300, "NovaSeq": 150, "MiSeq": 300}
+
+
+@dataclass
+class SimulationPlan:
+    """What a run will simulate, as far as it is known before it starts."""
+
+    samples: int
+    reference_bytes: int
+    reference_compressed: bool = True
+    shards: int = 1
+    amplicon: bool = False
+    amplicon_read_count: int = 500
+    amplicon_read_length: int = 130
+    target_capture: bool = False
+    target_capture_mode: str = "illumina"
+    target_capture_num: int = 500_000
+    target_capture_illen: int = 150
+    target_capture_pblen: int = 30_000
+    target_capture_ilmode: str = "pe"
+    metagenome: bool = False
+    metagenome_n_reads: str = "1M"
+    metagenome_model: str = "MiSeq"
+    wholegenome: bool = False
+    wholegenome_n_reads: int = 1_000_000
+    wholegenome_r1_length: int = 70
+    wholegenome_r2_length: int = 70
+    prepare_reference: bool = True
+    output_format: str = "fastq"
+
+    def reads_per_sample(self) -> typing.Dict[str, typing.Tuple[int, int]]:
+        """`(reads, bases)` each enabled mode simulates for one sample."""
+        modes = {}
+        if self.amplicon:
+            amplicons = min(max(self.reference_bytes // AMPLICON_SPACING, 1), MAX_AMPLICONS)
+            reads = 2 * self.amplicon_read_count * amplicons
+            modes["amplicon"] = (reads, reads * self.amplicon_read_length)
+        if self.target_capture:
+            if self.target_capture_mode == "pacbio":
+                modes["target_capture"] = (self.target_capture_num, self.target_capture_num * self.target_capture_pblen)
+            else:
+                ends = 2 if self.target_capture_ilmode == "pe" else 1
+                reads = ends * self.target_capture_num
+                modes["target_capture"] = (reads, reads * self.target_capture_illen)
+        if self.metagenome:
+            reads = parse_read_count(self.metagenome_n_reads)
+            modes["metagenome"] = (reads, reads * ISS_READ_LENGTH.get(self.metagenome_model, 300))
+        if self.wholegenome:
+            pairs = self.wholegenome_n_reads
+            modes["wholegenome"] = (2 * pairs, pairs * (self.wholegenome_r1_length + self.wholegenome_r2_length))
+        return modes
+
+    def tasks(self) -> int:
+        """Rough number of Nextflow tasks, which drives the memory of the head job."""
+        per_sample = 3 * max(self.shards, 1) + (self.output_format != "fastq")
+        return 20 + self.samples * per_sample * len(self.reads_per_sample())
+
+
+@dataclass
+class ResourceEstimate:
+    storage_gib: int
+    runtime_cpus: int
+    runtime_memory_gib: int
+    java_heap_gib: int
+    # process name or selector -> memory in GiB for the first attempt, where it exceeds the label's
+    process_memory_gib: typing.Dict[str, int] = field(default_factory=dict)
+
+    def fits_runtime(self) -> bool:
+        return self.runtime_cpus <= RUNTIME_CPUS and self.runtime_memory_gib <= RUNTIME_MEMORY_GIB
+
+    def nxf_opts(self) -> str:
+        cpus = min(self.runtime_cpus, RUNTIME_CPUS)
+        return f"-Xms2048M -Xmx{self.java_heap_gib}G -XX:ActiveProcessorCount={cpus}"
+
+    def to_config(self) -> str:
+        lines = [
+            "// Generated by wf/sizing.py from the parameters of this run",
+            "process {",
+        ]
+        for selector, memory in sorted(self.process_memory_gib.items()):
+            lines.extend(
+                [
+                    f"    withName: '{selector}' {{",
+                    f"        memory = {{ check_max( {memory}.GB * task.attempt, 'memory' ) }}",
+                    "    }",
+                ]
+            )
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def write_config(self, path: Path) -> None:
+        path.write_text(self.to_config())
+
+
+def _ceil_gib(nbytes: float) -> int:
+    return max(int(math.ceil(nbytes / GIB)), 1)
+
+
+def estimate(plan: SimulationPlan) -> ResourceEstimate:
+    """Work out storage, head job and per-process resources for `plan`."""
+    ref = plan.reference_bytes
+    ref_gz = ref * FASTA_GZIP_RATIO if plan.reference_compressed else ref
+
+    # Reference and the copies derived from it in the work directory
+    work = ref_gz
+    if plan.prepare_reference:
+        work += ref
+    if plan.amplicon:
+        work += ref
+    if plan.target_capture:
+        work += ref * 2.5  # uncompressed copy and Bowtie2 index
+    # Reads: the uncompressed output of the external simulators, the compressed
+    # FASTQ, the gathered copy when samples are sharded, and the BAM, CRAM or
+    # 2-bit copy (no larger than the compressed FASTQ) of --output_format
+    for reads, bases in plan.reads_per_sample().values():
+        raw = reads * FASTQ_RECORD_OVERHEAD + 2 * bases
+        copies = (2 if plan.shards > 1 else 1) + (plan.output_format != "fastq")
+        work += plan.samples * raw * (1 + FASTQ_GZIP_RATIO * copies)
+    storage = int(math.ceil(1.25 * work / GIB)) + 10
+    storage = min(max(storage, MIN_STORAGE_GIB), MAX_STORAGE_GIB)
+
+    # The head job needs about 1 GiB of heap per thousand tasks; what is left of
+    # the runtime pod is available to processes run there by the local executor
+    tasks = plan.tasks()
+    runtime_memory = 4 + tasks // 1000
+    runtime_cpus = 2 if tasks < 200 else 4 if tasks < 5000 else 8
+    java_heap = max(min(runtime_memory, RUNTIME_MEMORY_GIB) - 2, 2)
+
+    memory: typing.Dict[str, int] = {}
+
+    def limit(selector: str, label: str, gib: float) -> None:
+        # an override only ever raises the memory the process label asks for
+        needed = min(_ceil_gib(gib * GIB), MAX_PROCESS_MEMORY_GIB)
+        if needed > LABEL_MEMORY_GIB[label]:
+            memory[selector] = needed
+
+    if plan.wholegenome:
+        limit("WGSIM", "process_single", 2.5 * ref / GIB + 1)
+        limit("READSIM_WGSIM", "process_medium", 2.5 * ref / GIB + 1)
+        # the unmutated reference stays loaded next to the genome of the current sample
+        limit("READSIM_WGSIM_BATCH", "process_medium", 3.5 * ref / GIB + 1)
+        # the reference and both haplotypes, with the edits and text of a contig while its VCF records are written
+        limit("READSIM_HAPLOTYPES", "process_single", 4 * ref / GIB + 1)
+    if plan.metagenome:
+        limit("INSILICOSEQ_GENERATE", "process_low", 4 * ref / GIB + 4)
+        # only the contigs being simulated are in memory, at most two per CPU
+        limit("READSIM_METAGENOME|READSIM_METAGENOME_BATCH", "process_medium", ref / GIB + 2)
+    if plan.amplicon:
+        limit("CRABS_DBIMPORT|CRABS_INSILICOPCR", "process_medium", 3 * ref / GIB + 2)
+        limit("READSIM_ISPCR", "process_medium", 1.5 * ref / GIB + 1)
+    if plan.target_capture:
+        limit("BOWTIE2_BUILD", "process_high", 4 * ref / GIB + 2)
+        # the probe index is small, but streamed contigs are queued for the workers
+        limit("READSIM_PROBEMAP", "process_medium", ref / GIB + 2)
+        # the contigs with probes, unless the prepared reference is mapped instead
+        limit("READSIM_CAPSIM", "process_medium", ref / GIB + 2)
+
+    return ResourceEstimate(
+        storage_gib=storage,
+        runtime_cpus=runtime_cpus,
+        runtime_memory_gib=runtime_memory,
+        java_heap_gib=java_heap,
+        process_memory_gib=memory,
+    )
+
+
+def count_samples(samplesheet: Path) -> int:
+    with open(samplesheet) as f:
+        rows = [line for line in f.read().splitlines()[1:] if line.strip()]
+    return max(len(rows), 1)
+
+
+def remote_size(file: LatchFile) -> typing.Optional[int]:
+    try:
+        return LPath(file.remote_path).size()
+    except (LatchPathError, ValueError):
+        return None
+
+
+def reference_size(
+    fasta: typing.Optional[LatchFile],
+    accessions: typing.Optional[LatchFile],
+) -> typing.Tuple[int, bool]:
+    """Uncompressed size of the reference, and whether it is read compressed."""
+    if fasta is not None:
+        size = remote_size(fasta)
+        compressed = str(fasta.remote_path).endswith(".gz")
+        if size is None:
+            return UNKNOWN_REFERENCE_BYTES, compressed
+        return (int(size / FASTA_GZIP_RATIO) if compressed else size), compressed
+    if accessions is not None:
+        lines = Path(accessions).read_text().splitlines()
+        n = len([line for line in lines if line.strip() and not line.startswith("#")])
+        return max(n, 1) * ACCESSION_BYTES, True
+    return UNKNOWN_REFERENCE_BYTES, True
@@ -0,0 +1,242 @@
+import json
+import re
+import typing
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+# The default columns of the nf-core execution trace, followed by the ones the
+# summary needs as well
+TRACE_FIELDS = [
+    "task_id",
+    "hash",
+    "native_id",
+    "name",
+    "status",
+    "exit",
+    "submit",
+    "duration",
+    "realtime",
+    "%cpu",
+    "peak_rss",
+    "peak_vmem",
+    "rchar",
+    "wchar",
+    "process",
+    "attempt",
+    "start",
+    "complete",
+    "cpus",
+    "read_bytes",
+    "write_bytes",
+]
+
+# Nextflow's human-readable units: durations like `1h 2m 3s` or `250ms`,
+# sizes like `1.5 GB` (powers of 1024) and timestamps to the millisecond
+_DURATION_MS = {"ms": 1, "s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000}
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)\s*(ms|s|m|h|d)")
+_SIZE_UNITS = ["B", "KB", "MB", "GB", "TB", "PB", "EB"]
+_SIZE = re.compile(r"(\d+(?:\.\d+)?)\s*([KMGTPE]?B)")
+_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def trace_config() -> str:
+    """Extra columns for the pipeline's own trace; its file and format stay those of nextflow.config."""
+    return "\n".join(
+        [
+            "// Generated by wf/trace.py: columns for the per-process summary",
+            "trace {",
+            f"    fields = '{','.join(TRACE_FIELDS)}'",
+            "}",
+            "",
+        ]
+    )
+
+
+def latest_trace(pipeline_info: Path) -> typing.Optional[Path]:
+    """The most recent `execution_trace_<timestamp>.txt` the pipeline wrote to `pipeline_info`."""
+    traces = sorted(pipeline_info.glob("execution_trace_*.txt"), key=lambda path: path.stat().st_mtime)
+    return traces[-1] if traces else None
+
+
+def _number(value: typing.Optional[str]) -> typing.Optional[float]:
+    if value is None or value in ("", "-"):
+        return None
+    try:
+        return float(value.rstrip("%"))
+    except ValueError:
+        return None
+
+
+def _milliseconds(value: typing.Optional[str]) -> typing.Optional[float]:
+    """A duration in milliseconds, from a raw or a human-readable trace."""
+    number = _number(value)
+    if number is not None or not value:
+        return number
+    parts = _DURATION.findall(value)
+    return sum(float(n) * _DURATION_MS[unit] for n, unit in parts) if parts else None
+
+
+def _bytes_value(value: typing.Optional[str]) -> typing.Optional[float]:
+    """A size in bytes, from a raw or a human-readable trace."""
+    number = _number(value)
+    if number is not None or not value:
+        return number
+    match = _SIZE.fullmatch(value.strip())
+    return float(match[1]) * 1024 ** _SIZE_UNITS.index(match[2]) if match else None
+
+
+def _timestamp_ms(value: typing.Optional[str]) -> typing.Optional[float]:
+    """Milliseconds since the epoch, from a raw or a human-readable trace."""
+    number = _number(value)
+    if number is not None or not value:
+        return number
+    try:
+        return datetime.strptime(value, _TIMESTAMP_FORMAT).timestamp() * 1000
+    except ValueError:
+        return None
+
+
+@dataclass
+class TaskRecord:
+    module: str
+    status: str
+    realtime_ms: typing.Optional[float]
+    queue_ms: typing.Optional[float]
+    cpu_percent: typing.Optional[float]
+    peak_rss: typing.Optional[float]
+    rchar: typing.Optional[float]
+    wchar: typing.Optional[float]
+    read_bytes: typing.Optional[float]
+    write_bytes: typing.Optional[float]
+
+
+def module_name(process: str) -> str:
+    """`NFCORE_READSIMULATOR:READSIMULATOR:WGSIM (sample)` -> `WGSIM`."""
+    return process.split(" (", 1)[0].rsplit(":", 1)[-1]
+
+
+def parse_trace(path: Path) -> typing.List[TaskRecord]:
+    """Read a tab-separated Nextflow trace, in human-readable or raw units."""
+    lines = path.read_text().splitlines()
+    if not lines:
+        return []
+    header = lines[0].split("\t")
+    records = []
+    for line in lines[1:]:
+        row = dict(zip(header, line.split("\t")))
+        process = row.get("process") or row.get("name")
+        if not process:
+            continue
+        submit, start = _timestamp_ms(row.get("submit")), _timestamp_ms(row.get("start"))
+        records.append(
+            TaskRecord(
+                module=module_name(process),
+                status=row.get("status", ""),
+                realtime_ms=_milliseconds(row.get("realtime")),
+                queue_ms=start - submit if submit is not None and start is not None else None,
+                cpu_percent=_number(row.get("%cpu")),
+                peak_rss=_bytes_value(row.get("peak_rss")),
+                rchar=_bytes_value(row.get("rchar")),
+                wchar=_bytes_value(row.get("wchar")),
+                read_bytes=_bytes_value(row.get("read_bytes")),
+                write_bytes=_bytes_value(row.get("write_bytes")),
+            )
+        )
+    return records
+
+
+@dataclass
+class ProcessSummary:
+    module: str
+    tasks: int = 0
+    # task count by status: COMPLETED, CACHED, FAILED, ABORTED
+    statuses: typing.Dict[str, int] = field(default_factory=dict)
+    realtime_total_s: float = 0.0
+    realtime_max_s: float = 0.0
+    cpu_percent_mean: typing.Optional[float] = None
+    peak_rss_max: typing.Optional[int] = None
+    rchar: int = 0
+    wchar: int = 0
+    read_bytes: int = 0
+    write_bytes: int = 0
+    queue_total_s: float = 0.0
+    queue_max_s: float = 0.0
+
+
+def summarize(records: typing.Iterable[TaskRecord]) -> typing.List[ProcessSummary]:
+    """Aggregate task records by module, slowest modules (by total realtime) first.
+
+    Cached tasks did not run in this execution, so only their status is counted.
+    """
+    by_module: typing.Dict[str, ProcessSummary] = {}
+    cpu: typing.Dict[str, typing.List[float]] = {}
+    for r in records:
+        s = by_module.setdefault(r.module, ProcessSummary(r.module))
+        s.tasks += 1
+        s.statuses[r.status] = s.statuses.get(r.status, 0) + 1
+        if r.status == "CACHED":
+            continue
+        if r.realtime_ms is not None:
+            s.realtime_total_s += r.realtime_ms / 1000
+            s.realtime_max_s = max(s.realtime_max_s, r.realtime_ms / 1000)
+        if r.queue_ms is not None:
+            s.queue_total_s += r.queue_ms / 1000
+            s.queue_max_s = max(s.queue_max_s, r.queue_ms / 1000)
+        if r.cpu_percent is not None:
+            cpu.setdefault(r.module, []).append(r.cpu_percent)
+        if r.peak_rss is not None:
+            s.peak_rss_max = max(s.peak_rss_max or 0, int(r.peak_rss))
+        s.rchar += int(r.rchar or 0)
+        s.wchar += int(r.wchar or 0)
+        s.read_bytes += int(r.read_bytes or 0)
+        s.write_bytes += int(r.write_bytes or 0)
+    for module, values in cpu.items():
+        by_module[module].cpu_percent_mean = sum(values) / len(values)
+    return sorted(by_module.values(), key=lambda s: (-s.realtime_total_s, s.module))
+
+
+def _bytes(n: typing.Optional[float]) -> str:
+    if n is None:
+        return "-"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(n) < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} TiB"
+
+
+def format_table(summaries: typing.Sequence[ProcessSummary]) -> str:
+    columns = ["module", "tasks", "cached", "failed", "realtime", "max", "cpu%", "peak_rss", "read", "written", "queue"]
+    rows = [
+        [
+            s.module,
+            str(s.tasks),
+            str(s.statuses.get("CACHED", 0)),
+            str(s.statuses.get("FAILED", 0) + s.statuses.get("ABORTED", 0)),
+            f"{s.realtime_total_s:.1f}s",
+            f"{s.realtime_max_s:.1f}s",
+            f"{s.cpu_percent_mean:.0f}" if s.cpu_percent_mean is not None else "-",
+            _bytes(s.peak_rss_max),
+            _bytes(s.rchar),
+            _bytes(s.wchar),
+            f"{s.queue_total_s:.1f}s",
+        ]
+        for s in summaries
+    ]
+    widths = [max(len(c), *(len(r[i]) for r in rows)) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.ljust(w) if i == 0 else c.rjust(w) for i, (c, w) in enumerate(zip(columns, widths)))]
+    for row in rows:
+        lines.append("  ".join(v.ljust(w) if i == 0 else v.rjust(w) for i, (v, w) in enumerate(zip(row, widths))))
+    return "\n".join(lines) + "\n"
+
+
+def write_summary(trace_file: Path, outdir: Path) -> typing.Tuple[Path, Path, str]:
+    """Write `process_summary.json` and `process_summary.txt` into `outdir`; returns their paths and the table."""
+    summaries = summarize(parse_trace(trace_file))
+    json_path = outdir / "process_summary.json"
+    table_path = outdir / "process_summary.txt"
+    json_path.write_text(json.dumps([asdict(s) for s in summaries], indent=2) + "\n")
+    table = format_table(summaries)
+    table_path.write_text(table)
+    return json_path, table_path, table
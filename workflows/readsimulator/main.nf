@@ -11,10 +11,26 @@ include { paramsSummaryMultiqc        } from '../../subworkflows/nf-core/utils_n
 include { softwareVersionsToYAML      } from '../../subworkflows/nf-core/utils_nfcore_pipeline'
 include { methodsDescriptionText      } from '../../subworkflows/local/utils_nfcore_readsimulator_pipeline'
 include { MERGE_FASTAS                } from '../../modules/local/custom/merge_fastas/main'
+include { READSIM_MERGE_FASTAS        } from '../../modules/local/readsim/merge_fastas/main'
+include { SHA256SUM                   } from '../../modules/local/custom/sha256sum/main'
 include { INSILICOSEQ_GENERATE        } from '../../modules/local/insilicoseq/generate/main'       // TODO: Add module to nf-core/modules
 include { CREATE_SAMPLESHEET          } from '../../modules/local/custom/create_samplesheet/main'
 include { MERGE_SAMPLESHEETS          } from '../../modules/local/custom/merge_samplesheets/main'
+include { COLLATE_SAMPLESHEETS        } from '../../modules/local/custom/collate_samplesheets/main'
 include { WGSIM                       } from '../../modules/local/wgsim/main'                      // TODO: Add module to nf-core/modules
+include { READSIM_WGSIM               } from '../../modules/local/readsim/wgsim/main'
+include { READSIM_SHARDS              } from '../../modules/local/readsim/shards/main'
+include { READSIM_GATHER              } from '../../modules/local/readsim/gather/main'
+include { READSIM_PREPARE_REFERENCE   } from '../../modules/local/readsim/prepare_reference/main'
+include { READSIM_QC_REPORT           } from '../../modules/local/readsim/qc_report/main'
+include { READSIM_METAGENOME          } from '../../modules/local/readsim/metagenome/main'
+include { READSIM_WGSIM_BATCH         } from '../../modules/local/readsim/wgsim_batch/main'
+include { READSIM_METAGENOME_BATCH    } from '../../modules/local/readsim/metagenome_batch/main'
+include { READSIM_COMPILE_MODEL       } from '../../modules/local/readsim/compile_model/main'
+include { READSIM_NCBI_DOWNLOAD       } from '../../modules/local/readsim/ncbi_download/main'
+include { READSIM_HAPLOTYPES          } from '../../modules/local/readsim/haplotypes/main'
+include { READSIM_PACK                } from '../../modules/local/readsim/pack/main'
+include { SAMTOOLS_IMPORT             } from '../../modules/local/samtools/import/main'
 include { AMPLICON_WORKFLOW           } from '../../subworkflows/local/amplicon_workflow'
 include { TARGET_CAPTURE_WORKFLOW     } from '../../subworkflows/local/target_capture_workflow'
 include { NCBIGENOMEDOWNLOAD          } from '../../modules/nf-core/ncbigenomedownload/main'
@@ -35,6 +51,7 @@ workflow READSIMULATOR {
     ch_versions        = Channel.empty()
     ch_multiqc_files   = Channel.empty()
     ch_simulated_reads = Channel.empty()
+    ch_read_stats      = Channel.empty()
     ch_taxids          = Channel.empty()
     ch_accessions      = Channel.empty()
     ch_fasta           = Channel.empty()
@@ -48,30 +65,119 @@ workflow READSIMULATOR {
             ch_taxids = Channel.fromPath(params.ncbidownload_taxids)
         }
 
-        //
-        // MODULE: Download reference fasta files
-        //
-        NCBIGENOMEDOWNLOAD (
-            [ id:"ncbigenomedownload" ],
-            ch_accessions.ifEmpty([]),
-            ch_taxids.ifEmpty([]),
-            params.ncbidownload_group
-        )
+        if ( params.ncbidownload_engine == 'readsim' ) {
+            //
+            // MODULE: Download the reference genomes straight into one BGZF fasta file
+            //
+            READSIM_NCBI_DOWNLOAD (
+                [ id:"ncbigenomedownload" ],
+                ch_accessions.ifEmpty([]),
+                ch_taxids.ifEmpty([]),
+                params.ncbidownload_group
+            )
+            ch_versions = ch_versions.mix(READSIM_NCBI_DOWNLOAD.out.versions)
+            ch_fasta    = READSIM_NCBI_DOWNLOAD.out.fasta
+        } else {
+            //
+            // MODULE: Download reference fasta files
+            //
+            NCBIGENOMEDOWNLOAD (
+                [ id:"ncbigenomedownload" ],
+                ch_accessions.ifEmpty([]),
+                ch_taxids.ifEmpty([]),
+                params.ncbidownload_group
+            )
 
-        //
-        // MODULE: Combine FASTA files
-        //
-        MERGE_FASTAS (
-            NCBIGENOMEDOWNLOAD.out.fna
-        )
+            if ( params.merge_fastas_bgzf ) {
+                //
+                // MODULE: Combine FASTA files into one indexed BGZF file
+                //
+                READSIM_MERGE_FASTAS (
+                    NCBIGENOMEDOWNLOAD.out.fna
+                )
+                ch_versions = ch_versions.mix(READSIM_MERGE_FASTAS.out.versions)
+                ch_fasta    = READSIM_MERGE_FASTAS.out.fasta
+            } else {
+                //
+                // MODULE: Combine FASTA files
+                //
+                MERGE_FASTAS (
+                    NCBIGENOMEDOWNLOAD.out.fna
+                )
+                ch_fasta = MERGE_FASTAS.out.fasta
+            }
+        }
 
-        ch_fasta = MERGE_FASTAS.out.fasta
+        ch_fasta = ch_fasta
             .map {
                 meta, fasta ->
                 return fasta
             }
     }
 
+    //
+    // MODULE: Inflate and index the reference once, shared by every simulator
+    //
+    if ( params.prepare_reference ) {
+        READSIM_PREPARE_REFERENCE (
+            ch_fasta.map { fasta -> [ [ id:"reference" ], fasta ] }
+        )
+        ch_versions = ch_versions.mix(READSIM_PREPARE_REFERENCE.out.versions)
+        ch_fasta    = READSIM_PREPARE_REFERENCE.out.fasta
+            .map {
+                meta, fasta ->
+                return fasta
+            }
+    }
+
+    //
+    // MODULE: Checksum the reference in a task for the Bowtie2 index and haplotype cache keys
+    //
+    ch_fasta_sha256     = Channel.empty()
+    def index_cache     = params.target_capture && params.target_capture_engine != 'readsim' && params.bowtie2_index_cache
+    def haplotype_cache = params.wholegenome && params.wholegenome_engine == 'readsim' && params.wholegenome_haplotypes && params.haplotype_cache
+    if ( index_cache || haplotype_cache ) {
+        SHA256SUM (
+            ch_fasta
+        )
+        ch_versions     = ch_versions.mix(SHA256SUM.out.versions)
+        ch_fasta_sha256 = SHA256SUM.out.sha256
+    }
+
+    //
+    // MODULE: Split every sample into shards, each with its own seed stream
+    //
+    if ( params.simulation_shards > 1 ) {
+        READSIM_SHARDS (
+            ch_samplesheet.map { it[0] },
+            params.simulation_shards
+        )
+        ch_versions    = ch_versions.mix(READSIM_SHARDS.out.versions.first())
+        ch_samplesheet = READSIM_SHARDS.out.csv
+            .splitCsv(header: true, elem: 1)
+            .map {
+                meta, row ->
+                    def n_reads = row
+                        .findAll { key, value -> !(key in [ 'shard', 'seed' ]) }
+                        .collectEntries { key, value -> [ key, value as long ] }
+                    def shard_meta = meta + [
+                        sample_seed : meta.seed,
+                        seed        : row.seed as long,
+                        shard       : row.shard as int,
+                        shards      : params.simulation_shards as int,
+                        n_reads     : n_reads
+                    ]
+                    return [ shard_meta ]
+            }
+    }
+
+    //
+    // All samples of a mode simulated by one task from a single read of the reference
+    //
+    ch_sample_batch = ch_samplesheet
+        .map { it[0] }
+        .collect(flat: false)
+
     if ( params.probe_file ) {
         ch_probes = Channel.fromPath(params.probe_file)
     } else {
@@ -96,26 +202,68 @@ workflow READSIMULATOR {
     if ( params.target_capture ) {
         TARGET_CAPTURE_WORKFLOW (
             ch_fasta,
+            ch_fasta_sha256,
             ch_samplesheet,
             ch_probes.ifEmpty([])
         )
         ch_versions        = ch_versions.mix(TARGET_CAPTURE_WORKFLOW.out.versions.first())
         ch_simulated_reads = ch_simulated_reads.mix(TARGET_CAPTURE_WORKFLOW.out.reads)
+        ch_read_stats      = ch_read_stats.mix(TARGET_CAPTURE_WORKFLOW.out.stats)
+
+        TARGET_CAPTURE_WORKFLOW.out.index_cache
+            .collectFile(storeDir: "${params.outdir}/pipeline_info", name: 'bowtie2_index_cache.tsv', seed: "reference_sha256\tstatus", newLine: true)
     }
 
     //
     // MODULE: Simulate metagenomic reads
     //
     if ( params.metagenome ) {
-        INSILICOSEQ_GENERATE (
-            ch_samplesheet.combine(ch_fasta.ifEmpty([[]])),
-            params.metagenome_input_format
-        )
-        ch_versions         = ch_versions.mix(INSILICOSEQ_GENERATE.out.versions.first())
-        ch_metagenome_reads = INSILICOSEQ_GENERATE.out.fastq
+        //
+        // MODULE: Compile the InSilicoSeq KDE model once for every readsim metagenome task
+        //
+        ch_compiled_model = []
+        if ( params.metagenome_engine == 'readsim' && params.metagenome_mode == 'kde' ) {
+            READSIM_COMPILE_MODEL (
+                params.metagenome_model
+            )
+            ch_versions       = ch_versions.mix(READSIM_COMPILE_MODEL.out.versions)
+            ch_compiled_model = READSIM_COMPILE_MODEL.out.model
+        }
+        if ( params.metagenome_engine == 'readsim' && params.batch_samples ) {
+            READSIM_METAGENOME_BATCH (
+                ch_sample_batch.map { samples -> [ [ id:"metagenome" ], samples ] }.combine(ch_fasta),
+                params.metagenome_input_format,
+                params.metagenome_abundance_file ? file(params.metagenome_abundance_file, checkIfExists: true) : [],
+                params.metagenome_coverage_file ? file(params.metagenome_coverage_file, checkIfExists: true) : [],
+                ch_compiled_model
+            )
+            ch_versions         = ch_versions.mix(READSIM_METAGENOME_BATCH.out.versions)
+            ch_metagenome_fastq = READSIM_METAGENOME_BATCH.out.fastq
+                .flatMap { meta, samples, fastqs -> splitBatchReads(samples, fastqs, '.fastq.gz') }
+            ch_read_stats       = ch_read_stats.mix(READSIM_METAGENOME_BATCH.out.stats.map { meta, stats -> stats })
+        } else if ( params.metagenome_engine == 'readsim' ) {
+            READSIM_METAGENOME (
+                ch_samplesheet.combine(ch_fasta),
+                params.metagenome_input_format,
+                params.metagenome_abundance_file ? file(params.metagenome_abundance_file, checkIfExists: true) : [],
+                params.metagenome_coverage_file ? file(params.metagenome_coverage_file, checkIfExists: true) : [],
+                ch_compiled_model
+            )
+            ch_versions         = ch_versions.mix(READSIM_METAGENOME.out.versions.first())
+            ch_metagenome_fastq = READSIM_METAGENOME.out.fastq
+            ch_read_stats       = ch_read_stats.mix(READSIM_METAGENOME.out.stats.map { meta, stats -> stats })
+        } else {
+            INSILICOSEQ_GENERATE (
+                ch_samplesheet.combine(ch_fasta.ifEmpty([[]])),
+                params.metagenome_input_format
+            )
+            ch_versions         = ch_versions.mix(INSILICOSEQ_GENERATE.out.versions.first())
+            ch_metagenome_fastq = INSILICOSEQ_GENERATE.out.fastq
+        }
+        ch_metagenome_reads = ch_metagenome_fastq
             .map {
                 meta, fastqs ->
-                    meta.outdir   = "insilicoseq"
+                    meta.outdir   = params.metagenome_engine == 'readsim' ? "readsim_metagenome" : "insilicoseq"
                     meta.datatype = "metagenomic_illumina"
                     return [ meta, fastqs ]
             }
@@ -126,11 +274,99 @@ workflow READSIMULATOR {
     // MODULE: Simulate wholegenomic reads
     //
     if ( params.wholegenome ) {
-        WGSIM (
-            ch_samplesheet.combine(ch_fasta)
-        )
-        ch_versions          = ch_versions.mix(WGSIM.out.versions.first())
-        ch_wholegenome_reads = WGSIM.out.fastq
+        ch_wgsim_input       = ch_samplesheet.combine(ch_fasta)
+        ch_wgsim_batch_input = ch_sample_batch.map { samples -> [ [ id:"wholegenome" ], samples ] }.combine(ch_fasta)
+        ch_haplotype_files   = []
+        if ( params.wholegenome_engine == 'readsim' && params.wholegenome_haplotypes ) {
+            //
+            // Look up the haplotypes of every sample seed in the haplotype cache
+            //
+            ch_haplotype_lookup = ch_samplesheet
+                .map { it -> haplotypeSeed(it[0]) }
+                .unique()
+                .combine(ch_fasta)
+                .combine(params.haplotype_cache ? ch_fasta_sha256 : Channel.of(''))
+                .map {
+                    seed, fasta, sha256 ->
+                        def meta = [ id:"haplotypes_${seed}", seed:seed ]
+                        if ( !sha256 ) {
+                            return [ meta, fasta, null ]
+                        }
+                        def key    = "${sha256}/${haplotypeSettings()}/${seed}"
+                        def cached = file("${params.haplotype_cache}/${key}/${meta.id}.rhap")
+                        def hit    = cached.exists()
+                        log.info "Haplotype cache ${hit ? 'hit' : 'miss'} for seed ${seed} of ${fasta.name} (${key})"
+                        return [ meta + [ haplotype_key: key, haplotype_cache: hit ? 'hit' : 'miss' ], fasta, hit ? cached : null ]
+                }
+                .branch {
+                    meta, fasta, cached ->
+                        hit:  cached
+                            return [ meta, cached ]
+                        miss: true
+                            return [ meta, fasta ]
+                }
+
+            //
+            // MODULE: Mutate the reference once per seed and record the variants in a truth VCF
+            //
+            READSIM_HAPLOTYPES (
+                ch_haplotype_lookup.miss
+            )
+            ch_versions   = ch_versions.mix(READSIM_HAPLOTYPES.out.versions.first())
+            ch_haplotypes = ch_haplotype_lookup.hit.mix(READSIM_HAPLOTYPES.out.haplotypes)
+
+            ch_haplotypes
+                .filter { meta, haplotypes -> meta.haplotype_key }
+                .map { meta, haplotypes -> "${meta.haplotype_key}\t${meta.haplotype_cache}" }
+                .collectFile(storeDir: "${params.outdir}/pipeline_info", name: 'wgsim_haplotype_cache.tsv', seed: "key\tstatus", newLine: true)
+
+            //
+            // Every sample, and every shard of it, draws its reads from the haplotypes of its own seed
+            //
+            ch_wgsim_input = ch_samplesheet
+                .map { it -> [ haplotypeSeed(it[0]), it[0] ] }
+                .combine(ch_haplotypes.map { meta, haplotypes -> [ meta.seed, haplotypes ] }, by: 0)
+                .map { seed, meta, haplotypes -> [ meta, haplotypes ] }
+            ch_haplotype_names = ch_haplotypes
+                .map { meta, haplotypes -> [ meta.seed, haplotypes.name ] }
+                .collect(flat: false)
+                .map { names -> [ names.collectEntries() ] }
+            ch_wgsim_batch_input = ch_sample_batch
+                .map { samples -> [ samples ] }
+                .combine(ch_haplotype_names)
+                .map {
+                    samples, names ->
+                        def haplotypes = samples.collectEntries { sample -> [ sample.id, names[haplotypeSeed(sample)] ] }
+                        return [ [ id:"wholegenome", haplotypes:haplotypes ], samples ]
+                }
+                .combine(ch_fasta)
+            ch_haplotype_files = ch_haplotypes.map { meta, haplotypes -> haplotypes }.collect()
+        }
+
+        if ( params.wholegenome_engine == 'readsim' && params.batch_samples ) {
+            READSIM_WGSIM_BATCH (
+                ch_wgsim_batch_input,
+                ch_haplotype_files
+            )
+            ch_versions        = ch_versions.mix(READSIM_WGSIM_BATCH.out.versions)
+            ch_wgsim_fastq     = READSIM_WGSIM_BATCH.out.fastq
+                .flatMap { meta, samples, fastqs -> splitBatchReads(samples, fastqs, '.fq.gz') }
+            ch_read_stats      = ch_read_stats.mix(READSIM_WGSIM_BATCH.out.stats.map { meta, stats -> stats })
+        } else if ( params.wholegenome_engine == 'readsim' ) {
+            READSIM_WGSIM (
+                ch_wgsim_input
+            )
+            ch_versions        = ch_versions.mix(READSIM_WGSIM.out.versions.first())
+            ch_wgsim_fastq     = READSIM_WGSIM.out.fastq
+            ch_read_stats      = ch_read_stats.mix(READSIM_WGSIM.out.stats.map { meta, stats -> stats })
+        } else {
+            WGSIM (
+                ch_wgsim_input
+            )
+            ch_versions        = ch_versions.mix(WGSIM.out.versions.first())
+            ch_wgsim_fastq     = WGSIM.out.fastq
+        }
+        ch_wholegenome_reads = ch_wgsim_fastq
             .map {
                 meta, fastqs ->
                     meta.outdir   = "wgsim"
@@ -140,38 +376,120 @@ workflow READSIMULATOR {
         ch_simulated_reads  = ch_simulated_reads.mix(ch_wholegenome_reads)
     }
 
-    // MODULE: Create sample sheet (just the header and one row)
-    CREATE_SAMPLESHEET (
-        ch_simulated_reads
-    )
+    //
+    // MODULE: Concatenate the shards of every sample in shard order
+    //
+    if ( params.simulation_shards > 1 ) {
+        ch_shard_reads = ch_simulated_reads
+            .map {
+                meta, fastqs ->
+                    def sample_meta = meta.findAll { key, value -> !(key in [ 'seed', 'sample_seed', 'shard', 'shards', 'n_reads' ]) }
+                    sample_meta.seed = meta.sample_seed
+                    return [ sample_meta, meta.shard, fastqs ]
+            }
+            .groupTuple(size: params.simulation_shards)
+            .map {
+                meta, shards, fastqs ->
+                    def ordered = [ shards, fastqs ].transpose().sort { it[0] }.collect { it[1] }.flatten()
+                    return [ meta, ordered ]
+            }
 
-    // Group the samplesheets by datatype so that we can merge them
-    ch_samplesheets = CREATE_SAMPLESHEET.out.samplesheet
-        .map {
-            meta, samplesheet ->
-                tuple( meta.datatype, meta, samplesheet )
-        }
-        .groupTuple(sort: 'deep')
-        .map {
-            datatype, old_meta, samplesheet ->
-                def meta = [:]
-                meta.id  = datatype
-                return [ meta, samplesheet ]
-        }
+        READSIM_GATHER (
+            ch_shard_reads
+        )
+        ch_versions        = ch_versions.mix(READSIM_GATHER.out.versions.first())
+        ch_simulated_reads = READSIM_GATHER.out.fastq
+    }
 
-    // MODULE: Merge the samplesheets by data type
-    ch_final_samplesheet = MERGE_SAMPLESHEETS (
-        ch_samplesheets
-    )
+    //
+    // MODULE: Store the reads in the compact --output_format instead of FASTQ
+    //
+    if ( params.output_format in [ 'bam', 'cram' ] ) {
+        SAMTOOLS_IMPORT (
+            ch_simulated_reads
+        )
+        ch_versions        = ch_versions.mix(SAMTOOLS_IMPORT.out.versions.first())
+        ch_published_reads = SAMTOOLS_IMPORT.out.bam.mix(SAMTOOLS_IMPORT.out.cram)
+    } else if ( params.output_format == '2bit' ) {
+        READSIM_PACK (
+            ch_simulated_reads
+        )
+        ch_versions        = ch_versions.mix(READSIM_PACK.out.versions.first())
+        ch_published_reads = READSIM_PACK.out.store
+    } else {
+        ch_published_reads = ch_simulated_reads
+    }
+
+    if ( params.local_bookkeeping ) {
+        //
+        // MODULE: Write every per-datatype samplesheet in one pass inside the Nextflow process
+        //
+        ch_samplesheet_rows = ch_published_reads
+            .map {
+                meta, fastq ->
+                    def outdir  = params.samplesheet_outdir ?: params.outdir
+                    def fastqs  = fastq instanceof List ? fastq : [ fastq ]
+                    def fastq_1 = "${outdir}/${meta.outdir}/${fastqs[0].name}"
+                    def fastq_2 = fastqs.size() == 2 ? "${outdir}/${meta.outdir}/${fastqs[1].name}" : ''
+                    return [ meta.datatype, "${meta.id}", fastq_1, fastq_2 ]
+            }
+            .collect(flat: false)
+
+        ch_final_samplesheet = COLLATE_SAMPLESHEETS (
+            ch_samplesheet_rows
+        ).samplesheet
+            .flatten()
+            .map {
+                samplesheet ->
+                    def meta = [:]
+                    meta.id  = samplesheet.name - '_samplesheet.csv'
+                    return [ meta, samplesheet ]
+            }
+    } else {
+        // MODULE: Create sample sheet (just the header and one row)
+        CREATE_SAMPLESHEET (
+            ch_published_reads
+        )
+
+        // Group the samplesheets by datatype so that we can merge them
+        ch_samplesheets = CREATE_SAMPLESHEET.out.samplesheet
+            .map {
+                meta, samplesheet ->
+                    tuple( meta.datatype, meta, samplesheet )
+            }
+            .groupTuple(sort: 'deep')
+            .map {
+                datatype, old_meta, samplesheet ->
+                    def meta = [:]
+                    meta.id  = datatype
+                    return [ meta, samplesheet ]
+            }
+
+        // MODULE: Merge the samplesheets by data type
+        ch_final_samplesheet = MERGE_SAMPLESHEETS (
+            ch_samplesheets
+        )
+    }
 
     //
     // MODULE: Run FastQC
     //
-    FASTQC (
-        ch_simulated_reads
+    if ( !params.skip_fastqc ) {
+        FASTQC (
+            ch_simulated_reads
+        )
+        ch_multiqc_files = ch_multiqc_files.mix(FASTQC.out.zip.collect{it[1]})
+        ch_versions = ch_versions.mix(FASTQC.out.versions.first())
+    }
+
+    //
+    // MODULE: Report the read statistics the readsim engines collected while writing reads
+    //
+    READSIM_QC_REPORT (
+        ch_read_stats.collect()
     )
-    ch_multiqc_files = ch_multiqc_files.mix(FASTQC.out.zip.collect{it[1]})
-    ch_versions = ch_versions.mix(FASTQC.out.versions.first())
+    ch_multiqc_files = ch_multiqc_files.mix(READSIM_QC_REPORT.out.mqc)
+    ch_versions      = ch_versions.mix(READSIM_QC_REPORT.out.versions)
 
     //
     // Collate and save software versions
@@ -208,6 +526,45 @@ workflow READSIMULATOR {
     versions        = ch_versions                 // channel: [ path(versions.yml) ]
 }
 
+/*
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+    FUNCTIONS
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+*/
+
+//
+// Pair every sample of a batched task with its own <id>_R1/<id>_R2 reads
+//
+def splitBatchReads(samples, fastqs, extension) {
+    return samples.collect {
+        sample ->
+            def names = [ "${sample.id}_R1${extension}", "${sample.id}_R2${extension}" ]*.toString()
+            def reads = fastqs.findAll { fastq -> fastq.name in names }.sort { fastq -> fastq.name }
+            return [ sample + [:], reads ]
+    }
+}
+
+//
+// Seed of the mutated genome of a sample; the shards of a sample share its genome
+//
+def haplotypeSeed(meta) {
+    return meta.containsKey('sample_seed') ? meta.sample_seed : meta.seed
+}
+
+//
+// Options the haplotypes depend on besides the reference and the seed, as a cache directory name
+//
+def haplotypeSettings() {
+    return [
+        "r${params.wholegenome_mutation_rate}",
+        "R${params.wholegenome_indel_fraction}",
+        "X${params.wholegenome_indel_extended}",
+        "d${params.wholegenome_outer_dist}",
+        "s${params.wholegenome_standard_dev}",
+        "l${Math.max(params.wholegenome_r1_length as int, params.wholegenome_r2_length as int)}"
+    ].join('_')
+}
+
 /*
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
     THE END